@@ -1,28 +1,41 @@
-
-
-cmake_minimum_required(VERSION 2.8)
-enable_language(Fortran)
-
-find_package(BLAS REQUIRED)
-find_package(LAPACK REQUIRED)
-find_package(LAPACKE REQUIRED)
-
-include_directories(${LAPACKE_INCLUDE_DIRS})
-
-find_package(SlicerExecutionModel REQUIRED)
-find_package(MeshLib REQUIRED)
-
-find_package(VTK REQUIRED)
-include(${VTK_USE_FILE})
-
-include(${SlicerExecutionModel_USE_FILE})
-include(${GenerateCLP_USE_FILE})
-include_directories(Mesh GroupwiseRegistration)
-include_directories( ${CMAKE_SOURCE_DIR} ${CMAKE_BINARY_DIR} )
-
-
-include_directories(src)
-
-include_directories(wrapper)
-add_subdirectory(wrapper)
-add_subdirectory(src)
\ No newline at end of file
+
+
+cmake_minimum_required(VERSION 2.8)
+enable_language(Fortran)
+
+find_package(BLAS REQUIRED)
+find_package(LAPACK REQUIRED)
+find_package(LAPACKE REQUIRED)
+
+include_directories(${LAPACKE_INCLUDE_DIRS})
+
+find_package(SlicerExecutionModel REQUIRED)
+find_package(MeshLib REQUIRED)
+
+find_package(VTK REQUIRED)
+include(${VTK_USE_FILE})
+
+# threaded cost evaluation (optional)
+find_package(OpenMP)
+if(OPENMP_FOUND)
+  set(CMAKE_C_FLAGS "${CMAKE_C_FLAGS} ${OpenMP_C_FLAGS}")
+  set(CMAKE_CXX_FLAGS "${CMAKE_CXX_FLAGS} ${OpenMP_CXX_FLAGS}")
+  set(CMAKE_EXE_LINKER_FLAGS "${CMAKE_EXE_LINKER_FLAGS} ${OpenMP_EXE_LINKER_FLAGS}")
+endif()
+
+include(${SlicerExecutionModel_USE_FILE})
+include(${GenerateCLP_USE_FILE})
+include_directories(Mesh GroupwiseRegistration)
+include_directories( ${CMAKE_SOURCE_DIR} ${CMAKE_BINARY_DIR} )
+
+
+include_directories(src)
+
+include_directories(wrapper)
+add_subdirectory(wrapper)
+add_subdirectory(src)
+
+include(CTest)
+if(BUILD_TESTING)
+  add_subdirectory(Testing)
+endif()
\ No newline at end of file
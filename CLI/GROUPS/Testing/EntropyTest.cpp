@@ -0,0 +1,88 @@
+/*************************************************
+*	EntropyTest.cpp
+*
+*	Agreement of the eigenvalue and Cholesky
+*	entropies on synthetic centered cohorts
+*************************************************/
+
+#include <cstdlib>
+#include <cmath>
+#include <iostream>
+#include "GroupwiseRegistration.h"
+
+static void covariance(int nSubj, int nFeature, float *cov)
+{
+	// dual covariance of random feature vectors, centered as in GroupwiseRegistration::covariance
+	float *feature = new float[nSubj * nFeature];
+	float *mean = new float[nFeature];
+	for (int i = 0; i < nSubj * nFeature; i++) feature[i] = (float)rand() / RAND_MAX;
+	for (int k = 0; k < nFeature; k++)
+	{
+		mean[k] = 0;
+		for (int subj = 0; subj < nSubj; subj++) mean[k] += feature[subj * nFeature + k];
+		mean[k] /= nSubj;
+	}
+	for (int i = 0; i < nSubj; i++)
+	{
+		for (int j = i; j < nSubj; j++)
+		{
+			float sum = 0;
+			for (int k = 0; k < nFeature; k++)
+				sum += (feature[i * nFeature + k] - mean[k]) * (feature[j * nFeature + k] - mean[k]);
+			cov[i * nSubj + j] = cov[j * nSubj + i] = sum / (nSubj - 1);
+		}
+	}
+	delete [] feature;
+	delete [] mean;
+}
+
+static int check(int nSubj, int nFeature)
+{
+	float alpha = 1e-5;	// the same as GroupwiseRegistration::entropy
+	float *cov = new float[nSubj * nSubj];
+	float *chol = new float[nSubj * nSubj];
+	float *eig = new float[nSubj];
+	float *work = new float[nSubj * 3];
+	covariance(nSubj, nFeature, cov);
+
+	double E1;
+	bool success = GroupwiseRegistration::logDeterminant(cov, nSubj, alpha, &E1, chol);
+
+	GroupwiseRegistration::eigenvalues(cov, nSubj, eig, work);	// overwrites cov
+	double E0 = 0;
+	for (int i = 1; i < nSubj; i++) E0 += log(eig[i] + alpha);
+
+	delete [] cov;
+	delete [] chol;
+	delete [] eig;
+	delete [] work;
+
+	double diff = fabs(E1 - E0) / max(fabs(E0), 1.0);
+	cout << nSubj << " subjects, " << nFeature << " features: eigenvalues " << E0 << ", Cholesky " << E1 << ", relative difference " << diff << endl;
+	if (!success)
+	{
+		cout << "-Cholesky factorization failed" << endl;
+		return 1;
+	}
+	if (diff > GroupwiseRegistration::entropyTolerance)
+	{
+		cout << "-exceeds the tolerance " << GroupwiseRegistration::entropyTolerance << endl;
+		return 1;
+	}
+	return 0;
+}
+
+int main(int argc, char *argv[])
+{
+	srand(0);
+	int nErrors = 0;
+	// fewer features than subjects (rank deficient, alpha dominates the small eigenvalues) and more
+	nErrors += check(10, 5);
+	nErrors += check(10, 1000);
+	nErrors += check(50, 20);
+	nErrors += check(50, 2000);
+	nErrors += check(200, 5000);
+
+	cout << nErrors << " errors" << endl;
+	return (nErrors == 0) ? EXIT_SUCCESS: EXIT_FAILURE;
+}
@@ -0,0 +1,146 @@
+/*************************************************
+*	VTKPropertyReaderTest.cpp
+*
+*	Selective reads of the point-data arrays of
+*	ASCII and binary legacy VTK files
+*************************************************/
+
+#include <cstdio>
+#include <cstdlib>
+#include <cstring>
+#include <cmath>
+#include <iostream>
+#include "VTKPropertyReader.h"
+
+static const int nPoints = 50;
+static const int nCells = 20;
+static const char *fieldNames[3] = {"Curvedness", "Shape_Index", "Other"};
+
+static float value(int array, int i)
+{
+	return array * 100 + i * 0.25f;
+}
+
+static void writeValues(FILE *fp, bool binary, const float *v, int n)
+{
+	for (int i = 0; i < n; i++)
+	{
+		if (binary)
+		{
+			// big-endian
+			unsigned char b[4], *p = (unsigned char *)&v[i];
+			int one = 1;
+			for (int k = 0; k < 4; k++) b[k] = (*(char *)&one == 1) ? p[3 - k]: p[k];
+			fwrite(b, 1, 4, fp);
+		}
+		else fprintf(fp, "%g\n", v[i]);
+	}
+	if (binary) fprintf(fp, "\n");
+}
+
+static void writeInts(FILE *fp, bool binary, const int *v, int n)
+{
+	float *f = new float[n];
+	if (binary)
+	{
+		for (int i = 0; i < n; i++) memcpy(&f[i], &v[i], 4);
+		writeValues(fp, true, f, n);
+	}
+	else for (int i = 0; i < n; i++) fprintf(fp, "%d\n", v[i]);
+	delete [] f;
+}
+
+static void writeFile(const char *filename, bool binary)
+{
+	// cell data first, a point-data SCALARS array and the other point arrays in one FIELD block (as vtkPolyDataWriter does)
+	FILE *fp = fopen(filename, "wb");
+	fprintf(fp, "# vtk DataFile Version 4.2\nvtk output\n%s\nDATASET POLYDATA\n", binary ? "BINARY": "ASCII");
+	float *v = new float[nPoints * 3];
+	for (int i = 0; i < nPoints * 3; i++) v[i] = (float)i;
+	fprintf(fp, "POINTS %d float\n", nPoints);
+	writeValues(fp, binary, v, nPoints * 3);
+	int *cells = new int[nCells * 4];
+	for (int i = 0; i < nCells; i++)
+	{
+		cells[i * 4] = 3;
+		for (int k = 1; k < 4; k++) cells[i * 4 + k] = (i + k) % nPoints;
+	}
+	fprintf(fp, "POLYGONS %d %d\n", nCells, nCells * 4);
+	writeInts(fp, binary, cells, nCells * 4);
+	fprintf(fp, "CELL_DATA %d\nSCALARS Color_Map_Phi float 1\nLOOKUP_TABLE default\n", nCells);
+	for (int i = 0; i < nCells; i++) v[i] = -1;
+	writeValues(fp, binary, v, nCells);
+	fprintf(fp, "POINT_DATA %d\nSCALARS Color_Map_Phi float 1\nLOOKUP_TABLE default\n", nPoints);
+	for (int i = 0; i < nPoints; i++) v[i] = value(9, i);
+	writeValues(fp, binary, v, nPoints);
+	fprintf(fp, "METADATA\nINFORMATION 0\n\n");
+	fprintf(fp, "FIELD FieldData 3\n");
+	for (int a = 0; a < 3; a++)
+	{
+		fprintf(fp, "%s 1 %d float\n", fieldNames[a], nPoints);
+		for (int i = 0; i < nPoints; i++) v[i] = value(a, i);
+		writeValues(fp, binary, v, nPoints);
+	}
+	fclose(fp);
+	delete [] v;
+	delete [] cells;
+}
+
+static int check(const char *filename, const vector<string> &names, const vector<int> &arrays)
+{
+	VTKPropertyReader reader;
+	if (!reader.open(filename, names) || reader.nPoints() != nPoints)
+	{
+		cout << filename << ": open failed (" << names.size() << " arrays, first " << names[0] << ")" << endl;
+		return 1;
+	}
+	float *buffer = new float[nPoints];
+	int nErrors = 0;
+	for (int a = 0; a < names.size(); a++)
+	{
+		bool found = reader.read(names[a].c_str(), buffer, nPoints);
+		if (found != (arrays[a] >= 0))
+		{
+			cout << filename << ": " << names[a] << (found ? " found": " not found") << endl;
+			nErrors++;
+			continue;
+		}
+		for (int i = 0; found && i < nPoints; i++)
+		{
+			if (fabs(buffer[i] - value(arrays[a], i)) > 1e-4f)
+			{
+				cout << filename << ": " << names[a] << "[" << i << "] = " << buffer[i] << " instead of " << value(arrays[a], i) << endl;
+				nErrors++;
+				break;
+			}
+		}
+	}
+	delete [] buffer;
+	return nErrors;
+}
+
+int main(int argc, char *argv[])
+{
+	string dir = (argc > 1) ? argv[1]: ".";
+	int nErrors = 0;
+	for (int binary = 0; binary < 2; binary++)
+	{
+		string filename = dir + ((binary) ? "/VTKPropertyReaderTest_binary.vtk": "/VTKPropertyReaderTest_ascii.vtk");
+		writeFile(filename.c_str(), binary != 0);
+
+		// each FIELD array alone (the first ones are not the last of the block), pairs, the SCALARS array, and a missing one
+		for (int a = 0; a < 3; a++)
+			nErrors += check(filename.c_str(), vector<string>(1, fieldNames[a]), vector<int>(1, a));
+		vector<string> names;
+		vector<int> arrays;
+		names.push_back("Curvedness"); arrays.push_back(0);
+		names.push_back("Shape_Index"); arrays.push_back(1);
+		nErrors += check(filename.c_str(), names, arrays);
+		names[1] = "Color_Map_Phi"; arrays[1] = 9;
+		nErrors += check(filename.c_str(), names, arrays);
+		names.push_back("Missing"); arrays.push_back(-1);
+		nErrors += check(filename.c_str(), names, arrays);
+	}
+	cout << nErrors << " errors" << endl;
+	return (nErrors == 0) ? EXIT_SUCCESS: EXIT_FAILURE;
+}
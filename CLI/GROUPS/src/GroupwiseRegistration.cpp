@@ -1,1345 +1,3284 @@
-/*************************************************
-*	GroupwiseRegistration.cpp
-*
-*	Release: Sep 2016
-*	Update: Sep 2016
-*
-*	University of North Carolina at Chapel Hill
-*	Department of Computer Science
-*	
-*	Ilwoo Lyu, ilwoolyu@cs.unc.edu
-*************************************************/
-
-#include <cstring>
-#include <iterator>
-#include <float.h>
-#include "GroupwiseRegistration.h"
-#include "SphericalHarmonics.h"
-#include <lapacke.h>
-#include "newuoa.h"
-
-#include <vtkPolyData.h>
-#include <vtkPolyDataReader.h>
-#include <vtkDataArray.h>
-#include <vtkDoubleArray.h>
-#include <vtkSmartPointer.h>
-#include <vtkPointData.h>
-#include <vtkPointLocator.h>
-
-GroupwiseRegistration::GroupwiseRegistration(void)
-{
-	m_maxIter = 0;
-	m_nSubj = 0;
-	m_mincost = FLT_MAX;
-	m_nProperties = 0;
-	m_nSurfaceProperties = 0;
-	m_degree = 0;
-	m_degree_inc = 1;	// starting degree for the incremental optimization
-	m_UseLandmarks = false;
-}
-
-// GroupwiseRegistration::GroupwiseRegistration(const char **sphere, int nSubj, const char **property, int nProperties, const char **output, const float *weight, int deg, const char **landmark, float weightLoc, const char **coeff, const char **surf, int maxIter)
-// {
-// 	m_maxIter = maxIter;
-// 	m_nSubj = nSubj;
-// 	m_mincost = FLT_MAX;
-// 	m_nProperties = nProperties;
-// 	m_nSurfaceProperties = (weightLoc > 0)? 3: 0;
-// 	m_output = output;
-// 	m_degree = deg;
-// 	m_degree_inc = 3;	// starting degree for the incremental optimization
-// 	init(sphere, property, weight, landmark, weightLoc, coeff, surf, 4);
-// 	m_UseLandmarks = false;
-// }
-
-GroupwiseRegistration::GroupwiseRegistration(vector<string> sphere, vector<string> surf, std::map<std::string, float> mapProperty, vector<string> outputcoeff, bool landmarksOn, double weightLoc, int deg, vector<string> inputcoeff, int maxIter)
-{
-	m_maxIter = maxIter;
-	m_nSubj = sphere.size();
-	m_mincost = FLT_MAX;
-	m_nProperties = mapProperty.size();
-	//For backward compatibility, we substract 1 from the number of properties and make sure that the landmarks (now included in properties) are in the array.
-	// for(int i = 0; i < m_nProperties; i++){
-	// 	if(propertiesnames[i].compare("Landmarks") || propertiesnames[i].compare("LANDMARKS") || propertiesnames[i].compare("landmarks")){
-	// 		m_nProperties--;
-	// 		m_UseLandmarks = true;
-	// 		break;
-	// 	}
-	// }
-
-	m_UseLandmarks = landmarksOn;
-
-	if(m_UseLandmarks){
-		cout<<"Using landmarks included in file"<<endl;
-	}
-
-	m_nSurfaceProperties = (weightLoc > 0)? 3: 0;
-	m_Output = outputcoeff;
-	m_degree = deg;
-	m_degree_inc = 3;	// starting degree for the incremental optimization
-	m_SamplingDegree = 4;
-	init(sphere, surf, mapProperty, weightLoc, inputcoeff, m_SamplingDegree);
-}
-
-GroupwiseRegistration::~GroupwiseRegistration(void)
-{
-	delete [] m_cov;
-	delete [] m_feature_weight;
-	delete [] m_eig;
-	delete [] m_feature;
-	delete [] m_updated;
-	delete [] m_work;
-	delete [] m_coeff;
-	delete [] m_coeff_prev_step;
-	for (int subj = 0; subj < m_nSubj; subj++)
-	{
-		delete m_spharm[subj].tree;
-		delete m_spharm[subj].surf;
-		delete m_spharm[subj].sphere;
-		delete [] m_spharm[subj].coeff;
-		delete [] m_spharm[subj].coeff_prev_step;
-		delete [] m_spharm[subj].tree_cache;
-		delete [] m_spharm[subj].meanProperty;
-		delete [] m_spharm[subj].maxProperty;
-		delete [] m_spharm[subj].minProperty;
-		delete [] m_spharm[subj].sdevProperty;
-		delete [] m_spharm[subj].property;
-		delete [] m_spharm[subj].flip;
-	}
-	delete [] m_spharm;
-	for (int i = 0; i < m_propertySamples.size(); i++)
-		delete m_propertySamples[i];
-}
-
-void GroupwiseRegistration::run(void)
-{
-	cout << "Optimization\n";
-	optimization();
-
-	// write the solutions
-	for (int subj = 0; subj < m_nSubj; subj++)
-	{
-		saveCoeff(m_Output[subj].c_str(), subj);
-	}
-	cout << "All done!\n";
-}
-
-void GroupwiseRegistration::init(vector<string> sphere,vector<string> surf, std::map<std::string, float> mapProperty, double weightLoc, vector<string> inputcoeff, double m_SamplingDegree){
-	m_spharm = new spharm[m_nSubj];	// spharm info
-	m_updated = new bool[m_nSubj];	// AABB_Sphere tree cache
-	m_eig = new float[m_nSubj];		// eigenvalues
-	m_work = new float[m_nSubj * 3 - 1];	// workspace for eigenvalue computation
-	m_csize = (m_degree + 1) * (m_degree + 1) * m_nSubj; // total # of coefficients
-	m_coeff = new float[m_csize * 2];	// how many coefficients are required: the sum of all possible coefficients
-	m_coeff_prev_step = new float[m_csize * 2];	// the previous coefficients
-
-	// set all the coefficient to zeros
-	memset(m_coeff, 0, sizeof(float) * m_csize * 2);
-	memset(m_coeff_prev_step, 0, sizeof(float) * m_csize * 2);
-	memset(m_updated, 0, sizeof(bool) * m_nSubj);
-	
-	cout << "Initialzation of subject information\n";
-
-	for (int subj = 0; subj < m_nSubj; subj++)
-	{
-		cout << "Subject " << subj << " - " << sphere[subj] << endl;
-		
-		// spehre and surface information
-		cout << "-Sphere information\n";
-		m_spharm[subj].sphere = new Mesh();
-		if (sphere.size() > 0)
-		{
-			m_spharm[subj].sphere->openFile(sphere[subj].c_str());
-			// make sure a unit sphere
-			m_spharm[subj].sphere->centering();
-			for (int i = 0; i < m_spharm[subj].sphere->nVertex(); i++)
-			{
-				Vertex *v = (Vertex *)m_spharm[subj].sphere->vertex(i);	// vertex information on the sphere
-				const float *v0 = v->fv();
-				Vector V(v0); V.unit();
-				v->setVertex(V.fv());
-			}
-		}
-		else cout << " Fatal error: No sphere mapping is provided!\n";
-		
-		// previous spherical harmonic deformation fields
-		cout << "-Spherical harmonics information\n";
-		initSphericalHarmonics(subj, inputcoeff);
-		updateDeformation(subj);	// deform the sphere for efficient AABB_Sphere tree creation
-		
-		if (m_nSurfaceProperties > 0)
-		{
-			cout << "-Location information\n";
-			m_spharm[subj].surf = new Mesh();
-			m_spharm[subj].surf->openFile(surf[subj].c_str());
-		}
-		else m_spharm[subj].surf = NULL;
-		cout << "m_nProperties :: " << m_nProperties << endl;
-		if (m_nProperties + m_nSurfaceProperties > 0)
-		{
-			// AABB_Sphere tree construction for speedup computation
-			cout << "-AABB_Sphere tree construction\n";
-			m_spharm[subj].tree = new AABB_Sphere(m_spharm[subj].sphere);
-		}
-		else m_spharm[subj].tree = NULL;
-		
-		// triangle flipping
-		cout << "-Triangle flipping\n";
-		initTriangleFlipping(subj);
-		
-		// triangle flipping
-		cout << "-Triangle flipping\n";
-		initTriangleFlipping(subj);
-		
-		// property information
-		// cout << "-Property information\n";
-		// initProperties(subj, property, 3);
-		
-		// // landmarks
-		// if (landmark != NULL)
-		// {
-		// 	cout << "-Landmark information\n";
-		// 	initLandmarks(subj, landmark, surf);
-		// 	// m_UseLandmarks = true
-		// }
-		// cout << "----------" << endl;
-
-		//initLandmarks(subj, landmark, surf);
-
-		// property information
-		cout << "-Property and landmarks information\n";
-		initPropertiesAndLandmarks(subj, surf[subj], mapProperty);
-		
-		cout << "----------" << endl;
-	}
-
-	// icosahedron subdivision for evaluation on properties: this generates uniform sampling points over the sphere - m_propertySamples
-	if (m_nProperties + m_nSurfaceProperties > 0) icosahedron(m_SamplingDegree);
-	// landmark information - the number of landamrks should be the same across subjects
-	if (m_UseLandmarks)
-	{
-		int nLandmark = m_spharm[0].landmark.size();
-		for (int subj = 0; subj < m_nSubj; subj++)
-			if (nLandmark != m_spharm[subj].landmark.size())
-				cout << " Fatal error: # of landamrks should be agreed!\n";
-	}
-
-	cout << "Computing weight terms\n";
-	int nLandmark = m_spharm[0].landmark.size() * 3;	// # of landmarks: we assume all the subject has the same number, which already is checked above.
-	int nSamples = m_propertySamples.size();	// # of sampling points for property map agreement
-
-	cout<<"Number of samples: "<<nSamples<<endl;
-	
-	// weights for covariance matrix computation
-	int nTotalProperties = m_nProperties + m_nSurfaceProperties;	// if location information is provided, total number = # of property + 3 -> (x, y, z location)
-	m_feature_weight = new float[nLandmark + nSamples * nTotalProperties];
-	float landmarkWeight = (nLandmark > 0) ? (float)nSamples / (float)nLandmark: 0;	// based on the number ratio (balance between landmark and property)
-	float totalWeight = weightLoc;
-	std::map< std::string, float >::const_iterator it = mapProperty.begin(), it_end = mapProperty.end();
-	for ( ; it != it_end ; it ++ )
-		totalWeight += it->second;
-
-
-	landmarkWeight *= totalWeight;
-	if (landmarkWeight == 0) landmarkWeight = 1;
-	cout << "Total properties: " << nTotalProperties << endl;
-	cout << "Sampling points: " << nSamples << endl;
-
-	// assign the weighting factors
-	for (int i = 0; i < nLandmark; i++) m_feature_weight[i] = landmarkWeight;
-	int n = 0;
-	it = mapProperty.begin(), it_end = mapProperty.end();
-	for ( ; it != it_end ; it ++ )
-	{
-		for (int i = 0; i < nSamples; i++)
-			m_feature_weight[nLandmark + nSamples * n + i] = it->second;
-		n++;
-	}
-	// weight for location information
-	for (int n = 0; n < m_nSurfaceProperties; n++)
-		for (int i = 0; i < nSamples; i++)
-			m_feature_weight[nLandmark + nSamples * (m_nProperties + n) + i] = weightLoc;
-	
-	if (nLandmark > 0) cout << "Landmark weight: " << landmarkWeight << endl;
-	if (m_nProperties > 0)
-	{
-		cout << "Property weight: ";
-		it = mapProperty.begin(), it_end = mapProperty.end();
-		for ( ; it != it_end ; it ++ ) cout << it->second << " ";
-		cout << endl;
-	}
-	if (weightLoc > 0) cout << "Location weight: " << weightLoc << endl;
-	
-	cout << "Initialization of work space\n";
-	m_cov = new float[m_nSubj * m_nSubj];	// convariance matrix defined in the duel space with dimensions: nSubj x nSubj
-	m_feature = new float[m_nSubj * (nLandmark + nSamples * nTotalProperties)];	// the entire feature vector map for optimization
-
-	// AABB_Sphere tree cache for each subject: this stores the closest face of the sampling point to the corresponding face on the input sphere model
-	for (int subj = 0; subj < m_nSubj; subj++)
-	{
-		if (nTotalProperties > 0)
-		{
-			m_spharm[subj].tree_cache = new int[nSamples];
-			for (int i = 0; i < nSamples; i++)
-				m_spharm[subj].tree_cache[i] = -1;	// initially, set to -1 (invalid index)
-		}
-		else m_spharm[subj].tree_cache = NULL;
-	}
-
-	// inital coefficients for the previous step
-	memcpy(m_coeff_prev_step, m_coeff, sizeof(float) * m_csize * 2);
-
-	cout << "Feature vector creation\n";
-	// set all the tree needs to be updated
-	memset(m_updated, 0, sizeof(bool) * m_nSubj);
-
-	// feature update
-	if (nLandmark > 0) updateLandmark(); // update landmark
-	if (nSamples > 0) updateProperties(); // update properties
-
-	cout << "Initialization done!" << endl;
-}
-
-void GroupwiseRegistration::init(const char **sphere, const char **property, const float *weight, const char **landmark, float weightLoc, const char **coeff, const char **surf, int samplingDegree)
-{
-	m_spharm = new spharm[m_nSubj];	// spharm info
-	m_updated = new bool[m_nSubj];	// AABB_Sphere tree cache
-	m_eig = new float[m_nSubj];		// eigenvalues
-	m_work = new float[m_nSubj * 3 - 1];	// workspace for eigenvalue computation
-	m_csize = (m_degree + 1) * (m_degree + 1) * m_nSubj; // total # of coefficients
-	m_coeff = new float[m_csize * 2];	// how many coefficients are required: the sum of all possible coefficients
-	m_coeff_prev_step = new float[m_csize * 2];	// the previous coefficients
-
-	// set all the coefficient to zeros
-	memset(m_coeff, 0, sizeof(float) * m_csize * 2);
-	memset(m_coeff_prev_step, 0, sizeof(float) * m_csize * 2);
-	memset(m_updated, 0, sizeof(bool) * m_nSubj);
-	
-	cout << "Initialzation of subject information\n";
-
-	for (int subj = 0; subj < m_nSubj; subj++)
-	{
-		cout << "Subject " << subj << " - " << sphere[subj] << endl;
-		
-		// spehre and surface information
-		cout << "-Sphere information\n";
-		m_spharm[subj].sphere = new Mesh();
-		if (sphere != NULL)
-		{
-			m_spharm[subj].sphere->openFile(sphere[subj]);
-			// make sure a unit sphere
-			m_spharm[subj].sphere->centering();
-			for (int i = 0; i < m_spharm[subj].sphere->nVertex(); i++)
-			{
-				Vertex *v = (Vertex *)m_spharm[subj].sphere->vertex(i);	// vertex information on the sphere
-				const float *v0 = v->fv();
-				Vector V(v0); V.unit();
-				v->setVertex(V.fv());
-			}
-		}
-		else cout << " Fatal error: No sphere mapping is provided!\n";
-		
-		// previous spherical harmonic deformation fields
-		cout << "-Spherical harmonics information\n";
-		initSphericalHarmonics(subj, coeff);
-		updateDeformation(subj);	// deform the sphere for efficient AABB_Sphere tree creation
-		
-		if (m_nSurfaceProperties > 0)
-		{
-			cout << "-Location information\n";
-			m_spharm[subj].surf = new Mesh();
-			m_spharm[subj].surf->openFile(surf[subj]);
-		}
-		else m_spharm[subj].surf = NULL;
-		
-		if (m_nProperties + m_nSurfaceProperties > 0)
-		{
-			// AABB_Sphere tree construction for speedup computation
-			cout << "-AABB_Sphere tree construction\n";
-			m_spharm[subj].tree = new AABB_Sphere(m_spharm[subj].sphere);
-		}
-		else m_spharm[subj].tree = NULL;
-		
-		// triangle flipping
-		cout << "-Triangle flipping\n";
-		initTriangleFlipping(subj);
-		
-		// property information
-		cout << "-Property information\n";
-		initProperties(subj, property, 3);
-		
-		// landmarks
-		if (landmark != NULL)
-		{
-			cout << "-Landmark information\n";
-			initLandmarks(subj, landmark, surf);
-			// m_UseLandmarks = true
-		}
-		cout << "----------" << endl;
-	}
-
-	cout << " state m_UseLandmarks :: " << m_UseLandmarks << endl << endl;
-	// icosahedron subdivision for evaluation on properties: this generates uniform sampling points over the sphere - m_propertySamples
-	if (m_nProperties + m_nSurfaceProperties > 0) icosahedron(samplingDegree);
-	// landmark information - the number of landamrks should be the same across subjects
-	if (m_UseLandmarks)
-	{
-		int nLandmark = m_spharm[0].landmark.size();
-		for (int subj = 0; subj < m_nSubj; subj++)
-			if (nLandmark != m_spharm[subj].landmark.size())
-				cout << " Fatal error: # of landamrks should be agreed!\n";
-	}
-
-	cout << "Computing weight terms\n";
-	int nLandmark = m_spharm[0].landmark.size() * 3;	// # of landmarks: we assume all the subject has the same number, which already is checked above.
-	int nSamples = m_propertySamples.size();	// # of sampling points for property map agreement
-	
-	// weights for covariance matrix computation
-	int nTotalProperties = m_nProperties + m_nSurfaceProperties;	// if location information is provided, total number = # of property + 3 -> (x, y, z location)
-	m_feature_weight = new float[nLandmark + nSamples * nTotalProperties];
-	float landmarkWeight = (nLandmark > 0) ? (float)nSamples / (float)nLandmark: 0;	// based on the number ratio (balance between landmark and property)
-	float totalWeight = weightLoc;
-	for (int n = 0; n < m_nProperties; n++) totalWeight += weight[n];
-	landmarkWeight *= totalWeight;
-	if (landmarkWeight == 0) landmarkWeight = 1;
-	cout << "Total properties: " << nTotalProperties << endl;
-	cout << "Sampling points: " << nSamples << endl;
-
-	// assign the weighting factors
-	for (int i = 0; i < nLandmark; i++) m_feature_weight[i] = landmarkWeight;
-	for (int n = 0; n < m_nProperties; n++)
-		for (int i = 0; i < nSamples; i++)
-			m_feature_weight[nLandmark + nSamples * n + i] = weight[n];
-	// weight for location information
-	for (int n = 0; n < m_nSurfaceProperties; n++)
-		for (int i = 0; i < nSamples; i++)
-			m_feature_weight[nLandmark + nSamples * (m_nProperties + n) + i] = weightLoc;
-	
-	if (nLandmark > 0) cout << "Landmark weight: " << landmarkWeight << endl;
-	if (m_nProperties > 0)
-	{
-		cout << "Property weight: ";
-		for (int i = 0; i < m_nProperties; i++) cout << weight[i] << " ";
-		cout << endl;
-	}
-	if (weightLoc > 0) cout << "Location weight: " << weightLoc << endl;
-	
-	cout << "Initialization of work space\n";
-	m_cov = new float[m_nSubj * m_nSubj];	// convariance matrix defined in the duel space with dimensions: nSubj x nSubj
-	m_feature = new float[m_nSubj * (nLandmark + nSamples * nTotalProperties)];	// the entire feature vector map for optimization
-
-	// AABB_Sphere tree cache for each subject: this stores the closest face of the sampling point to the corresponding face on the input sphere model
-	for (int subj = 0; subj < m_nSubj; subj++)
-	{
-		if (nTotalProperties > 0)
-		{
-			m_spharm[subj].tree_cache = new int[nSamples];
-			for (int i = 0; i < nSamples; i++)
-				m_spharm[subj].tree_cache[i] = -1;	// initially, set to -1 (invalid index)
-		}
-		else m_spharm[subj].tree_cache = NULL;
-	}
-
-	// inital coefficients for the previous step
-	memcpy(m_coeff_prev_step, m_coeff, sizeof(float) * m_csize * 2);
-
-	cout << "Feature vector creation\n";
-	// set all the tree needs to be updated
-	memset(m_updated, 0, sizeof(bool) * m_nSubj);
-
-	// feature update
-	if (nLandmark > 0) updateLandmark(); // update landmark
-	if (nSamples > 0) updateProperties(); // update properties
-
-	cout << "Initialization done!" << endl;
-}
-
-void GroupwiseRegistration::initSphericalHarmonics(int subj, vector<string> coeff)
-{
-	// spherical harmonics information
-	int n = (m_degree + 1) * (m_degree + 1);	// total number of coefficients (this must be the same across all the subjects at the end of this program)
-	// new memory allocation for coefficients
-	m_spharm[subj].coeff = new float*[n * 2];
-	m_spharm[subj].coeff_prev_step = new float*[n * 2];
-	
-	for (int i = 0; i < n; i++)
-	{
-		// store coefficients by asc order (low to high frequencies)
-		m_spharm[subj].coeff[i] = &m_coeff[m_nSubj * 2 * i + subj * 2];	// latitudes
-		m_spharm[subj].coeff[n + i] = &m_coeff[m_nSubj * 2 * i + subj * 2 + 1];	// longitudes
-		m_spharm[subj].coeff_prev_step[i] = &m_coeff_prev_step[m_nSubj * 2 * i + subj * 2];	// latitudes
-		m_spharm[subj].coeff_prev_step[n + i] = &m_coeff_prev_step[m_nSubj * 2 * i + subj * 2 + 1];	// longitudes
-	}
-
-	if (coeff.size() > 0)	// previous spherical harmonics information
-	{
-		FILE *fp = fopen(coeff[subj].c_str(),"r");
-		fscanf(fp, "%f %f %f", &m_spharm[subj].pole[0], &m_spharm[subj].pole[1], &m_spharm[subj].pole[2]);	// optimal pole information
-		fscanf(fp, "%d", &m_spharm[subj].degree);	// previous deformation field degree
-
-		if (m_spharm[subj].degree > m_degree) m_spharm[subj].degree = m_degree;	// if the previous degree is larger than desired one, just crop it.
-
-		// load previous coefficient information
-		for (int i = 0; i < (m_spharm[subj].degree + 1) * (m_spharm[subj].degree + 1); i++)
-			fscanf(fp, "%f %f", m_spharm[subj].coeff[i], m_spharm[subj].coeff[n + i]);
-		fclose(fp);
-	}
-	else	// no spherical harmonic information is provided
-	{
-		// just set the pole to [0, 0, 1]
-		m_spharm[subj].pole[0] = 0;
-		m_spharm[subj].pole[1] = 0;
-		m_spharm[subj].pole[2] = 1;
-	}
-	m_spharm[subj].degree = m_degree;
-	
-	// build spherical harmonic basis functions for each vertex
-	int nVertex = m_spharm[subj].sphere->nVertex();
-	for (int i = 0; i < nVertex; i++)
-	{
-		// vertex information
-		point *p = new point();	// new spherical information allocation
-		Vertex *v = (Vertex *)m_spharm[subj].sphere->vertex(i);	// vertex information on the sphere
-		const float *v0 = v->fv();
-		p->Y = new float[(m_degree + 1) * (m_degree + 1)];
-		p->p[0] = v0[0]; p->p[1] = v0[1]; p->p[2] = v0[2];
-		p->id = i;
-		p->subject = subj;
-		SphericalHarmonics::basis(m_degree, p->p, p->Y);
-		m_spharm[subj].vertex.push_back(p);
-	}
-}
-
-void GroupwiseRegistration::initSphericalHarmonics(int subj, const char **coeff)
-{
-	// spherical harmonics information
-	int n = (m_degree + 1) * (m_degree + 1);	// total number of coefficients (this must be the same across all the subjects at the end of this program)
-	// new memory allocation for coefficients
-	m_spharm[subj].coeff = new float*[n * 2];
-	m_spharm[subj].coeff_prev_step = new float*[n * 2];
-	
-	for (int i = 0; i < n; i++)
-	{
-		// store coefficients by asc order (low to high frequencies)
-		m_spharm[subj].coeff[i] = &m_coeff[m_nSubj * 2 * i + subj * 2];	// latitudes
-		m_spharm[subj].coeff[n + i] = &m_coeff[m_nSubj * 2 * i + subj * 2 + 1];	// longitudes
-		m_spharm[subj].coeff_prev_step[i] = &m_coeff_prev_step[m_nSubj * 2 * i + subj * 2];	// latitudes
-		m_spharm[subj].coeff_prev_step[n + i] = &m_coeff_prev_step[m_nSubj * 2 * i + subj * 2 + 1];	// longitudes
-	}
-
-	if (coeff != NULL)	// previous spherical harmonics information
-	{
-		FILE *fp = fopen(coeff[subj],"r");
-		fscanf(fp, "%f %f %f", &m_spharm[subj].pole[0], &m_spharm[subj].pole[1], &m_spharm[subj].pole[2]);	// optimal pole information
-		fscanf(fp, "%d", &m_spharm[subj].degree);	// previous deformation field degree
-
-		if (m_spharm[subj].degree > m_degree) m_spharm[subj].degree = m_degree;	// if the previous degree is larger than desired one, just crop it.
-
-		// load previous coefficient information
-		for (int i = 0; i < (m_spharm[subj].degree + 1) * (m_spharm[subj].degree + 1); i++)
-			fscanf(fp, "%f %f", m_spharm[subj].coeff[i], m_spharm[subj].coeff[n + i]);
-		fclose(fp);
-	}
-	else	// no spherical harmonic information is provided
-	{
-		// just set the pole to [0, 0, 1]
-		m_spharm[subj].pole[0] = 0;
-		m_spharm[subj].pole[1] = 0;
-		m_spharm[subj].pole[2] = 1;
-	}
-	m_spharm[subj].degree = m_degree;
-	
-	// build spherical harmonic basis functions for each vertex
-	int nVertex = m_spharm[subj].sphere->nVertex();
-	for (int i = 0; i < nVertex; i++)
-	{
-		// vertex information
-		point *p = new point();	// new spherical information allocation
-		Vertex *v = (Vertex *)m_spharm[subj].sphere->vertex(i);	// vertex information on the sphere
-		const float *v0 = v->fv();
-		p->Y = new float[(m_degree + 1) * (m_degree + 1)];
-		p->p[0] = v0[0]; p->p[1] = v0[1]; p->p[2] = v0[2];
-		p->id = i;
-		p->subject = subj;
-		SphericalHarmonics::basis(m_degree, p->p, p->Y);
-		m_spharm[subj].vertex.push_back(p);
-	}
-}
-
-void GroupwiseRegistration::initProperties(int subj, const char **property, int nHeaderLines)
-{
-	int nVertex = m_spharm[subj].sphere->nVertex();	// this is the same as the number of properties
-	int nFace = m_spharm[subj].sphere->nFace();
-	if (m_nProperties + m_nSurfaceProperties > 0)
-	{
-		m_spharm[subj].meanProperty = new float[m_nProperties + m_nSurfaceProperties];
-		m_spharm[subj].maxProperty = new float[m_nProperties + m_nSurfaceProperties];
-		m_spharm[subj].minProperty = new float[m_nProperties + m_nSurfaceProperties];
-		m_spharm[subj].sdevProperty = new float[m_nProperties + m_nSurfaceProperties];
-		m_spharm[subj].property = new float[(m_nProperties + m_nSurfaceProperties) * nVertex];
-	}
-	else
-	{
-		m_spharm[subj].meanProperty = NULL;
-		m_spharm[subj].maxProperty = NULL;
-		m_spharm[subj].minProperty = NULL;
-		m_spharm[subj].sdevProperty = NULL;
-		m_spharm[subj].property = NULL;
-	}
-	for (int i = 0; i < m_nProperties; i++)	// property information
-	{
-		int index = subj * m_nProperties + i;
-		cout << "\t" << property[index] << endl;
-		FILE *fp = fopen(property[index], "r");
-		
-		// remove header lines
-		char line[1024];
-		for (int j = 0; j < nHeaderLines; j++) fgets(line, sizeof(line), fp);
-		
-		// load property information
-		for (int j = 0; j < nVertex; j++) fscanf(fp, "%f", &m_spharm[subj].property[nVertex * i + j]);
-		fclose(fp);
-	}
-	for (int i = 0; i < m_nSurfaceProperties; i++)	// x, y, z dimensions
-	{
-		for (int j = 0; j < nVertex; j++)
-		{
-			Vertex *v = (Vertex *)m_spharm[subj].surf->vertex(j);
-			const float *v0 = v->fv();
-			m_spharm[subj].property[nVertex * (m_nProperties + i) + j] = v0[i];
-		}
-	}
-	
-	// find the best statistics across subjects
-	for (int i = 0; i < m_nProperties + m_nSurfaceProperties; i++)
-	{
-		cout << "--Property " << i << endl;
-		m_spharm[subj].meanProperty[i] = Statistics::mean(&m_spharm[subj].property[nVertex * i], nVertex);
-		m_spharm[subj].maxProperty[i] = Statistics::max(&m_spharm[subj].property[nVertex * i], nVertex);
-		m_spharm[subj].minProperty[i] = Statistics::min(&m_spharm[subj].property[nVertex * i], nVertex);
-		m_spharm[subj].sdevProperty[i] = sqrt(Statistics::var(&m_spharm[subj].property[nVertex * i], nVertex));
-		cout << "---Min/Max: " << m_spharm[subj].minProperty[i] << ", " << m_spharm[subj].maxProperty[i] << endl;
-		cout << "---Mean/Stdev: " << m_spharm[subj].meanProperty[i] << ", " << m_spharm[subj].sdevProperty[i] << endl;
-	}
-}
-
-void GroupwiseRegistration::initPropertiesAndLandmarks(int subj, string surfacename, std::map<std::string, float> mapProperty){
-
-
-	vtkSmartPointer<vtkPolyDataReader> reader = vtkSmartPointer<vtkPolyDataReader>::New();
-	reader->SetFileName(surfacename.c_str());
-	reader->Update();
-
-	vtkSmartPointer<vtkPolyData> surface = reader->GetOutput();
-
-	if(m_UseLandmarks){
-		vtkDoubleArray* arr = vtkDoubleArray::SafeDownCast(surface->GetPointData()->GetArray("Landmarks"));
-		if(arr != NULL){
-			cout<<endl;
-			cout<<endl;
-			cout<<"Landmarks for subject "<<subj<<endl;
-
-			for (int j = 0; j < arr->GetSize(); j++){
-				int id = (int)arr->GetValue(j);
-				if(id > 0 ){
-					const float *v = m_spharm[subj].sphere->vertex(id)->fv();
-		
-					float *Y = new float[(m_degree + 1) * (m_degree + 1)];
-					point *p = new point();
-					p->p[0] = v[0]; p->p[1] = v[1]; p->p[2] = v[2];
-					SphericalHarmonics::basis(m_degree, p->p, Y);
-					p->subject = subj;
-					p->Y = Y;
-					p->id = j;
-					cout<<p->subject<<endl;
-					cout<<Y<<endl;
-					cout<<id<<endl;
-					cout<<endl;
-					
-					m_spharm[subj].landmark.push_back(p);
-				}	
-			}
-		}
-	}
-
-	// int nVertex = surface->GetNumberOfPoints();
-	int nVertex = m_spharm[subj].sphere->nVertex();	// this is the same as the number of properties
-	if (m_nProperties + m_nSurfaceProperties > 0)
-	{
-		m_spharm[subj].meanProperty = new float[m_nProperties + m_nSurfaceProperties];
-		m_spharm[subj].maxProperty = new float[m_nProperties + m_nSurfaceProperties];
-		m_spharm[subj].minProperty = new float[m_nProperties + m_nSurfaceProperties];
-		m_spharm[subj].sdevProperty = new float[m_nProperties + m_nSurfaceProperties];
-		m_spharm[subj].property = new float[(m_nProperties + m_nSurfaceProperties) * nVertex];
-	}
-	else
-	{
-		m_spharm[subj].meanProperty = NULL;
-		m_spharm[subj].maxProperty = NULL;
-		m_spharm[subj].minProperty = NULL;
-		m_spharm[subj].sdevProperty = NULL;
-		m_spharm[subj].property = NULL;
-	}
-
-	
-	cout << "nVertex :: " << nVertex << endl;
-	int i = 0;
-	std::map<std::string, float>::const_iterator it = mapProperty.begin(), it_end = mapProperty.end();
-	for( ; it != it_end ; it ++ )
-	{
-		vtkDataArray* propArray = surface->GetPointData()->GetScalars((it->first).c_str());
-		if(propArray == NULL){
-			cerr<<"There is no property with name: " + it->first<<endl;
-			throw exception();
-		}
-		for (int j = 0; j < nVertex; j++ )
-		{
-			double k1 = propArray->GetTuple1(j);
-			m_spharm[subj].property[nVertex * i + j] = (float) k1;
-		}
-		i++;
-	}
-
-	// find the best statistics across subjects
-	it = mapProperty.begin(), it_end = mapProperty.end();
-	i = 0;
-	for( ; it != it_end ; it ++ )
-	// for (int i = 0; i < propertyNames.size(); i++)
-	{
-		cout << "--Property " << it->first << endl;
-		m_spharm[subj].meanProperty[i] = Statistics::mean(&m_spharm[subj].property[nVertex * i], nVertex);
-		m_spharm[subj].maxProperty[i] = Statistics::max(&m_spharm[subj].property[nVertex * i], nVertex);
-		m_spharm[subj].minProperty[i] = Statistics::min(&m_spharm[subj].property[nVertex * i], nVertex);
-		m_spharm[subj].sdevProperty[i] = sqrt(Statistics::var(&m_spharm[subj].property[nVertex * i], nVertex));
-		cout << "---Min/Max: " << m_spharm[subj].minProperty[i] << ", " << m_spharm[subj].maxProperty[i] << endl;
-		cout << "---Mean/Stdev: " << m_spharm[subj].meanProperty[i] << ", " << m_spharm[subj].sdevProperty[i] << endl;
-		i++;
-	}
-
-}
-
-void GroupwiseRegistration::initTriangleFlipping(int subj)
-{
-	int nFace = m_spharm[subj].sphere->nFace();
-	m_spharm[subj].flip = new bool[nFace];
-	
-	// check triangle flips
-	for (int i = 0; i < nFace; i++)
-	{
-		const float *v1 = m_spharm[subj].sphere->vertex(m_spharm[subj].sphere->face(i)->list(0))->fv();
-		const float *v2 = m_spharm[subj].sphere->vertex(m_spharm[subj].sphere->face(i)->list(1))->fv();
-		const float *v3 = m_spharm[subj].sphere->vertex(m_spharm[subj].sphere->face(i)->list(2))->fv();
-
-		Vector V1(v1), V2(v2), V3(v3);
-		Vector V = (V1 + v2 + V3) / 3;
-
-		Vector U = (V2 - V1).cross(V3 - V1);
-
-		if (V * U < 0) m_spharm[subj].flip[i] = true;
-		else m_spharm[subj].flip[i] = false;
-	}
-}
-
-// void GroupwiseRegistration::initLandmarks(int subj, const char **landmark)
-// {
-// 	FILE *fp = fopen(landmark[subj], "r");
-// 	int i = 0;
-// 	while (!feof(fp))
-// 	{
-// 		// indices for corresponding points
-// 		int srcid;
-
-// 		// landmark information
-// 		int id;
-// 		if (fscanf(fp, "%d", &id) == -1) break;
-// 		const float *v = m_spharm[subj].sphere->vertex(id)->fv();
-		
-// 		float *Y = new float[(m_degree + 1) * (m_degree + 1)];
-// 		point *p = new point();
-// 		p->p[0] = v[0]; p->p[1] = v[1]; p->p[2] = v[2];
-// 		SphericalHarmonics::basis(m_degree, p->p, Y);
-// 		p->subject = subj;
-// 		p->Y = Y;
-// 		p->id = id;
-
-// 		m_spharm[subj].landmark.push_back(p);
-		
-// 		i++;
-// 	}
-// 	fclose(fp);
-// }
-
-// InitLandmark while they are stored in the vtk file!
-void GroupwiseRegistration::initLandmarks(int subj, const char **landmark, const char **surf)
-{
-	// cout << " J'entre dans initlandmarks " << endl;
-	#define NB_LINES 250
-	#define NB_WORDS 250
-
-	std::fstream fcsvfile(landmark[subj]);
-	std::string line;
-	std::string mot;
-	std::string words[NB_LINES][NB_WORDS]; // !!!! WARNING DEFINE AND TO PROTECT IF SUPERIOR TO 20
-	int i,j;
-	int* landmarkPids;
-	int NbLandmarks;
-
-	// Get all surface data from the file
-	vtkSmartPointer<vtkPolyDataReader> surfacereader = vtkSmartPointer<vtkPolyDataReader>::New();
-	surfacereader->SetFileName(surf[subj]);
-	surfacereader->Update();
-
-	// Build a locator
-	vtkPointLocator *pointLocator = vtkPointLocator::New();
-	pointLocator->SetDataSet(surfacereader->GetOutput());
-	pointLocator->BuildLocator();
-
-	if(fcsvfile)
-	{
-		getline(fcsvfile, line);
-		fcsvfile>>mot;
-		while(mot=="#")
-		{
-			if(getline(fcsvfile, line))
-				fcsvfile>>mot;
-			else
-				mot="#";
-		}
-
-		i=0;
-		do
-		{
-			std::size_t pos_end;// = mot.find(",,");
-			std::size_t pos1;
-			j=0;
-			do
-			{
-				std::size_t pos0 = 0;
-				pos1 = mot.find(',');
-				pos_end = mot.find(",,");
-				words[i][j] = mot.substr(pos0, pos1-pos0);
-				mot = mot.substr(pos1+1);
-				j++;
-			}
-			while(pos1+1<pos_end);
-			i++;
-		}
-		while(fcsvfile>>mot);
-
-		NbLandmarks = i;
-        landmarkPids = new int[NbLandmarks]; 
-        
-		for (int i = 0; i < NbLandmarks; i++)
-		{
-			double x = atof(words[i][1].c_str());
-			double y = atof(words[i][2].c_str());
-			double z = atof(words[i][3].c_str());
-                        
-			// Find closest point
-			vtkIdType ptId;
-			double p[] = {0.0, 0.0, 0.0};
-			p[0] = x; p[1] = y; p[2] = z;
-			ptId = pointLocator->FindClosestPoint(p);
-			landmarkPids[i] = ptId;
-
-			std::cout << "landmark " << i << " position " << x << "," << y << "," << z << " and the corresponding Pid is " << landmarkPids[i] << std::endl;
-		}
-	}
-	else
-	{
-		std::cout<<"Error !";
-	}
-
-	std::cout << "NbLandmarks :: " << NbLandmarks << std::endl;
-	for (int i = 0; i < NbLandmarks; i++)
-	{
-		std::cout << "landmarkPids[i] :: " << landmarkPids[i] << std::endl;
-		const float *v = m_spharm[subj].sphere->vertex(landmarkPids[i])->fv();
-		
-		float *Y = new float[(m_degree + 1) * (m_degree + 1)];
-		point *p = new point();
-		p->p[0] = v[0]; p->p[1] = v[1]; p->p[2] = v[2];
-		SphericalHarmonics::basis(m_degree, p->p, Y);
-		p->subject = subj;
-		p->Y = Y;
-		p->id = landmarkPids[i];
-
-		m_spharm[subj].landmark.push_back(p);
-	}
-
-	for (int j = 0; j < NbLandmarks; j ++)
-		std::cout << m_spharm[subj].landmark[j]->p[0] << " :: " << m_spharm[subj].landmark[j]->p[1] << " :: " << m_spharm[subj].landmark[j]->p[2] << std::endl; 
-}
-
-
-bool GroupwiseRegistration::updateCoordinate(const float *v0, float *v1, const float *Y, const float **coeff, float degree, const float *pole)
-{
-	// spharm basis
-	int n = (degree + 1) * (degree + 1);
-
-	Vector p0(pole), axis;
-	float dot;
-
-	// fit to the equator
-	float rot[9];
-	Vector v(v0);
-	axis = p0.cross(v);
-	if (axis.norm() == 0)	// point == pole
-	{
-		memcpy(v1, v0, sizeof(float) * 3);
-		return false;
-	}
-
-	float delta[2] = {0, 0};
-	for (int i = 0; i < n; i++)
-	{
-		delta[0] += Y[i] * *coeff[i];
-		delta[1] += Y[i] * *coeff[(m_degree + 1) * (m_degree + 1) + i];
-	}
-
-	if (delta[0] == 0 && delta[1] == 0)
-	{
-		memcpy(v1, v0, sizeof(float) * 3);
-		return false;
-	}
-
-	dot = p0 * v;
-	dot = (dot > 1) ? 1: dot;
-	dot = (dot < -1) ? -1: dot;
-	float deg = PI / 2 - acos(dot);
-	Coordinate::rotation(axis.fv(), deg, rot);
-
-	// rotation to the eqautor
-	float rv[3];
-	Coordinate::rotPoint(v0, rot, rv);
-
-	// polar coodinate
-	float phi, theta;
-	Coordinate::cart2sph(rv, &phi, &theta);
-	
-	// displacement
-	phi += delta[0];	// longitude (azimuth) change
-	Coordinate::sph2cart(phi, theta, rv);
-	
-	// rotation to the new longitude change
-	// a simple inverse rotation is not enough due to not exact location back
-	Vector u(rv);
-	axis = p0.cross(u);
-	if (axis.norm() == 0) axis = p0;
-	Coordinate::rotation(axis.fv(), -deg, rot);
-	
-	theta += delta[1];
-	Coordinate::sph2cart(phi, theta, rv);	// locally normalized polar system
-
-	// inverse rotation
-	Coordinate::rotPoint(rv, rot, v1);
-	
-	return true;
-}
-
-void GroupwiseRegistration::updateDeformation(int subject)
-{
-	// note: the deformation happens only if the coefficients change; otherwise, nothing to do
-	bool updated = m_updated[subject];
-	
-	// check if the coefficients change
-	int n = (m_degree_inc + 1) * (m_degree_inc + 1);
-	for (int i = 0; i < n && updated; i++)
-		if (*m_spharm[subject].coeff[i] != *m_spharm[subject].coeff_prev_step[i] ||
-			*m_spharm[subject].coeff[(m_degree + 1) * (m_degree + 1) + i] != *m_spharm[subject].coeff_prev_step[(m_degree + 1) * (m_degree + 1) + i])
-			updated = false;
-	
-	// deform a sphere based on the current coefficients if necessary
-	for (int i = 0; i < m_spharm[subject].vertex.size() && !updated; i++)
-	{
-		Vertex *v = (Vertex *)m_spharm[subject].sphere->vertex(i);
-		float v1[3];
-		const float *v0 = v->fv();
-		updateCoordinate(m_spharm[subject].vertex[i]->p, v1, m_spharm[subject].vertex[i]->Y, (const float **)m_spharm[subject].coeff, m_degree_inc, m_spharm[subject].pole); // update using the current incremental degree
-		{
-			Vector V(v1); V.unit();
-			v->setVertex(V.fv());
-		}
-	}
-	m_updated[subject] = updated;
-}
-
-void GroupwiseRegistration::updateLandmark(void)
-{
-	int nLandmark = m_spharm[0].landmark.size();
-	int nSamples = m_propertySamples.size();	// # of sampling points for property map agreemen
-
-	for (int i = 0; i < nLandmark; i++)
-	{
-		float m[3] = {0, 0, 0};	// mean
-		for (int subj = 0; subj < m_nSubj; subj++)
-		{
-			int id = m_spharm[subj].landmark[i]->id;
-			updateCoordinate(m_spharm[subj].landmark[i]->p, &m_feature[subj * (nLandmark * 3 + nSamples * (m_nProperties + m_nSurfaceProperties)) + i * 3], m_spharm[subj].landmark[i]->Y, (const float **)m_spharm[subj].coeff, m_degree_inc, m_spharm[subj].pole);
-
-			// mean locations
-			for (int k = 0; k < 3; k++) m[k] += m_feature[subj * (nLandmark * 3 + nSamples * (m_nProperties + m_nSurfaceProperties)) + i * 3 + k];
-		}
-		// forcing the mean to be on the sphere
-		float norm = sqrt(m[0] * m[0] + m[1] * m[1] + m[2] * m[2]);
-		for (int k = 0; k < 3; k++) m[k] /= norm;
-		
-		// projection
-		for (int subj = 0; subj < m_nSubj; subj++)
-		{
-			float newp[3];
-			Coordinate::proj2plane(m[0], m[1], m[2], -1, &m_feature[subj * (nLandmark * 3 + nSamples * (m_nProperties + m_nSurfaceProperties)) + i * 3], newp);
-			memcpy(&m_feature[subj * (nLandmark * 3 + nSamples * (m_nProperties + m_nSurfaceProperties)) + i * 3], newp, sizeof(float) * 3);
-		}
-	}
-}
-
-void GroupwiseRegistration::updateLandmarkMedian(void)
-{
-	int nLandmark = m_spharm[0].landmark.size();
-	int nSamples = m_propertySamples.size();	// # of sampling points for property map agreemen
-	
-	// m-estimator
-	float m1 = 0.03 * 0.01;
-	float m2 = 16.8 * 0.01;
-	float u = (m2 + m1) / 2;
-	float sigma = ((m2 + m1) / 2 - m1) / 3;
-
-	// deformed points
-	float *x = new float[m_nSubj];
-	float *y = new float[m_nSubj];
-	float *z = new float[m_nSubj];
-	
-	for (int i = 0; i < nLandmark; i++)
-	{
-		float m[3] = {0, 0, 0};	// median
-		
-		for (int subj = 0; subj < m_nSubj; subj++)
-		{
-			int id = m_spharm[subj].landmark[i]->id;
-			updateCoordinate(m_spharm[subj].landmark[i]->p, &m_feature[subj * (nLandmark * 3 + nSamples * (m_nProperties + m_nSurfaceProperties)) + i * 3], m_spharm[subj].landmark[i]->Y, (const float **)m_spharm[subj].coeff, m_degree_inc, m_spharm[subj].pole);
-
-			// median locations
-			x[subj] = m_feature[subj * (nLandmark * 3 + nSamples * (m_nProperties + m_nSurfaceProperties)) + i * 3 + 0];
-			y[subj] = m_feature[subj * (nLandmark * 3 + nSamples * (m_nProperties + m_nSurfaceProperties)) + i * 3 + 1];
-			z[subj] = m_feature[subj * (nLandmark * 3 + nSamples * (m_nProperties + m_nSurfaceProperties)) + i * 3 + 2];
-		}
-		m[0] = Statistics::median(x, m_nSubj);
-		m[1] = Statistics::median(y, m_nSubj);
-		m[2] = Statistics::median(z, m_nSubj);
-
-		// forcing the mean to be on the sphere
-		float norm = sqrt(m[0] * m[0] + m[1] * m[1] + m[2] * m[2]);
-		for (int k = 0; k < 3; k++) m[k] /= norm;
-
-		// projection
-		for (int subj = 0; subj < m_nSubj; subj++)
-		{
-			float newp[3];
-			Coordinate::proj2plane(m[0], m[1], m[2], -1, &m_feature[subj * (nLandmark * 3 + nSamples * (m_nProperties + m_nSurfaceProperties)) + i * 3], newp);
-
-			// m-estimator
-			float len = sqrt((newp[0] - m[0]) * (newp[0] - m[0]) + (newp[1] - m[1]) * (newp[1] - m[1]) + (newp[2] - m[2]) * (newp[2] - m[2]));
-			float slen = Statistics::normal_cdf(len, u, sigma);
-			slen = (len < m2) ? len: m2;
-			float ratio = 1.0f;
-			if (len > 0) ratio = slen / len;
-
-			newp[0] = m[0] + (newp[0] - m[0]) * ratio;
-			newp[1] = m[1] + (newp[1] - m[1]) * ratio;
-			newp[2] = m[2] + (newp[2] - m[2]) * ratio;
-
-			memcpy(&m_feature[subj * (nLandmark * 3 + nSamples * (m_nProperties + m_nSurfaceProperties)) + i * 3], newp, sizeof(float) * 3);
-		}
-	}
-	
-	// free
-	delete [] x;
-	delete [] y;
-	delete [] z;
-}
-
-void GroupwiseRegistration::updateProperties(void)
-{
-	int nLandmark = m_spharm[0].landmark.size();
-	int nSamples = m_propertySamples.size();	// # of sampling points for property map agreement
-
-	float err = 0;
-	for (int subj = 0; subj < m_nSubj; subj++)
-	{
-		if (!m_updated[subj])
-		{
-			m_updated[subj] = true;
-			m_spharm[subj].tree->update();
-		}
-		else continue;	// don't compute again since tree is the same as the previous. The feature vector won't be changed
-		for (int i = 0; i < nSamples; i++)
-		{
-			int fid = -1;
-			float coeff[3];
-			if (m_spharm[subj].tree_cache[i] != -1)	// if previous cache is available
-			{
-				Face *f = (Face *)m_spharm[subj].sphere->face(m_spharm[subj].tree_cache[i]);
-				Vertex *a = (Vertex *)f->vertex(0);
-				Vertex *b = (Vertex *)f->vertex(1);
-				Vertex *c = (Vertex *)f->vertex(2);
-
-				// bary centric
-				Coordinate::cart2bary((float *)a->fv(), (float *)b->fv(), (float *)c->fv(), m_propertySamples[i], coeff);
-
-				fid = (coeff[0] >= err && coeff[1] >= err && coeff[2] >= err) ? m_spharm[subj].tree_cache[i]: -1;
-			}
-			if (fid == -1)	// if no closest face is found
-			{
-				fid = m_spharm[subj].tree->closestFace(m_propertySamples[i], coeff);
-				if (fid == -1)	// something goes wrong
-					cout << "Fatal error: no closest point found!\n";
-			}
-
-			int nVertex = m_spharm[subj].sphere->nVertex();
-			for (int k = 0; k < m_nProperties + m_nSurfaceProperties; k++)
-			{
-				m_feature[subj * (nLandmark * 3 + nSamples * (m_nProperties + m_nSurfaceProperties)) + nLandmark * 3 + nSamples * k + i] = propertyInterpolation(&m_spharm[subj].property[nVertex * k], fid, coeff, m_spharm[subj].sphere) / m_spharm[subj].sdevProperty[k];
-			}
-			m_spharm[subj].tree_cache[i] = fid;
-		}
-	}
-}
-
-float GroupwiseRegistration::entropy(void)
-{
-	int nLandmark = m_spharm[0].landmark.size() * 3;	// # of landmarks: we assume all the subject has the same number
-	int nSamples = m_propertySamples.size();	// # of sampling points for property map agreement
-	
-	float E = 0;	// entropy
-	
-	memset(m_cov, 0, sizeof(float) * m_nSubj * m_nSubj);	// reset covariance matrix
-
-	// update landmark
-	if (nLandmark > 0) updateLandmark();
-	
-	// update properties
-	if (nSamples > 0) updateProperties();
-	
-	// dual covariance matrix (m_nSubj x m_nSubj) of feature vector (nLandmark + nSamples * (m_nProperties + m_nSurfaceProperties) x m_nSubj)
-	Statistics::wcov_trans(m_feature, m_nSubj, nLandmark + nSamples * (m_nProperties + m_nSurfaceProperties), m_cov, m_feature_weight);
-	
-	// entropy
-	eigenvalues(m_cov, m_nSubj, m_eig);
-
-	float alpha = 1e-5;	// avoid a degenerative case
-	for (int i = 1; i < m_nSubj; i++)	// just ignore the first eigenvalue (trivial = 0)
-		E += log(m_eig[i] + alpha);
-
-	return E;
-}
-
-void GroupwiseRegistration::eigenvalues(float *M, int dim, float *eig)
-{
-	int n = dim;
-	int lwork = dim * 3 - 1;	// dimension of the work array
-	int lda = n;			// lda: leading dimension
-	int info;				// information (0 for successful exit)
-	
-	char jobz[] = "N";	// eigenvalue only
-	char uplo[] = "L"; // Lower triangle
-	ssyev_(jobz, uplo, &n, M, &lda, eig, m_work, &lwork, &info);
-}
-
-float GroupwiseRegistration::propertyInterpolation(float *refMap, int index, float *coeff, Mesh *mesh)
-{
-	float property = 0;
-
-	if (index != -1)
-	{
-		Face *f = (Face *)mesh->face(index);
-		Vertex *a = (Vertex *)f->vertex(0);
-		Vertex *b = (Vertex *)f->vertex(1);
-		Vertex *c = (Vertex *)f->vertex(2);
-		property = refMap[a->id()] * coeff[0] + refMap[b->id()] * coeff[1] + refMap[c->id()] * coeff[2];
-	}
-
-	return property;
-}
-
-float GroupwiseRegistration::cost(float *coeff, int statusStep)
-{
-	// update defomation fields
-	for (int i = 0; i < m_nSubj; i++) updateDeformation(i);
-	
-	// how many flips are detected
-	int nFolds = 0;
-	for (int i = 0; i < m_nSubj; i++)
-		nFolds += testTriangleFlip(m_spharm[i].sphere, m_spharm[i].flip);
-
-	float fcost = (nFolds == 0) ? 0: (nFolds + 1) * fabs(m_mincost);
-	float ecost = (nFolds == 0) ? entropy(): m_mincost;
-
-	float cost = ecost + fcost;
-	if (m_mincost > cost)
-	{
-		m_mincost = cost;
-		// write the current optimal solutions
-		for (int subj = 0; subj < m_nSubj; subj++)
-		{
-			saveCoeff(m_Output[subj].c_str(), subj);
-		}
-	}
-	
-	if (nIter % statusStep == 0)
-	{
-		cout << "[" << nIter << "] " << cost << " (" << ecost << " + " << fcost << ")" << " " << m_mincost << endl;
-	}
-	nIter++;
-
-	// copy previous coefficients
-	memcpy(m_coeff_prev_step, m_coeff, sizeof(float) * m_csize * 2);
-	
-	return cost;
-}
-
-int GroupwiseRegistration::testTriangleFlip(Mesh *mesh, const bool *flip)
-{
-	int nFolds = 0;
-	for (int i = 0; i < mesh->nFace(); i++)
-	{
-		const float *v1 = mesh->vertex(mesh->face(i)->list(0))->fv();
-		const float *v2 = mesh->vertex(mesh->face(i)->list(1))->fv();
-		const float *v3 = mesh->vertex(mesh->face(i)->list(2))->fv();
-
-		Vector V1(v1), V2(v2), V3(v3);
-		Vector V = (V1 + v2 + V3) / 3;
-
-		Vector U = (V2 - V1).cross(V3 - V1);
-
-		if ((V * U < 0 && !flip[i]) || (V * U > 0 && flip[i])) nFolds++;
-		
-		if (nFolds > 0) break;	// do not allow any flips!
-	}
-	return nFolds;
-}
-
-void GroupwiseRegistration::optimization(void)
-{
-	cost_function costFunc(this);
-	int prev = 0;
-	int step = 1;
-	
-	int n1 = (m_degree_inc + 1) * (m_degree_inc + 1) * m_nSubj * 2;
-	int n2 = m_csize * 2 - n1;
-
-	while (m_degree_inc < m_degree)
-	{
-		nIter = 0;
-		int n = (m_degree_inc + 1) * (m_degree_inc + 1) * m_nSubj * 2 - prev;
-		min_newuoa(n, &m_coeff[prev], costFunc, 1.0f, 1e-5f, m_maxIter);
-		prev = (m_degree_inc + 1) * (m_degree_inc + 1) * m_nSubj * 2;
-		m_degree_inc = min(m_degree_inc + step, m_degree);
-	}
-	
-	// the entire optimization together
-	nIter = 0;
-	min_newuoa(m_csize * 2, m_coeff, costFunc, 1.0f, 1e-6f, m_maxIter);
-}
-
-int GroupwiseRegistration::icosahedron(int degree)
-{
-	// http://www.1activeserverpagesstreet.com/vb/scripts/ShowCode.asp?txtCodeId=9814&lngWId=3
-	vector<Vector *> triangles;
-	vector<Vector> vertices;
-
-	float t = (1 + sqrt(5.0)) / 2.0;
-	float s = sqrt(1 + t * t);
-
-	// create the 12 vertices
-	Vector v0 = Vector(t, 1.0, 0.0) / s;
-	Vector v1 = Vector(-t, 1.0, 0.0) / s;
-	Vector v2 = Vector(t, -1.0, 0.0) / s;
-	Vector v3 = Vector(-t, -1.0, 0.0) / s;
-	Vector v4 = Vector(1.0, 0.0, t) / s;
-	Vector v5 = Vector(1.0, 0.0, -t) / s;
-	Vector v6 = Vector(-1.0, 0.0, t) / s;
-	Vector v7 = Vector(-1.0, 0.0, -t) / s;
-	Vector v8 = Vector(0.0, t, 1.0) / s;
-	Vector v9 = Vector(0.0, -t, 1.0) / s;
-	Vector v10 = Vector(0.0, t, -1.0) / s;
-	Vector v11 = Vector(0.0, -t, -1.0) / s;
-    
-	// create the 20 triangles
-	Vector *f; 
-	f = new Vector[3]; f[0] = v0; f[1] = v8; f[2] = v4; triangles.push_back(f);
-	f = new Vector[3]; f[0] = v1; f[1] = v10; f[2] = v7; triangles.push_back(f);
-	f = new Vector[3]; f[0] = v2; f[1] = v9; f[2] = v11; triangles.push_back(f);
-	f = new Vector[3]; f[0] = v7; f[1] = v3; f[2] = v1; triangles.push_back(f);
-	f = new Vector[3]; f[0] = v0; f[1] = v5; f[2] = v10; triangles.push_back(f);
-	f = new Vector[3]; f[0] = v3; f[1] = v9; f[2] = v6; triangles.push_back(f);
-	f = new Vector[3]; f[0] = v3; f[1] = v11; f[2] = v9; triangles.push_back(f);
-	f = new Vector[3]; f[0] = v8; f[1] = v6; f[2] = v4; triangles.push_back(f);
-	f = new Vector[3]; f[0] = v2; f[1] = v4; f[2] = v9; triangles.push_back(f);
-	f = new Vector[3]; f[0] = v3; f[1] = v7; f[2] = v11; triangles.push_back(f);
-	f = new Vector[3]; f[0] = v4; f[1] = v2; f[2] = v0; triangles.push_back(f);
-	f = new Vector[3]; f[0] = v9; f[1] = v4; f[2] = v6; triangles.push_back(f);
-	f = new Vector[3]; f[0] = v2; f[1] = v11; f[2] = v5; triangles.push_back(f);
-	f = new Vector[3]; f[0] = v0; f[1] = v10; f[2] = v8; triangles.push_back(f);
-	f = new Vector[3]; f[0] = v5; f[1] = v0; f[2] = v2; triangles.push_back(f);
-	f = new Vector[3]; f[0] = v10; f[1] = v5; f[2] = v7; triangles.push_back(f);
-	f = new Vector[3]; f[0] = v1; f[1] = v6; f[2] = v8; triangles.push_back(f);
-	f = new Vector[3]; f[0] = v1; f[1] = v8; f[2] = v10; triangles.push_back(f);
-	f = new Vector[3]; f[0] = v6; f[1] = v1; f[2] = v3; triangles.push_back(f);
-	f = new Vector[3]; f[0] = v11; f[1] = v7; f[2] = v5; triangles.push_back(f);
-
-	// subdivision
-	for (int d = 0; d < degree; d++)
-	{
-		int nFaces = triangles.size();
-		for (int i = 0 ; i < nFaces; i++)
-		{
-			Vector *f = triangles[i];
-			Vector a = f[0], b = f[1], c = f[2];
-			Vector v1 = a + b;
-			Vector v2 = c + a;
-			Vector v3 = b + c;
-			// normalization
-			v1.unit(); v2.unit(); v3.unit();
-			f[0] = v1; f[1] = v3; f[2] = v2; // overwrite the original
-			/*Vector f1[3] = {a, v1, v2}; triangles.push_back(f1);
-			Vector f2[3] = {c, v2, v3}; triangles.push_back(f2);
-			Vector f3[3] = {b, v3, v1}; triangles.push_back(f3);*/
-			Vector *f1 = new Vector[3]; f1[0] = a; f1[1] = v1; f1[2] = v2; triangles.push_back(f1);
-			Vector *f2 = new Vector[3]; f2[0] = c; f2[1] = v2; f2[2] = v3; triangles.push_back(f2);
-			Vector *f3 = new Vector[3]; f3[0] = b; f3[1] = v3; f3[2] = v1; triangles.push_back(f3);
-		}
-	}
-	for (int i = 0; i < triangles.size(); i++)
-	{
-		Vector *f = triangles[i];
-		for (int j = 0; j < 3; j++)
-			vertices.push_back(f[j]);
-	}
-	sort(vertices.begin(), vertices.end());
-	vertices.erase(unique(vertices.begin(), vertices.end()), vertices.end());
-
-	for (int i = 0; i < vertices.size(); i++)
-	{
-		float *p = new float[3];
-		p[0] = vertices[i][0];
-		p[1] = vertices[i][1];
-		p[2] = vertices[i][2];
-		m_propertySamples.push_back(p);
-	}
-
-	return m_propertySamples.size();
-}
-
-void GroupwiseRegistration::saveCoeff(const char *filename, int id)
-{
-	FILE *fp = fopen(filename, "w");
-	fprintf(fp, "%f %f %f\n", m_spharm[id].pole[0], m_spharm[id].pole[1], m_spharm[id].pole[2]);
-	fprintf(fp, "%d\n", m_spharm[id].degree);
-	int n = (m_spharm[id].degree + 1) * (m_spharm[id].degree + 1);
-	for (int i = 0; i < n; i++)
-	{
-		fprintf(fp, "%f %f\n", *m_spharm[id].coeff[i], *m_spharm[id].coeff[n + i]);
-	}
-	fclose(fp);
-}
+/*************************************************
+*	GroupwiseRegistration.cpp
+*
+*	Release: Sep 2016
+*	Update: Sep 2016
+*
+*	University of North Carolina at Chapel Hill
+*	Department of Computer Science
+*	
+*	Ilwoo Lyu, ilwoolyu@cs.unc.edu
+*************************************************/
+
+#include <cstring>
+#include <cstdlib>
+#include <iterator>
+#include <float.h>
+#include <ctime>
+#include <sstream>
+#include "GroupwiseRegistration.h"
+#include "SphericalHarmonics.h"
+#include <lapacke.h>
+#include "newuoa.h"
+#include "lbfgs.h"
+#include "VTKPropertyReader.h"
+
+#include <vtkPolyData.h>
+#include <vtkPolyDataReader.h>
+#include <vtkDataArray.h>
+#include <vtkDoubleArray.h>
+#include <vtkSmartPointer.h>
+#include <vtkPointData.h>
+#include <vtkPointLocator.h>
+
+#ifdef _OPENMP
+#include <omp.h>
+#endif
+
+// BLAS matrix-vector product (not declared by lapacke.h)
+extern "C" void sgemv_(const char *trans, const int *m, const int *n, const float *alpha, const float *a, const int *lda, const float *x, const int *incx, const float *beta, float *y, const int *incy);
+
+// relative difference allowed between the eigenvalue and Cholesky entropies (--benchmark and Testing/EntropyTest)
+const double GroupwiseRegistration::entropyTolerance = 1e-3;
+
+// wall-clock time (seconds)
+static double wallTime(void)
+{
+#ifdef _OPENMP
+	return omp_get_wtime();
+#else
+	return (double)clock() / CLOCKS_PER_SEC;
+#endif
+}
+
+// standard normal deviate (Box-Muller) from rand(): perturbation of the initial coefficients (multi-start) and of the benchmark batches
+static float gaussian(void)
+{
+	float u1 = (rand() + 1.0f) / (RAND_MAX + 1.0f);
+	float u2 = rand() / (RAND_MAX + 1.0f);
+	return sqrt(-2 * log(u1)) * cos(2 * PI * u2);
+}
+
+// cost/gradient evaluation that records when the best cost was found and when a target cost was reached (optimizer benchmark)
+class target_function
+{
+public:
+	target_function (GroupwiseRegistration *instance, int offset, int n, float target)
+	{
+		m_instance = instance;
+		m_offset = offset;
+		m_n = n;
+		m_target = target;
+		m_best = FLT_MAX;
+		m_bestTime = m_reachedTime = -1;
+		m_nEval = m_bestEval = m_reachedEval = 0;
+		m_start = wallTime();
+	}
+
+	double operator () (float *arg)
+	{
+		return record(m_instance->cost(arg));
+	}
+
+	double operator () (float *arg, float *grad)
+	{
+		return record(m_instance->costGradient(arg, grad, m_offset, m_n));
+	}
+
+	float best(void) { return m_best; }
+	double bestTime(void) { return m_bestTime; }
+	int bestEval(void) { return m_bestEval; }
+	bool reached(void) { return m_reachedTime >= 0; }
+	double reachedTime(void) { return m_reachedTime; }
+	int reachedEval(void) { return m_reachedEval; }
+	bool converged(void) { return false; }	// the benchmark runs the optimizers to their own termination
+
+private:
+	float record(float cost)
+	{
+		m_nEval++;
+		double t = wallTime() - m_start;
+		if (cost < m_best)
+		{
+			m_best = cost;
+			m_bestTime = t;
+			m_bestEval = m_nEval;
+		}
+		if (cost <= m_target && m_reachedTime < 0)
+		{
+			m_reachedTime = t;
+			m_reachedEval = m_nEval;
+		}
+		return cost;
+	}
+
+	GroupwiseRegistration *m_instance;
+	int m_offset, m_n;
+	float m_target, m_best;
+	double m_start, m_bestTime, m_reachedTime;
+	int m_nEval, m_bestEval, m_reachedEval;
+};
+
+GroupwiseRegistration::GroupwiseRegistration(void)
+{
+	m_maxIter = 0;
+	m_nSubj = 0;
+	m_mincost = FLT_MAX;
+	m_nProperties = 0;
+	m_nSurfaceProperties = 0;
+	m_degree = 0;
+	m_degree_inc = 1;	// starting degree for the incremental optimization
+	m_UseLandmarks = false;
+	m_nThreads = 1;
+	m_incremental = false;
+	m_lbfgs = false;
+	m_cholesky = false;
+	m_nCacheHit = m_nWalkHit = m_nTreeQuery = m_nGridHit = 0;
+	m_blockCoordinate = false;
+	m_maxSweeps = 10;
+	m_stopWindow = 0;
+	m_stopTol = 1e-4f;
+	m_adaptiveDegree = false;
+	m_degreeGain = 1e-3f;
+	m_lastFolds = 0;
+	m_cache = NULL;
+	m_frozen = NULL;
+	m_checkpointInterval = 0;
+	m_resumeStage = -1;
+	m_stageOffset = 0;
+	m_degreeStep = 1;
+	m_phase = 0;
+	m_nReplay = 0;
+	m_coarseToFine = false;
+	m_binaryCoeff = false;
+	m_bestUpdated = false;
+	m_flushInterval = 0;	// write on every improvement
+	m_flushTime = time(NULL);
+}
+
+// GroupwiseRegistration::GroupwiseRegistration(const char **sphere, int nSubj, const char **property, int nProperties, const char **output, const float *weight, int deg, const char **landmark, float weightLoc, const char **coeff, const char **surf, int maxIter)
+// {
+// 	m_maxIter = maxIter;
+// 	m_nSubj = nSubj;
+// 	m_mincost = FLT_MAX;
+// 	m_nProperties = nProperties;
+// 	m_nSurfaceProperties = (weightLoc > 0)? 3: 0;
+// 	m_output = output;
+// 	m_degree = deg;
+// 	m_degree_inc = 3;	// starting degree for the incremental optimization
+// 	init(sphere, property, weight, landmark, weightLoc, coeff, surf, 4);
+// 	m_UseLandmarks = false;
+// }
+
+GroupwiseRegistration::GroupwiseRegistration(vector<string> sphere, vector<string> surf, std::map<std::string, float> mapProperty, vector<string> outputcoeff, bool landmarksOn, double weightLoc, int deg, vector<string> inputcoeff, int maxIter, string cacheDir)
+{
+	m_maxIter = maxIter;
+	m_nSubj = sphere.size();
+	m_mincost = FLT_MAX;
+	m_nProperties = mapProperty.size();
+	//For backward compatibility, we substract 1 from the number of properties and make sure that the landmarks (now included in properties) are in the array.
+	// for(int i = 0; i < m_nProperties; i++){
+	// 	if(propertiesnames[i].compare("Landmarks") || propertiesnames[i].compare("LANDMARKS") || propertiesnames[i].compare("landmarks")){
+	// 		m_nProperties--;
+	// 		m_UseLandmarks = true;
+	// 		break;
+	// 	}
+	// }
+
+	m_UseLandmarks = landmarksOn;
+
+	if(m_UseLandmarks){
+		cout<<"Using landmarks included in file"<<endl;
+	}
+
+	m_nSurfaceProperties = (weightLoc > 0)? 3: 0;
+	m_Output = outputcoeff;
+	m_degree = deg;
+	m_degree_inc = 3;	// starting degree for the incremental optimization
+	m_SamplingDegree = 4;
+	m_nThreads = 1;
+	m_incremental = false;
+	m_lbfgs = false;
+	m_cholesky = false;
+	m_nCacheHit = m_nWalkHit = m_nTreeQuery = m_nGridHit = 0;
+	m_blockCoordinate = false;
+	m_maxSweeps = 10;
+	m_stopWindow = 0;
+	m_stopTol = 1e-4f;
+	m_adaptiveDegree = false;
+	m_degreeGain = 1e-3f;
+	m_lastFolds = 0;
+	m_cacheDir = cacheDir;
+	m_cache = NULL;
+	m_frozen = NULL;
+	m_checkpointInterval = 0;
+	m_resumeStage = -1;
+	m_stageOffset = 0;
+	m_degreeStep = 1;
+	m_phase = 0;
+	m_nReplay = 0;
+	m_coarseToFine = false;
+	m_binaryCoeff = false;
+	m_bestUpdated = false;
+	m_flushInterval = 0;	// write on every improvement
+	m_flushTime = time(NULL);
+	init(sphere, surf, mapProperty, weightLoc, inputcoeff, m_SamplingDegree);
+}
+
+GroupwiseRegistration::~GroupwiseRegistration(void)
+{
+	delete [] m_cov;
+	delete [] m_feature_weight;
+	delete [] m_mean;
+	delete [] m_gram;
+	delete [] m_gram_work;
+	delete [] m_landmark;
+	delete [] m_landmarkWork;
+	delete [] m_frozen;
+	freeBatch();
+	delete [] m_eig;
+	delete [] m_feature;
+	delete [] m_updated;
+	delete [] m_feature_updated;
+	delete [] m_work;
+	delete [] m_chol;
+	delete [] m_coeff;
+	delete [] m_coeff_prev_step;
+	delete [] m_coeff_stage;
+	delete [] m_coeff_best;
+	for (int subj = 0; subj < m_nSubj; subj++)
+	{
+		delete m_spharm[subj].tree;
+		delete m_spharm[subj].locator;
+		delete m_spharm[subj].surf;
+		delete m_spharm[subj].sphere;
+		delete [] m_spharm[subj].coeff;
+		delete [] m_spharm[subj].coeff_prev_step;
+		delete [] m_spharm[subj].tree_cache;
+		delete [] m_spharm[subj].meanProperty;
+		delete [] m_spharm[subj].maxProperty;
+		delete [] m_spharm[subj].minProperty;
+		delete [] m_spharm[subj].sdevProperty;
+		delete [] m_spharm[subj].property;
+		delete [] m_spharm[subj].flip;
+		delete [] m_spharm[subj].coord;
+		delete [] m_spharm[subj].basis;
+		delete [] m_spharm[subj].equator;
+		delete [] m_spharm[subj].atPole;
+		delete [] m_spharm[subj].displacement;
+		delete [] m_spharm[subj].face;
+		delete [] m_spharm[subj].neighbor;
+	}
+	delete [] m_spharm;
+	for (int i = 0; i < m_propertySamples.size(); i++)
+		delete m_propertySamples[i];
+}
+
+void GroupwiseRegistration::run(void)
+{
+	cout << "Optimization\n";
+	optimization();
+	flushCoeff(true);
+
+	// write the solutions
+	for (int subj = 0; subj < m_nSubj; subj++)
+	{
+		if (frozen(subj)) continue;	// the population is left untouched
+		saveCoeff(m_Output[subj].c_str(), subj);
+	}
+	cout << "All done!\n";
+}
+
+void GroupwiseRegistration::setThreads(int nThreads)
+{
+#ifdef _OPENMP
+	m_nThreads = (nThreads > 0) ? nThreads: omp_get_max_threads();	// 0: all the available cores
+#else
+	if (nThreads != 1) cout << "Warning: OpenMP is not available, the cost is evaluated serially\n";
+	m_nThreads = 1;
+#endif
+	cout << "Number of threads: " << m_nThreads << endl;
+	
+	// the threaded evaluation uses its own covariance computation: report the agreement with the serial path
+	if (m_nThreads > 1)
+	{
+		float *cov = new float[m_nSubj * m_nSubj];
+		int nLandmark = m_spharm[0].landmark.size() * 3;
+		int nSamples = m_propertySamples.size();
+		Statistics::wcov_trans(m_feature, m_nSubj, nLandmark + nSamples * (m_nProperties + m_nSurfaceProperties), m_cov, m_feature_weight);
+		covariance(cov);
+		float err = 0;
+		for (int i = 0; i < m_nSubj * m_nSubj; i++)
+		{
+			float scale = max(fabs(m_cov[i]), FLT_MIN);
+			err = max(err, (float)fabs(cov[i] - m_cov[i]) / scale);
+		}
+		cout << "Threaded covariance: max relative difference to the serial path " << err << endl;
+		delete [] cov;
+	}
+}
+
+void GroupwiseRegistration::setIncrementalCovariance(bool incremental)
+{
+	m_incremental = incremental;
+	if (!m_incremental) return;
+	cout << "Incremental covariance update\n";
+
+	// build the entire inner products from the initial features and report the agreement with the serial path
+	memset(m_feature_updated, 1, sizeof(bool) * m_nSubj);
+	float *cov = new float[m_nSubj * m_nSubj];
+	int nLandmark = m_spharm[0].landmark.size() * 3;
+	int nSamples = m_propertySamples.size();
+	Statistics::wcov_trans(m_feature, m_nSubj, nLandmark + nSamples * (m_nProperties + m_nSurfaceProperties), m_cov, m_feature_weight);
+	incrementalCovariance(cov);
+	float err = 0;
+	for (int i = 0; i < m_nSubj * m_nSubj; i++)
+	{
+		float scale = max(fabs(m_cov[i]), FLT_MIN);
+		err = max(err, (float)fabs(cov[i] - m_cov[i]) / scale);
+	}
+	cout << "Incremental covariance: max relative difference to the serial path " << err << endl;
+	delete [] cov;
+
+	// no entropy is cached yet: the first evaluation goes through the eigenvalue computation
+	memset(m_feature_updated, 1, sizeof(bool) * m_nSubj);
+}
+
+void GroupwiseRegistration::setCheckpoint(const char *filename, int interval, bool resume)
+{
+	m_checkpoint = filename;
+	m_checkpointInterval = interval;
+	m_checkpointTime = time(NULL);
+	if (m_checkpoint.empty()) return;
+	cout << "Checkpoint: " << m_checkpoint << " (every " << m_checkpointInterval << " seconds)\n";
+
+	if (resume && !loadCheckpoint())
+		cout << "Warning: no valid checkpoint to resume from; starting from the beginning\n";
+}
+
+void GroupwiseRegistration::setCoeffOutput(const char *format, int flushInterval)
+{
+	m_binaryCoeff = (strcmp(format, "binary") == 0);
+	m_flushInterval = flushInterval;
+	m_flushTime = time(NULL);
+	cout << "Coefficient output: " << ((m_binaryCoeff) ? "binary": "text") << " (written at most every " << m_flushInterval << " seconds)\n";
+}
+
+void GroupwiseRegistration::setSampling(int samplingDegree, bool coarseToFine)
+{
+	// the sampling points are regenerated at the beginning of the optimization if necessary
+	m_SamplingDegree = samplingDegree;
+	m_coarseToFine = coarseToFine;
+	cout << "Sampling: icosahedron subdivision " << m_SamplingDegree << ((m_coarseToFine) ? " (coarse-to-fine)": "") << endl;
+}
+
+void GroupwiseRegistration::setOptimizer(const char *optimizer)
+{
+	m_lbfgs = (strcmp(optimizer, "lbfgs") == 0);
+	if (m_lbfgs && m_spharm[0].landmark.size() > 0)
+	{
+		// the analytic gradient covers the property features only
+		cout << "Warning: L-BFGS does not support landmarks; NEWUOA is used instead\n";
+		m_lbfgs = false;
+	}
+	cout << "Optimizer: " << ((m_lbfgs) ? "L-BFGS (analytic gradient)": "NEWUOA") << endl;
+}
+
+void GroupwiseRegistration::setEntropyMethod(const char *method)
+{
+	m_cholesky = (strcmp(method, "cholesky") == 0);
+	cout << "Entropy: " << ((m_cholesky) ? "Cholesky log-determinant": "eigenvalues") << endl;
+}
+
+void GroupwiseRegistration::setLocator(const char *locator)
+{
+	bool grid = (strcmp(locator, "grid") == 0) && m_nProperties + m_nSurfaceProperties > 0;
+	cout << "Closest face locator: " << ((grid) ? "cube-map grid": "AABB tree") << endl;
+	for (int subj = 0; subj < m_nSubj; subj++)
+	{
+		delete m_spharm[subj].locator;
+		m_spharm[subj].locator = (grid) ? new SphereLocator(m_spharm[subj].coord, m_spharm[subj].sphere->nVertex(), m_spharm[subj].face, m_spharm[subj].sphere->nFace()): NULL;
+	}
+}
+
+void GroupwiseRegistration::setBlockCoordinate(bool blockCoordinate, int maxSweeps)
+{
+	m_blockCoordinate = blockCoordinate;
+	m_maxSweeps = maxSweeps;
+	if (!m_blockCoordinate) return;
+	cout << "Block-coordinate optimization: one subject at a time, " << m_maxSweeps << " sweeps at most per stage\n";
+	if (m_lbfgs) cout << "Warning: the subjects are optimized by NEWUOA in the block-coordinate mode\n";
+
+	// only one feature row changes per evaluation: the incremental covariance keeps the evaluation O(nSubj) instead of O(nSubj^2)
+	if (!m_incremental) setIncrementalCovariance(true);
+}
+
+void GroupwiseRegistration::setStopping(int window, float tol, bool adaptiveDegree, float degreeGain)
+{
+	m_stopWindow = window;
+	m_stopTol = tol;
+	m_adaptiveDegree = adaptiveDegree;
+	m_degreeGain = degreeGain;
+	if (m_stopWindow > 0) cout << "Early stop: relative decrease of the minimum cost below " << m_stopTol << " over " << m_stopWindow << " evaluations\n";
+	if (m_adaptiveDegree) cout << "Adaptive degree schedule: the degree step doubles after a stage with a relative gain below " << m_degreeGain << endl;
+}
+
+void GroupwiseRegistration::setPerturbation(float sigma, int seed)
+{
+	// random restart (multi-start): Gaussian perturbation of the initial coefficients of degree 1 and higher
+	if (sigma <= 0) return;
+	srand(seed);
+	for (int i = m_nSubj * 2; i < m_csize * 2; i++)
+	{
+		if (frozen((i / 2) % m_nSubj)) continue;
+		m_coeff[i] += sigma * gaussian();
+	}
+	cout << "Initial coefficients perturbed: sigma " << sigma << ", seed " << seed << endl;
+
+	// all the subjects are deformed again at the first evaluation
+	memcpy(m_coeff_prev_step, m_coeff, sizeof(float) * m_csize * 2);
+	memset(m_updated, 0, sizeof(bool) * m_nSubj);
+	memset(m_feature_updated, 1, sizeof(bool) * m_nSubj);
+}
+
+void GroupwiseRegistration::setNewSubjects(const vector<int> &subjects)
+{
+	// add-subjects mode: the other subjects are a finished population whose coefficients are fixed
+	m_frozen = new bool[m_nSubj];
+	for (int subj = 0; subj < m_nSubj; subj++) m_frozen[subj] = true;
+	for (int i = 0; i < subjects.size(); i++) m_frozen[subjects[i]] = false;
+	cout << "Add-subjects mode: " << subjects.size() << " new subjects registered against " << m_nSubj - subjects.size() << " frozen subjects\n";
+	if (subjects.empty()) cout << "Warning: every subject has coefficients; nothing to register\n";
+
+	// the frozen subjects are deformed by their full degree at the next evaluation, and their feature rows are never recomputed after that
+	memset(m_updated, 0, sizeof(bool) * m_nSubj);
+	memset(m_feature_updated, 1, sizeof(bool) * m_nSubj);
+
+	// only the new subjects are optimized, one at a time: each evaluation recomputes one feature row and the covariance incrementally
+	m_blockCoordinate = true;
+	if (!m_incremental) setIncrementalCovariance(true);
+}
+
+bool GroupwiseRegistration::frozen(int subj)
+{
+	return m_frozen != NULL && m_frozen[subj];
+}
+
+bool GroupwiseRegistration::converged(void)
+{
+	// sliding window: relative decrease of the minimum cost over the last m_stopWindow evaluations of the stage
+	int n = m_minHistory.size();
+	if (m_stopWindow <= 0 || n <= m_stopWindow) return false;
+	float start = m_minHistory[n - 1 - m_stopWindow];
+	if (start == FLT_MAX || start - m_mincost > m_stopTol * fabs(m_mincost)) return false;
+
+	if (m_stopReason.empty())
+	{
+		ostringstream reason;
+		reason << "relative decrease below " << m_stopTol << " over " << m_stopWindow << " evaluations";
+		m_stopReason = reason.str();
+	}
+	return true;
+}
+
+void GroupwiseRegistration::init(vector<string> sphere,vector<string> surf, std::map<std::string, float> mapProperty, double weightLoc, vector<string> inputcoeff, double m_SamplingDegree){
+	m_spharm = new spharm[m_nSubj];	// spharm info
+	m_updated = new bool[m_nSubj];	// AABB_Sphere tree cache
+	m_feature_updated = new bool[m_nSubj];	// feature vector changes for the incremental covariance
+	m_eig = new float[m_nSubj];		// eigenvalues
+	m_work = new float[m_nSubj * 3 - 1];	// workspace for eigenvalue computation
+	m_chol = new float[max(m_nSubj - 1, 1) * max(m_nSubj - 1, 1)];	// workspace for the Cholesky factorization
+	m_csize = (m_degree + 1) * (m_degree + 1) * m_nSubj; // total # of coefficients
+	m_coeff = new float[m_csize * 2];	// how many coefficients are required: the sum of all possible coefficients
+	m_coeff_prev_step = new float[m_csize * 2];	// the previous coefficients
+	m_coeff_stage = new float[m_csize * 2];	// the coefficients at the beginning of the current stage
+	m_coeff_best = new float[m_csize * 2];	// the optimal coefficients so far
+
+	// set all the coefficient to zeros
+	memset(m_coeff, 0, sizeof(float) * m_csize * 2);
+	memset(m_coeff_prev_step, 0, sizeof(float) * m_csize * 2);
+	memset(m_updated, 0, sizeof(bool) * m_nSubj);
+	memset(m_feature_updated, 1, sizeof(bool) * m_nSubj);
+	
+	cout << "Initialzation of subject information\n";
+
+	for (int subj = 0; subj < m_nSubj; subj++)
+	{
+		cout << "Subject " << subj << " - " << sphere[subj] << endl;
+		
+		// spehre and surface information
+		cout << "-Sphere information\n";
+		m_spharm[subj].sphere = new Mesh();
+		if (sphere.size() > 0)
+		{
+			m_spharm[subj].sphere->openFile(sphere[subj].c_str());
+			// make sure a unit sphere
+			m_spharm[subj].sphere->centering();
+			for (int i = 0; i < m_spharm[subj].sphere->nVertex(); i++)
+			{
+				Vertex *v = (Vertex *)m_spharm[subj].sphere->vertex(i);	// vertex information on the sphere
+				const float *v0 = v->fv();
+				Vector V(v0); V.unit();
+				v->setVertex(V.fv());
+			}
+		}
+		else cout << " Fatal error: No sphere mapping is provided!\n";
+		
+		// cached inputs from a previous run
+		SubjectCache cache;
+		unsigned long long key = 0;
+		string cacheName;
+		if (!m_cacheDir.empty())
+		{
+			key = cacheKey(sphere[subj], surf[subj], mapProperty);
+			cacheName = SubjectCache::filename(m_cacheDir.c_str(), key);
+			if (cache.load(cacheName.c_str(), key) && cache.nVertex() == m_spharm[subj].sphere->nVertex())
+			{
+				cout << "-Cached inputs: " << cacheName << endl;
+				m_cache = &cache;
+			}
+		}
+		
+		// previous spherical harmonic deformation fields
+		cout << "-Spherical harmonics information\n";
+		initSphericalHarmonics(subj, inputcoeff);
+		updateDeformation(subj);	// deform the sphere for efficient AABB_Sphere tree creation
+		
+		if (m_nSurfaceProperties > 0)
+		{
+			cout << "-Location information\n";
+			m_spharm[subj].surf = new Mesh();
+			m_spharm[subj].surf->openFile(surf[subj].c_str());
+		}
+		else m_spharm[subj].surf = NULL;
+		cout << "m_nProperties :: " << m_nProperties << endl;
+		if (m_nProperties + m_nSurfaceProperties > 0)
+		{
+			// AABB_Sphere tree construction for speedup computation
+			cout << "-AABB_Sphere tree construction\n";
+			m_spharm[subj].tree = new AABB_Sphere(m_spharm[subj].sphere);
+		}
+		else m_spharm[subj].tree = NULL;
+		m_spharm[subj].locator = NULL;	// optional (setLocator)
+		
+		// triangle flipping
+		cout << "-Triangle flipping\n";
+		initTriangleFlipping(subj);
+		initAdjacency(subj);
+		
+		// property information
+		// cout << "-Property information\n";
+		// initProperties(subj, property, 3);
+		
+		// // landmarks
+		// if (landmark != NULL)
+		// {
+		// 	cout << "-Landmark information\n";
+		// 	initLandmarks(subj, landmark, surf);
+		// 	// m_UseLandmarks = true
+		// }
+		// cout << "----------" << endl;
+
+		//initLandmarks(subj, landmark, surf);
+
+		// property information
+		cout << "-Property and landmarks information\n";
+		if (m_cache != NULL) initPropertiesAndLandmarks(subj, m_cache);
+		else
+		{
+			initPropertiesAndLandmarks(subj, surf[subj], mapProperty);
+			if (!m_cacheDir.empty()) saveCache(subj, cacheName.c_str(), key);
+		}
+		m_cache = NULL;
+		
+		cout << "----------" << endl;
+	}
+
+	// icosahedron subdivision for evaluation on properties: this generates uniform sampling points over the sphere - m_propertySamples
+	if (m_nProperties + m_nSurfaceProperties > 0) icosahedron(m_SamplingDegree);
+	m_samplingLevel = m_SamplingDegree;
+	// landmark information - the number of landamrks should be the same across subjects
+	if (m_UseLandmarks)
+	{
+		int nLandmark = m_spharm[0].landmark.size();
+		for (int subj = 0; subj < m_nSubj; subj++)
+			if (nLandmark != m_spharm[subj].landmark.size())
+				cout << " Fatal error: # of landamrks should be agreed!\n";
+	}
+
+	cout << "Computing weight terms\n";
+	int nLandmark = m_spharm[0].landmark.size() * 3;	// # of landmarks: we assume all the subject has the same number, which already is checked above.
+	int nSamples = m_propertySamples.size();	// # of sampling points for property map agreement
+
+	cout<<"Number of samples: "<<nSamples<<endl;
+	
+	// weights for covariance matrix computation
+	int nTotalProperties = m_nProperties + m_nSurfaceProperties;	// if location information is provided, total number = # of property + 3 -> (x, y, z location)
+	m_feature_weight = new float[nLandmark + nSamples * nTotalProperties];
+	float landmarkWeight = (nLandmark > 0) ? (float)nSamples / (float)nLandmark: 0;	// based on the number ratio (balance between landmark and property)
+	float totalWeight = weightLoc;
+	std::map< std::string, float >::const_iterator it = mapProperty.begin(), it_end = mapProperty.end();
+	for ( ; it != it_end ; it ++ )
+		totalWeight += it->second;
+
+
+	landmarkWeight *= totalWeight;
+	if (landmarkWeight == 0) landmarkWeight = 1;
+	cout << "Total properties: " << nTotalProperties << endl;
+	cout << "Sampling points: " << nSamples << endl;
+
+	// assign the weighting factors
+	for (int i = 0; i < nLandmark; i++) m_feature_weight[i] = landmarkWeight;
+	int n = 0;
+	it = mapProperty.begin(), it_end = mapProperty.end();
+	for ( ; it != it_end ; it ++ )
+	{
+		for (int i = 0; i < nSamples; i++)
+			m_feature_weight[nLandmark + nSamples * n + i] = it->second;
+		n++;
+	}
+	// weight for location information
+	for (int n = 0; n < m_nSurfaceProperties; n++)
+		for (int i = 0; i < nSamples; i++)
+			m_feature_weight[nLandmark + nSamples * (m_nProperties + n) + i] = weightLoc;
+	
+	if (nLandmark > 0) cout << "Landmark weight: " << landmarkWeight << endl;
+	if (m_nProperties > 0)
+	{
+		cout << "Property weight: ";
+		it = mapProperty.begin(), it_end = mapProperty.end();
+		for ( ; it != it_end ; it ++ ) cout << it->second << " ";
+		cout << endl;
+	}
+	if (weightLoc > 0) cout << "Location weight: " << weightLoc << endl;
+	
+	cout << "Initialization of work space\n";
+	m_cov = new float[m_nSubj * m_nSubj];	// convariance matrix defined in the duel space with dimensions: nSubj x nSubj
+	m_feature = new float[m_nSubj * (nLandmark + nSamples * nTotalProperties)];	// the entire feature vector map for optimization
+	m_mean = new float[nLandmark + nSamples * nTotalProperties];
+	m_gram = new double[m_nSubj * m_nSubj];
+	m_gram_work = new double[m_nSubj * m_nSubj];
+	m_landmark = new float[nLandmark * m_nSubj];	// deformed landmarks (landmark-major)
+	m_landmarkWork = new float[m_nSubj];
+
+	// AABB_Sphere tree cache for each subject: this stores the closest face of the sampling point to the corresponding face on the input sphere model
+	for (int subj = 0; subj < m_nSubj; subj++)
+	{
+		if (nTotalProperties > 0)
+		{
+			m_spharm[subj].tree_cache = new int[nSamples];
+			for (int i = 0; i < nSamples; i++)
+				m_spharm[subj].tree_cache[i] = -1;	// initially, set to -1 (invalid index)
+		}
+		else m_spharm[subj].tree_cache = NULL;
+	}
+
+	// inital coefficients for the previous step
+	memcpy(m_coeff_prev_step, m_coeff, sizeof(float) * m_csize * 2);
+
+	cout << "Feature vector creation\n";
+	// set all the tree needs to be updated
+	memset(m_updated, 0, sizeof(bool) * m_nSubj);
+
+	// feature update
+	if (nLandmark > 0) updateLandmark(); // update landmark
+	if (nSamples > 0) updateProperties(); // update properties
+
+	cout << "Initialization done!" << endl;
+}
+
+void GroupwiseRegistration::init(const char **sphere, const char **property, const float *weight, const char **landmark, float weightLoc, const char **coeff, const char **surf, int samplingDegree)
+{
+	m_spharm = new spharm[m_nSubj];	// spharm info
+	m_updated = new bool[m_nSubj];	// AABB_Sphere tree cache
+	m_feature_updated = new bool[m_nSubj];	// feature vector changes for the incremental covariance
+	m_eig = new float[m_nSubj];		// eigenvalues
+	m_work = new float[m_nSubj * 3 - 1];	// workspace for eigenvalue computation
+	m_chol = new float[max(m_nSubj - 1, 1) * max(m_nSubj - 1, 1)];	// workspace for the Cholesky factorization
+	m_csize = (m_degree + 1) * (m_degree + 1) * m_nSubj; // total # of coefficients
+	m_coeff = new float[m_csize * 2];	// how many coefficients are required: the sum of all possible coefficients
+	m_coeff_prev_step = new float[m_csize * 2];	// the previous coefficients
+	m_coeff_stage = new float[m_csize * 2];	// the coefficients at the beginning of the current stage
+	m_coeff_best = new float[m_csize * 2];	// the optimal coefficients so far
+
+	// set all the coefficient to zeros
+	memset(m_coeff, 0, sizeof(float) * m_csize * 2);
+	memset(m_coeff_prev_step, 0, sizeof(float) * m_csize * 2);
+	memset(m_updated, 0, sizeof(bool) * m_nSubj);
+	memset(m_feature_updated, 1, sizeof(bool) * m_nSubj);
+	
+	cout << "Initialzation of subject information\n";
+
+	for (int subj = 0; subj < m_nSubj; subj++)
+	{
+		cout << "Subject " << subj << " - " << sphere[subj] << endl;
+		
+		// spehre and surface information
+		cout << "-Sphere information\n";
+		m_spharm[subj].sphere = new Mesh();
+		if (sphere != NULL)
+		{
+			m_spharm[subj].sphere->openFile(sphere[subj]);
+			// make sure a unit sphere
+			m_spharm[subj].sphere->centering();
+			for (int i = 0; i < m_spharm[subj].sphere->nVertex(); i++)
+			{
+				Vertex *v = (Vertex *)m_spharm[subj].sphere->vertex(i);	// vertex information on the sphere
+				const float *v0 = v->fv();
+				Vector V(v0); V.unit();
+				v->setVertex(V.fv());
+			}
+		}
+		else cout << " Fatal error: No sphere mapping is provided!\n";
+		
+		// previous spherical harmonic deformation fields
+		cout << "-Spherical harmonics information\n";
+		initSphericalHarmonics(subj, coeff);
+		updateDeformation(subj);	// deform the sphere for efficient AABB_Sphere tree creation
+		
+		if (m_nSurfaceProperties > 0)
+		{
+			cout << "-Location information\n";
+			m_spharm[subj].surf = new Mesh();
+			m_spharm[subj].surf->openFile(surf[subj]);
+		}
+		else m_spharm[subj].surf = NULL;
+		
+		if (m_nProperties + m_nSurfaceProperties > 0)
+		{
+			// AABB_Sphere tree construction for speedup computation
+			cout << "-AABB_Sphere tree construction\n";
+			m_spharm[subj].tree = new AABB_Sphere(m_spharm[subj].sphere);
+		}
+		else m_spharm[subj].tree = NULL;
+		m_spharm[subj].locator = NULL;	// optional (setLocator)
+		
+		// triangle flipping
+		cout << "-Triangle flipping\n";
+		initTriangleFlipping(subj);
+		initAdjacency(subj);
+		
+		// property information
+		cout << "-Property information\n";
+		initProperties(subj, property, 3);
+		
+		// landmarks
+		if (landmark != NULL)
+		{
+			cout << "-Landmark information\n";
+			initLandmarks(subj, landmark, surf);
+			// m_UseLandmarks = true
+		}
+		cout << "----------" << endl;
+	}
+
+	cout << " state m_UseLandmarks :: " << m_UseLandmarks << endl << endl;
+	// icosahedron subdivision for evaluation on properties: this generates uniform sampling points over the sphere - m_propertySamples
+	if (m_nProperties + m_nSurfaceProperties > 0) icosahedron(samplingDegree);
+	m_SamplingDegree = samplingDegree;
+	m_samplingLevel = samplingDegree;
+	// landmark information - the number of landamrks should be the same across subjects
+	if (m_UseLandmarks)
+	{
+		int nLandmark = m_spharm[0].landmark.size();
+		for (int subj = 0; subj < m_nSubj; subj++)
+			if (nLandmark != m_spharm[subj].landmark.size())
+				cout << " Fatal error: # of landamrks should be agreed!\n";
+	}
+
+	cout << "Computing weight terms\n";
+	int nLandmark = m_spharm[0].landmark.size() * 3;	// # of landmarks: we assume all the subject has the same number, which already is checked above.
+	int nSamples = m_propertySamples.size();	// # of sampling points for property map agreement
+	
+	// weights for covariance matrix computation
+	int nTotalProperties = m_nProperties + m_nSurfaceProperties;	// if location information is provided, total number = # of property + 3 -> (x, y, z location)
+	m_feature_weight = new float[nLandmark + nSamples * nTotalProperties];
+	float landmarkWeight = (nLandmark > 0) ? (float)nSamples / (float)nLandmark: 0;	// based on the number ratio (balance between landmark and property)
+	float totalWeight = weightLoc;
+	for (int n = 0; n < m_nProperties; n++) totalWeight += weight[n];
+	landmarkWeight *= totalWeight;
+	if (landmarkWeight == 0) landmarkWeight = 1;
+	cout << "Total properties: " << nTotalProperties << endl;
+	cout << "Sampling points: " << nSamples << endl;
+
+	// assign the weighting factors
+	for (int i = 0; i < nLandmark; i++) m_feature_weight[i] = landmarkWeight;
+	for (int n = 0; n < m_nProperties; n++)
+		for (int i = 0; i < nSamples; i++)
+			m_feature_weight[nLandmark + nSamples * n + i] = weight[n];
+	// weight for location information
+	for (int n = 0; n < m_nSurfaceProperties; n++)
+		for (int i = 0; i < nSamples; i++)
+			m_feature_weight[nLandmark + nSamples * (m_nProperties + n) + i] = weightLoc;
+	
+	if (nLandmark > 0) cout << "Landmark weight: " << landmarkWeight << endl;
+	if (m_nProperties > 0)
+	{
+		cout << "Property weight: ";
+		for (int i = 0; i < m_nProperties; i++) cout << weight[i] << " ";
+		cout << endl;
+	}
+	if (weightLoc > 0) cout << "Location weight: " << weightLoc << endl;
+	
+	cout << "Initialization of work space\n";
+	m_cov = new float[m_nSubj * m_nSubj];	// convariance matrix defined in the duel space with dimensions: nSubj x nSubj
+	m_feature = new float[m_nSubj * (nLandmark + nSamples * nTotalProperties)];	// the entire feature vector map for optimization
+	m_mean = new float[nLandmark + nSamples * nTotalProperties];
+	m_gram = new double[m_nSubj * m_nSubj];
+	m_gram_work = new double[m_nSubj * m_nSubj];
+	m_landmark = new float[nLandmark * m_nSubj];	// deformed landmarks (landmark-major)
+	m_landmarkWork = new float[m_nSubj];
+
+	// AABB_Sphere tree cache for each subject: this stores the closest face of the sampling point to the corresponding face on the input sphere model
+	for (int subj = 0; subj < m_nSubj; subj++)
+	{
+		if (nTotalProperties > 0)
+		{
+			m_spharm[subj].tree_cache = new int[nSamples];
+			for (int i = 0; i < nSamples; i++)
+				m_spharm[subj].tree_cache[i] = -1;	// initially, set to -1 (invalid index)
+		}
+		else m_spharm[subj].tree_cache = NULL;
+	}
+
+	// inital coefficients for the previous step
+	memcpy(m_coeff_prev_step, m_coeff, sizeof(float) * m_csize * 2);
+
+	cout << "Feature vector creation\n";
+	// set all the tree needs to be updated
+	memset(m_updated, 0, sizeof(bool) * m_nSubj);
+
+	// feature update
+	if (nLandmark > 0) updateLandmark(); // update landmark
+	if (nSamples > 0) updateProperties(); // update properties
+
+	cout << "Initialization done!" << endl;
+}
+
+void GroupwiseRegistration::initSphericalHarmonics(int subj, vector<string> coeff)
+{
+	// spherical harmonics information
+	int n = (m_degree + 1) * (m_degree + 1);	// total number of coefficients (this must be the same across all the subjects at the end of this program)
+	// new memory allocation for coefficients
+	m_spharm[subj].coeff = new float*[n * 2];
+	m_spharm[subj].coeff_prev_step = new float*[n * 2];
+	
+	for (int i = 0; i < n; i++)
+	{
+		// store coefficients by asc order (low to high frequencies)
+		m_spharm[subj].coeff[i] = &m_coeff[m_nSubj * 2 * i + subj * 2];	// latitudes
+		m_spharm[subj].coeff[n + i] = &m_coeff[m_nSubj * 2 * i + subj * 2 + 1];	// longitudes
+		m_spharm[subj].coeff_prev_step[i] = &m_coeff_prev_step[m_nSubj * 2 * i + subj * 2];	// latitudes
+		m_spharm[subj].coeff_prev_step[n + i] = &m_coeff_prev_step[m_nSubj * 2 * i + subj * 2 + 1];	// longitudes
+	}
+
+	if (coeff.size() > 0 && !coeff[subj].empty())	// previous spherical harmonics information (none for the new subjects in the add-subjects mode)
+	{
+		loadCoeff(subj, coeff[subj].c_str());
+	}
+	else	// no spherical harmonic information is provided
+	{
+		// just set the pole to [0, 0, 1]
+		m_spharm[subj].pole[0] = 0;
+		m_spharm[subj].pole[1] = 0;
+		m_spharm[subj].pole[2] = 1;
+	}
+	m_spharm[subj].degree = m_degree;
+	
+	// build spherical harmonic basis functions for each vertex
+	initBasis(subj);
+}
+
+void GroupwiseRegistration::initSphericalHarmonics(int subj, const char **coeff)
+{
+	// spherical harmonics information
+	int n = (m_degree + 1) * (m_degree + 1);	// total number of coefficients (this must be the same across all the subjects at the end of this program)
+	// new memory allocation for coefficients
+	m_spharm[subj].coeff = new float*[n * 2];
+	m_spharm[subj].coeff_prev_step = new float*[n * 2];
+	
+	for (int i = 0; i < n; i++)
+	{
+		// store coefficients by asc order (low to high frequencies)
+		m_spharm[subj].coeff[i] = &m_coeff[m_nSubj * 2 * i + subj * 2];	// latitudes
+		m_spharm[subj].coeff[n + i] = &m_coeff[m_nSubj * 2 * i + subj * 2 + 1];	// longitudes
+		m_spharm[subj].coeff_prev_step[i] = &m_coeff_prev_step[m_nSubj * 2 * i + subj * 2];	// latitudes
+		m_spharm[subj].coeff_prev_step[n + i] = &m_coeff_prev_step[m_nSubj * 2 * i + subj * 2 + 1];	// longitudes
+	}
+
+	if (coeff != NULL)	// previous spherical harmonics information
+	{
+		loadCoeff(subj, coeff[subj]);
+	}
+	else	// no spherical harmonic information is provided
+	{
+		// just set the pole to [0, 0, 1]
+		m_spharm[subj].pole[0] = 0;
+		m_spharm[subj].pole[1] = 0;
+		m_spharm[subj].pole[2] = 1;
+	}
+	m_spharm[subj].degree = m_degree;
+	
+	// build spherical harmonic basis functions for each vertex
+	initBasis(subj);
+}
+
+void GroupwiseRegistration::loadCoeff(int subj, const char *filename)
+{
+	// text (pole, degree, pairs of coefficients) or binary (the same information with a magic number) format
+	int n = (m_degree + 1) * (m_degree + 1);
+	char magic[8];
+	FILE *fp = fopen(filename, "rb");
+	if (fp == NULL)
+	{
+		cout << " Fatal error: cannot open " << filename << endl;
+		return;
+	}
+	if (fread(magic, 1, 8, fp) == 8 && memcmp(magic, "GRPCOEF1", 8) == 0)
+	{
+		int degree;
+		fread(m_spharm[subj].pole, sizeof(float), 3, fp);	// optimal pole information
+		fread(&degree, sizeof(int), 1, fp);	// previous deformation field degree
+		m_spharm[subj].degree = min(degree, m_degree);	// if the previous degree is larger than desired one, just crop it.
+
+		// load previous coefficient information
+		for (int i = 0; i < (m_spharm[subj].degree + 1) * (m_spharm[subj].degree + 1); i++)
+		{
+			float c[2];
+			fread(c, sizeof(float), 2, fp);
+			*m_spharm[subj].coeff[i] = c[0];
+			*m_spharm[subj].coeff[n + i] = c[1];
+		}
+	}
+	else
+	{
+		rewind(fp);
+		fscanf(fp, "%f %f %f", &m_spharm[subj].pole[0], &m_spharm[subj].pole[1], &m_spharm[subj].pole[2]);	// optimal pole information
+		fscanf(fp, "%d", &m_spharm[subj].degree);	// previous deformation field degree
+
+		if (m_spharm[subj].degree > m_degree) m_spharm[subj].degree = m_degree;	// if the previous degree is larger than desired one, just crop it.
+
+		// load previous coefficient information
+		for (int i = 0; i < (m_spharm[subj].degree + 1) * (m_spharm[subj].degree + 1); i++)
+			fscanf(fp, "%f %f", m_spharm[subj].coeff[i], m_spharm[subj].coeff[n + i]);
+	}
+	fclose(fp);
+}
+
+void GroupwiseRegistration::initBasis(int subj)
+{
+	// spherical harmonic basis functions for each vertex, stored in a single contiguous matrix (one row per vertex)
+	int nVertex = m_spharm[subj].sphere->nVertex();
+	int nBasis = (m_degree + 1) * (m_degree + 1);
+	m_spharm[subj].basis = new float[nVertex * nBasis];
+	m_spharm[subj].equator = new float[nVertex * 3];
+	m_spharm[subj].atPole = new bool[nVertex];
+	m_spharm[subj].displacement = new float[nVertex * 2];
+	m_spharm[subj].coord = new float[nVertex * 3];
+
+	Vector p0(m_spharm[subj].pole);
+	for (int i = 0; i < nVertex; i++)
+	{
+		// vertex information
+		point *p = new point();	// new spherical information allocation
+		Vertex *v = (Vertex *)m_spharm[subj].sphere->vertex(i);	// vertex information on the sphere
+		const float *v0 = v->fv();
+		p->Y = &m_spharm[subj].basis[nBasis * i];
+		p->p[0] = v0[0]; p->p[1] = v0[1]; p->p[2] = v0[2];
+		p->id = i;
+		p->subject = subj;
+		if (m_cache != NULL) memcpy(p->Y, &m_cache->basis()[nBasis * i], sizeof(float) * nBasis);
+		else SphericalHarmonics::basis(m_degree, p->p, p->Y);
+		m_spharm[subj].vertex.push_back(p);
+		for (int k = 0; k < 3; k++) m_spharm[subj].coord[nVertex * k + i] = v0[k];
+
+		// rotation to the equator (the same as updateCoordinate): this only depends on the pole and the undeformed location
+		float *e = &m_spharm[subj].equator[i * 3];
+		Vector V(p->p);
+		Vector axis = p0.cross(V);
+		m_spharm[subj].atPole[i] = (axis.norm() == 0);
+		if (m_spharm[subj].atPole[i])
+		{
+			e[0] = e[1] = e[2] = 0;
+			continue;
+		}
+		float dot = p0 * V;
+		dot = (dot > 1) ? 1: dot;
+		dot = (dot < -1) ? -1: dot;
+		e[2] = PI / 2 - acos(dot);
+		float rot[9], rv[3];
+		Coordinate::rotation(axis.fv(), e[2], rot);
+		Coordinate::rotPoint(p->p, rot, rv);
+		Coordinate::cart2sph(rv, &e[0], &e[1]);
+	}
+}
+
+void GroupwiseRegistration::initProperties(int subj, const char **property, int nHeaderLines)
+{
+	int nVertex = m_spharm[subj].sphere->nVertex();	// this is the same as the number of properties
+	int nFace = m_spharm[subj].sphere->nFace();
+	if (m_nProperties + m_nSurfaceProperties > 0)
+	{
+		m_spharm[subj].meanProperty = new float[m_nProperties + m_nSurfaceProperties];
+		m_spharm[subj].maxProperty = new float[m_nProperties + m_nSurfaceProperties];
+		m_spharm[subj].minProperty = new float[m_nProperties + m_nSurfaceProperties];
+		m_spharm[subj].sdevProperty = new float[m_nProperties + m_nSurfaceProperties];
+		m_spharm[subj].property = new float[(m_nProperties + m_nSurfaceProperties) * nVertex];
+	}
+	else
+	{
+		m_spharm[subj].meanProperty = NULL;
+		m_spharm[subj].maxProperty = NULL;
+		m_spharm[subj].minProperty = NULL;
+		m_spharm[subj].sdevProperty = NULL;
+		m_spharm[subj].property = NULL;
+	}
+	for (int i = 0; i < m_nProperties; i++)	// property information
+	{
+		int index = subj * m_nProperties + i;
+		cout << "\t" << property[index] << endl;
+		FILE *fp = fopen(property[index], "r");
+		
+		// remove header lines
+		char line[1024];
+		for (int j = 0; j < nHeaderLines; j++) fgets(line, sizeof(line), fp);
+		
+		// load property information
+		for (int j = 0; j < nVertex; j++) fscanf(fp, "%f", &m_spharm[subj].property[nVertex * i + j]);
+		fclose(fp);
+	}
+	for (int i = 0; i < m_nSurfaceProperties; i++)	// x, y, z dimensions
+	{
+		for (int j = 0; j < nVertex; j++)
+		{
+			Vertex *v = (Vertex *)m_spharm[subj].surf->vertex(j);
+			const float *v0 = v->fv();
+			m_spharm[subj].property[nVertex * (m_nProperties + i) + j] = v0[i];
+		}
+	}
+	
+	// find the best statistics across subjects
+	for (int i = 0; i < m_nProperties + m_nSurfaceProperties; i++)
+	{
+		cout << "--Property " << i << endl;
+		m_spharm[subj].meanProperty[i] = Statistics::mean(&m_spharm[subj].property[nVertex * i], nVertex);
+		m_spharm[subj].maxProperty[i] = Statistics::max(&m_spharm[subj].property[nVertex * i], nVertex);
+		m_spharm[subj].minProperty[i] = Statistics::min(&m_spharm[subj].property[nVertex * i], nVertex);
+		m_spharm[subj].sdevProperty[i] = sqrt(Statistics::var(&m_spharm[subj].property[nVertex * i], nVertex));
+		cout << "---Min/Max: " << m_spharm[subj].minProperty[i] << ", " << m_spharm[subj].maxProperty[i] << endl;
+		cout << "---Mean/Stdev: " << m_spharm[subj].meanProperty[i] << ", " << m_spharm[subj].sdevProperty[i] << endl;
+	}
+}
+
+void GroupwiseRegistration::initPropertiesAndLandmarks(int subj, string surfacename, std::map<std::string, float> mapProperty){
+
+	// int nVertex = surface->GetNumberOfPoints();
+	int nVertex = m_spharm[subj].sphere->nVertex();	// this is the same as the number of properties
+
+	// only the requested arrays are decoded (legacy files); VTK parses the whole surface if the selective reader cannot
+	vector<string> names;
+	std::map<std::string, float>::const_iterator it = mapProperty.begin(), it_end = mapProperty.end();
+	for ( ; it != it_end ; it ++ ) names.push_back(it->first);
+	if (m_UseLandmarks) names.push_back("Landmarks");
+	VTKPropertyReader arrays;
+	bool selective = arrays.open(surfacename.c_str(), names) && arrays.nPoints() >= nVertex;
+	vtkSmartPointer<vtkPolyData> surface;
+	if (!selective)
+	{
+		vtkSmartPointer<vtkPolyDataReader> reader = vtkSmartPointer<vtkPolyDataReader>::New();
+		reader->SetFileName(surfacename.c_str());
+		reader->Update();
+		surface = reader->GetOutput();
+	}
+
+	if(m_UseLandmarks){
+		vector<double> landmarkId;
+		bool found = false;
+		if (selective) found = arrays.read("Landmarks", landmarkId);
+		else
+		{
+			vtkDoubleArray* arr = vtkDoubleArray::SafeDownCast(surface->GetPointData()->GetArray("Landmarks"));
+			if (arr != NULL)
+			{
+				found = true;
+				for (int j = 0; j < arr->GetSize(); j++) landmarkId.push_back(arr->GetValue(j));
+			}
+		}
+		if(found){
+			cout<<endl;
+			cout<<endl;
+			cout<<"Landmarks for subject "<<subj<<endl;
+
+			for (int j = 0; j < landmarkId.size(); j++){
+				int id = (int)landmarkId[j];
+				if(id > 0 ){
+					const float *v = m_spharm[subj].sphere->vertex(id)->fv();
+		
+					float *Y = new float[(m_degree + 1) * (m_degree + 1)];
+					point *p = new point();
+					p->p[0] = v[0]; p->p[1] = v[1]; p->p[2] = v[2];
+					SphericalHarmonics::basis(m_degree, p->p, Y);
+					p->subject = subj;
+					p->Y = Y;
+					p->id = j;
+					cout<<p->subject<<endl;
+					cout<<Y<<endl;
+					cout<<id<<endl;
+					cout<<endl;
+					
+					m_spharm[subj].landmark.push_back(p);
+					m_spharm[subj].landmarkVertex.push_back(id);
+				}	
+			}
+		}
+	}
+
+	if (m_nProperties + m_nSurfaceProperties > 0)
+	{
+		m_spharm[subj].meanProperty = new float[m_nProperties + m_nSurfaceProperties];
+		m_spharm[subj].maxProperty = new float[m_nProperties + m_nSurfaceProperties];
+		m_spharm[subj].minProperty = new float[m_nProperties + m_nSurfaceProperties];
+		m_spharm[subj].sdevProperty = new float[m_nProperties + m_nSurfaceProperties];
+		m_spharm[subj].property = new float[(m_nProperties + m_nSurfaceProperties) * nVertex];
+	}
+	else
+	{
+		m_spharm[subj].meanProperty = NULL;
+		m_spharm[subj].maxProperty = NULL;
+		m_spharm[subj].minProperty = NULL;
+		m_spharm[subj].sdevProperty = NULL;
+		m_spharm[subj].property = NULL;
+	}
+
+	
+	cout << "nVertex :: " << nVertex << endl;
+	int i = 0;
+	it = mapProperty.begin(), it_end = mapProperty.end();
+	for( ; it != it_end ; it ++ )
+	{
+		if (selective)
+		{
+			// decoded straight into the property buffer
+			if (!arrays.read((it->first).c_str(), &m_spharm[subj].property[nVertex * i], nVertex))
+			{
+				cerr<<"There is no property with name: " + it->first<<endl;
+				throw exception();
+			}
+			i++;
+			continue;
+		}
+		vtkDataArray* propArray = surface->GetPointData()->GetScalars((it->first).c_str());
+		if(propArray == NULL){
+			cerr<<"There is no property with name: " + it->first<<endl;
+			throw exception();
+		}
+		for (int j = 0; j < nVertex; j++ )
+		{
+			double k1 = propArray->GetTuple1(j);
+			m_spharm[subj].property[nVertex * i + j] = (float) k1;
+		}
+		i++;
+	}
+
+	// find the best statistics across subjects
+	it = mapProperty.begin(), it_end = mapProperty.end();
+	i = 0;
+	for( ; it != it_end ; it ++ )
+	// for (int i = 0; i < propertyNames.size(); i++)
+	{
+		cout << "--Property " << it->first << endl;
+		m_spharm[subj].meanProperty[i] = Statistics::mean(&m_spharm[subj].property[nVertex * i], nVertex);
+		m_spharm[subj].maxProperty[i] = Statistics::max(&m_spharm[subj].property[nVertex * i], nVertex);
+		m_spharm[subj].minProperty[i] = Statistics::min(&m_spharm[subj].property[nVertex * i], nVertex);
+		m_spharm[subj].sdevProperty[i] = sqrt(Statistics::var(&m_spharm[subj].property[nVertex * i], nVertex));
+		cout << "---Min/Max: " << m_spharm[subj].minProperty[i] << ", " << m_spharm[subj].maxProperty[i] << endl;
+		cout << "---Mean/Stdev: " << m_spharm[subj].meanProperty[i] << ", " << m_spharm[subj].sdevProperty[i] << endl;
+		i++;
+	}
+
+}
+
+void GroupwiseRegistration::initPropertiesAndLandmarks(int subj, const SubjectCache *cache)
+{
+	// the same as initPropertiesAndLandmarks(subj, surfacename, mapProperty) from the cached inputs (no VTK parsing)
+	for (int j = 0; j < cache->nLandmarks(); j++)
+	{
+		int id = cache->landmark()[j * 2 + 1];
+		const float *v = m_spharm[subj].sphere->vertex(id)->fv();
+
+		float *Y = new float[(m_degree + 1) * (m_degree + 1)];
+		point *p = new point();
+		p->p[0] = v[0]; p->p[1] = v[1]; p->p[2] = v[2];
+		SphericalHarmonics::basis(m_degree, p->p, Y);
+		p->subject = subj;
+		p->Y = Y;
+		p->id = cache->landmark()[j * 2];
+
+		m_spharm[subj].landmark.push_back(p);
+		m_spharm[subj].landmarkVertex.push_back(id);
+	}
+	if (cache->nLandmarks() > 0) cout << "--Landmarks: " << cache->nLandmarks() << endl;
+
+	int nVertex = m_spharm[subj].sphere->nVertex();
+	if (m_nProperties + m_nSurfaceProperties > 0)
+	{
+		m_spharm[subj].meanProperty = new float[m_nProperties + m_nSurfaceProperties];
+		m_spharm[subj].maxProperty = new float[m_nProperties + m_nSurfaceProperties];
+		m_spharm[subj].minProperty = new float[m_nProperties + m_nSurfaceProperties];
+		m_spharm[subj].sdevProperty = new float[m_nProperties + m_nSurfaceProperties];
+		m_spharm[subj].property = new float[(m_nProperties + m_nSurfaceProperties) * nVertex];
+	}
+	else
+	{
+		m_spharm[subj].meanProperty = NULL;
+		m_spharm[subj].maxProperty = NULL;
+		m_spharm[subj].minProperty = NULL;
+		m_spharm[subj].sdevProperty = NULL;
+		m_spharm[subj].property = NULL;
+	}
+	if (m_nProperties > 0)
+	{
+		memcpy(m_spharm[subj].property, cache->property(), sizeof(float) * m_nProperties * nVertex);
+		memcpy(m_spharm[subj].meanProperty, cache->meanProperty(), sizeof(float) * m_nProperties);
+		memcpy(m_spharm[subj].maxProperty, cache->maxProperty(), sizeof(float) * m_nProperties);
+		memcpy(m_spharm[subj].minProperty, cache->minProperty(), sizeof(float) * m_nProperties);
+		memcpy(m_spharm[subj].sdevProperty, cache->sdevProperty(), sizeof(float) * m_nProperties);
+	}
+	for (int i = 0; i < m_nProperties; i++)
+	{
+		cout << "--Property " << i << endl;
+		cout << "---Min/Max: " << m_spharm[subj].minProperty[i] << ", " << m_spharm[subj].maxProperty[i] << endl;
+		cout << "---Mean/Stdev: " << m_spharm[subj].meanProperty[i] << ", " << m_spharm[subj].sdevProperty[i] << endl;
+	}
+}
+
+unsigned long long GroupwiseRegistration::cacheKey(string sphere, string surf, std::map<std::string, float> mapProperty)
+{
+	// content hash of the input files and the settings that change the cached data: property names (not the weights), landmarks, and degree
+	unsigned long long key = SubjectCache::hashFile(sphere.c_str());
+	key = SubjectCache::hashFile(surf.c_str(), key);
+	std::map<std::string, float>::const_iterator it = mapProperty.begin(), it_end = mapProperty.end();
+	for ( ; it != it_end ; it ++ )
+		key = SubjectCache::hash(it->first.c_str(), it->first.size() + 1, key);
+	int settings[3] = {m_UseLandmarks, m_degree, m_nProperties};
+	key = SubjectCache::hash(settings, sizeof(settings), key);
+
+	return key;
+}
+
+void GroupwiseRegistration::saveCache(int subj, const char *filename, unsigned long long key)
+{
+	vector<int> landmark;
+	for (int i = 0; i < m_spharm[subj].landmark.size(); i++)
+	{
+		landmark.push_back(m_spharm[subj].landmark[i]->id);
+		landmark.push_back(m_spharm[subj].landmarkVertex[i]);
+	}
+	if (SubjectCache::save(filename, key, m_spharm[subj].sphere->nVertex(), m_nProperties, (m_degree + 1) * (m_degree + 1),
+		m_spharm[subj].property, m_spharm[subj].meanProperty, m_spharm[subj].maxProperty, m_spharm[subj].minProperty, m_spharm[subj].sdevProperty,
+		landmark, m_spharm[subj].basis))
+		cout << "-Cache file: " << filename << endl;
+}
+
+void GroupwiseRegistration::initTriangleFlipping(int subj)
+{
+	int nFace = m_spharm[subj].sphere->nFace();
+	m_spharm[subj].flip = new bool[nFace];
+	m_spharm[subj].face = new int[nFace * 3];
+	
+	// face list for the flip test
+	for (int i = 0; i < nFace; i++)
+		for (int k = 0; k < 3; k++)
+			m_spharm[subj].face[nFace * k + i] = m_spharm[subj].sphere->face(i)->list(k);
+
+	// check triangle flips: the orientation is the sign of det(v1, v2, v3) = centroid * normal * 3 (the same measure as testTriangleFlip)
+	int nVertex = m_spharm[subj].sphere->nVertex();
+	const float *x = m_spharm[subj].coord, *y = x + nVertex, *z = y + nVertex;
+	const int *a = m_spharm[subj].face, *b = a + nFace, *c = b + nFace;
+	for (int i = 0; i < nFace; i++)
+	{
+		float det = x[a[i]] * (y[b[i]] * z[c[i]] - z[b[i]] * y[c[i]]) +
+					y[a[i]] * (z[b[i]] * x[c[i]] - x[b[i]] * z[c[i]]) +
+					z[a[i]] * (x[b[i]] * y[c[i]] - y[b[i]] * x[c[i]]);
+
+		if (det < 0) m_spharm[subj].flip[i] = true;
+		else m_spharm[subj].flip[i] = false;
+	}
+	m_spharm[subj].nFolds = 0;	// no flips at the initial deformation
+}
+
+// void GroupwiseRegistration::initLandmarks(int subj, const char **landmark)
+// {
+// 	FILE *fp = fopen(landmark[subj], "r");
+// 	int i = 0;
+// 	while (!feof(fp))
+// 	{
+// 		// indices for corresponding points
+// 		int srcid;
+
+// 		// landmark information
+// 		int id;
+// 		if (fscanf(fp, "%d", &id) == -1) break;
+// 		const float *v = m_spharm[subj].sphere->vertex(id)->fv();
+		
+// 		float *Y = new float[(m_degree + 1) * (m_degree + 1)];
+// 		point *p = new point();
+// 		p->p[0] = v[0]; p->p[1] = v[1]; p->p[2] = v[2];
+// 		SphericalHarmonics::basis(m_degree, p->p, Y);
+// 		p->subject = subj;
+// 		p->Y = Y;
+// 		p->id = id;
+
+// 		m_spharm[subj].landmark.push_back(p);
+		
+// 		i++;
+// 	}
+// 	fclose(fp);
+// }
+
+// InitLandmark while they are stored in the vtk file!
+void GroupwiseRegistration::initAdjacency(int subj)
+{
+	// neighbor[i * 3 + k]: face across the edge opposite to the k-th vertex of face i (-1: boundary)
+	int nFace = m_spharm[subj].sphere->nFace();
+	const int *face = m_spharm[subj].face;
+	m_spharm[subj].neighbor = new int[nFace * 3];
+
+	std::map<pair<int, int>, pair<int, int> > edge;	// (vertex ids) -> (face, opposite vertex index)
+	for (int i = 0; i < nFace; i++)
+	{
+		for (int k = 0; k < 3; k++)
+		{
+			m_spharm[subj].neighbor[i * 3 + k] = -1;
+			int a = face[nFace * ((k + 1) % 3) + i];
+			int b = face[nFace * ((k + 2) % 3) + i];
+			pair<int, int> key(min(a, b), max(a, b));
+			std::map<pair<int, int>, pair<int, int> >::iterator it = edge.find(key);
+			if (it == edge.end()) edge[key] = make_pair(i, k);
+			else
+			{
+				m_spharm[subj].neighbor[i * 3 + k] = it->second.first;
+				m_spharm[subj].neighbor[it->second.first * 3 + it->second.second] = i;
+			}
+		}
+	}
+}
+
+void GroupwiseRegistration::initLandmarks(int subj, const char **landmark, const char **surf)
+{
+	// cout << " J'entre dans initlandmarks " << endl;
+	#define NB_LINES 250
+	#define NB_WORDS 250
+
+	std::fstream fcsvfile(landmark[subj]);
+	std::string line;
+	std::string mot;
+	std::string words[NB_LINES][NB_WORDS]; // !!!! WARNING DEFINE AND TO PROTECT IF SUPERIOR TO 20
+	int i,j;
+	int* landmarkPids;
+	int NbLandmarks;
+
+	// Get all surface data from the file
+	vtkSmartPointer<vtkPolyDataReader> surfacereader = vtkSmartPointer<vtkPolyDataReader>::New();
+	surfacereader->SetFileName(surf[subj]);
+	surfacereader->Update();
+
+	// Build a locator
+	vtkPointLocator *pointLocator = vtkPointLocator::New();
+	pointLocator->SetDataSet(surfacereader->GetOutput());
+	pointLocator->BuildLocator();
+
+	if(fcsvfile)
+	{
+		getline(fcsvfile, line);
+		fcsvfile>>mot;
+		while(mot=="#")
+		{
+			if(getline(fcsvfile, line))
+				fcsvfile>>mot;
+			else
+				mot="#";
+		}
+
+		i=0;
+		do
+		{
+			std::size_t pos_end;// = mot.find(",,");
+			std::size_t pos1;
+			j=0;
+			do
+			{
+				std::size_t pos0 = 0;
+				pos1 = mot.find(',');
+				pos_end = mot.find(",,");
+				words[i][j] = mot.substr(pos0, pos1-pos0);
+				mot = mot.substr(pos1+1);
+				j++;
+			}
+			while(pos1+1<pos_end);
+			i++;
+		}
+		while(fcsvfile>>mot);
+
+		NbLandmarks = i;
+        landmarkPids = new int[NbLandmarks]; 
+        
+		for (int i = 0; i < NbLandmarks; i++)
+		{
+			double x = atof(words[i][1].c_str());
+			double y = atof(words[i][2].c_str());
+			double z = atof(words[i][3].c_str());
+                        
+			// Find closest point
+			vtkIdType ptId;
+			double p[] = {0.0, 0.0, 0.0};
+			p[0] = x; p[1] = y; p[2] = z;
+			ptId = pointLocator->FindClosestPoint(p);
+			landmarkPids[i] = ptId;
+
+			std::cout << "landmark " << i << " position " << x << "," << y << "," << z << " and the corresponding Pid is " << landmarkPids[i] << std::endl;
+		}
+	}
+	else
+	{
+		std::cout<<"Error !";
+	}
+
+	std::cout << "NbLandmarks :: " << NbLandmarks << std::endl;
+	for (int i = 0; i < NbLandmarks; i++)
+	{
+		std::cout << "landmarkPids[i] :: " << landmarkPids[i] << std::endl;
+		const float *v = m_spharm[subj].sphere->vertex(landmarkPids[i])->fv();
+		
+		float *Y = new float[(m_degree + 1) * (m_degree + 1)];
+		point *p = new point();
+		p->p[0] = v[0]; p->p[1] = v[1]; p->p[2] = v[2];
+		SphericalHarmonics::basis(m_degree, p->p, Y);
+		p->subject = subj;
+		p->Y = Y;
+		p->id = landmarkPids[i];
+
+		m_spharm[subj].landmark.push_back(p);
+	}
+
+	for (int j = 0; j < NbLandmarks; j ++)
+		std::cout << m_spharm[subj].landmark[j]->p[0] << " :: " << m_spharm[subj].landmark[j]->p[1] << " :: " << m_spharm[subj].landmark[j]->p[2] << std::endl; 
+}
+
+
+bool GroupwiseRegistration::updateCoordinate(const float *v0, float *v1, const float *Y, const float **coeff, float degree, const float *pole)
+{
+	// spharm basis
+	int n = (degree + 1) * (degree + 1);
+
+	Vector p0(pole), axis;
+	float dot;
+
+	// fit to the equator
+	float rot[9];
+	Vector v(v0);
+	axis = p0.cross(v);
+	if (axis.norm() == 0)	// point == pole
+	{
+		memcpy(v1, v0, sizeof(float) * 3);
+		return false;
+	}
+
+	float delta[2] = {0, 0};
+	for (int i = 0; i < n; i++)
+	{
+		delta[0] += Y[i] * *coeff[i];
+		delta[1] += Y[i] * *coeff[(m_degree + 1) * (m_degree + 1) + i];
+	}
+
+	if (delta[0] == 0 && delta[1] == 0)
+	{
+		memcpy(v1, v0, sizeof(float) * 3);
+		return false;
+	}
+
+	dot = p0 * v;
+	dot = (dot > 1) ? 1: dot;
+	dot = (dot < -1) ? -1: dot;
+	float deg = PI / 2 - acos(dot);
+	Coordinate::rotation(axis.fv(), deg, rot);
+
+	// rotation to the eqautor
+	float rv[3];
+	Coordinate::rotPoint(v0, rot, rv);
+
+	// polar coodinate
+	float phi, theta;
+	Coordinate::cart2sph(rv, &phi, &theta);
+	
+	// displacement
+	phi += delta[0];	// longitude (azimuth) change
+	Coordinate::sph2cart(phi, theta, rv);
+	
+	// rotation to the new longitude change
+	// a simple inverse rotation is not enough due to not exact location back
+	Vector u(rv);
+	axis = p0.cross(u);
+	if (axis.norm() == 0) axis = p0;
+	Coordinate::rotation(axis.fv(), -deg, rot);
+	
+	theta += delta[1];
+	Coordinate::sph2cart(phi, theta, rv);	// locally normalized polar system
+
+	// inverse rotation
+	Coordinate::rotPoint(rv, rot, v1);
+	
+	return true;
+}
+
+bool GroupwiseRegistration::updateCoordinate(int subj, int index, float dphi, float dtheta, float *v1)
+{
+	// same as updateCoordinate(v0, v1, Y, coeff, degree, pole) with the precomputed rotation to the equator and displacement
+	const float *v0 = m_spharm[subj].vertex[index]->p;
+	if (m_spharm[subj].atPole[index] || (dphi == 0 && dtheta == 0))
+	{
+		memcpy(v1, v0, sizeof(float) * 3);
+		return false;
+	}
+
+	const float *e = &m_spharm[subj].equator[index * 3];
+	Vector p0(m_spharm[subj].pole), axis;
+	float rot[9];
+	float rv[3];
+
+	// displacement
+	float phi = e[0] + dphi;	// longitude (azimuth) change
+	float theta = e[1];
+	Coordinate::sph2cart(phi, theta, rv);
+
+	// rotation to the new longitude change
+	Vector u(rv);
+	axis = p0.cross(u);
+	if (axis.norm() == 0) axis = p0;
+	Coordinate::rotation(axis.fv(), -e[2], rot);
+
+	theta += dtheta;
+	Coordinate::sph2cart(phi, theta, rv);	// locally normalized polar system
+
+	// inverse rotation
+	Coordinate::rotPoint(rv, rot, v1);
+
+	return true;
+}
+
+void GroupwiseRegistration::updateDeformation(int subject)
+{
+	// note: the deformation happens only if the coefficients change; otherwise, nothing to do
+	bool updated = m_updated[subject];
+	
+	// check if the coefficients change
+	int degree = (frozen(subject)) ? m_degree: m_degree_inc;	// the frozen population keeps its full deformation
+	int n = (degree + 1) * (degree + 1);
+	for (int i = 0; i < n && updated; i++)
+		if (*m_spharm[subject].coeff[i] != *m_spharm[subject].coeff_prev_step[i] ||
+			*m_spharm[subject].coeff[(m_degree + 1) * (m_degree + 1) + i] != *m_spharm[subject].coeff_prev_step[(m_degree + 1) * (m_degree + 1) + i])
+			updated = false;
+	
+	// deform a sphere based on the current coefficients if necessary
+	int nVertex = m_spharm[subject].vertex.size();
+	if (!updated)
+	{
+		const float *coord = m_spharm[subject].coord;
+		deform(subject, m_coeff, m_spharm[subject].coord, m_spharm[subject].displacement);
+		for (int i = 0; i < nVertex; i++)
+		{
+			Vertex *v = (Vertex *)m_spharm[subject].sphere->vertex(i);
+			float v1[3] = {coord[i], coord[nVertex + i], coord[nVertex * 2 + i]};
+			v->setVertex(v1);
+		}
+		m_spharm[subject].nFolds = -1;	// the flip test is required for the new deformation
+	}
+	m_updated[subject] = updated;
+}
+
+void GroupwiseRegistration::deform(int subject, const float *coeff, float *coord, float *displacement)
+{
+	// displacements of all the vertices at once: basis (nVertex x n) * coefficients (n) using the current incremental degree.
+	// the coefficients of a subject are interleaved across subjects in coeff (the layout of m_coeff), which is handled by the stride.
+	// coord receives the deformed sphere (x, y, z blocks); only read-only subject data is used otherwise
+	int nVertex = m_spharm[subject].vertex.size();
+	int degree = (frozen(subject)) ? m_degree: m_degree_inc;
+	int n = (degree + 1) * (degree + 1);
+	int nBasis = (m_degree + 1) * (m_degree + 1);
+	int inc = m_nSubj * 2;
+	int one = 1;
+	float alpha = 1, beta = 0;
+	char trans[] = "T";	// the row-major basis is the transpose of a column-major (nBasis x nVertex) matrix
+	float *dphi = displacement;
+	float *dtheta = &displacement[nVertex];
+	sgemv_(trans, &n, &nVertex, &alpha, m_spharm[subject].basis, &nBasis, (float *)&coeff[subject * 2], &inc, &beta, dphi, &one);
+	sgemv_(trans, &n, &nVertex, &alpha, m_spharm[subject].basis, &nBasis, (float *)&coeff[subject * 2 + 1], &inc, &beta, dtheta, &one);
+
+	for (int i = 0; i < nVertex; i++)
+	{
+		float v1[3];
+		updateCoordinate(subject, i, dphi[i], dtheta[i], v1);
+		Vector V(v1); V.unit();
+		for (int k = 0; k < 3; k++) coord[nVertex * k + i] = V[k];
+	}
+}
+
+void GroupwiseRegistration::deformLandmarks(void)
+{
+	// deformed landmarks in the landmark-major layout: m_landmark[(i * 3 + k) * nSubj + subj] is the k-th coordinate of the i-th landmark of subj
+	int nLandmark = m_spharm[0].landmark.size();
+
+	#pragma omp parallel for schedule(static) num_threads(m_nThreads) if (m_nThreads > 1)
+	for (int subj = 0; subj < m_nSubj; subj++)
+	{
+		for (int i = 0; i < nLandmark; i++)
+		{
+			float v[3];
+			updateCoordinate(m_spharm[subj].landmark[i]->p, v, m_spharm[subj].landmark[i]->Y, (const float **)m_spharm[subj].coeff, (frozen(subj)) ? m_degree: m_degree_inc, m_spharm[subj].pole);
+			for (int k = 0; k < 3; k++) m_landmark[(i * 3 + k) * m_nSubj + subj] = v[k];
+		}
+	}
+}
+
+void GroupwiseRegistration::updateLandmark(void)
+{
+	deformLandmarks();
+	projectLandmarks(m_landmark, m_feature);
+}
+
+void GroupwiseRegistration::projectLandmarks(const float *landmark, float *feature)
+{
+	// landmark features: the deformed landmarks (landmark-major) projected onto the tangent planes at their mean locations
+	int nLandmark = m_spharm[0].landmark.size();
+	int nSamples = m_propertySamples.size();
+	int stride = nLandmark * 3 + nSamples * (m_nProperties + m_nSurfaceProperties);	// feature vector size
+
+	for (int i = 0; i < nLandmark; i++)
+	{
+		const float *x = &landmark[i * 3 * m_nSubj], *y = x + m_nSubj, *z = y + m_nSubj;
+
+		// mean locations
+		float m[3] = {0, 0, 0};	// mean
+		for (int subj = 0; subj < m_nSubj; subj++)
+		{
+			m[0] += x[subj];
+			m[1] += y[subj];
+			m[2] += z[subj];
+		}
+		// forcing the mean to be on the sphere
+		float norm = sqrt(m[0] * m[0] + m[1] * m[1] + m[2] * m[2]);
+		for (int k = 0; k < 3; k++) m[k] /= norm;
+		
+		// projection
+		for (int subj = 0; subj < m_nSubj; subj++)
+		{
+			float p[3] = {x[subj], y[subj], z[subj]};
+			Coordinate::proj2plane(m[0], m[1], m[2], -1, p, &feature[subj * stride + i * 3]);
+		}
+	}
+}
+
+static float selectMedian(float *v, int n)
+{
+	// median by linear-time selection (v is reordered): the mean of the two middle values for an even n
+	int h = n / 2;
+	nth_element(v, v + h, v + n);
+	float m = v[h];
+	if (n % 2 == 0) m = (m + *max_element(v, v + h)) / 2;
+	return m;
+}
+
+void GroupwiseRegistration::updateLandmarkMedian(void)
+{
+	int nLandmark = m_spharm[0].landmark.size();
+	int nSamples = m_propertySamples.size();	// # of sampling points for property map agreemen
+	int stride = nLandmark * 3 + nSamples * (m_nProperties + m_nSurfaceProperties);	// feature vector size
+	
+	// m-estimator: distances to the median are clipped at m2
+	float m2 = 16.8 * 0.01;
+
+	deformLandmarks();
+	for (int i = 0; i < nLandmark; i++)
+	{
+		const float *x = &m_landmark[i * 3 * m_nSubj], *y = x + m_nSubj, *z = y + m_nSubj;
+
+		// median locations (the selection works on a copy)
+		float m[3];	// median
+		for (int k = 0; k < 3; k++)
+		{
+			memcpy(m_landmarkWork, &m_landmark[(i * 3 + k) * m_nSubj], sizeof(float) * m_nSubj);
+			m[k] = selectMedian(m_landmarkWork, m_nSubj);
+		}
+
+		// forcing the mean to be on the sphere
+		float norm = sqrt(m[0] * m[0] + m[1] * m[1] + m[2] * m[2]);
+		for (int k = 0; k < 3; k++) m[k] /= norm;
+
+		// projection
+		for (int subj = 0; subj < m_nSubj; subj++)
+		{
+			float p[3] = {x[subj], y[subj], z[subj]};
+			float *newp = &m_feature[subj * stride + i * 3];
+			Coordinate::proj2plane(m[0], m[1], m[2], -1, p, newp);
+
+			// m-estimator
+			float len = sqrt((newp[0] - m[0]) * (newp[0] - m[0]) + (newp[1] - m[1]) * (newp[1] - m[1]) + (newp[2] - m[2]) * (newp[2] - m[2]));
+			float ratio = (len > m2) ? m2 / len: 1.0f;
+
+			newp[0] = m[0] + (newp[0] - m[0]) * ratio;
+			newp[1] = m[1] + (newp[1] - m[1]) * ratio;
+			newp[2] = m[2] + (newp[2] - m[2]) * ratio;
+		}
+	}
+}
+
+void GroupwiseRegistration::updateProperties(void)
+{
+	int nLandmark = m_spharm[0].landmark.size();
+	int nSamples = m_propertySamples.size();	// # of sampling points for property map agreement
+
+	float err = 0;
+	const int maxWalk = 16;	// maximum # of faces visited from the cached face
+	long long nCacheHit = 0, nWalkHit = 0, nTreeQuery = 0, nGridHit = 0;
+	#pragma omp parallel for schedule(dynamic) reduction(+:nCacheHit,nWalkHit,nTreeQuery,nGridHit) num_threads(m_nThreads) if (m_nThreads > 1)
+	for (int subj = 0; subj < m_nSubj; subj++)
+	{
+		if (!m_updated[subj])
+		{
+			m_updated[subj] = true;
+			m_feature_updated[subj] = true;
+		}
+		else continue;	// don't compute again since tree is the same as the previous. The feature vector won't be changed
+
+		// the tree/grid is updated only if a sampling point is not found by the walk below (small steps rarely need it)
+		bool treeUpdated = false;
+		bool gridUpdated = false;
+		for (int i = 0; i < nSamples; i++)
+		{
+			int fid = -1;
+			float coeff[3];
+			if (m_spharm[subj].tree_cache[i] != -1)	// if previous cache is available
+			{
+				// walk from the cached face toward the sampling point: the next face is across the edge opposite to the most negative barycentric coordinate
+				int cur = m_spharm[subj].tree_cache[i];
+				for (int step = 0; step <= maxWalk && cur != -1; step++)
+				{
+					Face *f = (Face *)m_spharm[subj].sphere->face(cur);
+					Vertex *a = (Vertex *)f->vertex(0);
+					Vertex *b = (Vertex *)f->vertex(1);
+					Vertex *c = (Vertex *)f->vertex(2);
+
+					// bary centric
+					Coordinate::cart2bary((float *)a->fv(), (float *)b->fv(), (float *)c->fv(), m_propertySamples[i], coeff);
+
+					if (coeff[0] >= err && coeff[1] >= err && coeff[2] >= err)
+					{
+						fid = cur;
+						if (step == 0) nCacheHit++;
+						else nWalkHit++;
+						break;
+					}
+					int k = (coeff[0] < coeff[1]) ? ((coeff[0] < coeff[2]) ? 0: 2): ((coeff[1] < coeff[2]) ? 1: 2);
+					cur = m_spharm[subj].neighbor[cur * 3 + k];
+				}
+			}
+			if (fid == -1 && m_spharm[subj].locator != NULL)	// grid lookup
+			{
+				if (!gridUpdated)
+				{
+					m_spharm[subj].locator->update();
+					gridUpdated = true;
+				}
+				fid = m_spharm[subj].locator->closestFace(m_propertySamples[i], coeff, err);
+				if (fid != -1) nGridHit++;
+			}
+			if (fid == -1)	// if no closest face is found
+			{
+				if (!treeUpdated)
+				{
+					m_spharm[subj].tree->update();
+					treeUpdated = true;
+				}
+				fid = m_spharm[subj].tree->closestFace(m_propertySamples[i], coeff);
+				nTreeQuery++;
+				if (fid == -1)	// something goes wrong
+					cout << "Fatal error: no closest point found!\n";
+			}
+
+			int nVertex = m_spharm[subj].sphere->nVertex();
+			for (int k = 0; k < m_nProperties + m_nSurfaceProperties; k++)
+			{
+				m_feature[subj * (nLandmark * 3 + nSamples * (m_nProperties + m_nSurfaceProperties)) + nLandmark * 3 + nSamples * k + i] = propertyInterpolation(&m_spharm[subj].property[nVertex * k], fid, coeff, m_spharm[subj].sphere) / m_spharm[subj].sdevProperty[k];
+			}
+			m_spharm[subj].tree_cache[i] = fid;
+		}
+	}
+	m_nCacheHit += nCacheHit;
+	m_nWalkHit += nWalkHit;
+	m_nTreeQuery += nTreeQuery;
+	m_nGridHit += nGridHit;
+}
+
+void GroupwiseRegistration::reportSampling(void)
+{
+	// closest face searches of the sampling points since the last report
+	long long total = m_nCacheHit + m_nWalkHit + m_nGridHit + m_nTreeQuery;
+	if (total == 0) return;
+	cout << "Closest faces: " << total << " searches, cache hits " << m_nCacheHit << " (" << 100.0 * m_nCacheHit / total << "%), walk hits " << m_nWalkHit << " (" << 100.0 * m_nWalkHit / total << "%), ";
+	if (m_spharm[0].locator != NULL) cout << "grid hits " << m_nGridHit << " (" << 100.0 * m_nGridHit / total << "%), ";
+	cout << "tree queries " << m_nTreeQuery << " (" << 100.0 * m_nTreeQuery / total << "%)\n";
+	m_nCacheHit = m_nWalkHit = m_nTreeQuery = m_nGridHit = 0;
+}
+
+float GroupwiseRegistration::entropy(void)
+{
+	int nLandmark = m_spharm[0].landmark.size() * 3;	// # of landmarks: we assume all the subject has the same number
+	int nSamples = m_propertySamples.size();	// # of sampling points for property map agreement
+	
+	float E = 0;	// entropy
+	
+	memset(m_cov, 0, sizeof(float) * m_nSubj * m_nSubj);	// reset covariance matrix
+
+	// update landmark
+	if (nLandmark > 0) updateLandmark();
+	
+	// update properties
+	if (nSamples > 0) updateProperties();
+	
+	// dual covariance matrix (m_nSubj x m_nSubj) of feature vector (nLandmark + nSamples * (m_nProperties + m_nSurfaceProperties) x m_nSubj)
+	if (m_incremental)
+	{
+		// nothing to do if no feature vector changes (landmarks are always updated)
+		bool updated = (nLandmark > 0);
+		for (int subj = 0; subj < m_nSubj && !updated; subj++) updated = m_feature_updated[subj];
+		if (!updated) return m_entropy;
+		incrementalCovariance(m_cov);
+	}
+	else if (m_nThreads > 1) covariance(m_cov);
+	else Statistics::wcov_trans(m_feature, m_nSubj, nLandmark + nSamples * (m_nProperties + m_nSurfaceProperties), m_cov, m_feature_weight);
+	
+	float alpha = 1e-5;	// avoid a degenerative case
+
+	// entropy: log-determinant of the covariance without the null direction (fast path)
+	double logdet;
+	if (m_cholesky && logDeterminant(m_cov, m_nSubj, alpha, &logdet, m_chol))
+	{
+		m_entropy = (float)logdet;
+		return m_entropy;
+	}
+
+	// entropy: eigenvalues (verification path, or fallback if the factorization fails)
+	eigenvalues(m_cov, m_nSubj, m_eig, m_work);
+
+	for (int i = 1; i < m_nSubj; i++)	// just ignore the first eigenvalue (trivial = 0)
+		E += log(m_eig[i] + alpha);
+	m_entropy = E;
+
+	return E;
+}
+
+bool GroupwiseRegistration::logDeterminant(const float *M, int dim, float alpha, double *logdet, float *chol)
+{
+	// sum_{i >= 1} log(lambda_i + alpha) of a centered covariance matrix (M 1 = 0) by the Cholesky factorization, O(n^3 / 3) instead of
+	// the eigen-decomposition. The null direction 1 / sqrt(n) is removed by the Householder reflection H = I - 2 v v^T that maps it to
+	// the last axis: the leading (n - 1) x (n - 1) block of H M H holds the nontrivial spectrum. M is not modified.
+	// chol: (n - 1) x (n - 1) work space. false if the regularized block is not positive definite (float rounding): the caller falls back to the eigenvalues
+	*logdet = 0;
+	int n = dim - 1;
+	if (n <= 0) return true;
+
+	double *v = new double[dim];
+	double *Mv = new double[dim];
+	double norm = 0;
+	for (int i = 0; i < dim; i++)
+	{
+		v[i] = 1.0 / sqrt((double)dim) - ((i == n) ? 1: 0);
+		norm += v[i] * v[i];
+	}
+	norm = sqrt(norm);
+	for (int i = 0; i < dim; i++) v[i] /= norm;
+	double vMv = 0;
+	for (int i = 0; i < dim; i++)
+	{
+		Mv[i] = 0;
+		for (int j = 0; j < dim; j++) Mv[i] += (double)M[i * dim + j] * v[j];
+		vMv += v[i] * Mv[i];
+	}
+
+	// H M H = M - 2 v (M v)^T - 2 (M v) v^T + 4 (v^T M v) v v^T (leading block)
+	for (int i = 0; i < n; i++)
+		for (int j = 0; j < n; j++)
+			chol[i * n + j] = (float)(M[i * dim + j] - 2 * v[i] * Mv[j] - 2 * Mv[i] * v[j] + 4 * vMv * v[i] * v[j] + ((i == j) ? alpha: 0));
+
+	int lda = n;
+	int info;
+	char uplo[] = "L";
+	spotrf_(uplo, &n, chol, &lda, &info);
+	if (info == 0)
+	{
+		double sum = 0;
+		for (int i = 0; i < n; i++) sum += log((double)chol[i * n + i]);
+		*logdet = 2 * sum;
+	}
+
+	delete [] v;
+	delete [] Mv;
+
+	return info == 0;
+}
+
+void GroupwiseRegistration::covariance(float *cov)
+{
+	covariance(m_feature, m_mean, cov);
+}
+
+void GroupwiseRegistration::covariance(const float *feature, float *mean, float *cov)
+{
+	// weighted dual covariance (same as Statistics::wcov_trans) computed in parallel:
+	// cov(i, j) = sum_k w_k (x_ik - m_k) (x_jk - m_k) / (nSubj - 1)
+	// each entry is accumulated by a single thread in the same order, so the result does not depend on the number of threads
+	int nLandmark = m_spharm[0].landmark.size() * 3;
+	int nSamples = m_propertySamples.size();
+	int nFeature = nLandmark + nSamples * (m_nProperties + m_nSurfaceProperties);
+
+	#pragma omp parallel for schedule(static) num_threads(m_nThreads) if (m_nThreads > 1)
+	for (int k = 0; k < nFeature; k++)
+	{
+		float m = 0;
+		for (int subj = 0; subj < m_nSubj; subj++) m += feature[subj * nFeature + k];
+		mean[k] = m / m_nSubj;
+	}
+
+	#pragma omp parallel for schedule(dynamic) num_threads(m_nThreads) if (m_nThreads > 1)
+	for (int i = 0; i < m_nSubj; i++)
+	{
+		const float *xi = &feature[i * nFeature];
+		for (int j = i; j < m_nSubj; j++)
+		{
+			const float *xj = &feature[j * nFeature];
+			float sum = 0;
+			for (int k = 0; k < nFeature; k++)
+				sum += (xi[k] - mean[k]) * (xj[k] - mean[k]) * m_feature_weight[k];
+			cov[i * m_nSubj + j] = cov[j * m_nSubj + i] = sum / (m_nSubj - 1);
+		}
+	}
+}
+
+void GroupwiseRegistration::incrementalCovariance(float *cov)
+{
+	// weighted dual covariance (same as Statistics::wcov_trans) from the inner products G(i, j) = sum_k w_k x_ik x_jk:
+	// cov(i, j) = (G(i, j) - r_i - r_j + s) / (nSubj - 1), where r_i = sum_j G(i, j) / nSubj and s = sum_i r_i / nSubj
+	// the property part of G is kept between evaluations, and only the rows/columns of the subjects whose feature vectors changed are recomputed:
+	// O(nSubj x nFeature) per changed subject instead of O(nSubj^2 x nFeature). The sums are accumulated in double to avoid cancellation.
+	int nLandmark = m_spharm[0].landmark.size() * 3;
+	int nSamples = m_propertySamples.size();
+	int nFeature = nLandmark + nSamples * (m_nProperties + m_nSurfaceProperties);
+	const float *w = m_feature_weight;
+
+	// property part: changed subjects only
+	#pragma omp parallel for schedule(dynamic) num_threads(m_nThreads) if (m_nThreads > 1)
+	for (int i = 0; i < m_nSubj; i++)
+	{
+		const float *xi = &m_feature[i * nFeature];
+		for (int j = i; j < m_nSubj; j++)
+		{
+			if (!m_feature_updated[i] && !m_feature_updated[j]) continue;
+			const float *xj = &m_feature[j * nFeature];
+			double sum = 0;
+			for (int k = nLandmark; k < nFeature; k++)
+				sum += (double)xi[k] * xj[k] * w[k];
+			m_gram[i * m_nSubj + j] = m_gram[j * m_nSubj + i] = sum;
+		}
+	}
+	memset(m_feature_updated, 0, sizeof(bool) * m_nSubj);
+
+	// landmark part: the landmarks are projected onto their mean locations, so all the subjects change together
+	#pragma omp parallel for schedule(dynamic) num_threads(m_nThreads) if (m_nThreads > 1)
+	for (int i = 0; i < m_nSubj; i++)
+	{
+		const float *xi = &m_feature[i * nFeature];
+		for (int j = i; j < m_nSubj; j++)
+		{
+			const float *xj = &m_feature[j * nFeature];
+			double sum = m_gram[i * m_nSubj + j];
+			for (int k = 0; k < nLandmark; k++)
+				sum += (double)xi[k] * xj[k] * w[k];
+			m_gram_work[i * m_nSubj + j] = m_gram_work[j * m_nSubj + i] = sum;
+		}
+	}
+
+	// mean correction
+	double *r = new double[m_nSubj];
+	double s = 0;
+	for (int i = 0; i < m_nSubj; i++)
+	{
+		r[i] = 0;
+		for (int j = 0; j < m_nSubj; j++) r[i] += m_gram_work[i * m_nSubj + j];
+		r[i] /= m_nSubj;
+		s += r[i];
+	}
+	s /= m_nSubj;
+	for (int i = 0; i < m_nSubj; i++)
+		for (int j = 0; j < m_nSubj; j++)
+			cov[i * m_nSubj + j] = (float)((m_gram_work[i * m_nSubj + j] - r[i] - r[j] + s) / (m_nSubj - 1));
+	delete [] r;
+}
+
+void GroupwiseRegistration::eigenvalues(float *M, int dim, float *eig, float *work)
+{
+	int n = dim;
+	int lwork = dim * 3 - 1;	// dimension of the work array
+	int lda = n;			// lda: leading dimension
+	int info;				// information (0 for successful exit)
+	
+	char jobz[] = "N";	// eigenvalue only
+	char uplo[] = "L"; // Lower triangle
+	ssyev_(jobz, uplo, &n, M, &lda, eig, work, &lwork, &info);
+}
+
+void GroupwiseRegistration::entropyGradient(float *grad)
+{
+	// gradient of the entropy with respect to the coefficients (m_coeff layout) at the current deformation, for the property features only.
+	// E = sum_{i >= 1} log(lambda_i + alpha) of the dual covariance C = Xc W Xc^T / (nSubj - 1), Xc = P X, P = I - 11^T / nSubj:
+	// dE/dC = M = sum_{i >= 1} v_i v_i^T / (lambda_i + alpha), and dE/dX = H = 2 / (nSubj - 1) P M Xc W.
+	// A feature is the property interpolated at a sampling point q in the face (a, b, c) with the barycentric coordinates along the ray through q:
+	// p = (n_a p_a + n_b p_b + n_c p_c) / (n_a + n_b + n_c), n_a = q . (b x c), n_b = q . (c x a), n_c = q . (a x b), whose derivatives
+	// with respect to the vertices are accumulated per vertex. The vertex gradients are then mapped to the displacements (phi, theta)
+	// through updateCoordinate (central differences of the two-parameter map per vertex), and to the coefficients by the basis: B^T g.
+	int nLandmark = m_spharm[0].landmark.size() * 3;
+	int nSamples = m_propertySamples.size();
+	int nTotalProperties = m_nProperties + m_nSurfaceProperties;
+	int nFeature = nLandmark + nSamples * nTotalProperties;
+	int n = m_nSubj;
+	float alpha = 1e-5;	// the same as entropy()
+
+	memset(grad, 0, sizeof(float) * m_csize * 2);
+	if (nSamples == 0 || nTotalProperties == 0) return;
+
+	// eigen-decomposition of the dual covariance (the cached covariance may be skipped by the incremental update, so it is computed again)
+	float *V = new float[n * n];
+	float *eig = new float[n];
+	covariance(V);
+	int lwork = n * 3 - 1, lda = n, info;
+	char jobz[] = "V", uplo[] = "L";
+	ssyev_(jobz, uplo, &n, V, &lda, eig, m_work, &lwork, &info);	// eigenvectors in the columns (ascending eigenvalues)
+
+	// M, then P M
+	float *M = new float[n * n];
+	for (int s = 0; s < n; s++)
+	{
+		for (int t = 0; t < n; t++)
+		{
+			double sum = 0;
+			for (int i = 1; i < n; i++) sum += (double)V[i * n + s] * V[i * n + t] / (eig[i] + alpha);
+			M[s * n + t] = (float)sum;
+		}
+	}
+	for (int t = 0; t < n; t++)
+	{
+		float m = 0;
+		for (int s = 0; s < n; s++) m += M[s * n + t];
+		m /= n;
+		for (int s = 0; s < n; s++) M[s * n + t] -= m;
+	}
+
+	// H = 2 / (nSubj - 1) P M Xc W (property features)
+	float *H = new float[n * nFeature];
+	#pragma omp parallel for schedule(static) num_threads(m_nThreads) if (m_nThreads > 1)
+	for (int s = 0; s < n; s++)
+	{
+		float *h = &H[s * nFeature];
+		memset(h, 0, sizeof(float) * nFeature);
+		for (int t = 0; t < n; t++)
+		{
+			float c = M[s * n + t];
+			const float *x = &m_feature[t * nFeature];
+			for (int k = nLandmark; k < nFeature; k++) h[k] += c * (x[k] - m_mean[k]);
+		}
+		for (int k = nLandmark; k < nFeature; k++) h[k] *= 2.0f / (n - 1) * m_feature_weight[k];
+	}
+
+	int nBasis = (m_degree + 1) * (m_degree + 1);
+	int nInc = (m_degree_inc + 1) * (m_degree_inc + 1);
+	const float hstep = 1e-3f;	// step of the central differences (radian)
+
+	#pragma omp parallel for schedule(dynamic) num_threads(m_nThreads) if (m_nThreads > 1)
+	for (int subj = 0; subj < n; subj++)
+	{
+		int nVertex = m_spharm[subj].sphere->nVertex();
+		int nFace = m_spharm[subj].sphere->nFace();
+		const float *x = m_spharm[subj].coord, *y = x + nVertex, *z = y + nVertex;
+		const int *face = m_spharm[subj].face;
+		const float *h = &H[subj * nFeature + nLandmark];
+
+		// vertex gradients
+		float *gv = new float[nVertex * 3];
+		memset(gv, 0, sizeof(float) * nVertex * 3);
+		for (int i = 0; i < nSamples; i++)
+		{
+			int fid = m_spharm[subj].tree_cache[i];
+			if (fid == -1) continue;
+			int id[3] = {face[fid], face[nFace + fid], face[nFace * 2 + fid]};
+			Vector A(x[id[0]], y[id[0]], z[id[0]]), B(x[id[1]], y[id[1]], z[id[1]]), C(x[id[2]], y[id[2]], z[id[2]]), Q(m_propertySamples[i]);
+			float na = Q * B.cross(C), nb = Q * C.cross(A), nc = Q * A.cross(B);
+			float D = na + nb + nc;
+			if (D == 0) continue;
+
+			// c_j = sum_k dE/dp_k (p_j - p)
+			float c[3] = {0, 0, 0};
+			for (int k = 0; k < nTotalProperties; k++)
+			{
+				const float *P = &m_spharm[subj].property[nVertex * k];
+				float p = (na * P[id[0]] + nb * P[id[1]] + nc * P[id[2]]) / D;
+				float g = h[nSamples * k + i] / m_spharm[subj].sdevProperty[k];
+				for (int j = 0; j < 3; j++) c[j] += g * (P[id[j]] - p);
+			}
+			Vector dA = (Q.cross(C) * c[1] + B.cross(Q) * c[2]) / D;
+			Vector dB = (C.cross(Q) * c[0] + Q.cross(A) * c[2]) / D;
+			Vector dC = (Q.cross(B) * c[0] + A.cross(Q) * c[1]) / D;
+			for (int k = 0; k < 3; k++)
+			{
+				gv[id[0] * 3 + k] += dA[k];
+				gv[id[1] * 3 + k] += dB[k];
+				gv[id[2] * 3 + k] += dC[k];
+			}
+		}
+
+		// displacement gradients
+		const float *dphi = m_spharm[subj].displacement, *dtheta = dphi + nVertex;
+		float *gphi = new float[nVertex * 2], *gtheta = gphi + nVertex;
+		for (int i = 0; i < nVertex; i++)
+		{
+			gphi[i] = gtheta[i] = 0;
+			float *g = &gv[i * 3];
+			if (g[0] == 0 && g[1] == 0 && g[2] == 0) continue;
+
+			// tangential part: the deformed vertices are normalized
+			float r = g[0] * x[i] + g[1] * y[i] + g[2] * z[i];
+			g[0] -= r * x[i]; g[1] -= r * y[i]; g[2] -= r * z[i];
+
+			float v0[3], v1[3];
+			updateCoordinate(subj, i, dphi[i] + hstep, dtheta[i], v1);
+			updateCoordinate(subj, i, dphi[i] - hstep, dtheta[i], v0);
+			for (int k = 0; k < 3; k++) gphi[i] += g[k] * (v1[k] - v0[k]) / (2 * hstep);
+			updateCoordinate(subj, i, dphi[i], dtheta[i] + hstep, v1);
+			updateCoordinate(subj, i, dphi[i], dtheta[i] - hstep, v0);
+			for (int k = 0; k < 3; k++) gtheta[i] += g[k] * (v1[k] - v0[k]) / (2 * hstep);
+		}
+
+		// coefficient gradients: basis^T (nInc x nVertex) * displacement gradients, interleaved across subjects as in m_coeff
+		int inc = m_nSubj * 2;
+		int one = 1;
+		float a = 1, b = 0;
+		char trans[] = "N";	// the row-major basis is a column-major (nBasis x nVertex) matrix
+		sgemv_(trans, &nInc, &nVertex, &a, m_spharm[subj].basis, &nBasis, gphi, &one, &b, &grad[subj * 2], &inc);
+		sgemv_(trans, &nInc, &nVertex, &a, m_spharm[subj].basis, &nBasis, gtheta, &one, &b, &grad[subj * 2 + 1], &inc);
+
+		delete [] gv;
+		delete [] gphi;
+	}
+
+	delete [] V;
+	delete [] eig;
+	delete [] M;
+	delete [] H;
+}
+
+float GroupwiseRegistration::propertyInterpolation(float *refMap, int index, float *coeff, Mesh *mesh)
+{
+	float property = 0;
+
+	if (index != -1)
+	{
+		Face *f = (Face *)mesh->face(index);
+		Vertex *a = (Vertex *)f->vertex(0);
+		Vertex *b = (Vertex *)f->vertex(1);
+		Vertex *c = (Vertex *)f->vertex(2);
+		property = refMap[a->id()] * coeff[0] + refMap[b->id()] * coeff[1] + refMap[c->id()] * coeff[2];
+	}
+
+	return property;
+}
+
+float GroupwiseRegistration::cost(float *coeff, int statusStep)
+{
+	// resumed run: the costs logged before the checkpoint drive NEWUOA along the same trajectory without evaluation
+	if (nIter < m_nReplay)
+	{
+		float cost = m_costLog[nIter];
+		if (m_mincost > cost) m_mincost = cost;
+		m_minHistory.push_back(m_mincost);
+		nIter++;
+		if (nIter == m_nReplay) cout << "[" << nIter << "] resumed " << m_mincost << endl;
+		return cost;
+	}
+
+	// update defomation fields
+	#pragma omp parallel for schedule(dynamic) num_threads(m_nThreads) if (m_nThreads > 1)
+	for (int i = 0; i < m_nSubj; i++) updateDeformation(i);
+	
+	// how many flips are detected: only the subjects deformed above are tested again
+	int nFolds = 0;
+	#pragma omp parallel for schedule(dynamic) reduction(+:nFolds) num_threads(m_nThreads) if (m_nThreads > 1)
+	for (int i = 0; i < m_nSubj; i++)
+	{
+		if (m_spharm[i].nFolds == -1) m_spharm[i].nFolds = testTriangleFlip(i);
+		nFolds += m_spharm[i].nFolds;
+	}
+
+	m_lastFolds = nFolds;
+	float fcost = (nFolds == 0) ? 0: (nFolds + 1) * fabs(m_mincost);
+	float ecost = (nFolds == 0) ? entropy(): m_mincost;
+
+	float cost = ecost + fcost;
+	if (m_mincost > cost)
+	{
+		m_mincost = cost;
+		// keep the current optimal solutions: they are written by flushCoeff
+		memcpy(m_coeff_best, m_coeff, sizeof(float) * m_csize * 2);
+		m_bestUpdated = true;
+	}
+	flushCoeff(false);
+	m_minHistory.push_back(m_mincost);
+	
+	if (nIter % statusStep == 0)
+	{
+		cout << "[" << nIter << "] " << cost << " (" << ecost << " + " << fcost << ")" << " " << m_mincost << endl;
+	}
+	nIter++;
+
+	// copy previous coefficients
+	memcpy(m_coeff_prev_step, m_coeff, sizeof(float) * m_csize * 2);
+
+	// periodic checkpoint
+	if (!m_checkpoint.empty())
+	{
+		m_costLog.push_back(cost);
+		if (difftime(time(NULL), m_checkpointTime) >= m_checkpointInterval) saveCheckpoint();
+	}
+	
+	return cost;
+}
+
+float GroupwiseRegistration::costGradient(float *coeff, float *grad, int offset, int n)
+{
+	// cost and its gradient with respect to m_coeff[offset, offset + n). Deformations with flips are rejected (FLT_MAX),
+	// so that the line search shortens the step instead of following the flip penalty
+	float cost = this->cost(coeff);
+	if (m_lastFolds > 0) return FLT_MAX;
+
+	float *g = new float[m_csize * 2];
+	entropyGradient(g);
+	memcpy(grad, &g[offset], sizeof(float) * n);
+	delete [] g;
+
+	return cost;
+}
+
+void GroupwiseRegistration::costBatch(const float *coeff, int nBatch, float *cost, int *nFolds)
+{
+	// re-entrant evaluation of nBatch coefficient vectors (m_csize x 2 floats each, in the layout of m_coeff) at the current incremental degree,
+	// e.g. the candidates of a population-based optimizer. The evaluations run in parallel, each on its own scratch (deformed spheres,
+	// closest face caches and grids, features and covariance), and share the read-only subject data (basis, properties, sampling points,
+	// topology). The state of the sequential optimization (m_coeff, m_mincost, nIter, caches, checkpoints) is not modified.
+	// cost: entropy (FLT_MAX if a subject has flips), nFolds: # of subjects with flips
+	initBatch(nBatch);
+	#pragma omp parallel for schedule(dynamic) num_threads(m_nThreads) if (m_nThreads > 1)
+	for (int b = 0; b < nBatch; b++)
+		cost[b] = batchCost(&m_batch[b], &coeff[(size_t)b * m_csize * 2], &nFolds[b]);
+}
+
+void GroupwiseRegistration::initBatch(int nBatch)
+{
+	// scratch of the batched evaluation: added on demand, and rebuilt if the sampling points changed since
+	int nLandmark = m_spharm[0].landmark.size();
+	int nSamples = m_propertySamples.size();
+	int nFeature = nLandmark * 3 + nSamples * (m_nProperties + m_nSurfaceProperties);
+	if (!m_batch.empty() && (m_batch[0].nFeature != nFeature || m_batch[0].nSamples != nSamples)) freeBatch();
+
+	int maxVertex = 0;
+	for (int subj = 0; subj < m_nSubj; subj++) maxVertex = max(maxVertex, m_spharm[subj].sphere->nVertex());
+	while (m_batch.size() < nBatch)
+	{
+		evaluation e;
+		e.nFeature = nFeature;
+		e.nSamples = nSamples;
+		e.coord = new float*[m_nSubj];
+		e.locator = new SphereLocator*[m_nSubj];
+		e.tree_cache = new int[m_nSubj * nSamples];
+		for (int subj = 0; subj < m_nSubj; subj++)
+		{
+			e.coord[subj] = new float[m_spharm[subj].sphere->nVertex() * 3];
+			e.locator[subj] = NULL;	// built on the first miss of the walk
+			if (nSamples > 0) memcpy(&e.tree_cache[subj * nSamples], m_spharm[subj].tree_cache, sizeof(int) * nSamples);	// warm start
+		}
+		e.displacement = new float[maxVertex * 2];
+		e.landmark = new float[nLandmark * 3 * m_nSubj];
+		e.feature = new float[m_nSubj * nFeature];
+		e.mean = new float[nFeature];
+		e.cov = new float[m_nSubj * m_nSubj];
+		e.eig = new float[m_nSubj];
+		e.work = new float[m_nSubj * 3 - 1];
+		e.chol = new float[max(m_nSubj - 1, 1) * max(m_nSubj - 1, 1)];
+		m_batch.push_back(e);
+	}
+}
+
+void GroupwiseRegistration::freeBatch(void)
+{
+	for (int b = 0; b < m_batch.size(); b++)
+	{
+		evaluation &e = m_batch[b];
+		for (int subj = 0; subj < m_nSubj; subj++)
+		{
+			delete [] e.coord[subj];
+			delete e.locator[subj];
+		}
+		delete [] e.coord;
+		delete [] e.locator;
+		delete [] e.tree_cache;
+		delete [] e.displacement;
+		delete [] e.landmark;
+		delete [] e.feature;
+		delete [] e.mean;
+		delete [] e.cov;
+		delete [] e.eig;
+		delete [] e.work;
+		delete [] e.chol;
+	}
+	m_batch.clear();
+}
+
+float GroupwiseRegistration::batchCost(evaluation *e, const float *coeff, int *nFolds)
+{
+	// one evaluation of costBatch: same cost as entropy() at coeff, with every intermediate result kept in e
+	int nLandmark = m_spharm[0].landmark.size();
+	int nSamples = m_propertySamples.size();
+	int nTotalProperties = m_nProperties + m_nSurfaceProperties;
+	int stride = nLandmark * 3 + nSamples * nTotalProperties;
+
+	// deformation and flip test: no features for an invalid deformation
+	*nFolds = 0;
+	for (int subj = 0; subj < m_nSubj; subj++)
+	{
+		deform(subj, coeff, e->coord[subj], e->displacement);
+		*nFolds += testTriangleFlip(subj, e->coord[subj]);
+	}
+	if (*nFolds > 0) return FLT_MAX;
+
+	// landmarks: the coefficients of a subject are referenced as in m_spharm[subj].coeff
+	if (nLandmark > 0)
+	{
+		int n = (m_degree + 1) * (m_degree + 1);
+		const float **c = new const float*[n * 2];
+		for (int subj = 0; subj < m_nSubj; subj++)
+		{
+			for (int i = 0; i < n; i++)
+			{
+				c[i] = &coeff[m_nSubj * 2 * i + subj * 2];
+				c[n + i] = &coeff[m_nSubj * 2 * i + subj * 2 + 1];
+			}
+			for (int i = 0; i < nLandmark; i++)
+			{
+				float v[3];
+				updateCoordinate(m_spharm[subj].landmark[i]->p, v, m_spharm[subj].landmark[i]->Y, c, (frozen(subj)) ? m_degree: m_degree_inc, m_spharm[subj].pole);
+				for (int k = 0; k < 3; k++) e->landmark[(i * 3 + k) * m_nSubj + subj] = v[k];
+			}
+		}
+		delete [] c;
+		projectLandmarks(e->landmark, e->feature);
+	}
+
+	// properties: the closest faces are found by the walk from the cached faces of this evaluation, then by its own grid
+	const int maxWalk = 16;
+	for (int subj = 0; subj < m_nSubj && nSamples > 0; subj++)
+	{
+		int nVertex = m_spharm[subj].sphere->nVertex();
+		int nFace = m_spharm[subj].sphere->nFace();
+		const float *coord = e->coord[subj];
+		const int *face = m_spharm[subj].face;
+		int *cache = &e->tree_cache[subj * nSamples];
+		bool gridUpdated = false;
+		for (int i = 0; i < nSamples; i++)
+		{
+			int fid = -1;
+			float bc[3];
+			for (int step = 0, cur = cache[i]; step <= maxWalk && cur != -1; step++)
+			{
+				float p[3][3];
+				for (int j = 0; j < 3; j++)
+					for (int k = 0; k < 3; k++) p[j][k] = coord[nVertex * k + face[nFace * j + cur]];
+				Coordinate::cart2bary(p[0], p[1], p[2], m_propertySamples[i], bc);
+				if (bc[0] >= 0 && bc[1] >= 0 && bc[2] >= 0)
+				{
+					fid = cur;
+					break;
+				}
+				int k = (bc[0] < bc[1]) ? ((bc[0] < bc[2]) ? 0: 2): ((bc[1] < bc[2]) ? 1: 2);
+				cur = m_spharm[subj].neighbor[cur * 3 + k];
+			}
+			if (fid == -1)
+			{
+				if (e->locator[subj] == NULL) e->locator[subj] = new SphereLocator(coord, nVertex, face, nFace);
+				else if (!gridUpdated) e->locator[subj]->update();
+				gridUpdated = true;
+				fid = e->locator[subj]->closestFace(m_propertySamples[i], bc);
+			}
+			if (fid == -1)
+			{
+				// float rounding on an edge: the face with the largest minimum barycentric coordinate
+				float best = -FLT_MAX;
+				for (int f = 0; f < nFace; f++)
+				{
+					float p[3][3], c[3];
+					for (int j = 0; j < 3; j++)
+						for (int k = 0; k < 3; k++) p[j][k] = coord[nVertex * k + face[nFace * j + f]];
+					Coordinate::cart2bary(p[0], p[1], p[2], m_propertySamples[i], c);
+					float m = min(c[0], min(c[1], c[2]));
+					if (m > best)
+					{
+						best = m;
+						fid = f;
+						memcpy(bc, c, sizeof(float) * 3);
+					}
+				}
+			}
+			cache[i] = fid;
+
+			const int a = face[fid], b = face[nFace + fid], c = face[nFace * 2 + fid];
+			for (int k = 0; k < nTotalProperties; k++)
+			{
+				const float *refMap = &m_spharm[subj].property[nVertex * k];
+				e->feature[subj * stride + nLandmark * 3 + nSamples * k + i] = (refMap[a] * bc[0] + refMap[b] * bc[1] + refMap[c] * bc[2]) / m_spharm[subj].sdevProperty[k];
+			}
+		}
+	}
+
+	// entropy of the covariance
+	covariance(e->feature, e->mean, e->cov);
+	float alpha = 1e-5;
+	double logdet;
+	if (m_cholesky && logDeterminant(e->cov, m_nSubj, alpha, &logdet, e->chol)) return (float)logdet;
+	eigenvalues(e->cov, m_nSubj, e->eig, e->work);
+	float E = 0;
+	for (int i = 1; i < m_nSubj; i++) E += log(e->eig[i] + alpha);
+	return E;
+}
+
+int GroupwiseRegistration::testTriangleFlip(Mesh *mesh, const bool *flip)
+{
+	int nFolds = 0;
+	for (int i = 0; i < mesh->nFace(); i++)
+	{
+		const float *v1 = mesh->vertex(mesh->face(i)->list(0))->fv();
+		const float *v2 = mesh->vertex(mesh->face(i)->list(1))->fv();
+		const float *v3 = mesh->vertex(mesh->face(i)->list(2))->fv();
+
+		Vector V1(v1), V2(v2), V3(v3);
+		Vector V = (V1 + v2 + V3) / 3;
+
+		Vector U = (V2 - V1).cross(V3 - V1);
+
+		if ((V * U < 0 && !flip[i]) || (V * U > 0 && flip[i])) nFolds++;
+		
+		if (nFolds > 0) break;	// do not allow any flips!
+	}
+	return nFolds;
+}
+
+int GroupwiseRegistration::testTriangleFlip(int subj)
+{
+	return testTriangleFlip(subj, m_spharm[subj].coord);
+}
+
+int GroupwiseRegistration::testTriangleFlip(int subj, const float *coord)
+{
+	// struct-of-arrays version of testTriangleFlip(Mesh *, const bool *): the orientation of a face is the sign of det(v1, v2, v3),
+	// which is the dot product of its centroid and normal up to a factor of 3. The faces are processed in blocks: the vertices are
+	// gathered into contiguous arrays, then tested without branches so that the loop can be vectorized. The test stops at the first block with a flip.
+	const int blockSize = 256;
+	float v[10][blockSize];
+
+	int nVertex = m_spharm[subj].sphere->nVertex();
+	int nFace = m_spharm[subj].sphere->nFace();
+	const float *x = coord, *y = x + nVertex, *z = y + nVertex;
+	const int *a = m_spharm[subj].face, *b = a + nFace, *c = b + nFace;
+	const bool *flip = m_spharm[subj].flip;
+
+	for (int i0 = 0; i0 < nFace; i0 += blockSize)
+	{
+		int n = min(blockSize, nFace - i0);
+
+		// gather
+		for (int i = 0; i < n; i++)
+		{
+			int f = i0 + i;
+			v[0][i] = x[a[f]]; v[1][i] = y[a[f]]; v[2][i] = z[a[f]];
+			v[3][i] = x[b[f]]; v[4][i] = y[b[f]]; v[5][i] = z[b[f]];
+			v[6][i] = x[c[f]]; v[7][i] = y[c[f]]; v[8][i] = z[c[f]];
+			v[9][i] = flip[f] ? -1.0f: 1.0f;	// initial orientation
+		}
+
+		// orientation test: a flip if the sign differs from the initial one
+		int nFolds = 0;
+		for (int i = 0; i < n; i++)
+		{
+			float det = v[0][i] * (v[4][i] * v[8][i] - v[5][i] * v[7][i]) +
+						v[1][i] * (v[5][i] * v[6][i] - v[3][i] * v[8][i]) +
+						v[2][i] * (v[3][i] * v[7][i] - v[4][i] * v[6][i]);
+			nFolds += (v[9][i] * det < 0);
+		}
+		if (nFolds > 0) return 1;	// do not allow any flips!
+	}
+	return 0;
+}
+
+void GroupwiseRegistration::evaluate(void)
+{
+	// cost of the input coefficients at the maximum degree and the full sampling, without optimization: solutions optimized
+	// with different settings (e.g. sampling levels) are compared on a common resolution
+	setSamplingLevel(m_SamplingDegree);
+	m_degree_inc = m_degree;
+	memset(m_updated, 0, sizeof(bool) * m_nSubj);
+	memset(m_feature_updated, 1, sizeof(bool) * m_nSubj);
+	int nFolds = 0;
+	for (int subj = 0; subj < m_nSubj; subj++)
+	{
+		updateDeformation(subj);
+		nFolds += testTriangleFlip(subj);
+	}
+	float cost = entropy();
+	cout << "Evaluation: " << cost << " (" << nFolds << " triangle flips)\n";
+}
+
+bool GroupwiseRegistration::benchmark(void)
+{
+	cout << "Benchmark\n";
+	benchmarkTriangleFlip(100);
+	bool agreement = benchmarkEntropy(100);
+	benchmarkLocator(10);
+	benchmarkBatch(16);
+	benchmarkOptimizer(m_maxIter);
+
+	return agreement;
+}
+
+void GroupwiseRegistration::benchmarkBatch(int nBatch)
+{
+	// batched evaluation of perturbed coefficients vs the sequential cost: agreement and throughput. No coefficients are written.
+	vector<string> output;
+	output.swap(m_Output);
+	setSamplingLevel(samplingLevel());
+	int n = (m_degree_inc + 1) * (m_degree_inc + 1) * m_nSubj * 2;
+	float *coeff0 = new float[m_csize * 2];
+	float *coeff = new float[m_csize * 2 * nBatch];
+	float *fBatch = new float[nBatch];
+	float *fSeq = new float[nBatch];
+	int *nFolds = new int[nBatch];
+	memcpy(coeff0, m_coeff, sizeof(float) * m_csize * 2);
+	srand(0);
+	for (int b = 0; b < nBatch; b++)
+	{
+		memcpy(&coeff[m_csize * 2 * b], coeff0, sizeof(float) * m_csize * 2);
+		for (int i = 0; i < n; i++) coeff[m_csize * 2 * b + i] += 1e-3f * gaussian();
+	}
+
+	// the sequential path: one evaluation at a time through the shared state
+	double tic = wallTime();
+	for (int b = 0; b < nBatch; b++)
+	{
+		resetOptimization(&coeff[m_csize * 2 * b]);
+		fSeq[b] = cost(m_coeff, nBatch + 1);
+		if (m_lastFolds > 0) fSeq[b] = FLT_MAX;
+	}
+	double toc = wallTime();
+	costBatch(coeff, nBatch, fBatch, nFolds);	// scratch allocation and grids
+	double toc2 = wallTime();
+	costBatch(coeff, nBatch, fBatch, nFolds);
+	double toc3 = wallTime();
+
+	float err = 0;
+	int nValid = 0, nMismatch = 0;
+	for (int b = 0; b < nBatch; b++)
+	{
+		if ((fBatch[b] == FLT_MAX) != (fSeq[b] == FLT_MAX)) nMismatch++;
+		else if (fBatch[b] != FLT_MAX)
+		{
+			err = max(err, (float)fabs(fBatch[b] - fSeq[b]) / max((float)fabs(fSeq[b]), 1.0f));
+			nValid++;
+		}
+	}
+	cout << "Batch: " << nBatch << " evaluations, degree " << m_degree_inc << ", " << m_nThreads << " threads\n";
+	cout << "-Sequential: " << (toc - tic) * 1000 / nBatch << " ms per evaluation\n";
+	cout << "-Batched: " << (toc3 - toc2) * 1000 / nBatch << " ms per evaluation (" << (toc2 - toc) * 1000 << " ms for the first batch with the scratch allocation)\n";
+	cout << "-Max relative difference: " << err << " (" << nValid << " valid evaluations, " << nMismatch << " flip mismatches)\n";
+
+	resetOptimization(coeff0);
+	output.swap(m_Output);
+	delete [] coeff0;
+	delete [] coeff;
+	delete [] fBatch;
+	delete [] fSeq;
+	delete [] nFolds;
+}
+
+void GroupwiseRegistration::benchmarkTriangleFlip(int nRepeat)
+{
+	// full scans over the current deformation: legacy (Mesh/Vector) vs struct-of-arrays flip test
+	int nFace = 0;
+	int mismatch = 0;
+	double t0 = 0, t1 = 0;
+	for (int subj = 0; subj < m_nSubj; subj++)
+	{
+		int n0 = 0, n1 = 0;
+		clock_t tic = clock();
+		for (int r = 0; r < nRepeat; r++) n0 += testTriangleFlip(m_spharm[subj].sphere, m_spharm[subj].flip);
+		clock_t toc = clock();
+		for (int r = 0; r < nRepeat; r++) n1 += testTriangleFlip(subj);
+		clock_t toc2 = clock();
+		t0 += (double)(toc - tic) / CLOCKS_PER_SEC;
+		t1 += (double)(toc2 - toc) / CLOCKS_PER_SEC;
+		if (n0 != n1) mismatch++;
+		nFace += m_spharm[subj].sphere->nFace();
+	}
+	cout << "Triangle flip test: " << m_nSubj << " subjects, " << nFace << " faces, " << nRepeat << " repetitions\n";
+	cout << "-Legacy: " << t0 * 1000 / nRepeat << " ms per evaluation\n";
+	cout << "-Struct-of-arrays: " << t1 * 1000 / nRepeat << " ms per evaluation\n";
+	if (t1 > 0) cout << "-Speedup: " << t0 / t1 << endl;
+	cout << "-Subjects with different results: " << mismatch << endl;
+}
+
+bool GroupwiseRegistration::benchmarkEntropy(int nRepeat)
+{
+	// entropy of the current features: eigenvalues vs Cholesky log-determinant (agreement and time)
+	// false if the two differ by more than entropyTolerance (relative)
+	for (int subj = 0; subj < m_nSubj; subj++) updateDeformation(subj);
+	bool cholesky = m_cholesky;
+	m_cholesky = false;
+	entropy();	// features and covariance
+	m_cholesky = cholesky;
+	float alpha = 1e-5;
+
+	float *cov = new float[m_nSubj * m_nSubj];
+	float E0 = 0;
+	double E1 = 0;
+	bool success = true;
+	double tic = wallTime();
+	for (int r = 0; r < nRepeat; r++)
+	{
+		covariance(cov);
+		eigenvalues(cov, m_nSubj, m_eig, m_work);
+		E0 = 0;
+		for (int i = 1; i < m_nSubj; i++) E0 += log(m_eig[i] + alpha);
+	}
+	double toc = wallTime();
+	for (int r = 0; r < nRepeat; r++)
+	{
+		covariance(cov);
+		success = logDeterminant(cov, m_nSubj, alpha, &E1, m_chol);
+	}
+	double toc2 = wallTime();
+	delete [] cov;
+
+	cout << "Entropy: " << m_nSubj << " subjects, " << nRepeat << " repetitions (including the covariance)\n";
+	cout << "-Eigenvalues: " << E0 << ", " << (toc - tic) * 1000 / nRepeat << " ms per evaluation\n";
+	if (success)
+	{
+		double diff = fabs(E1 - E0) / max(fabs((double)E0), 1.0);
+		cout << "-Cholesky: " << E1 << ", " << (toc2 - toc) * 1000 / nRepeat << " ms per evaluation\n";
+		cout << "-Relative difference: " << diff << ((diff <= entropyTolerance) ? " (agree": " (FAILED") << ", tolerance " << entropyTolerance << ")" << endl;
+		return diff <= entropyTolerance;
+	}
+	cout << "-Cholesky: not positive definite (the eigenvalues are used)\n";
+
+	return true;	// the fallback keeps the entropy exact
+}
+
+void GroupwiseRegistration::benchmarkLocator(int nRepeat)
+{
+	// closest faces of all the sampling points at the current deformation without the face cache: AABB tree vs cube-map grid
+	int nSamples = m_propertySamples.size();
+	if (nSamples == 0 || m_spharm[0].tree == NULL) return;
+	setSamplingLevel(m_SamplingDegree);	// full resolution
+	nSamples = m_propertySamples.size();
+
+	int nFace = 0, mismatch = 0, miss = 0;
+	long long nEntries = 0;
+	double tTree = 0, tGrid = 0, tTreeUpdate = 0, tGridBuild = 0;
+	for (int subj = 0; subj < m_nSubj; subj++)
+	{
+		updateDeformation(subj);
+		int nVertex = m_spharm[subj].sphere->nVertex();
+		nFace += m_spharm[subj].sphere->nFace();
+		int *fid = new int[nSamples];
+		float coeff[3];
+
+		double tic = wallTime();
+		for (int r = 0; r < nRepeat; r++) m_spharm[subj].tree->update();
+		double toc = wallTime();
+		for (int r = 0; r < nRepeat; r++)
+			for (int i = 0; i < nSamples; i++) fid[i] = m_spharm[subj].tree->closestFace(m_propertySamples[i], coeff);
+		double toc2 = wallTime();
+		SphereLocator *grid = NULL;
+		for (int r = 0; r < nRepeat; r++)
+		{
+			delete grid;
+			grid = new SphereLocator(m_spharm[subj].coord, nVertex, m_spharm[subj].face, m_spharm[subj].sphere->nFace());
+		}
+		double toc3 = wallTime();
+		int m = 0, n = 0;
+		for (int r = 0; r < nRepeat; r++)
+		{
+			m = n = 0;
+			for (int i = 0; i < nSamples; i++)
+			{
+				int f = grid->closestFace(m_propertySamples[i], coeff);
+				if (f == -1) n++;
+				else if (f != fid[i]) m++;
+			}
+		}
+		double toc4 = wallTime();
+		nEntries += grid->nEntries();
+		delete grid;
+		delete [] fid;
+
+		tTreeUpdate += toc - tic;
+		tTree += toc2 - toc;
+		tGridBuild += toc3 - toc2;
+		tGrid += toc4 - toc3;
+		mismatch += m;
+		miss += n;
+	}
+	cout << "Closest face locator: " << m_nSubj << " subjects, " << nFace << " faces, " << nSamples << " sampling points, " << nRepeat << " repetitions\n";
+	cout << "-AABB tree: update " << tTreeUpdate * 1000 / nRepeat << " ms, queries " << tTree * 1000 / nRepeat << " ms\n";
+	cout << "-Grid: build " << tGridBuild * 1000 / nRepeat << " ms, queries " << tGrid * 1000 / nRepeat << " ms (" << (double)nEntries / nFace << " cells per face)\n";
+	if (tGrid > 0) cout << "-Query speedup: " << tTree / tGrid << endl;
+	cout << "-Different faces (shared edges/vertices): " << mismatch << ", not found by the grid: " << miss << endl;
+}
+
+void GroupwiseRegistration::resetOptimization(const float *coeff)
+{
+	// restart from the given coefficients: all the subjects are deformed again at the next evaluation
+	memcpy(m_coeff, coeff, sizeof(float) * m_csize * 2);
+	memcpy(m_coeff_prev_step, coeff, sizeof(float) * m_csize * 2);
+	memset(m_updated, 0, sizeof(bool) * m_nSubj);
+	memset(m_feature_updated, 1, sizeof(bool) * m_nSubj);
+	m_mincost = FLT_MAX;
+	m_bestUpdated = false;
+	m_nReplay = 0;
+	m_minHistory.clear();
+	nIter = 0;
+}
+
+void GroupwiseRegistration::benchmarkOptimizer(int maxEval)
+{
+	// the first stage from the initial coefficients: NEWUOA runs for (at most) maxEval evaluations,
+	// and L-BFGS is timed to the cost where NEWUOA stopped. No coefficients are written.
+	vector<string> output;
+	output.swap(m_Output);
+	float *coeff0 = new float[m_csize * 2];
+	memcpy(coeff0, m_coeff, sizeof(float) * m_csize * 2);
+	setSamplingLevel(samplingLevel());
+	int n = (m_degree_inc + 1) * (m_degree_inc + 1) * m_nSubj * 2;
+	cout << "Optimizer: " << m_nSubj << " subjects, " << n << " variables, degree " << m_degree_inc << ", " << maxEval << " evaluations at most\n";
+
+	// gradient check against central differences on the largest components
+	resetOptimization(coeff0);
+	float *grad = new float[n];
+	costGradient(m_coeff, grad, 0, n);
+	vector<pair<float, int> > order;
+	for (int i = 0; i < n; i++) order.push_back(make_pair(-(float)fabs(grad[i]), i));
+	sort(order.begin(), order.end());
+	for (int i = 0; i < min(5, n); i++)
+	{
+		int j = order[i].second;
+		float h = 1e-3f;
+		float c = m_coeff[j];
+		m_coeff[j] = c + h; float f1 = cost(m_coeff);
+		m_coeff[j] = c - h; float f0 = cost(m_coeff);
+		m_coeff[j] = c;
+		cout << "-Gradient check: coefficient " << j << ", analytic " << grad[j] << ", finite difference " << (f1 - f0) / (2 * h) << endl;
+	}
+	delete [] grad;
+
+	// NEWUOA
+	resetOptimization(coeff0);
+	target_function newuoaFunc(this, 0, n, -FLT_MAX);
+	min_newuoa(n, m_coeff, newuoaFunc, 1.0f, 1e-5f, maxEval);
+	float target = newuoaFunc.best();
+
+	// L-BFGS
+	resetOptimization(coeff0);
+	target_function lbfgsFunc(this, 0, n, target);
+	min_lbfgs(n, m_coeff, lbfgsFunc, 1e-2f, 1e-5f, maxEval);
+
+	cout << "-NEWUOA: cost " << target << " after " << newuoaFunc.bestTime() << " s (" << newuoaFunc.bestEval() << " evaluations)\n";
+	if (lbfgsFunc.reached())
+		cout << "-L-BFGS: cost " << lbfgsFunc.best() << " reached after " << lbfgsFunc.reachedTime() << " s (" << lbfgsFunc.reachedEval() << " evaluations)\n";
+	else
+		cout << "-L-BFGS: cost " << lbfgsFunc.best() << " after " << lbfgsFunc.bestTime() << " s (" << lbfgsFunc.bestEval() << " evaluations), NEWUOA cost not reached\n";
+	if (lbfgsFunc.reached() && lbfgsFunc.reachedTime() > 0) cout << "-Speedup: " << newuoaFunc.bestTime() / lbfgsFunc.reachedTime() << endl;
+
+	resetOptimization(coeff0);
+	output.swap(m_Output);
+	delete [] coeff0;
+}
+
+void GroupwiseRegistration::minimize(int offset, int n, float tol)
+{
+	// minimization over m_coeff[offset, offset + n)
+	if (m_blockCoordinate) minimizeBlocks(offset, tol);
+	else if (m_lbfgs)
+	{
+		gradient_function gradFunc(this, offset, n);
+		min_lbfgs(n, &m_coeff[offset], gradFunc, 1e-2f, tol, m_maxIter);
+	}
+	else
+	{
+		cost_function costFunc(this);
+		min_newuoa(n, &m_coeff[offset], costFunc, 1.0f, tol, m_maxIter);
+	}
+	if (m_stopReason.empty()) m_stopReason = (nIter >= m_maxIter) ? "maximum evaluations": "optimizer tolerance";
+}
+
+void GroupwiseRegistration::minimizeBlocks(int offset, float tol)
+{
+	// block-coordinate descent over the coefficients m_coeff[offset, (m_degree_inc + 1)^2 x nSubj x 2): sweeps over the subjects,
+	// each minimizing the coefficients of one subject against the fixed rest of the population. Only the deformation and feature row
+	// of that subject change per evaluation (m_updated), and the NEWUOA workspace depends on the block size, not on the number of subjects.
+	int b0 = offset / (m_nSubj * 2);
+	int b1 = (m_degree_inc + 1) * (m_degree_inc + 1);
+	int n = (b1 - b0) * 2;
+	int npt = 2 * n + 1;
+	int nActive = 0;	// subjects to optimize (the frozen population is skipped)
+	for (int subj = 0; subj < m_nSubj; subj++) if (!frozen(subj)) nActive++;
+	if (nActive == 0)
+	{
+		m_stopReason = "no subject to optimize";
+		return;
+	}
+	int maxIter = max(m_maxIter / nActive, npt * 2);	// the evaluation budget is shared by the subjects (at least two rounds of the interpolation points)
+	double workspace = ((double)(npt + 13) * (npt + n) + 3.0 * n * (n + 3) / 2) * sizeof(float) / 1048576;
+	int nAll = n * nActive;
+	double workspaceAll = ((double)(2 * nAll + 14) * (3 * nAll + 1) + 3.0 * nAll * (nAll + 3) / 2) * sizeof(float) / 1048576;
+	cout << "Block-coordinate: " << n << " variables per subject, NEWUOA workspace " << workspace << " MB (" << workspaceAll << " MB for all the subjects together)\n";
+
+	float *x = new float[n];
+	for (int sweep = 0; sweep < m_maxSweeps; sweep++)
+	{
+		float start = m_mincost;
+		for (int subj = 0; subj < m_nSubj; subj++)
+		{
+			if (frozen(subj)) continue;
+			subject_cost_function costFunc(this, m_coeff, m_nSubj, subj, b0, b1);
+			costFunc.gather(x);
+			min_newuoa(n, x, costFunc, 1.0f, tol, maxIter);
+			costFunc.scatter(x);	// the best point of the block (not necessarily the last evaluation)
+			if (converged()) break;	// early stop of the stage: the remaining subjects are not visited
+		}
+		cout << "Sweep " << sweep + 1 << ": " << m_mincost << endl;
+		if (!m_stopReason.empty()) break;
+
+		// convergence: relative decrease over a sweep
+		if (start != FLT_MAX && start - m_mincost <= tol * fabs(m_mincost))
+		{
+			m_stopReason = "no decrease over a sweep";
+			break;
+		}
+	}
+	if (m_stopReason.empty()) m_stopReason = "maximum sweeps";
+	delete [] x;
+}
+
+void GroupwiseRegistration::optimization(void)
+{
+	// a resumed run continues the schedule (degree, first variable, degree step and phase) restored from the checkpoint
+	int stage = (m_resumeStage >= 0) ? m_resumeStage: 0;
+
+	while (m_phase == 0 && m_degree_inc < m_degree)
+	{
+		beginStage(stage++);
+		int n = (m_degree_inc + 1) * (m_degree_inc + 1) * m_nSubj * 2 - m_stageOffset;
+		minimize(m_stageOffset, n, 1e-5f);
+		endStage();
+
+		// adaptive schedule: after a stage without gain, the next stage raises the degree by twice the step (the degrees in between
+		// are optimized together), up to the maximum degree, which skips the remaining incremental stages
+		if (m_adaptiveDegree)
+		{
+			float gain = (m_mincost_stage == FLT_MAX) ? 1: (m_mincost_stage - m_mincost) / max((float)fabs(m_mincost), FLT_MIN);
+			int step = (gain < m_degreeGain) ? min(m_degreeStep * 2, m_degree - m_degree_inc): 1;
+			if (step != m_degreeStep) cout << "Degree step: " << step << " (relative gain of the stage " << gain << ")\n";
+			m_degreeStep = step;
+		}
+		m_stageOffset = (m_degree_inc + 1) * (m_degree_inc + 1) * m_nSubj * 2;
+		m_degree_inc = min(m_degree_inc + m_degreeStep, m_degree);
+	}
+	
+	// the entire optimization together
+	if (m_phase <= 1)
+	{
+		m_phase = 1;
+		m_stageOffset = 0;
+		beginStage(stage++);
+		minimize(0, m_csize * 2, 1e-6f);
+		endStage();
+	}
+
+	// completed: the last checkpoint holds the final coefficients (nothing to run if resumed)
+	m_phase = 2;
+	beginStage(stage);
+	reportSampling();
+}
+
+void GroupwiseRegistration::beginStage(int stage)
+{
+	flushCoeff(true);	// the optimal solutions so far at the stage boundary
+	reportSampling();	// closest face searches of the previous stage
+
+	nIter = 0;
+	m_stage = stage;
+	m_nReplay = 0;
+	m_minHistory.clear();
+	m_stopReason.clear();
+	bool resampled = setSamplingLevel(samplingLevel());	// sampling resolution of this stage
+	if (stage == m_resumeStage)
+	{
+		// restore the beginning of the stage; the logged costs (m_costLog) are replayed from there
+		memcpy(m_coeff, m_coeff_stage, sizeof(float) * m_csize * 2);
+		m_mincost = m_mincost_stage;
+		m_nReplay = m_costLog.size();
+		m_resumeStage = -1;
+		if (m_lbfgs)
+		{
+			// the replay drives a derivative-free trajectory only: L-BFGS restarts the stage (deterministically)
+			m_costLog.clear();
+			m_nReplay = 0;
+		}
+		cout << "Resuming stage " << stage << " (degree " << m_degree_inc << "): " << m_nReplay << " evaluations to replay\n";
+
+		// the deformations and feature vectors of all the subjects are recomputed at the first evaluation after the replay
+		memset(m_updated, 0, sizeof(bool) * m_nSubj);
+		memset(m_feature_updated, 1, sizeof(bool) * m_nSubj);
+	}
+	else
+	{
+		if (resampled && m_mincost != FLT_MAX)
+		{
+			// costs at different resolutions are not comparable: the minimum cost restarts from the current solution
+			for (int subj = 0; subj < m_nSubj; subj++) updateDeformation(subj);
+			m_mincost = entropy();
+			memcpy(m_coeff_prev_step, m_coeff, sizeof(float) * m_csize * 2);
+			cout << "Minimum cost at the new resolution: " << m_mincost << endl;
+		}
+		memcpy(m_coeff_stage, m_coeff, sizeof(float) * m_csize * 2);
+		m_mincost_stage = m_mincost;
+		m_costLog.clear();
+	}
+	if (!m_checkpoint.empty()) saveCheckpoint();
+}
+
+void GroupwiseRegistration::endStage(void)
+{
+	cout << "Stage " << m_stage << " (degree " << m_degree_inc << ") stopped after " << nIter << " evaluations: " << m_stopReason << ", minimum cost " << m_mincost << endl;
+}
+
+void GroupwiseRegistration::saveCheckpoint(void)
+{
+	// stage, beginning of the stage (coefficients and minimum cost), costs evaluated since then, and the current state
+	int header[9] = {m_nSubj, m_csize, m_degree, m_stage, m_degree_inc, (int)m_costLog.size(), m_stageOffset, m_degreeStep, m_phase};
+	float cost[2] = {m_mincost_stage, m_mincost};
+
+	// write to a temporary file first: the previous checkpoint remains valid if the job dies while writing
+	string tmp = m_checkpoint + ".tmp";
+	FILE *fp = fopen(tmp.c_str(), "wb");
+	if (fp == NULL)
+	{
+		cout << "Warning: cannot write the checkpoint " << tmp << endl;
+		return;
+	}
+	bool success = fwrite("GRPCKPT2", 1, 8, fp) == 8;
+	success = success && fwrite(header, sizeof(int), 9, fp) == 9;
+	success = success && fwrite(cost, sizeof(float), 2, fp) == 2;
+	success = success && fwrite(m_coeff_stage, sizeof(float), m_csize * 2, fp) == m_csize * 2;
+	success = success && fwrite(m_coeff, sizeof(float), m_csize * 2, fp) == m_csize * 2;
+	if (!m_costLog.empty()) success = success && fwrite(&m_costLog[0], sizeof(float), m_costLog.size(), fp) == m_costLog.size();
+	if (fclose(fp) != 0) success = false;	// a full disk may only show up when the buffer is flushed
+
+	if (success)
+	{
+#ifdef _WIN32
+		remove(m_checkpoint.c_str());	// rename does not overwrite on Windows
+#endif
+		success = rename(tmp.c_str(), m_checkpoint.c_str()) == 0;
+	}
+	else remove(tmp.c_str());	// keep the previous checkpoint
+	if (!success) cout << "Warning: cannot write the checkpoint " << m_checkpoint << endl;
+	m_checkpointTime = time(NULL);
+}
+
+bool GroupwiseRegistration::loadCheckpoint(void)
+{
+	FILE *fp = fopen(m_checkpoint.c_str(), "rb");
+	if (fp == NULL) return false;
+
+	// GRPCKPT1: fixed degree step of 1 without the schedule fields, which are derived from the stage
+	char magic[8];
+	int header[9];
+	float cost[2];
+	bool success = fread(magic, 1, 8, fp) == 8;
+	int version = (success && memcmp(magic, "GRPCKPT2", 8) == 0) ? 2: (success && memcmp(magic, "GRPCKPT1", 8) == 0) ? 1: 0;
+	success = version > 0;
+	success = success && fread(header, sizeof(int), (version == 2) ? 9: 6, fp) == ((version == 2) ? 9: 6);
+	if (success && version == 1)
+	{
+		int nIncremental = max(m_degree - m_degree_inc, 0);	// stages before the entire optimization
+		header[6] = (header[3] == 0 || header[3] >= nIncremental) ? 0: header[4] * header[4] * m_nSubj * 2;
+		header[7] = 1;
+		header[8] = (header[3] < nIncremental) ? 0: (header[3] == nIncremental) ? 1: 2;
+	}
+	success = success && fread(cost, sizeof(float), 2, fp) == 2;
+	if (success && (header[0] != m_nSubj || header[1] != m_csize || header[2] != m_degree))
+	{
+		cout << "Warning: the checkpoint does not match the current subjects/degree\n";
+		success = false;
+	}
+	if (success)
+	{
+		m_costLog.resize(header[5]);
+		success = fread(m_coeff_stage, sizeof(float), m_csize * 2, fp) == m_csize * 2;
+		success = success && fseek(fp, sizeof(float) * m_csize * 2, SEEK_CUR) == 0;	// current coefficients: reached again by the replay
+		if (!m_costLog.empty()) success = success && fread(&m_costLog[0], sizeof(float), m_costLog.size(), fp) == m_costLog.size();
+	}
+	fclose(fp);
+
+	if (!success)
+	{
+		m_costLog.clear();
+		return false;
+	}
+	m_resumeStage = header[3];
+	m_degree_inc = header[4];
+	m_stageOffset = header[6];
+	m_degreeStep = header[7];
+	m_phase = header[8];
+	m_mincost_stage = cost[0];
+	cout << "Checkpoint loaded: stage " << header[3] << " (degree " << header[4] << "), " << header[5] << " evaluations, minimum cost " << cost[1] << endl;
+
+	return true;
+}
+
+int GroupwiseRegistration::samplingLevel(void)
+{
+	// coarse-to-fine: one subdivision level less per degree below the maximum degree (at least level 2, 162 points)
+	if (!m_coarseToFine) return m_SamplingDegree;
+	return max(min(2, m_SamplingDegree), m_SamplingDegree - (m_degree - m_degree_inc));
+}
+
+bool GroupwiseRegistration::setSamplingLevel(int level)
+{
+	// regenerate the sampling points at the given subdivision level, and resize the buffers that depend on them
+	if (level == m_samplingLevel || m_nProperties + m_nSurfaceProperties == 0) return false;
+
+	int nLandmark = m_spharm[0].landmark.size() * 3;
+	int nTotalProperties = m_nProperties + m_nSurfaceProperties;
+	vector<float *> prevSamples = m_propertySamples;
+	int nPrevSamples = prevSamples.size();
+	m_propertySamples.clear();
+	icosahedron(level);
+	int nSamples = m_propertySamples.size();
+	m_samplingLevel = level;
+	cout << "Sampling: icosahedron subdivision " << level << ", " << nSamples << " points\n";
+
+	// the subdivisions are nested: the points shared with the previous level keep their cached faces
+	std::map<std::vector<float>, int> prevIndex;
+	for (int i = 0; i < nPrevSamples; i++) prevIndex[std::vector<float>(prevSamples[i], prevSamples[i] + 3)] = i;
+	for (int subj = 0; subj < m_nSubj; subj++)
+	{
+		int *cache = new int[nSamples];
+		for (int i = 0; i < nSamples; i++)
+		{
+			std::map<std::vector<float>, int>::const_iterator it = prevIndex.find(std::vector<float>(m_propertySamples[i], m_propertySamples[i] + 3));
+			cache[i] = (it != prevIndex.end()) ? m_spharm[subj].tree_cache[it->second]: -1;
+		}
+		delete [] m_spharm[subj].tree_cache;
+		m_spharm[subj].tree_cache = cache;
+	}
+	for (int i = 0; i < nPrevSamples; i++) delete [] prevSamples[i];
+
+	// weights: the same per property; the landmark weight is proportional to the number of sampling points
+	float *weight = new float[nLandmark + nSamples * nTotalProperties];
+	float totalWeight = 0;
+	for (int k = 0; k < nTotalProperties; k++)
+	{
+		float w = m_feature_weight[nLandmark + nPrevSamples * k];
+		for (int i = 0; i < nSamples; i++) weight[nLandmark + nSamples * k + i] = w;
+		if (k <= m_nProperties) totalWeight += w;	// location weight counted once
+	}
+	for (int i = 0; i < nLandmark; i++) weight[i] = (totalWeight == 0) ? 1: m_feature_weight[i] * nSamples / nPrevSamples;
+	delete [] m_feature_weight;
+	m_feature_weight = weight;
+
+	// feature vectors at the new resolution
+	delete [] m_feature;
+	delete [] m_mean;
+	m_feature = new float[m_nSubj * (nLandmark + nSamples * nTotalProperties)];
+	m_mean = new float[nLandmark + nSamples * nTotalProperties];
+	memset(m_updated, 0, sizeof(bool) * m_nSubj);
+	memset(m_feature_updated, 1, sizeof(bool) * m_nSubj);
+
+	return true;
+}
+
+int GroupwiseRegistration::icosahedron(int degree)
+{
+	// http://www.1activeserverpagesstreet.com/vb/scripts/ShowCode.asp?txtCodeId=9814&lngWId=3
+	vector<Vector *> triangles;
+	vector<Vector> vertices;
+
+	float t = (1 + sqrt(5.0)) / 2.0;
+	float s = sqrt(1 + t * t);
+
+	// create the 12 vertices
+	Vector v0 = Vector(t, 1.0, 0.0) / s;
+	Vector v1 = Vector(-t, 1.0, 0.0) / s;
+	Vector v2 = Vector(t, -1.0, 0.0) / s;
+	Vector v3 = Vector(-t, -1.0, 0.0) / s;
+	Vector v4 = Vector(1.0, 0.0, t) / s;
+	Vector v5 = Vector(1.0, 0.0, -t) / s;
+	Vector v6 = Vector(-1.0, 0.0, t) / s;
+	Vector v7 = Vector(-1.0, 0.0, -t) / s;
+	Vector v8 = Vector(0.0, t, 1.0) / s;
+	Vector v9 = Vector(0.0, -t, 1.0) / s;
+	Vector v10 = Vector(0.0, t, -1.0) / s;
+	Vector v11 = Vector(0.0, -t, -1.0) / s;
+    
+	// create the 20 triangles
+	Vector *f; 
+	f = new Vector[3]; f[0] = v0; f[1] = v8; f[2] = v4; triangles.push_back(f);
+	f = new Vector[3]; f[0] = v1; f[1] = v10; f[2] = v7; triangles.push_back(f);
+	f = new Vector[3]; f[0] = v2; f[1] = v9; f[2] = v11; triangles.push_back(f);
+	f = new Vector[3]; f[0] = v7; f[1] = v3; f[2] = v1; triangles.push_back(f);
+	f = new Vector[3]; f[0] = v0; f[1] = v5; f[2] = v10; triangles.push_back(f);
+	f = new Vector[3]; f[0] = v3; f[1] = v9; f[2] = v6; triangles.push_back(f);
+	f = new Vector[3]; f[0] = v3; f[1] = v11; f[2] = v9; triangles.push_back(f);
+	f = new Vector[3]; f[0] = v8; f[1] = v6; f[2] = v4; triangles.push_back(f);
+	f = new Vector[3]; f[0] = v2; f[1] = v4; f[2] = v9; triangles.push_back(f);
+	f = new Vector[3]; f[0] = v3; f[1] = v7; f[2] = v11; triangles.push_back(f);
+	f = new Vector[3]; f[0] = v4; f[1] = v2; f[2] = v0; triangles.push_back(f);
+	f = new Vector[3]; f[0] = v9; f[1] = v4; f[2] = v6; triangles.push_back(f);
+	f = new Vector[3]; f[0] = v2; f[1] = v11; f[2] = v5; triangles.push_back(f);
+	f = new Vector[3]; f[0] = v0; f[1] = v10; f[2] = v8; triangles.push_back(f);
+	f = new Vector[3]; f[0] = v5; f[1] = v0; f[2] = v2; triangles.push_back(f);
+	f = new Vector[3]; f[0] = v10; f[1] = v5; f[2] = v7; triangles.push_back(f);
+	f = new Vector[3]; f[0] = v1; f[1] = v6; f[2] = v8; triangles.push_back(f);
+	f = new Vector[3]; f[0] = v1; f[1] = v8; f[2] = v10; triangles.push_back(f);
+	f = new Vector[3]; f[0] = v6; f[1] = v1; f[2] = v3; triangles.push_back(f);
+	f = new Vector[3]; f[0] = v11; f[1] = v7; f[2] = v5; triangles.push_back(f);
+
+	// subdivision
+	for (int d = 0; d < degree; d++)
+	{
+		int nFaces = triangles.size();
+		for (int i = 0 ; i < nFaces; i++)
+		{
+			Vector *f = triangles[i];
+			Vector a = f[0], b = f[1], c = f[2];
+			Vector v1 = a + b;
+			Vector v2 = c + a;
+			Vector v3 = b + c;
+			// normalization
+			v1.unit(); v2.unit(); v3.unit();
+			f[0] = v1; f[1] = v3; f[2] = v2; // overwrite the original
+			/*Vector f1[3] = {a, v1, v2}; triangles.push_back(f1);
+			Vector f2[3] = {c, v2, v3}; triangles.push_back(f2);
+			Vector f3[3] = {b, v3, v1}; triangles.push_back(f3);*/
+			Vector *f1 = new Vector[3]; f1[0] = a; f1[1] = v1; f1[2] = v2; triangles.push_back(f1);
+			Vector *f2 = new Vector[3]; f2[0] = c; f2[1] = v2; f2[2] = v3; triangles.push_back(f2);
+			Vector *f3 = new Vector[3]; f3[0] = b; f3[1] = v3; f3[2] = v1; triangles.push_back(f3);
+		}
+	}
+	for (int i = 0; i < triangles.size(); i++)
+	{
+		Vector *f = triangles[i];
+		for (int j = 0; j < 3; j++)
+			vertices.push_back(f[j]);
+	}
+	sort(vertices.begin(), vertices.end());
+	vertices.erase(unique(vertices.begin(), vertices.end()), vertices.end());
+
+	for (int i = 0; i < vertices.size(); i++)
+	{
+		float *p = new float[3];
+		p[0] = vertices[i][0];
+		p[1] = vertices[i][1];
+		p[2] = vertices[i][2];
+		m_propertySamples.push_back(p);
+	}
+
+	return m_propertySamples.size();
+}
+
+void GroupwiseRegistration::flushCoeff(bool force)
+{
+	// write the optimal solutions if they changed since the last write and the flush interval has passed
+	if (!m_bestUpdated || m_Output.empty()) return;	// no output (benchmark)
+	if (!force && difftime(time(NULL), m_flushTime) < m_flushInterval) return;
+
+	for (int subj = 0; subj < m_nSubj; subj++)
+	{
+		if (frozen(subj)) continue;
+		saveCoeff(m_Output[subj].c_str(), subj, m_coeff_best);
+	}
+	m_bestUpdated = false;
+	m_flushTime = time(NULL);
+}
+
+void GroupwiseRegistration::saveCoeff(const char *filename, int id)
+{
+	saveCoeff(filename, id, m_coeff);
+}
+
+void GroupwiseRegistration::saveCoeff(const char *filename, int id, const float *coeff)
+{
+	// coeff: the entire coefficient vector (the same layout as m_coeff)
+	// the file is written to a temporary file and renamed, so the previous solution remains if the job dies while writing
+	string tmp = string(filename) + ".tmp";
+	FILE *fp = fopen(tmp.c_str(), (m_binaryCoeff) ? "wb": "w");
+	if (fp == NULL)
+	{
+		cout << "Warning: cannot write " << tmp << endl;
+		return;
+	}
+	int n = (m_spharm[id].degree + 1) * (m_spharm[id].degree + 1);
+	bool success = true;
+	if (m_binaryCoeff)
+	{
+		success = success && fwrite("GRPCOEF1", 1, 8, fp) == 8;
+		success = success && fwrite(m_spharm[id].pole, sizeof(float), 3, fp) == 3;
+		success = success && fwrite(&m_spharm[id].degree, sizeof(int), 1, fp) == 1;
+		for (int i = 0; i < n && success; i++)
+			success = fwrite(&coeff[m_nSubj * 2 * i + id * 2], sizeof(float), 2, fp) == 2;	// latitude and longitude are adjacent
+	}
+	else
+	{
+		success = success && fprintf(fp, "%f %f %f\n", m_spharm[id].pole[0], m_spharm[id].pole[1], m_spharm[id].pole[2]) >= 0;
+		success = success && fprintf(fp, "%d\n", m_spharm[id].degree) >= 0;
+		for (int i = 0; i < n && success; i++)
+		{
+			success = fprintf(fp, "%f %f\n", coeff[m_nSubj * 2 * i + id * 2], coeff[m_nSubj * 2 * i + id * 2 + 1]) >= 0;
+		}
+	}
+	if (fclose(fp) != 0) success = false;	// a full disk may only show up when the buffer is flushed
+	if (!success)
+	{
+		remove(tmp.c_str());	// keep the previous solution
+		cout << "Warning: cannot write " << tmp << endl;
+		return;
+	}
+
+#ifdef _WIN32
+	remove(filename);	// rename does not overwrite on Windows
+#endif
+	if (rename(tmp.c_str(), filename) != 0) cout << "Warning: cannot write " << filename << endl;
+}
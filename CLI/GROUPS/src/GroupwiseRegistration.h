@@ -1,138 +1,363 @@
-/*************************************************
-*	GroupwiseRegistration.h
-*
-*	Release: Sep 2016
-*	Update: Sep 2016
-*
-*	University of North Carolina at Chapel Hill
-*	Department of Computer Science
-*	
-*	Ilwoo Lyu, ilwoolyu@cs.unc.edu
-*************************************************/
-
-#pragma once
-#include <algorithm>
-#include <iostream>
-#include <vector>
-#include <map>
-#include "Mesh.h"
-#include "AABB_Sphere.h"
-
-using namespace std;
-
-class GroupwiseRegistration
-{
-public:
-	GroupwiseRegistration(void);
-	GroupwiseRegistration(const char **sphere, int nSubj, const char **property, int nProperties, const char **output, const float *weight, int deg = 5, const char **landmark = NULL, float weightLoc = 0, const char **coeff = NULL, const char **surf = NULL, int maxIter = 50000);
-	GroupwiseRegistration(vector<string> sphere, vector<string> surf, std::map<std::string, float> mapProperty, vector<string> outputcoeff, bool landmarksOn, double weightLoc, int deg, vector<string> inputcoeff, int maxIter);
-	~GroupwiseRegistration(void);
-	void run(void);
-	void saveCoeff(const char *filename, int id);
-	float cost(float *coeff, int statusStep = 10);
-
-private:
-	// class members for initilaization
-	void init(const char **sphere, const char **property, const float *weight, const char **landmark, float weightLoc, const char **coeff, const char **surf, int samplingDegree = 3);
-	void init(vector<string> sphere,vector<string> surf, std::map<std::string, float> mapProperty, double weightLoc, vector<string> inputcoeff, double m_SamplingDegree);
-
-	void initSphericalHarmonics(int subj, const char **coeff);
-	void initSphericalHarmonics(int subj, vector<string> coeff);
-	void initTriangleFlipping(int subj);
-	void initProperties(int subj, const char **property, int nHeaderLines);
-	// void initLandmarks(int subj, const char **landmark);
-	void initLandmarks(int subj, const char **landmark, const char **surf);
-	void initPropertiesAndLandmarks(int subj, string surfacename, std::map<std::string, float> mapProperty);
-	int icosahedron(int degree);
-
-	// entropy computation
-	void optimization(void);
-	void updateLandmark(void);
-	void updateLandmarkMedian(void);
-	void updateProperties(void);
-	void eigenvalues(float *M, int dim, float *eig);
-	float entropy(void);
-	float propertyInterpolation(float *refMap, int index, float *coeff, Mesh *mesh);
-	int testTriangleFlip(Mesh *mesh, const bool *flip);
-
-	// deformation field reconstruction
-	void updateDeformation(int subject);
-	bool updateCoordinate(const float *v0, float *v1, const float *Y, const float **coeff, float degree, const float *pole);
-	
-private:
-	struct point
-	{
-		float p[3];
-		float id;
-		float *Y;
-		int subject;
-	};
-	struct spharm
-	{
-		int degree;
-		float **coeff;
-		float **coeff_prev_step;
-		float pole[3];
-		vector<point *> vertex;
-		AABB_Sphere *tree;
-		Mesh *sphere;
-		Mesh *surf;
-		float *property;
-		int *tree_cache;
-		float *meanProperty;
-		float *maxProperty;
-		float *minProperty;
-		float *sdevProperty;
-		vector<point *> landmark;
-		bool *flip;
-	};
-
-	int m_nSubj;
-	int m_csize;
-	int m_nProperties;
-	int m_nSurfaceProperties;
-	int m_maxIter;
-	int m_degree;
-	int m_degree_inc;	// incremental degree
-	int m_SamplingDegree;
-	bool m_UseLandmarks;
-	
-	float *m_coeff;
-	float *m_coeff_prev_step;	// previous coefficients
-	bool *m_updated;
-	spharm *m_spharm;
-	vector<float *> m_propertySamples;
-	
-	float m_mincost;
-	
-	// work space for the entire procedure
-	float *m_cov;
-	float *m_feature;
-	float *m_feature_weight;
-	float *m_eig;
-	float *m_work;	// for lapack eigenvalue computation
-	
-	// tic
-	int nIter;
-
-	// output list
-	vector<string> m_Output;
-};
-
-class cost_function
-{
-public:
-    cost_function (GroupwiseRegistration *instance)
-    {
-        m_instance = instance;
-    }
-
-    double operator () (float *arg)
-    {
-		float cost = m_instance->cost(arg);
-        return (double)cost;
-    }
-
-private:
-	GroupwiseRegistration *m_instance;
-};
+/*************************************************
+*	GroupwiseRegistration.h
+*
+*	Release: Sep 2016
+*	Update: Sep 2016
+*
+*	University of North Carolina at Chapel Hill
+*	Department of Computer Science
+*	
+*	Ilwoo Lyu, ilwoolyu@cs.unc.edu
+*************************************************/
+
+#pragma once
+#include <algorithm>
+#include <iostream>
+#include <vector>
+#include <map>
+#include <ctime>
+#include "Mesh.h"
+#include "AABB_Sphere.h"
+#include "SubjectCache.h"
+#include "SphereLocator.h"
+
+using namespace std;
+
+class GroupwiseRegistration
+{
+public:
+	GroupwiseRegistration(void);
+	GroupwiseRegistration(const char **sphere, int nSubj, const char **property, int nProperties, const char **output, const float *weight, int deg = 5, const char **landmark = NULL, float weightLoc = 0, const char **coeff = NULL, const char **surf = NULL, int maxIter = 50000);
+	GroupwiseRegistration(vector<string> sphere, vector<string> surf, std::map<std::string, float> mapProperty, vector<string> outputcoeff, bool landmarksOn, double weightLoc, int deg, vector<string> inputcoeff, int maxIter, string cacheDir = "");
+	~GroupwiseRegistration(void);
+	void run(void);
+	void saveCoeff(const char *filename, int id);
+	void saveCoeff(const char *filename, int id, const float *coeff);
+	float cost(float *coeff, int statusStep = 10);
+	float costGradient(float *coeff, float *grad, int offset, int n);
+	void costBatch(const float *coeff, int nBatch, float *cost, int *nFolds);
+	void setThreads(int nThreads);
+	void setIncrementalCovariance(bool incremental);
+	void setCheckpoint(const char *filename, int interval, bool resume);
+	void setCoeffOutput(const char *format, int flushInterval);
+	void setSampling(int samplingDegree, bool coarseToFine);
+	void setOptimizer(const char *optimizer);
+	void setBlockCoordinate(bool blockCoordinate, int maxSweeps);
+	void setLocator(const char *locator);
+	void setEntropyMethod(const char *method);
+	void setStopping(int window, float tol, bool adaptiveDegree, float degreeGain);
+	void setPerturbation(float sigma, int seed);
+	void setNewSubjects(const vector<int> &subjects);
+	bool converged(void);
+	void evaluate(void);
+	bool benchmark(void);
+
+	// entropy terms: sum_{i >= 1} log(lambda_i + alpha) of a centered covariance matrix
+	static void eigenvalues(float *M, int dim, float *eig, float *work);
+	static bool logDeterminant(const float *M, int dim, float alpha, double *logdet, float *chol);
+	static const double entropyTolerance;
+
+private:
+	// class members for initilaization
+	void init(const char **sphere, const char **property, const float *weight, const char **landmark, float weightLoc, const char **coeff, const char **surf, int samplingDegree = 3);
+	void init(vector<string> sphere,vector<string> surf, std::map<std::string, float> mapProperty, double weightLoc, vector<string> inputcoeff, double m_SamplingDegree);
+
+	void initSphericalHarmonics(int subj, const char **coeff);
+	void initSphericalHarmonics(int subj, vector<string> coeff);
+	void loadCoeff(int subj, const char *filename);
+	void initBasis(int subj);
+	void initTriangleFlipping(int subj);
+	void initAdjacency(int subj);
+	void initProperties(int subj, const char **property, int nHeaderLines);
+	// void initLandmarks(int subj, const char **landmark);
+	void initLandmarks(int subj, const char **landmark, const char **surf);
+	void initPropertiesAndLandmarks(int subj, string surfacename, std::map<std::string, float> mapProperty);
+	void initPropertiesAndLandmarks(int subj, const SubjectCache *cache);
+	unsigned long long cacheKey(string sphere, string surf, std::map<std::string, float> mapProperty);
+	void saveCache(int subj, const char *filename, unsigned long long key);
+	int icosahedron(int degree);
+	int samplingLevel(void);
+	bool setSamplingLevel(int level);
+
+	// entropy computation
+	void optimization(void);
+	void minimize(int offset, int n, float tol);
+	void minimizeBlocks(int offset, float tol);
+	void beginStage(int stage);
+	void endStage(void);
+	void saveCheckpoint(void);
+	bool loadCheckpoint(void);
+	void flushCoeff(bool force);
+	void deformLandmarks(void);
+	void updateLandmark(void);
+	void projectLandmarks(const float *landmark, float *feature);
+	void updateLandmarkMedian(void);
+	void updateProperties(void);
+	void reportSampling(void);
+	bool frozen(int subj);
+	void entropyGradient(float *grad);
+	void covariance(float *cov);
+	void covariance(const float *feature, float *mean, float *cov);
+	void incrementalCovariance(float *cov);
+	float entropy(void);
+	float propertyInterpolation(float *refMap, int index, float *coeff, Mesh *mesh);
+	int testTriangleFlip(Mesh *mesh, const bool *flip);
+	int testTriangleFlip(int subj);
+	int testTriangleFlip(int subj, const float *coord);
+	void benchmarkTriangleFlip(int nRepeat);
+	bool benchmarkEntropy(int nRepeat);
+	void benchmarkLocator(int nRepeat);
+	void benchmarkBatch(int nBatch);
+	void benchmarkOptimizer(int maxEval);
+	void resetOptimization(const float *coeff);
+
+	// deformation field reconstruction
+	void updateDeformation(int subject);
+	void deform(int subject, const float *coeff, float *coord, float *displacement);
+	bool updateCoordinate(const float *v0, float *v1, const float *Y, const float **coeff, float degree, const float *pole);
+	bool updateCoordinate(int subj, int index, float dphi, float dtheta, float *v1);
+	
+private:
+	struct point
+	{
+		float p[3];
+		float id;
+		float *Y;
+		int subject;
+	};
+	struct spharm
+	{
+		int degree;
+		float **coeff;
+		float **coeff_prev_step;
+		float pole[3];
+		vector<point *> vertex;
+		float *basis;	// spherical harmonic basis of the vertices (nVertex x (degree + 1)^2, row-major): vertex[i]->Y points to the i-th row
+		float *equator;	// (phi, theta, rotation angle) of each vertex in the frame where the vertex is rotated to the equator
+		bool *atPole;	// vertices at the pole (not deformed)
+		float *displacement;	// work space for the displacements (phi, theta blocks)
+		AABB_Sphere *tree;
+		SphereLocator *locator;	// cube-map grid for the closest faces (NULL: AABB tree only)
+		Mesh *sphere;
+		Mesh *surf;
+		float *property;
+		int *tree_cache;
+		float *meanProperty;
+		float *maxProperty;
+		float *minProperty;
+		float *sdevProperty;
+		vector<point *> landmark;
+		vector<int> landmarkVertex;	// vertex ids of the landmarks
+		bool *flip;
+		float *coord;	// vertex coordinates of the deformed sphere in the struct-of-arrays layout (x, y, z blocks)
+		int *face;	// vertex indices of the faces in the struct-of-arrays layout (1st, 2nd, 3rd vertex blocks)
+		int nFolds;	// triangle flips at the current deformation (-1: not tested yet)
+		int *neighbor;	// adjacent faces (across the edge opposite to each vertex) for the closest face walk
+	};
+	struct evaluation	// scratch of one evaluation in costBatch
+	{
+		int nFeature;
+		int nSamples;
+		float **coord;	// deformed sphere of each subject (x, y, z blocks)
+		SphereLocator **locator;	// grid of each subject over coord (NULL: not built yet)
+		int *tree_cache;	// closest faces of the sampling points (nSubj x nSamples)
+		float *displacement;
+		float *landmark;
+		float *feature;
+		float *mean;
+		float *cov;
+		float *eig;
+		float *work;
+		float *chol;
+	};
+	void initBatch(int nBatch);
+	void freeBatch(void);
+	float batchCost(evaluation *e, const float *coeff, int *nFolds);
+
+	int m_nSubj;
+	int m_csize;
+	int m_nProperties;
+	int m_nSurfaceProperties;
+	int m_maxIter;
+	int m_degree;
+	int m_degree_inc;	// incremental degree
+	int m_SamplingDegree;
+	int m_samplingLevel;	// current subdivision level of the sampling points
+	bool m_coarseToFine;	// subdivision level rising with the incremental degree
+	bool m_UseLandmarks;
+	int m_nThreads;	// # of threads for the cost evaluation
+	bool m_incremental;	// incremental covariance update
+	bool m_cholesky;	// entropy by the Cholesky log-determinant instead of the eigenvalues
+	bool m_lbfgs;	// L-BFGS with the analytic gradient instead of NEWUOA
+	bool m_blockCoordinate;	// per-subject optimization against the fixed rest of the population
+	int m_maxSweeps;	// maximum # of sweeps over the subjects per stage (block-coordinate)
+	bool *m_frozen;	// subjects with fixed coefficients in the add-subjects mode (NULL: none)
+	int m_stopWindow;	// # of evaluations of the sliding window for the early stop (0: disabled)
+	float m_stopTol;	// minimum relative decrease of the minimum cost over the window
+	bool m_adaptiveDegree;	// larger degree steps after stages without gain
+	float m_degreeGain;	// minimum relative gain of a stage to keep the degree step
+	string m_cacheDir;	// directory of the subject cache files (empty: no cache)
+	SubjectCache *m_cache;	// cache of the subject being initialized (NULL: not available)
+	
+	float *m_coeff;
+	float *m_coeff_prev_step;	// previous coefficients
+	float *m_coeff_stage;	// coefficients at the beginning of the current stage
+	float *m_coeff_best;	// optimal coefficients so far
+	bool *m_updated;
+	bool *m_feature_updated;	// feature vectors recomputed since the last covariance update
+	spharm *m_spharm;
+	vector<float *> m_propertySamples;
+	long long m_nCacheHit;	// sampling points found in the cached face
+	long long m_nWalkHit;	// sampling points found by the walk from the cached face
+	long long m_nTreeQuery;	// sampling points found by the tree query
+	long long m_nGridHit;	// sampling points found by the grid
+	
+	float m_mincost;
+	float m_entropy;	// entropy of the last covariance update
+	float m_mincost_stage;	// minimum cost at the beginning of the current stage
+	int m_lastFolds;	// triangle flips at the last cost evaluation
+
+	// output of the optimal coefficients
+	bool m_binaryCoeff;	// binary coefficient files
+	bool m_bestUpdated;	// optimal coefficients not written yet
+	int m_flushInterval;	// minimum time between writes of the optimal coefficients (seconds)
+	time_t m_flushTime;	// time of the last write
+
+	// checkpoint
+	string m_checkpoint;	// checkpoint file (empty: no checkpoint)
+	int m_checkpointInterval;	// minimum time between checkpoints (seconds)
+	time_t m_checkpointTime;	// time of the last checkpoint
+	int m_stage;	// current optimization stage
+	int m_resumeStage;	// stage to resume (-1: no resume)
+	int m_stageOffset;	// first variable of the current stage (incremental stages)
+	int m_degreeStep;	// degree step of the schedule at the current stage
+	int m_phase;	// 0: incremental stages, 1: entire optimization, 2: completed
+	vector<float> m_costLog;	// costs evaluated in the current stage
+	int m_nReplay;	// # of logged costs replayed in the resumed stage
+	vector<float> m_minHistory;	// minimum cost after each evaluation of the current stage
+	string m_stopReason;	// why the current stage stopped
+	
+	// work space for the entire procedure
+	float *m_cov;
+	float *m_feature;
+	float *m_feature_weight;
+	float *m_mean;	// mean feature vector for the threaded covariance computation
+	double *m_gram;	// weighted inner products of the property features between subjects (incremental covariance)
+	double *m_gram_work;	// work space for the incremental covariance: property + landmark inner products
+	float *m_landmark;	// deformed landmarks (landmark-major: x, y, z blocks of all the subjects per landmark)
+	float *m_landmarkWork;	// work space for the landmark median
+	float *m_eig;
+	float *m_work;	// for lapack eigenvalue computation
+	float *m_chol;	// for lapack Cholesky factorization
+	
+	// batched evaluation
+	vector<evaluation> m_batch;	// scratch of each evaluation of costBatch
+
+	// tic
+	int nIter;
+
+	// output list
+	vector<string> m_Output;
+};
+
+class cost_function
+{
+public:
+    cost_function (GroupwiseRegistration *instance)
+    {
+        m_instance = instance;
+    }
+
+    double operator () (float *arg)
+    {
+		float cost = m_instance->cost(arg);
+        return (double)cost;
+    }
+
+	bool converged(void)
+	{
+		return m_instance->converged();
+	}
+
+private:
+	GroupwiseRegistration *m_instance;
+};
+
+class gradient_function
+{
+public:
+	gradient_function (GroupwiseRegistration *instance, int offset, int n)
+	{
+		m_instance = instance;
+		m_offset = offset;
+		m_n = n;
+	}
+
+	double operator () (float *arg, float *grad)
+	{
+		float cost = m_instance->costGradient(arg, grad, m_offset, m_n);
+		return (double)cost;
+	}
+
+	bool converged(void)
+	{
+		return m_instance->converged();
+	}
+
+private:
+	GroupwiseRegistration *m_instance;
+	int m_offset;	// the variables are m_coeff[offset, offset + n)
+	int m_n;
+};
+
+class subject_cost_function
+{
+public:
+	// the variables are the coefficients [b0, b1) of a subject (phi and theta pairs), which are interleaved across the subjects in coeff
+	subject_cost_function (GroupwiseRegistration *instance, float *coeff, int nSubj, int subj, int b0, int b1)
+	{
+		m_instance = instance;
+		m_coeff = coeff;
+		m_nSubj = nSubj;
+		m_subj = subj;
+		m_b0 = b0;
+		m_b1 = b1;
+	}
+
+	double operator () (float *arg)
+	{
+		scatter(arg);
+		float cost = m_instance->cost(m_coeff);
+		return (double)cost;
+	}
+
+	bool converged(void)
+	{
+		return m_instance->converged();
+	}
+
+	void gather(float *x)
+	{
+		for (int i = m_b0; i < m_b1; i++)
+		{
+			x[(i - m_b0) * 2] = m_coeff[m_nSubj * 2 * i + m_subj * 2];
+			x[(i - m_b0) * 2 + 1] = m_coeff[m_nSubj * 2 * i + m_subj * 2 + 1];
+		}
+	}
+
+	void scatter(const float *x)
+	{
+		for (int i = m_b0; i < m_b1; i++)
+		{
+			m_coeff[m_nSubj * 2 * i + m_subj * 2] = x[(i - m_b0) * 2];
+			m_coeff[m_nSubj * 2 * i + m_subj * 2 + 1] = x[(i - m_b0) * 2 + 1];
+		}
+	}
+
+private:
+	GroupwiseRegistration *m_instance;
+	float *m_coeff;
+	int m_nSubj;
+	int m_subj;
+	int m_b0, m_b1;
+};
@@ -0,0 +1,181 @@
+/*************************************************
+*	SphereLocator.cpp
+*
+*	Point location on a (deformed) unit sphere mesh
+*	with a cube-map bucket grid
+*************************************************/
+
+#include <cmath>
+#include <cstring>
+#include <algorithm>
+#include "Geom.h"
+#include "SphereLocator.h"
+
+// The sphere is split into the 6 sides of a cube (side = 2 x axis + (negative direction)), each of which is a gnomonic projection
+// u = p[axis + 1] / |p[axis]|, v = p[axis + 2] / |p[axis]| in [-1, 1] divided into res x res cells. Great circles are straight lines
+// in a gnomonic projection, so a face covers the cells of the bounding box of its projected vertices on every side it reaches.
+// The bounds are enlarged by a margin, so the buckets remain valid until a vertex moves by more than a fraction of the margin.
+
+SphereLocator::SphereLocator(const float *coord, int nVertex, const int *face, int nFace, int resolution)
+{
+	m_coord = coord;
+	m_nVertex = nVertex;
+	m_face = face;
+	m_nFace = nFace;
+	m_res = (resolution > 0) ? resolution: max(1, (int)sqrt(nFace / 12.0));	// 6 res^2 = nFace / 2 cells
+	m_margin = 1.0f / m_res;	// half a cell
+	m_nBuilds = 0;
+	m_ref = new float[nVertex * 3];
+	build();
+}
+
+SphereLocator::~SphereLocator(void)
+{
+	delete [] m_ref;
+}
+
+bool SphereLocator::project(const float *p, int side, float *u, float *v) const
+{
+	int axis = side / 2;
+	float m = (side % 2 == 0) ? p[axis]: -p[axis];
+	if (m <= 0) return false;
+	*u = p[(axis + 1) % 3] / m;
+	*v = p[(axis + 2) % 3] / m;
+	return true;
+}
+
+int SphereLocator::cellIndex(float u) const
+{
+	int i = (int)((u + 1) * 0.5f * m_res);
+	return min(max(i, 0), m_res - 1);
+}
+
+int SphereLocator::cellRanges(int f, int *range) const
+{
+	// (side, u0, u1, v0, v1) of the cells covered by face f on each side: # of sides
+	int n = 0;
+	for (int side = 0; side < 6; side++)
+	{
+		float umin = 2, umax = -2, vmin = 2, vmax = -2;
+		bool valid = true;
+		for (int k = 0; k < 3 && valid; k++)
+		{
+			int id = m_face[m_nFace * k + f];
+			float p[3] = {m_coord[id], m_coord[m_nVertex + id], m_coord[m_nVertex * 2 + id]};
+			float u, v;
+			valid = project(p, side, &u, &v);
+			umin = min(umin, u); umax = max(umax, u);
+			vmin = min(vmin, v); vmax = max(vmax, v);
+		}
+		if (!valid) continue;
+		umin -= m_margin; umax += m_margin;
+		vmin -= m_margin; vmax += m_margin;
+		if (umax < -1 || umin > 1 || vmax < -1 || vmin > 1) continue;
+
+		range[n * 5] = side;
+		range[n * 5 + 1] = cellIndex(umin);
+		range[n * 5 + 2] = cellIndex(umax);
+		range[n * 5 + 3] = cellIndex(vmin);
+		range[n * 5 + 4] = cellIndex(vmax);
+		n++;
+	}
+	return n;
+}
+
+void SphereLocator::build(void)
+{
+	int nCell = 6 * m_res * m_res;
+	int range[30];
+
+	// compressed rows: counts, then entries
+	m_start.assign(nCell + 1, 0);
+	for (int f = 0; f < m_nFace; f++)
+	{
+		int n = cellRanges(f, range);
+		for (int s = 0; s < n; s++)
+		{
+			const int *r = &range[s * 5];
+			for (int j = r[3]; j <= r[4]; j++)
+				for (int i = r[1]; i <= r[2]; i++)
+					m_start[(r[0] * m_res + j) * m_res + i + 1]++;
+		}
+	}
+	for (int c = 0; c < nCell; c++) m_start[c + 1] += m_start[c];
+
+	m_entry.resize(m_start[nCell]);
+	vector<int> pos(m_start.begin(), m_start.end() - 1);
+	for (int f = 0; f < m_nFace; f++)
+	{
+		int n = cellRanges(f, range);
+		for (int s = 0; s < n; s++)
+		{
+			const int *r = &range[s * 5];
+			for (int j = r[3]; j <= r[4]; j++)
+				for (int i = r[1]; i <= r[2]; i++)
+					m_entry[pos[(r[0] * m_res + j) * m_res + i]++] = f;
+		}
+	}
+
+	memcpy(m_ref, m_coord, sizeof(float) * m_nVertex * 3);
+	m_nBuilds++;
+}
+
+void SphereLocator::update(void)
+{
+	// the projection enlarges displacements by at most ~3.5 (near the cube corners), so the buckets are kept while every vertex moved less than margin / 4
+	float thr = m_margin / 4;
+	float thr2 = thr * thr;
+	const float *x = m_coord, *y = x + m_nVertex, *z = y + m_nVertex;
+	const float *rx = m_ref, *ry = rx + m_nVertex, *rz = ry + m_nVertex;
+	for (int i = 0; i < m_nVertex; i++)
+	{
+		float d = (x[i] - rx[i]) * (x[i] - rx[i]) + (y[i] - ry[i]) * (y[i] - ry[i]) + (z[i] - rz[i]) * (z[i] - rz[i]);
+		if (d > thr2)
+		{
+			build();
+			return;
+		}
+	}
+}
+
+int SphereLocator::closestFace(const float *p, float *coeff, float err)
+{
+	// side of the dominant axis
+	int axis = 0;
+	for (int k = 1; k < 3; k++) if (fabs(p[k]) > fabs(p[axis])) axis = k;
+	int side = axis * 2 + ((p[axis] < 0) ? 1: 0);
+	float u, v;
+	if (!project(p, side, &u, &v)) return -1;
+	int c = (side * m_res + cellIndex(v)) * m_res + cellIndex(u);
+
+	for (int e = m_start[c]; e < m_start[c + 1]; e++)
+	{
+		int f = m_entry[e];
+		float a[3], b[3], d[3];
+		for (int k = 0; k < 3; k++)
+		{
+			a[k] = m_coord[m_nVertex * k + m_face[f]];
+			b[k] = m_coord[m_nVertex * k + m_face[m_nFace + f]];
+			d[k] = m_coord[m_nVertex * k + m_face[m_nFace * 2 + f]];
+		}
+		Coordinate::cart2bary(a, b, d, (float *)p, coeff);
+		if (coeff[0] >= err && coeff[1] >= err && coeff[2] >= err) return f;
+	}
+
+	return -1;
+}
+
+int SphereLocator::resolution(void) const
+{
+	return m_res;
+}
+
+int SphereLocator::nEntries(void) const
+{
+	return m_entry.size();
+}
+
+int SphereLocator::nBuilds(void) const
+{
+	return m_nBuilds;
+}
@@ -0,0 +1,48 @@
+/*************************************************
+*	SphereLocator.h
+*
+*	Point location on a (deformed) unit sphere mesh
+*	with a cube-map bucket grid
+*************************************************/
+
+#pragma once
+#include <vector>
+
+using namespace std;
+
+class SphereLocator
+{
+public:
+	// coord: vertex coordinates (x, y, z blocks), face: vertex indices (1st, 2nd, 3rd vertex blocks); both are referenced, not copied
+	// resolution: # of cells along an edge of a cube face (0: about two faces per cell)
+	SphereLocator(const float *coord, int nVertex, const int *face, int nFace, int resolution = 0);
+	~SphereLocator(void);
+
+	// refresh the buckets after the vertices moved: they are rebuilt only if a vertex moved beyond the margin of the cells
+	void update(void);
+
+	// face containing p and its barycentric coordinates (-1: not found)
+	int closestFace(const float *p, float *coeff, float err = 0);
+
+	int resolution(void) const;
+	int nEntries(void) const;
+	int nBuilds(void) const;
+
+private:
+	void build(void);
+	bool project(const float *p, int side, float *u, float *v) const;
+	int cellIndex(float u) const;
+	int cellRanges(int f, int *range) const;
+
+	const float *m_coord;
+	const int *m_face;
+	int m_nVertex;
+	int m_nFace;
+	int m_res;	// cells per edge of a cube face
+	float m_margin;	// margin of the face bounds in the cube face coordinates
+	int m_nBuilds;
+
+	float *m_ref;	// vertex coordinates at the last build
+	vector<int> m_start;	// first entry of each cell (compressed rows)
+	vector<int> m_entry;	// faces of the cells
+};
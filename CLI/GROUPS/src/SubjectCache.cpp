@@ -0,0 +1,244 @@
+/*************************************************
+*	SubjectCache.cpp
+*
+*	Binary cache of the parsed subject inputs
+*	(properties, statistics, landmarks, basis)
+*************************************************/
+
+#include <cstring>
+#include <iostream>
+#include "SubjectCache.h"
+
+#ifndef _WIN32
+#include <fcntl.h>
+#include <unistd.h>
+#include <sys/mman.h>
+#include <sys/stat.h>
+#else
+#include <process.h>
+#define getpid _getpid
+#endif
+
+static const char cacheMagic[8] = {'G', 'R', 'P', 'C', 'A', 'C', 'H', 'E'};
+static const int cacheVersion = 1;
+
+SubjectCache::SubjectCache(void)
+{
+	m_data = NULL;
+	m_size = 0;
+	m_mapped = false;
+	m_header = NULL;
+}
+
+SubjectCache::~SubjectCache(void)
+{
+	close();
+}
+
+unsigned long long SubjectCache::hash(const void *data, size_t size, unsigned long long h)
+{
+	const unsigned char *p = (const unsigned char *)data;
+	for (size_t i = 0; i < size; i++)
+	{
+		h ^= p[i];
+		h *= 1099511628211ULL;
+	}
+	return h;
+}
+
+unsigned long long SubjectCache::hashFile(const char *filename, unsigned long long h)
+{
+	FILE *fp = fopen(filename, "rb");
+	if (fp == NULL) return h;
+	char buf[1 << 16];
+	size_t n;
+	while ((n = fread(buf, 1, sizeof(buf), fp)) > 0) h = hash(buf, n, h);
+	fclose(fp);
+	return h;
+}
+
+string SubjectCache::filename(const char *cacheDir, unsigned long long key)
+{
+	char name[32];
+	sprintf(name, "%016llx.cache", key);
+	return string(cacheDir) + "/" + name;
+}
+
+size_t SubjectCache::size(const header *h)
+{
+	return sizeof(header) +
+		sizeof(float) * ((size_t)h->nProperties * h->nVertex + h->nProperties * 4 + (size_t)h->nVertex * h->nBasis) +
+		sizeof(int) * h->nLandmarks * 2;
+}
+
+bool SubjectCache::load(const char *filename, unsigned long long key)
+{
+	close();
+
+#ifdef _WIN32
+	FILE *fp = fopen(filename, "rb");
+	if (fp == NULL) return false;
+	fseek(fp, 0, SEEK_END);
+	m_size = ftell(fp);
+	fseek(fp, 0, SEEK_SET);
+	m_data = new char[m_size];
+	if (fread(m_data, 1, m_size, fp) != m_size) m_size = 0;
+	fclose(fp);
+#else
+	int fd = ::open(filename, O_RDONLY);
+	if (fd == -1) return false;
+	struct stat st;
+	if (fstat(fd, &st) == 0 && st.st_size > 0)
+	{
+		void *data = mmap(NULL, st.st_size, PROT_READ, MAP_PRIVATE, fd, 0);
+		if (data != MAP_FAILED)
+		{
+			m_data = (char *)data;
+			m_size = st.st_size;
+			m_mapped = true;
+		}
+	}
+	::close(fd);
+	if (m_data == NULL) return false;
+#endif
+
+	// validation
+	const header *h = (const header *)m_data;
+	if (m_size < sizeof(header) || memcmp(h->magic, cacheMagic, sizeof(cacheMagic)) != 0 || h->version != cacheVersion || h->key != key || m_size != size(h))
+	{
+		cout << "Warning: invalid cache file " << filename << endl;
+		close();
+		return false;
+	}
+	m_header = h;
+
+	return true;
+}
+
+void SubjectCache::close(void)
+{
+	if (m_data != NULL)
+	{
+#ifdef _WIN32
+		delete [] m_data;
+#else
+		if (m_mapped) munmap(m_data, m_size);
+		else delete [] m_data;
+#endif
+	}
+	m_data = NULL;
+	m_size = 0;
+	m_mapped = false;
+	m_header = NULL;
+}
+
+bool SubjectCache::loaded(void) const
+{
+	return m_header != NULL;
+}
+
+int SubjectCache::nVertex(void) const
+{
+	return m_header->nVertex;
+}
+
+int SubjectCache::nProperties(void) const
+{
+	return m_header->nProperties;
+}
+
+int SubjectCache::nBasis(void) const
+{
+	return m_header->nBasis;
+}
+
+int SubjectCache::nLandmarks(void) const
+{
+	return m_header->nLandmarks;
+}
+
+const float *SubjectCache::property(void) const
+{
+	return (const float *)(m_data + sizeof(header));
+}
+
+const float *SubjectCache::meanProperty(void) const
+{
+	return property() + (size_t)m_header->nProperties * m_header->nVertex;
+}
+
+const float *SubjectCache::maxProperty(void) const
+{
+	return meanProperty() + m_header->nProperties;
+}
+
+const float *SubjectCache::minProperty(void) const
+{
+	return maxProperty() + m_header->nProperties;
+}
+
+const float *SubjectCache::sdevProperty(void) const
+{
+	return minProperty() + m_header->nProperties;
+}
+
+const int *SubjectCache::landmark(void) const
+{
+	return (const int *)(sdevProperty() + m_header->nProperties);
+}
+
+const float *SubjectCache::basis(void) const
+{
+	return (const float *)(landmark() + m_header->nLandmarks * 2);
+}
+
+bool SubjectCache::save(const char *filename, unsigned long long key, int nVertex, int nProperties, int nBasis, const float *property, const float *meanProperty, const float *maxProperty, const float *minProperty, const float *sdevProperty, const vector<int> &landmark, const float *basis)
+{
+	header h;
+	memset(&h, 0, sizeof(header));
+	memcpy(h.magic, cacheMagic, sizeof(cacheMagic));
+	h.version = cacheVersion;
+	h.nVertex = nVertex;
+	h.nProperties = nProperties;
+	h.nBasis = nBasis;
+	h.nLandmarks = landmark.size() / 2;
+	h.key = key;
+
+	// write to a temporary file first so that a concurrent run never maps a partial cache;
+	// the name is per process so that concurrent runs saving the same subject do not write into each other's file
+	char pid[32];
+	sprintf(pid, ".%d.tmp", (int)getpid());
+	string tmp = string(filename) + pid;
+	FILE *fp = fopen(tmp.c_str(), "wb");
+	if (fp == NULL)
+	{
+		cout << "Warning: cannot write the cache file " << tmp << endl;
+		return false;
+	}
+	bool success = fwrite(&h, sizeof(header), 1, fp) == 1;
+	if (nProperties > 0)
+	{
+		success = success && fwrite(property, sizeof(float), (size_t)nProperties * nVertex, fp) == (size_t)nProperties * nVertex;
+		success = success && fwrite(meanProperty, sizeof(float), nProperties, fp) == (size_t)nProperties;
+		success = success && fwrite(maxProperty, sizeof(float), nProperties, fp) == (size_t)nProperties;
+		success = success && fwrite(minProperty, sizeof(float), nProperties, fp) == (size_t)nProperties;
+		success = success && fwrite(sdevProperty, sizeof(float), nProperties, fp) == (size_t)nProperties;
+	}
+	if (!landmark.empty()) success = success && fwrite(&landmark[0], sizeof(int), landmark.size(), fp) == landmark.size();
+	success = success && fwrite(basis, sizeof(float), (size_t)nVertex * nBasis, fp) == (size_t)nVertex * nBasis;
+	if (fclose(fp) != 0) success = false;
+
+	if (success)
+	{
+#ifdef _WIN32
+		remove(filename);	// rename does not overwrite on Windows
+#endif
+		success = rename(tmp.c_str(), filename) == 0;
+	}
+	if (!success)
+	{
+		cout << "Warning: cannot write the cache file " << filename << endl;
+		remove(tmp.c_str());
+	}
+	return success;
+}
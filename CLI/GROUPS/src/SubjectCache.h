@@ -0,0 +1,63 @@
+/*************************************************
+*	SubjectCache.h
+*
+*	Binary cache of the parsed subject inputs
+*	(properties, statistics, landmarks, basis)
+*************************************************/
+
+#pragma once
+#include <cstdio>
+#include <string>
+#include <vector>
+
+using namespace std;
+
+class SubjectCache
+{
+public:
+	SubjectCache(void);
+	~SubjectCache(void);
+
+	// content hash (64-bit FNV-1a)
+	static unsigned long long hash(const void *data, size_t size, unsigned long long h = 14695981039346656037ULL);
+	static unsigned long long hashFile(const char *filename, unsigned long long h = 14695981039346656037ULL);
+	static string filename(const char *cacheDir, unsigned long long key);
+
+	// read access (memory-mapped)
+	bool load(const char *filename, unsigned long long key);
+	void close(void);
+	bool loaded(void) const;
+	int nVertex(void) const;
+	int nProperties(void) const;
+	int nBasis(void) const;
+	int nLandmarks(void) const;
+	const float *property(void) const;	// nProperties x nVertex
+	const float *meanProperty(void) const;
+	const float *maxProperty(void) const;
+	const float *minProperty(void) const;
+	const float *sdevProperty(void) const;
+	const int *landmark(void) const;	// (index, vertex id) pairs
+	const float *basis(void) const;	// nVertex x nBasis (row-major)
+
+	// write a new cache file (atomic: temporary file + rename)
+	static bool save(const char *filename, unsigned long long key, int nVertex, int nProperties, int nBasis, const float *property, const float *meanProperty, const float *maxProperty, const float *minProperty, const float *sdevProperty, const vector<int> &landmark, const float *basis);
+
+private:
+	struct header
+	{
+		char magic[8];
+		int version;
+		int nVertex;
+		int nProperties;
+		int nBasis;
+		int nLandmarks;
+		int reserved;
+		unsigned long long key;
+	};
+	static size_t size(const header *h);
+
+	char *m_data;
+	size_t m_size;
+	bool m_mapped;
+	const header *m_header;
+};
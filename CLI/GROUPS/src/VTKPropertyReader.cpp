@@ -0,0 +1,413 @@
+/*************************************************
+*	VTKPropertyReader.cpp
+*
+*	Selective reader of the named point-data arrays
+*	of a legacy VTK file (ASCII or binary)
+*************************************************/
+
+#include <cstring>
+#include <cstdlib>
+#include <cctype>
+#include <sstream>
+#include <algorithm>
+#include "VTKPropertyReader.h"
+
+static const size_t bufferSize = 1 << 20;
+
+VTKPropertyReader::VTKPropertyReader(void)
+{
+	m_fp = NULL;
+	m_binary = false;
+	m_buf = NULL;
+	m_pos = 0;
+	m_len = 0;
+	m_bufOffset = 0;
+	m_nPoints = 0;
+}
+
+VTKPropertyReader::~VTKPropertyReader(void)
+{
+	close();
+}
+
+bool VTKPropertyReader::open(const char *filename, const vector<string> &names)
+{
+	close();
+	m_fp = fopen(filename, "rb");
+	if (m_fp == NULL) return false;
+	m_buf = new char[bufferSize];
+	m_names = names;
+
+	// header: version line, title, file type and dataset
+	string s;
+	if (!line(s) || s.compare(0, 14, "# vtk DataFile") != 0) return false;
+	if (!line(s)) return false;
+	if (!token(s)) return false;
+	transform(s.begin(), s.end(), s.begin(), ::toupper);
+	if (s == "BINARY") m_binary = true;
+	else if (s != "ASCII") return false;
+	string dataset;
+	if (!token(s) || !token(dataset)) return false;
+	transform(dataset.begin(), dataset.end(), dataset.begin(), ::toupper);
+	if (dataset != "POLYDATA") return false;
+
+	// sections: the geometry and the arrays that are not requested are skipped without decoding (a seek for the binary files)
+	bool pointData = false;
+	int nTuples = 0;
+	string key;
+	while (m_arrays.size() < m_names.size() && token(key))
+	{
+		transform(key.begin(), key.end(), key.begin(), ::toupper);
+		string name, type;
+		if (key == "POINTS")
+		{
+			if (!token(s)) return false;
+			m_nPoints = atoi(s.c_str());
+			if (!token(type) || !line(s) || !skipValues(typeOf(type), (long)m_nPoints * 3)) return false;
+		}
+		else if (key == "VERTICES" || key == "LINES" || key == "POLYGONS" || key == "TRIANGLE_STRIPS")
+		{
+			string n, size;
+			if (!token(n) || !token(size) || !line(s)) return false;
+			// VTK 5.1 files: OFFSETS and CONNECTIVITY arrays, cell sizes and point ids (int) before
+			long start = tell();
+			string offsets;
+			if (token(offsets) && offsets == "OFFSETS")
+			{
+				if (!token(type) || !line(s) || !skipValues(typeOf(type), atol(n.c_str()))) return false;
+				if (!token(s) || s != "CONNECTIVITY" || !token(type) || !line(s) || !skipValues(typeOf(type), atol(size.c_str()))) return false;
+			}
+			else if (!seek(start) || !skipValues(INT, atol(size.c_str()))) return false;
+		}
+		else if (key == "POINT_DATA" || key == "CELL_DATA")
+		{
+			if (!token(s)) return false;
+			nTuples = atoi(s.c_str());
+			pointData = (key == "POINT_DATA");
+		}
+		else if (key == "SCALARS")
+		{
+			if (!line(s)) return false;
+			istringstream header(s);
+			int nComponents = 1;
+			if (!(header >> name >> type)) return false;
+			header >> nComponents;
+			long start = tell();
+			string table;
+			if (token(table) && table == "LOOKUP_TABLE")
+			{
+				if (!token(table) || !line(s)) return false;
+			}
+			else if (!seek(start)) return false;
+			if (!index(name, typeOf(type), nComponents, nTuples, pointData)) return false;
+		}
+		else if (key == "VECTORS" || key == "NORMALS" || key == "TENSORS" || key == "TENSORS6" || key == "GLOBAL_IDS" || key == "PEDIGREE_IDS")
+		{
+			if (!token(name) || !token(type) || !line(s)) return false;
+			int nComponents = (key == "VECTORS" || key == "NORMALS") ? 3: (key == "TENSORS") ? 9: (key == "TENSORS6") ? 6: 1;
+			if (!index(name, typeOf(type), nComponents, nTuples, pointData)) return false;
+		}
+		else if (key == "TEXTURE_COORDINATES")
+		{
+			string dim;
+			if (!token(name) || !token(dim) || !token(type) || !line(s)) return false;
+			if (!index(name, typeOf(type), atoi(dim.c_str()), nTuples, pointData)) return false;
+		}
+		else if (key == "COLOR_SCALARS")
+		{
+			string nValues;
+			if (!token(name) || !token(nValues) || !line(s)) return false;
+			if (!index(name, m_binary ? UNSIGNED_CHAR: FLOAT, atoi(nValues.c_str()), nTuples, pointData)) return false;
+		}
+		else if (key == "LOOKUP_TABLE")
+		{
+			string size;
+			if (!token(name) || !token(size) || !line(s)) return false;
+			if (!skipValues(m_binary ? UNSIGNED_CHAR: FLOAT, atol(size.c_str()) * 4)) return false;
+		}
+		else if (key == "FIELD")
+		{
+			string nArrays;
+			if (!token(name) || !token(nArrays)) return false;
+			for (int i = 0; i < atoi(nArrays.c_str()); i++)
+			{
+				string nComponents, nFieldTuples;
+				if (!token(name)) return false;
+				if (name == "NULL_ARRAY") continue;
+				if (!token(nComponents) || !token(nFieldTuples) || !token(type) || !line(s)) return false;
+				int n = atoi(nFieldTuples.c_str());
+				if (!index(name, typeOf(type), atoi(nComponents.c_str()), n, pointData && n == nTuples)) return false;
+				if (m_arrays.size() == m_names.size()) break;	// the values of the last requested array are not skipped
+				// information keys of the array (VTK 8.1 and later)
+				long start = tell();
+				if (token(s) && s == "METADATA")
+				{
+					if (!line(s)) return false;
+					do if (!line(s)) return false; while (!s.empty());
+				}
+				else if (!seek(start)) return false;
+			}
+		}
+		else if (key == "METADATA")
+		{
+			// information keys of the previous array, up to an empty line
+			if (!line(s)) return false;
+			do if (!line(s)) return false; while (!s.empty());
+		}
+		else return false;	// unknown section: no way to skip it
+	}
+
+	return true;
+}
+
+void VTKPropertyReader::close(void)
+{
+	if (m_fp != NULL) fclose(m_fp);
+	m_fp = NULL;
+	delete [] m_buf;
+	m_buf = NULL;
+	m_pos = m_len = 0;
+	m_bufOffset = 0;
+	m_binary = false;
+	m_nPoints = 0;
+	m_names.clear();
+	m_arrays.clear();
+}
+
+int VTKPropertyReader::nPoints(void) const
+{
+	return m_nPoints;
+}
+
+bool VTKPropertyReader::hasArray(const char *name) const
+{
+	return find(name) != NULL;
+}
+
+bool VTKPropertyReader::read(const char *name, float *buffer, int n)
+{
+	const array *a = find(name);
+	if (a == NULL || a->nTuples < n) return false;
+	return decode(a, (long)n * a->nComponents, a->nComponents, buffer);
+}
+
+bool VTKPropertyReader::read(const char *name, vector<double> &values)
+{
+	const array *a = find(name);
+	if (a == NULL) return false;
+	values.resize((size_t)a->nTuples * a->nComponents);
+	if (values.empty()) return true;
+	return decode(a, (long)values.size(), 1, &values[0]);
+}
+
+int VTKPropertyReader::typeOf(const string &name)
+{
+	string s = name;
+	transform(s.begin(), s.end(), s.begin(), ::tolower);
+	if (s == "bit") return BIT;
+	if (s == "unsigned_char") return UNSIGNED_CHAR;
+	if (s == "char" || s == "signed_char") return CHAR;
+	if (s == "unsigned_short") return UNSIGNED_SHORT;
+	if (s == "short") return SHORT;
+	if (s == "unsigned_int") return UNSIGNED_INT;
+	if (s == "int" || s == "vtkidtype") return INT;	// vtkIdType values are written as int
+	if (s == "unsigned_long") return UNSIGNED_LONG;
+	if (s == "long") return LONG;
+	if (s == "float") return FLOAT;
+	if (s == "double") return DOUBLE;
+	if (s == "vtktypeint64") return INT64;
+	if (s == "vtktypeuint64") return UNSIGNED_INT64;
+	return UNKNOWN;
+}
+
+int VTKPropertyReader::typeSize(int type)
+{
+	switch (type)
+	{
+		case UNSIGNED_CHAR: case CHAR: return 1;
+		case UNSIGNED_SHORT: case SHORT: return 2;
+		case UNSIGNED_INT: case INT: case FLOAT: return 4;
+		case UNSIGNED_LONG: case LONG: return sizeof(long);
+		case DOUBLE: case INT64: case UNSIGNED_INT64: return 8;
+		default: return 0;
+	}
+}
+
+string VTKPropertyReader::decodeName(const string &name)
+{
+	// the legacy writer encodes the special characters of the names as %XX
+	string s;
+	for (size_t i = 0; i < name.size(); i++)
+	{
+		if (name[i] == '%' && i + 2 < name.size() && isxdigit(name[i + 1]) && isxdigit(name[i + 2]))
+		{
+			s += (char)strtol(name.substr(i + 1, 2).c_str(), NULL, 16);
+			i += 2;
+		}
+		else s += name[i];
+	}
+	return s;
+}
+
+bool VTKPropertyReader::fill(void)
+{
+	m_bufOffset += m_len;
+	m_pos = 0;
+	m_len = fread(m_buf, 1, bufferSize, m_fp);
+	return m_len > 0;
+}
+
+int VTKPropertyReader::peek(void)
+{
+	if (m_pos == m_len && !fill()) return EOF;
+	return (unsigned char)m_buf[m_pos];
+}
+
+int VTKPropertyReader::get(void)
+{
+	if (m_pos == m_len && !fill()) return EOF;
+	return (unsigned char)m_buf[m_pos++];
+}
+
+long VTKPropertyReader::tell(void) const
+{
+	return m_bufOffset + (long)m_pos;
+}
+
+bool VTKPropertyReader::seek(long offset)
+{
+	if (offset >= m_bufOffset && offset <= m_bufOffset + (long)m_len)
+	{
+		m_pos = offset - m_bufOffset;
+		return true;
+	}
+	if (fseek(m_fp, offset, SEEK_SET) != 0) return false;
+	m_bufOffset = offset;
+	m_pos = m_len = 0;
+	return true;
+}
+
+bool VTKPropertyReader::token(string &s)
+{
+	// next whitespace-separated word (bounded: a keyword probe may land on binary data)
+	s.clear();
+	int c;
+	while ((c = peek()) != EOF && isspace(c)) m_pos++;
+	while ((c = peek()) != EOF && !isspace(c) && s.size() < 256)
+	{
+		s += (char)c;
+		m_pos++;
+	}
+	return !s.empty();
+}
+
+bool VTKPropertyReader::line(string &s)
+{
+	// rest of the current line, without the end of line
+	s.clear();
+	int c;
+	while ((c = get()) != EOF && c != '\n') s += (char)c;
+	if (!s.empty() && s[s.size() - 1] == '\r') s.erase(s.size() - 1);
+	return c != EOF || !s.empty();
+}
+
+bool VTKPropertyReader::skipValues(int type, long n)
+{
+	if (type == UNKNOWN) return false;
+	if (m_binary)
+	{
+		long size = (type == BIT) ? (n + 7) / 8: n * typeSize(type);
+		return seek(tell() + size);
+	}
+
+	// ASCII: the words are counted, not converted
+	bool word = false;
+	while (n > 0)
+	{
+		if (m_pos == m_len && !fill()) return word && n == 1;
+		bool space = isspace((unsigned char)m_buf[m_pos++]) != 0;
+		if (!space) word = true;
+		else if (word)
+		{
+			word = false;
+			n--;
+		}
+	}
+	return true;
+}
+
+bool VTKPropertyReader::index(const string &name, int type, int nComponents, int nTuples, bool pointData)
+{
+	if (type == UNKNOWN || nComponents < 1) return false;
+	string decoded = decodeName(name);
+	if (pointData && find(decoded.c_str()) == NULL && std::find(m_names.begin(), m_names.end(), decoded) != m_names.end())
+	{
+		array a;
+		a.name = decoded;
+		a.type = type;
+		a.nComponents = nComponents;
+		a.nTuples = nTuples;
+		a.offset = tell();
+		m_arrays.push_back(a);
+		if (m_arrays.size() == m_names.size()) return true;	// nothing left to find: the values are not skipped
+	}
+	return skipValues(type, (long)nComponents * nTuples);
+}
+
+const VTKPropertyReader::array *VTKPropertyReader::find(const char *name) const
+{
+	for (size_t i = 0; i < m_arrays.size(); i++)
+		if (m_arrays[i].name == name) return &m_arrays[i];
+	return NULL;
+}
+
+template<class TYPE>
+bool VTKPropertyReader::decode(const array *a, long n, int stride, TYPE *values)
+{
+	if (a->type == BIT || !seek(a->offset)) return false;
+	if (m_binary)
+	{
+		// big-endian values
+		int one = 1;
+		bool littleEndian = *(char *)&one == 1;
+		int size = typeSize(a->type);
+		unsigned char b[8];
+		for (long i = 0; i < n; i++)
+		{
+			for (int k = 0; k < size; k++)
+			{
+				int c = get();
+				if (c == EOF) return false;
+				b[littleEndian ? size - 1 - k: k] = (unsigned char)c;
+			}
+			if (i % stride != 0) continue;
+			double v;
+			switch (a->type)
+			{
+				case UNSIGNED_CHAR: v = *(unsigned char *)b; break;
+				case CHAR: v = *(signed char *)b; break;
+				case UNSIGNED_SHORT: { unsigned short x; memcpy(&x, b, 2); v = x; } break;
+				case SHORT: { short x; memcpy(&x, b, 2); v = x; } break;
+				case UNSIGNED_INT: { unsigned int x; memcpy(&x, b, 4); v = x; } break;
+				case INT: { int x; memcpy(&x, b, 4); v = x; } break;
+				case UNSIGNED_LONG: { unsigned long x; memcpy(&x, b, sizeof(long)); v = (double)x; } break;
+				case LONG: { long x; memcpy(&x, b, sizeof(long)); v = (double)x; } break;
+				case FLOAT: { float x; memcpy(&x, b, 4); v = x; } break;
+				case DOUBLE: memcpy(&v, b, 8); break;
+				case INT64: { long long x; memcpy(&x, b, 8); v = (double)x; } break;
+				default: { unsigned long long x; memcpy(&x, b, 8); v = (double)x; } break;
+			}
+			values[i / stride] = (TYPE)v;
+		}
+	}
+	else
+	{
+		string s;
+		for (long i = 0; i < n; i++)
+		{
+			if (!token(s)) return false;
+			if (i % stride == 0) values[i / stride] = (TYPE)strtod(s.c_str(), NULL);
+		}
+	}
+	return true;
+}
@@ -0,0 +1,71 @@
+/*************************************************
+*	VTKPropertyReader.h
+*
+*	Selective reader of the named point-data arrays
+*	of a legacy VTK file (ASCII or binary)
+*************************************************/
+
+#pragma once
+#include <cstdio>
+#include <string>
+#include <vector>
+
+using namespace std;
+
+class VTKPropertyReader
+{
+public:
+	VTKPropertyReader(void);
+	~VTKPropertyReader(void);
+
+	// parse the sections of the file up to the last requested point-data array and index the requested ones (no value is decoded):
+	// false if the file is not a legacy VTK file or has a section the reader does not know (use vtkPolyDataReader then)
+	bool open(const char *filename, const vector<string> &names);
+	void close(void);
+	int nPoints(void) const;
+	bool hasArray(const char *name) const;
+
+	// first component of the first n tuples of an indexed array, decoded straight into buffer: false if the array is missing
+	bool read(const char *name, float *buffer, int n);
+	// all the values of an indexed array (e.g. Landmarks)
+	bool read(const char *name, vector<double> &values);
+
+private:
+	struct array
+	{
+		string name;
+		int type;
+		int nComponents;
+		int nTuples;
+		long offset;	// file offset of the first value
+	};
+	enum type {BIT, UNSIGNED_CHAR, CHAR, UNSIGNED_SHORT, SHORT, UNSIGNED_INT, INT, UNSIGNED_LONG, LONG, FLOAT, DOUBLE, INT64, UNSIGNED_INT64, UNKNOWN};
+	static int typeOf(const string &name);
+	static int typeSize(int type);
+	static string decodeName(const string &name);
+
+	// buffered input
+	bool fill(void);
+	int peek(void);
+	int get(void);
+	long tell(void) const;
+	bool seek(long offset);
+	bool token(string &s);
+	bool line(string &s);
+
+	// sections
+	bool skipValues(int type, long n);
+	bool index(const string &name, int type, int nComponents, int nTuples, bool pointData);
+	const array *find(const char *name) const;
+	template<class TYPE> bool decode(const array *a, long n, int stride, TYPE *values);	// every stride-th of the first n values
+
+	FILE *m_fp;
+	bool m_binary;
+	char *m_buf;
+	size_t m_pos;
+	size_t m_len;
+	long m_bufOffset;	// file offset of m_buf[0]
+	int m_nPoints;
+	vector<string> m_names;	// requested arrays
+	vector<array> m_arrays;	// indexed arrays
+};
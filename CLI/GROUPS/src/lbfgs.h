@@ -0,0 +1,147 @@
+/*************************************************
+*	lbfgs.h
+*
+*	Limited-memory BFGS minimization with a
+*	backtracking (Armijo) line search
+*************************************************/
+
+#ifndef LBFGS_HH_
+#define LBFGS_HH_
+#include <math.h>
+#include <string.h>
+#include <float.h>
+#include <algorithm>
+
+using namespace std;
+
+// func(x, g) returns f(x) and fills g with the gradient at x. A return value of FLT_MAX rejects x (e.g. an infeasible point):
+// the line search then shortens the step. x is updated in place, and every evaluation happens at x itself, so func may ignore its argument.
+// func.converged() is queried after every accepted iteration for an early stop by the caller.
+// step: maximum change of a variable in the first (steepest descent) iteration
+// tol: relative decrease of f or maximum gradient component for the termination
+template<class TYPE, class Func>
+TYPE min_lbfgs(int n, TYPE *x, Func &func, TYPE step = 1e-2, TYPE tol = 1e-6, int max_iter = 5000, int m = 10);
+
+template<class TYPE>
+static double lbfgs_dot_(int n, const TYPE *a, const TYPE *b)
+{
+	double sum = 0;
+	for (int i = 0; i < n; i++) sum += (double)a[i] * b[i];
+	return sum;
+}
+
+template<class TYPE>
+static TYPE lbfgs_maxabs_(int n, const TYPE *a)
+{
+	TYPE m = 0;
+	for (int i = 0; i < n; i++) m = max(m, (TYPE)fabs(a[i]));
+	return m;
+}
+
+template<class TYPE, class Func>
+TYPE min_lbfgs(int n, TYPE *x, Func &func, TYPE step, TYPE tol, int max_iter, int m)
+{
+	TYPE *g = new TYPE[n];
+	TYPE *x0 = new TYPE[n];
+	TYPE *g0 = new TYPE[n];
+	TYPE *d = new TYPE[n];
+	TYPE *s = new TYPE[m * n];	// position differences (circular buffer)
+	TYPE *y = new TYPE[m * n];	// gradient differences
+	double *rho = new double[m];
+	double *alpha = new double[m];
+	int nPairs = 0, newest = -1;
+
+	int nf = 0;
+	TYPE f = (TYPE)func(x, g); nf++;
+
+	while (f < FLT_MAX && nf < max_iter)
+	{
+		TYPE gmax = lbfgs_maxabs_(n, g);
+		if (gmax <= tol) break;
+
+		// search direction: two-loop recursion
+		memcpy(d, g, sizeof(TYPE) * n);
+		for (int k = 0; k < nPairs; k++)
+		{
+			int j = (newest - k + m) % m;
+			alpha[j] = rho[j] * lbfgs_dot_(n, &s[j * n], d);
+			for (int i = 0; i < n; i++) d[i] -= (TYPE)alpha[j] * y[j * n + i];
+		}
+		double gamma = (nPairs > 0) ? lbfgs_dot_(n, &s[newest * n], &y[newest * n]) / lbfgs_dot_(n, &y[newest * n], &y[newest * n]): step / gmax;
+		for (int i = 0; i < n; i++) d[i] *= (TYPE)gamma;
+		for (int k = nPairs - 1; k >= 0; k--)
+		{
+			int j = (newest - k + m) % m;
+			double beta = rho[j] * lbfgs_dot_(n, &y[j * n], d);
+			for (int i = 0; i < n; i++) d[i] += (TYPE)(alpha[j] - beta) * s[j * n + i];
+		}
+		for (int i = 0; i < n; i++) d[i] = -d[i];
+
+		double dg = lbfgs_dot_(n, d, g);
+		if (dg >= 0)
+		{
+			// not a descent direction: restart from the steepest descent
+			nPairs = 0;
+			for (int i = 0; i < n; i++) d[i] = -g[i] * step / gmax;
+			dg = lbfgs_dot_(n, d, g);
+		}
+
+		// backtracking line search: the step is halved until the sufficient decrease holds
+		memcpy(x0, x, sizeof(TYPE) * n);
+		memcpy(g0, g, sizeof(TYPE) * n);
+		TYPE f0 = f;
+		TYPE dmax = lbfgs_maxabs_(n, d);
+		double a = 1;
+		bool accepted = false;
+		while (nf < max_iter && a * dmax > FLT_EPSILON)
+		{
+			for (int i = 0; i < n; i++) x[i] = x0[i] + (TYPE)a * d[i];
+			f = (TYPE)func(x, g); nf++;
+			if (f < FLT_MAX && f <= f0 + 1e-4 * a * dg)
+			{
+				accepted = true;
+				break;
+			}
+			a *= 0.5;
+		}
+		if (!accepted)
+		{
+			// no progress along the direction: keep the last accepted point
+			memcpy(x, x0, sizeof(TYPE) * n);
+			memcpy(g, g0, sizeof(TYPE) * n);
+			f = f0;
+			break;
+		}
+
+		// curvature pair (skipped if the curvature condition fails)
+		int j = (newest + 1) % m;
+		for (int i = 0; i < n; i++)
+		{
+			s[j * n + i] = x[i] - x0[i];
+			y[j * n + i] = g[i] - g0[i];
+		}
+		double sy = lbfgs_dot_(n, &s[j * n], &y[j * n]);
+		if (sy > 1e-10 * sqrt(lbfgs_dot_(n, &s[j * n], &s[j * n]) * lbfgs_dot_(n, &y[j * n], &y[j * n])))
+		{
+			rho[j] = 1.0 / sy;
+			newest = j;
+			nPairs = min(nPairs + 1, m);
+		}
+
+		if (f0 - f <= tol * max((TYPE)1, (TYPE)fabs(f))) break;
+		if (func.converged()) break;
+	}
+
+	delete [] g;
+	delete [] x0;
+	delete [] g0;
+	delete [] d;
+	delete [] s;
+	delete [] y;
+	delete [] rho;
+	delete [] alpha;
+
+	return f;
+}
+
+#endif
@@ -1,829 +1,1475 @@
-import os, sys
-import unittest
-import vtk, qt, ctk, slicer
-from slicer.ScriptedLoadableModule import *
-import logging
-
-import shutil
-
-#
-# GroupWiseRegisteration
-#
-
-class GroupWiseRegisteration(ScriptedLoadableModule):
-    """Uses ScriptedLoadableModule base class, available at:
-  https://github.com/Slicer/Slicer/blob/master/Base/Python/slicer/ScriptedLoadableModule.py
-  """
-
-    def __init__(self, parent):
-        ScriptedLoadableModule.__init__(self, parent)
-        self.parent.title = "GroupWiseRegisteration"  # TODO make this more human readable by adding spaces
-        self.parent.categories = ["Quantification"]
-        self.parent.dependencies = []
-        self.parent.contributors = ["Mahmoud Mostapha (UNC)"]
-        self.parent.helpText = """
-        ...
-    """
-        self.parent.acknowledgementText = """
-        ...
-    """  # replace with organization, grant and thanks.
-
-
-#
-# GroupWiseRegisterationWidget
-#
-
-class GroupWiseRegisterationWidget(ScriptedLoadableModuleWidget):
-    """Uses ScriptedLoadableModuleWidget base class, available at:
-  https://github.com/Slicer/Slicer/blob/master/Base/Python/slicer/ScriptedLoadableModule.py
-  """
-
-    def setup(self):
-        ScriptedLoadableModuleWidget.setup(self)
-
-        ###################################################################
-        ##                                                               ##
-        ##  Collapsible part for input/output parameters for GroupWiseRegisteration CLI  ##
-        ##                                                               ##
-        ###################################################################
-
-        self.ioCollapsibleButton = ctk.ctkCollapsibleButton()
-        self.ioCollapsibleButton.text = "IO"
-        self.layout.addWidget(self.ioCollapsibleButton)
-        self.ioQVBox = qt.QVBoxLayout(self.ioCollapsibleButton)
-
-        # --------------------------------- #
-        # ----- Group Box DIRECTORIES ----- #
-        # --------------------------------- #
-        self.directoryGroupBox = qt.QGroupBox("Directories")
-        self.ioQVBox.addWidget(self.directoryGroupBox)
-        self.ioQFormLayout = qt.QFormLayout(self.directoryGroupBox)
-
-        # Selection of the directory containing the input models (option: --surfaceDir) and option procalign shape
-        self.inputMeshTypeHBox = qt.QVBoxLayout(self.directoryGroupBox)
-        self.inputModelsDirectorySelector = ctk.ctkDirectoryButton()
-        self.chooseProcalign = ctk.ctkCheckBox()
-        self.chooseProcalign.setText("Procalign mesh")
-        
-        self.inputMeshTypeHBox.addWidget(self.inputModelsDirectorySelector)
-        self.inputMeshTypeHBox.addWidget(self.chooseProcalign)
-        self.ioQFormLayout.addRow(qt.QLabel("Input Models Directory:"), self.inputMeshTypeHBox)
-
-        # Selection of the input directory containing the property files from SPHARM (txt files) (option: --propertyDir)
-        self.inputPropertyDirectorySelector = ctk.ctkDirectoryButton()
-        self.ioQFormLayout.addRow(qt.QLabel("Input Property Directory:"), self.inputPropertyDirectorySelector)
-
-        # Selection of the directory which contains each spherical model (option: --sphereDir)
-        self.sphericalModelsDirectorySelector = ctk.ctkDirectoryButton()
-        self.ioQFormLayout.addRow("Spherical Models Directory:", self.sphericalModelsDirectorySelector)
-
-        # Selection of the output directory for GroupWiseRegisteration (option: --outputDir)
-        self.outputDirectorySelector = ctk.ctkDirectoryButton()
-        self.ioQFormLayout.addRow(qt.QLabel("Output Directory:"), self.outputDirectorySelector)
-
-        # CheckBox. If checked, Group Box 'Parameters' will be enabled
-        self.enableParamCB = ctk.ctkCheckBox()
-        self.enableParamCB.setText("Personalize parameters")
-        self.ioQFormLayout.addRow(self.enableParamCB)
-
-        # Connections
-        self.inputModelsDirectorySelector.connect("directoryChanged(const QString &)", self.onSelect)
-        self.inputPropertyDirectorySelector.connect("directoryChanged(const QString &)", self.onSelect)
-        self.sphericalModelsDirectorySelector.connect("directoryChanged(const QString &)", self.onSelect)
-        self.outputDirectorySelector.connect("directoryChanged(const QString &)", self.onSelect)
-        self.enableParamCB.connect("stateChanged(int)", self.onCheckBoxParam)
-
-        # Name simplification (string)
-        self.modelsDirectory = str(self.inputModelsDirectorySelector.directory)
-        self.propertyDirectory = str(self.inputPropertyDirectorySelector.directory)
-        self.outputDirectory = str(self.outputDirectorySelector.directory)
-
-        # -------------------------------- #
-        # ----- Group Box PARAMETERS ----- #
-        # -------------------------------- #
-        self.parametersGroupBox = qt.QGroupBox("Parameters")
-        self.ioQVBox.addWidget(self.parametersGroupBox)
-        self.paramQFormLayout = qt.QFormLayout(self.parametersGroupBox)
-        self.parametersGroupBox.setEnabled(False)
-
-        # Selection of the property we want to use (option: --filter)
-        self.specifyPropertySelector = ctk.ctkCheckableComboBox()
-        self.specifyPropertySelector.addItems(("medialMeshArea","medialMeshPartialArea","medialMeshRadius","medialMeshPartialRadius","paraPhi","paraTheta"))
-        self.paramQFormLayout.addRow(qt.QLabel("Properties name to use:"), self.specifyPropertySelector)
-
-        # Weights of each property - Choices on 3 lines (option: -w)
-        self.weightLayout = qt.QVBoxLayout(self.parametersGroupBox)
-        self.weightline1 = qt.QHBoxLayout(self.parametersGroupBox)  # Line 1
-        self.weightLayout.addLayout(self.weightline1)
-        self.weightline2 = qt.QHBoxLayout(self.parametersGroupBox)  # Line 2
-        self.weightLayout.addLayout(self.weightline2)
-        self.weightline3 = qt.QHBoxLayout(self.parametersGroupBox)  # Line 3
-        self.weightLayout.addLayout(self.weightline3)
-
-        # Fill out first line
-        self.labelArea = qt.QLabel("medialMeshArea")
-        self.weightline1.addWidget(self.labelArea)
-        self.weightArea = ctk.ctkDoubleSpinBox()
-        self.weightArea.enabled = False
-        self.weightArea.value = 1
-        self.weightline1.addWidget(self.weightArea)
-
-        self.labelPartialArea = qt.QLabel("medialMeshPartialArea")
-        self.weightline1.addWidget(self.labelPartialArea)
-        self.weightPartialArea = ctk.ctkDoubleSpinBox()
-        self.weightPartialArea.enabled = False
-        self.weightPartialArea.value = 1
-        self.weightline1.addWidget(self.weightPartialArea)
-
-        # Fill out second line
-        self.labelRadius = qt.QLabel("medialMeshRadius")
-        self.weightline2.addWidget(self.labelRadius)
-        self.weightRadius = ctk.ctkDoubleSpinBox()
-        self.weightRadius.enabled = False
-        self.weightRadius.value = 1
-        self.weightline2.addWidget(self.weightRadius)
-
-        self.labelPartialRadius = qt.QLabel("medialMeshPartialRadius")
-        self.weightline2.addWidget(self.labelPartialRadius)
-        self.weightPartialRadius = ctk.ctkDoubleSpinBox()
-        self.weightPartialRadius.enabled = False
-        self.weightPartialRadius.value = 1
-        self.weightline2.addWidget(self.weightPartialRadius)
-
-        # Fill out third line
-        self.labelparaPhi = qt.QLabel("paraPhi")
-        self.weightline3.addWidget(self.labelparaPhi)
-        self.weightparaPhi = ctk.ctkDoubleSpinBox()
-        self.weightparaPhi.enabled = False
-        self.weightparaPhi.value = 1
-        self.weightline3.addWidget(self.weightparaPhi)
-
-        self.labelparaTheta = qt.QLabel("paraTheta")
-        self.weightline3.addWidget(self.labelparaTheta)
-        self.weightparaTheta = ctk.ctkDoubleSpinBox()
-        self.weightparaTheta.enabled = False
-        self.weightparaTheta.value = 1
-        self.weightline3.addWidget(self.weightparaTheta)
-
-        self.paramQFormLayout.addRow("Weight of each property:", self.weightLayout)
-
-        # Specification of the SPHARM decomposition degree (option: -d)
-        self.degreeSpharm = ctk.ctkSliderWidget()
-        self.degreeSpharm.minimum = 0
-        self.degreeSpharm.maximum = 50
-        self.degreeSpharm.value = 5        # initial value
-        self.degreeSpharm.setDecimals(0)
-        self.paramQFormLayout.addRow(qt.QLabel("Degree of SPHARM decomposition:"), self.degreeSpharm)
-
-        # Maximum iteration (option: --maxIter)
-        self.maxIter = qt.QSpinBox()
-        self.maxIter.minimum = 0            # Check the range authorized
-        self.maxIter.maximum = 100000
-        self.maxIter.value = 5000
-        self.paramQFormLayout.addRow("Maximum number of iteration:", self.maxIter)
-
-        # Name simplification
-        self.property = ""
-        self.propertyValue = ""
-
-        # Connections
-        self.specifyPropertySelector.connect("checkedIndexesChanged()", self.onSpecifyPropertyChanged)
-
-        # ------------------------------------------ #
-        # ----- Apply button to launch the CLI ----- #
-        # ------------------------------------------ #
-        self.applyButton = qt.QPushButton("Apply")
-        self.applyButton.enabled = False
-        self.ioQVBox.addWidget(self.applyButton)
-
-        self.errorLabel = qt.QLabel("Error: Invalide inputs")
-        self.errorLabel.hide()
-        self.errorLabel.setStyleSheet("color: rgb(255, 0, 0);")
-        self.ioQVBox.addWidget(self.errorLabel)
-
-        # Connections
-        self.applyButton.connect('clicked(bool)', self.onApplyButtonClicked)
-
-        # ----- Add vertical spacer ----- #
-        self.layout.addStretch(1)
-
-
-        #### SET PARAMETERS - for test!!
-        # self.inputModelsDirectorySelector.directory = "/Users/prisgdd/Desktop/Pipeline/inputGroupWiseRegisterationPART/Mesh-surfSPHARM"
-        # self.inputPropertyDirectorySelector.directory = "/Users/prisgdd/Desktop/Pipeline/inputGroupWiseRegisterationPART/attributes"
-        # self.outputDirectorySelector.directory = "/Users/prisgdd/Desktop/Example/outprout"
-        # self.sphericalModelsDirectorySelector.directory = "/Users/prisgdd/Desktop/Pipeline/inputGroupWiseRegisterationPART/mapped-sphere"
-        # self.degreeSpharm.value = 4
-        # self.maxIter.value = 11
-
-    ## Function cleanup(self):
-    def cleanup(self):
-        pass
-
-    ## Function onSelect(self):
-    # Check if each directory (Models, Property, Sphere and Output) have been chosen.
-    # If they were, Apply button is enabled to call the CLI
-    # Update the simplified names
-    def onSelect(self):
-        # Update names
-        self.modelsDirectory = str(self.inputModelsDirectorySelector.directory)
-        self.propertyDirectory = str(self.inputPropertyDirectorySelector.directory)
-        self.sphereDirectory = str(self.sphericalModelsDirectorySelector.directory)
-        self.outputDirectory = str(self.outputDirectorySelector.directory)
-
-        # Check if each directory has been choosen
-        self.applyButton.enabled = self.modelsDirectory != "." and self.propertyDirectory != "." and self.outputDirectory != "." and self.sphereDirectory != "."
-
-        # Hide error message if printed
-        self.errorLabel.hide()
-
-    ## Function onSpecifyPropertyChanged(self):
-    # Enable/Disable associated weights
-    def onSpecifyPropertyChanged(self):
-        if self.specifyPropertySelector.currentIndex == 0:
-            self.weightArea.enabled = not self.weightArea.enabled
-
-        if self.specifyPropertySelector.currentIndex == 1:
-            self.weightPartialArea.enabled = not self.weightPartialArea.enabled
-
-        if self.specifyPropertySelector.currentIndex == 2:
-            self.weightRadius.enabled = not self.weightRadius.enabled
-
-        if self.specifyPropertySelector.currentIndex == 3:
-            self.weightPartialRadius.enabled = not self.weightPartialRadius.enabled
-
-        if self.specifyPropertySelector.currentIndex == 4:
-            self.weightparaPhi.enabled = not self.weightparaPhi.enabled
-
-        if self.specifyPropertySelector.currentIndex == 5:
-            self.weightparaTheta.enabled = not self.weightparaTheta.enabled
-
-    ## Function onCheckBoxParam(self):
-    # Enable the parameter Group Box if associated check box is checked
-    def onCheckBoxParam(self):
-        if self.enableParamCB.checkState():
-            self.parametersGroupBox.setEnabled(True)
-        else:
-            self.parametersGroupBox.setEnabled(False)
-
-    ## Function onApplyButtonClicked(self):
-    # Update every parameters to call GroupWiseRegisteration
-    # Check maxIter is an integer
-    # Check if parameters group box enabled
-    def onApplyButtonClicked(self):
-        logic = GroupWiseRegisterationLogic()
-
-        self.errorLabel.hide()
-        # Update names
-        self.modelsDirectory = str(self.inputModelsDirectorySelector.directory)
-        self.propertyDirectory = str(self.inputPropertyDirectorySelector.directory)
-        self.sphereDirectory = str(self.sphericalModelsDirectorySelector.directory)
-        self.outputDirectory = str(self.outputDirectorySelector.directory)
-
-        if not self.enableParamCB.checkState():
-            endGroup = logic.runGroupWiseRegisteration(modelsDir=self.modelsDirectory, propertyDir=self.propertyDirectory, sphereDir=self.sphereDirectory, outputDir=self.outputDirectory, procalign=self.chooseProcalign.checkState())
-
-        else:
-            # ----- Creation of string for the specified properties and their values ----- #
-            self.property = ""
-            self.propertyValue = ""
-
-            if self.weightArea.enabled:
-                self.propertyValue = self.propertyValue + str(self.weightArea.value)
-                self.property = self.property + "medialMeshArea.txt"
-
-            if self.weightPartialArea.enabled:
-                if self.propertyValue != "":
-                    self.propertyValue = self.propertyValue + ","
-                    self.property = self.property + ","
-
-                self.propertyValue = self.propertyValue + str(self.weightPartialArea.value)
-                self.property = self.property + "medialMeshPartialArea.txt"
-
-            if self.weightRadius.enabled:
-                if self.propertyValue != "":
-                    self.propertyValue = self.propertyValue + ","
-                    self.property = self.property + ","
-
-                self.propertyValue = self.propertyValue + str(self.weightRadius.value)
-                self.property = self.property + "medialMeshRadius.txt"
-
-            if self.weightPartialRadius.enabled:
-                if self.propertyValue != "":
-                    self.propertyValue = self.propertyValue + ","
-                    self.property = self.property + ","
-
-                self.propertyValue = self.propertyValue + str(self.weightPartialRadius.value)
-                self.property = self.property + "medialMeshPartialRadius.txt"
-
-            if self.weightparaPhi.enabled:
-                if self.propertyValue != "":
-                    self.propertyValue = self.propertyValue + ","
-                    self.property = self.property + ","
-
-                self.propertyValue = self.propertyValue + str(self.weightparaPhi.value)
-                self.property = self.property + "paraPhi.txt"
-
-            if self.weightparaTheta.enabled:
-                if self.propertyValue != "":
-                    self.propertyValue = self.propertyValue + ","
-                    self.property = self.property + ","
-
-                self.propertyValue = self.propertyValue + str(self.weightparaTheta.value)
-                self.property = self.property + "paraTheta.txt"
-
-            if self.property == "" and self.propertyValue == "":                         # Si aucune propriete selectionnee
-                self.property = 0
-                self.propertyValue = 0
-
-            d = int(self.degreeSpharm.value)
-            m = int(self.maxIter.value)
-
-            endGroup = logic.runGroupWiseRegisteration(modelsDir = self.modelsDirectory, propertyDir = self.propertyDirectory,
-                                    sphereDir = self.sphereDirectory, outputDir = self.outputDirectory, procalign=self.chooseProcalign.checkState(), 
-                                    properties = self.property, propValues = self.propertyValue, degree = d, maxIter = m)
-
-        ## GroupWiseRegisteration didn't run because of invalid inputs
-        if not endGroup:
-            self.errorLabel.show()
-
-#
-# GroupWiseRegisterationLogic
-#
-
-class GroupWiseRegisterationLogic(ScriptedLoadableModuleLogic):
-    """This class should implement all the actual
-  computation done by your module.  The interface
-  should be such that other python code can import
-  this class and make use of the functionality without
-  requiring an instance of the Widget.
-  Uses ScriptedLoadableModuleLogic base class, available at:
-  https://github.com/Slicer/Slicer/blob/master/Base/Python/slicer/ScriptedLoadableModule.py
-  """
-
-    ## Function runGroupWiseRegisteration(...)
-    #   Check if directories are ok
-    #   Create the command line
-    #   Call the CLI GroupWiseRegisteration
-    def runGroupWiseRegisteration(self, modelsDir, propertyDir, sphereDir, outputDir, procalign=False, properties=0, propValues=0, degree=0, maxIter=0):
-        print "--- function runGroupWiseRegisteration() ---"
-
-        """
-        Calling GroupWiseRegisteration CLI
-            Arguments:
-             --surfaceDir: Directory with input models
-             --propertyDir: Property folder (txt files from SPHARM)
-             --sphereDir: Sphere folder
-             --outputDir: Output directory
-             --filter: Properties to consider
-             -w: weights associated with each property
-             -d: Degree of deformation field
-             --maxIter: Maximum number of iteration
-        """
-
-        #####################################################################################
-        ## ----- Check if directories contents correctly match with models Directory ----- ##
-        # For each shape, files should have the same name, with different extension.
-        #       Mesh: [name].vtk
-        #       Properties: 8 x [name].vtk.[prop].txt
-        #       Sphere: [name].txt.vtk
-# if file[len(file)-len(suffixSphere):] == suffixSphere:
-        
-
-        ## Preparation of the reference list (from modelsDir)
-        listModelsDir = os.listdir(modelsDir)
-        listModelsName = list()
-        if listModelsDir.count(".DS_Store"):
-            listModelsDir.remove(".DS_Store")
-        if not len(listModelsDir):
-            return False
-
-
-        # Get the list of all basename + check if they are all vtk files
-        for i in range(0, len(listModelsDir)):
-            if procalign:
-                modelsExtension = "_surfSPHARM_procalign.vtk"
-            else:
-                modelsExtension = "_surfSPHARM.vtk"
-            listModelsName.append( listModelsDir[i][:len(listModelsDir[i])-len(modelsExtension)] )
-            print "heeeeeeee " + listModelsDir[i][:len(listModelsDir[i])-len(modelsExtension)]
-            print "model num " + str(i) + " : " + listModelsName[i]
-
-        ## Check other directories
-        listPropertyDir = os.listdir(propertyDir)
-        listPropertyName = list()
-        if listPropertyDir.count(".DS_Store"):
-            listPropertyDir.remove(".DS_Store")
-        # There should be 6 files for each one in modelsDir
-        for i in range(0, len(listPropertyDir)):
-            listPropertyName.append(str(('_').join(listPropertyDir[i].split('_')[:-2])))
-        for file in listModelsName:
-            if listPropertyName.count(file) != 6:
-                print "Properties. Not enough properties for " + str(file)
-                return False        
-
-
-        listSphereDir = os.listdir(sphereDir)
-        listSphereName = list()
-        if listSphereDir.count(".DS_Store"):
-            listSphereDir.remove(".DS_Store")
-        # There should be the same basename files
-        suffix = "_surf_para.vtk"
-        for i in range(0, len(listSphereDir)): 
-            end = listSphereDir[i][len(listSphereDir[i])-len(suffix):]
-            print end
-            if end == suffix:
-                listSphereName.append('_'.join(listSphereDir[i].split('_')[:-2]))
-            else:
-                listSphereName.append('_'.join(listSphereDir[i].split('_')[:-1]))
-
-        for file in listModelsName:
-            if listSphereName.count(file) != 1:
-                print "Sphere. Wrong correspondence between name files " + str(file)
-                return False
-
-        # Get the list of all basename + check if they are all vtk files
-        # for i in range(0, len(listModelsDir)):
-        #     extension = listModelsDir[i].split('.')[-1]
-        #     if extension == 'vtk':
-        #         listModelsName.append('.'.join(listModelsDir[i].split('.')[:-1]))
-
-        # ## Check other directories
-        # listPropertyDir = os.listdir(propertyDir)
-        # listPropertyName = list()
-        # if listPropertyDir.count(".DS_Store"):
-        #     listPropertyDir.remove(".DS_Store")
-        # # There should be 8 files for each one in modelsDir
-        # listPropertyName = ['.'.join(file.split('.')[:-3]) for file in listPropertyDir]
-        # for file in listModelsName:
-        #     if listPropertyName.count(file) != 6:
-        #         print "Properties. Not enough properties for " + str(file)
-        #         return False
-
-        # listSphereDir = os.listdir(sphereDir)
-        # listSphereName = list()
-        # if listSphereDir.count(".DS_Store"):
-        #     listSphereDir.remove(".DS_Store")
-        # # There should be the same basename files
-        # listSphereName = ['.'.join(file.split('.')[:-2]) for file in listSphereDir]
-        # for file in listModelsName:
-        #     if listSphereName.count(file) != 1:
-        #         print "Sphere. Wrong correspondence between name files " + str(file)
-        #         return False
-
-        ############################################
-        # ----- Creation of the command line ----- #
-
-        # Avec le make package
-        # self.moduleName = "GroupWiseRegisteration"
-        # scriptedModulesPath = eval('slicer.modules.%s.path' % self.moduleName.lower())
-        # scriptedModulesPath = os.path.dirname(scriptedModulesPath)
-        
-        # libPath = os.path.join(scriptedModulesPath)
-        # sys.path.insert(0, libPath)
-        # GroupWiseRegisteration = os.path.join(scriptedModulesPath, '../hidden-cli-modules/GroupWiseRegisteration')
-
-        # Sans le make package
-        GroupWiseRegisteration = "/Users/prisgdd/Documents/Projects/GroupWiseRegisteration/GroupWiseRegisteration-build/GroupWiseRegisteration-build/bin/GroupWiseRegisteration"
-
-        arguments = list()
-        arguments.append("--surfaceDir")
-        arguments.append(modelsDir)
-        arguments.append("--propertyDir")
-        arguments.append(propertyDir)
-        arguments.append("--sphereDir")
-        arguments.append(sphereDir)
-        arguments.append("--outputDir")
-        arguments.append(outputDir)
-
-        if properties and propValues:
-            # If # of properties and # of weights aren't the same, we cut those at the end
-            if properties.count(',') > propValues.count(','):
-                while properties.count(',') > propValues.count(','):
-                    properties = (','.join(properties.split(',')[:-1]))
-            elif propValues.count(',') > properties.count(','):
-                while propValues.count(',') > properties.count(','):
-                    propValues = (','.join(propValues.split(',')[:-1]))
-            arguments.append("--filter")
-            arguments.append(properties)
-            arguments.append("-w")
-            arguments.append(propValues)
-        else:       # If no properties specified - Default: each property with weight=1
-            arguments.append("--filter")
-            arguments.append("medialMeshArea.txt,medialMeshPartialArea.txt,medialMeshRadius.txt,medialMeshPartialRadius.txt,paraPhi.txt,paraTheta.txt")
-            arguments.append("-w")
-            arguments.append("1.0,1.0,1.0,1.0,1.0,1.0")
-
-        if degree:
-            arguments.append("-d")
-            arguments.append(int(degree))
-        else:           # Default: degree=5
-            arguments.append("-d")
-            arguments.append(5)
-
-        if maxIter:
-            arguments.append("--maxIter")
-            arguments.append(maxIter)
-        else:           # Default: # maximum of iteration = 5000
-            arguments.append("--maxIter")
-            arguments.append(5000)
-
-        ############################
-        # ----- Call the CLI ----- #
-        self.process = qt.QProcess()
-        self.process.setProcessChannelMode(qt.QProcess.MergedChannels)
-
-        # print "Calling " + os.path.basename(GroupWiseRegisteration)
-        self.process.start(GroupWiseRegisteration, arguments)
-        self.process.waitForStarted()
-        # # print "state: " + str(self.process.state())
-        self.process.waitForFinished(-1)
-        # print "error: " + str(self.process.error())
-
-        processOutput = str(self.process.readAll())
-        sizeProcessOutput = len(processOutput)
-
-        finStr = processOutput[sizeProcessOutput - 10:sizeProcessOutput]
-        print "finStr : " + finStr
-
-        print "\n\n --------------------------- \n"
-        print processOutput
-        print "\n\n --------------------------- \n"
-        if finStr == "All done!\n":
-            return True
-
-        return False
-
-
-class GroupWiseRegisterationTest(ScriptedLoadableModuleTest):
-    """
-        This is the test case for your scripted module.
-        Uses ScriptedLoadableModuleTest base class, available at:
-        https://github.com/Slicer/Slicer/blob/master/Base/Python/slicer/ScriptedLoadableModule.py
-        """
-
-    def setUp(self):
-        """ Do whatever is needed to reset the state - typically a scene clear will be enough.
-            """
-        slicer.mrmlScene.Clear(0)
-
-        ## Prepare data & paths
-        self.initialPath = "/Users/prisgdd/Documents/Projects/GroupWiseRegisterationExtension/dataTest/"
-        self.localPath = slicer.app.temporaryPath + "/dataTest"
-
-        if os.path.isdir(self.localPath):
-            shutil.rmtree(self.localPath)
-
-        shutil.copytree(self.initialPath, self.localPath)
-
-    def runTest(self):
-        """Run as few or as many tests as needed here.
-            """
-        self.delayDisplay("Starting the test")
-        self.setUp()
-
-        self.delayDisplay("Test 1")
-        self.assertTrue(self.test_GroupWiseRegisteration1())
-        self.delayDisplay("Test 2 - All properties")
-        self.assertTrue(self.test_GroupWiseRegisteration2())
-        self.delayDisplay("Test 3 - Without landmark")
-        self.assertTrue(self.test_GroupWiseRegisteration3())
-        self.delayDisplay("Test 4 - No properties or weights specified")
-        self.assertTrue(self.test_GroupWiseRegisteration4())
-        self.delayDisplay("Test 5 - # of properties different from # of weights")
-        self.assertTrue(self.test_GroupWiseRegisteration5())
-        self.delayDisplay("Test 6 - No specified values for degree and # of iteration")
-        self.assertTrue(self.test_GroupWiseRegisteration6())
-
-        self.delayDisplay('All test passed!')
-
-
-    def test_GroupWiseRegisteration1(self):
-        self.delayDisplay('Start test 1')
-
-        ## --- Prepare parameters --- ##
-        meshDir = self.localPath + "/Mesh"
-        propertiesDir = self.localPath + "/attributes"
-        landmarkDir = self.localPath + "/landmark"
-        sphereDir = self.localPath + "/sphere"
-        degree = 5
-        maxIter = 1000
-        properties = "C.txt,S.txt"
-        propertiesValues = "0.5,0.25"
-        outputVerif1 = self.localPath + "/outputVerif/outputVerif1"
-        outputDir1 = self.localPath + "/outputTest/outputTest1"
-
-        if not os.path.exists(outputDir1):
-            os.mkdir(outputDir1)
-
-        ## --- Call the CLI --- ##
-        # logic = GroupWiseRegisterationLogic()
-        # logic.runGroupWiseRegisteration(modelsDir=meshDir, propertyDir=propertiesDir,
-        #                 sphereDir=sphereDir, outputDir=outputDir1, properties=properties,
-        #                 propValues=propertiesValues, landmark=landmarkDir, degree=degree, maxIter=maxIter)
-
-        ## --- Compare results --- ##
-        if self.outputcomparison(outputDir1, outputVerif1, meshDir):
-            self.delayDisplay('Test 1 passed!')
-            return True
-        else:
-            return False
-
-    # Test 2 - All properties
-    def test_GroupWiseRegisteration2(self):
-        self.delayDisplay('Start test 2')
-
-        ## --- Prepare parameters --- ##
-        meshDir = self.localPath + "/Mesh"
-        propertiesDir = self.localPath + "/attributes"
-        landmarkDir = self.localPath + "/landmark"
-        sphereDir = self.localPath + "/sphere"
-        degree = 5
-        maxIter = 5000
-        properties = "C.txt,H.txt,Kappa1.txt,S.txt,K.txt,Kappa2.txt,DPhi.txt,DTheta.txt"
-        propertiesValues = "0.2,1.0,0.3,0.25,0.3,0.8,0.1,0.4"
-        outputDir2 = self.localPath + "/outputTest/outputTest2"
-        outputVerif2 = self.localPath + "/outputVerif/outputVerif2"
-
-        if not os.path.exists(outputDir2):
-            os.mkdir(outputDir2)
-
-        ## --- Call the CLI --- ##
-        # logic = GroupWiseRegisterationLogic()
-        # logic.runGroupWiseRegisteration(modelsDir=meshDir, propertyDir=propertiesDir,
-        #                 sphereDir=sphereDir, outputDir=outputDir2, properties=properties,
-        #                 propValues=propertiesValues, landmark=landmarkDir, degree=degree, maxIter=maxIter)
-
-        ## --- Compare results --- ##
-        if self.outputcomparison(outputDir2, outputVerif2, meshDir):
-            self.delayDisplay('Test 2 passed!')
-            return True
-        else:
-            return False
-
-    # Test 3 - Without landmark
-    def test_GroupWiseRegisteration3(self):
-        self.delayDisplay('Start test 3')
-
-        ## --- Prepare parameters --- ##
-        meshDir = self.localPath + "/Mesh"
-        propertiesDir = self.localPath + "/attributes"
-        sphereDir = self.localPath + "/sphere"
-        degree = 5
-        maxIter = 1000
-        properties = "C.txt,S.txt"
-        propertiesValues = "0.5,0.25"
-        outputDir3 = self.localPath + "/outputTest/outputTest3"
-        outputVerif3 = self.localPath + "/outputVerif/outputVerif3"
-
-        if not os.path.exists(outputDir3):
-            os.mkdir(outputDir3)
-
-        ## --- Call the CLI --- ##
-        # logic = GroupWiseRegisterationLogic()
-        # logic.runGroupWiseRegisteration(modelsDir=meshDir, propertyDir=propertiesDir,
-        #                 sphereDir=sphereDir, outputDir=outputDir3, properties=properties,
-        #                 propValues=propertiesValues, degree=degree, maxIter=maxIter)
-
-        ## --- Compare results --- ##
-        if self.outputcomparison(outputDir3, outputVerif3, meshDir):
-            self.delayDisplay('Test 3 passed!')
-            return True
-        else:
-            return False
-
-    # Test 4 - No properties or weights specified"
-    def test_GroupWiseRegisteration4(self):
-        self.delayDisplay('Start test 4')
-
-        ## --- Prepare parameters --- ##
-        meshDir = self.localPath + "/Mesh"
-        propertiesDir = self.localPath + "/attributes"
-        landmarkDir = self.localPath + "/landmark"
-        sphereDir = self.localPath + "/sphere"
-        degree = 18
-        maxIter = 1000
-        outputDir4 = self.localPath + "/outputTest/outputTest4"
-        outputVerif4 = self.localPath + "/outputVerif/outputVerif4"
-
-        if not os.path.exists(outputDir4):
-            os.mkdir(outputDir4)
-
-        ## --- Call the CLI --- ##
-        # logic = GroupWiseRegisterationLogic()
-        # logic.runGroupWiseRegisteration(modelsDir=meshDir, propertyDir=propertiesDir,
-        #                 sphereDir=sphereDir, outputDir=outputDir4, landmark=landmarkDir, degree=degree, maxIter=maxIter)
-
-        ## --- Compare results --- ##
-        if self.outputcomparison(outputDir4, outputVerif4, meshDir):
-            self.delayDisplay('Test 4 passed!')
-            return True
-        else:
-            return False
-
-    # Test 5 - # of properties different from # of weights
-    def test_GroupWiseRegisteration5(self):
-        self.delayDisplay('Start test 5')
-
-        ## --- Prepare parameters --- ##
-        meshDir = self.localPath + "/Mesh"
-        propertiesDir = self.localPath + "/attributes"
-        sphereDir = self.localPath + "/sphere"
-        landmarkDir = self.localPath + "/landmark"
-        degree = 5
-        maxIter = 1000
-        properties = "DPhi.txt,C.txt,S.txt,Kappa1.txt"
-        propertiesValues = "0.1,0.3"
-        outputDir5 = self.localPath + "/outputTest/outputTest5"
-        outputVerif5 = self.localPath + "/outputVerif/outputVerif5"
-
-        if not os.path.exists(outputDir5):
-            os.mkdir(outputDir5)
-
-        ## --- Call the CLI --- ##
-        # logic = GroupWiseRegisterationLogic()
-        # logic.runGroupWiseRegisteration(modelsDir=meshDir, propertyDir=propertiesDir, properties=properties,
-        #                 propValues=propertiesValues,
-        #                 sphereDir=sphereDir, outputDir=outputDir5, landmark=landmarkDir, degree=degree, maxIter=maxIter)
-
-        ## --- Compare results --- ##
-        if self.outputcomparison(outputDir5, outputVerif5, meshDir):
-            self.delayDisplay('Test 5 passed!')
-            return True
-        else:
-            return False
-
-    # Test 6 - No specified values for degree and # of iteration
-    def test_GroupWiseRegisteration6(self):
-        self.delayDisplay('Start test 6')
-
-        ## --- Prepare parameters --- ##
-        meshDir = self.localPath + "/Mesh"
-        propertiesDir = self.localPath + "/attributes"
-        sphereDir = self.localPath + "/sphere"
-        landmarkDir = self.localPath + "/landmark"
-        properties = "C.txt,S.txt"
-        propertiesValues = "0.5,0.25"
-        outputDir6 = self.localPath + "/outputTest/outputTest6"
-        outputVerif6 = self.localPath + "/outputVerif/outputVerif6"
-
-        if not os.path.exists(outputDir6):
-            os.mkdir(outputDir6)
-
-        ## --- Call the CLI --- ##
-        # logic = GroupWiseRegisterationLogic()
-        # logic.runGroupWiseRegisteration(modelsDir=meshDir, propertyDir=propertiesDir,
-        #                 sphereDir=sphereDir, outputDir=outputDir6, properties=properties,
-        #                 propValues=propertiesValues, landmark=landmarkDir)
-
-        ## --- Compare results --- ##
-        if self.outputcomparison(outputDir6, outputVerif6, meshDir):
-            self.delayDisplay('Test 6 passed!')
-            return True
-        else:
-            return False
-
-    ## Function outputComparison(...)
-    # Compare the expected outputs (outputVerif) with those obtained (outputDir)
-    def outputcomparison(self, outputDir, outputVerif, inputDir):
-        listFilesOut = os.listdir(outputDir)
-        listFilesVerif = os.listdir(outputVerif)
-
-        ## Delete .DS_Store if there is one - for MacOS
-        if listFilesOut.count(".DS_Store"):
-            listFilesOut.remove(".DS_Store")
-        if listFilesVerif.count(".DS_Store"):
-            listFilesVerif.remove(".DS_Store")
-
-        ## Check number of outputs
-        nbFilesOut = len(listFilesOut)
-        nbFilesIn = len(os.listdir(inputDir))
-        if nbFilesOut != nbFilesIn:
-            print "Wrong number of outputs"
-            return False
-
-        ## Check files names
-        listFilesOutNames = list()
-        listFilesVerifNames = list()
-        for i in range(0, len(listFilesOut)):
-            listFilesOutNames.append('.'.join(listFilesOut[i].split('.')[:-1]))
-            listFilesVerifNames.append('.'.join(listFilesVerif[i].split('.')[:-1]))
-
-            if listFilesOutNames[i] != listFilesVerifNames[i]:
-                print "Erreur de noms"
-                return False
-
-        ## Compare files contents
-        taille = len(listFilesOut)
-        for i in range(0, taille):
-            fTest = open(outputDir + "/" + listFilesOut[i], "r")
-            contenuTest = fTest.read()
-
-            fVerif = open(outputVerif + "/" + listFilesVerif[i], "r")
-            contenuVerif = fVerif.read()
-
-            if contenuTest != contenuVerif:
-                print "Wrong contents"
-                return False
-
-        return True
+import os, sys
+import re, time
+import tempfile, multiprocessing
+import subprocess, select
+import unittest
+import logging
+
+# The GUI stack is only imported inside Slicer: run as a script (see main), the logic drives GROUPS with plain subprocess
+headless = __name__ == "__main__"
+if not headless:
+    try:
+        import qt, ctk, slicer
+        from slicer.ScriptedLoadableModule import *
+    except ImportError:
+        headless = True
+if headless:
+    qt = ctk = slicer = None
+    ScriptedLoadableModule = ScriptedLoadableModuleWidget = ScriptedLoadableModuleLogic = ScriptedLoadableModuleTest = object
+
+import shutil
+from GroupWiseRegisterationLib import CohortManifest
+
+#
+# GroupWiseRegisteration
+#
+
+class GroupWiseRegisteration(ScriptedLoadableModule):
+    """Uses ScriptedLoadableModule base class, available at:
+  https://github.com/Slicer/Slicer/blob/master/Base/Python/slicer/ScriptedLoadableModule.py
+  """
+
+    def __init__(self, parent):
+        ScriptedLoadableModule.__init__(self, parent)
+        self.parent.title = "GroupWiseRegisteration"  # TODO make this more human readable by adding spaces
+        self.parent.categories = ["Quantification"]
+        self.parent.dependencies = []
+        self.parent.contributors = ["Mahmoud Mostapha (UNC)"]
+        self.parent.helpText = """
+        ...
+    """
+        self.parent.acknowledgementText = """
+        ...
+    """  # replace with organization, grant and thanks.
+
+
+#
+# GroupWiseRegisterationWidget
+#
+
+class GroupWiseRegisterationWidget(ScriptedLoadableModuleWidget):
+    """Uses ScriptedLoadableModuleWidget base class, available at:
+  https://github.com/Slicer/Slicer/blob/master/Base/Python/slicer/ScriptedLoadableModule.py
+  """
+
+    def setup(self):
+        ScriptedLoadableModuleWidget.setup(self)
+
+        ###################################################################
+        ##                                                               ##
+        ##  Collapsible part for input/output parameters for GroupWiseRegisteration CLI  ##
+        ##                                                               ##
+        ###################################################################
+
+        self.ioCollapsibleButton = ctk.ctkCollapsibleButton()
+        self.ioCollapsibleButton.text = "IO"
+        self.layout.addWidget(self.ioCollapsibleButton)
+        self.ioQVBox = qt.QVBoxLayout(self.ioCollapsibleButton)
+
+        # --------------------------------- #
+        # ----- Group Box DIRECTORIES ----- #
+        # --------------------------------- #
+        self.directoryGroupBox = qt.QGroupBox("Directories")
+        self.ioQVBox.addWidget(self.directoryGroupBox)
+        self.ioQFormLayout = qt.QFormLayout(self.directoryGroupBox)
+
+        # Selection of the directory containing the input models (option: --surfaceDir) and option procalign shape
+        self.inputMeshTypeHBox = qt.QVBoxLayout(self.directoryGroupBox)
+        self.inputModelsDirectorySelector = ctk.ctkDirectoryButton()
+        self.chooseProcalign = ctk.ctkCheckBox()
+        self.chooseProcalign.setText("Procalign mesh")
+        
+        self.inputMeshTypeHBox.addWidget(self.inputModelsDirectorySelector)
+        self.inputMeshTypeHBox.addWidget(self.chooseProcalign)
+        self.ioQFormLayout.addRow(qt.QLabel("Input Models Directory:"), self.inputMeshTypeHBox)
+
+        # Selection of the input directory containing the property files from SPHARM (txt files) (option: --propertyDir)
+        self.inputPropertyDirectorySelector = ctk.ctkDirectoryButton()
+        self.ioQFormLayout.addRow(qt.QLabel("Input Property Directory:"), self.inputPropertyDirectorySelector)
+
+        # Selection of the directory which contains each spherical model (option: --sphereDir)
+        self.sphericalModelsDirectorySelector = ctk.ctkDirectoryButton()
+        self.ioQFormLayout.addRow("Spherical Models Directory:", self.sphericalModelsDirectorySelector)
+
+        # Selection of the output directory for GroupWiseRegisteration (option: --outputDir)
+        self.outputDirectorySelector = ctk.ctkDirectoryButton()
+        self.ioQFormLayout.addRow(qt.QLabel("Output Directory:"), self.outputDirectorySelector)
+
+        # CheckBox. If checked, Group Box 'Parameters' will be enabled
+        self.enableParamCB = ctk.ctkCheckBox()
+        self.enableParamCB.setText("Personalize parameters")
+        self.ioQFormLayout.addRow(self.enableParamCB)
+
+        # Connections
+        self.inputModelsDirectorySelector.connect("directoryChanged(const QString &)", self.onSelect)
+        self.inputPropertyDirectorySelector.connect("directoryChanged(const QString &)", self.onSelect)
+        self.sphericalModelsDirectorySelector.connect("directoryChanged(const QString &)", self.onSelect)
+        self.outputDirectorySelector.connect("directoryChanged(const QString &)", self.onSelect)
+        self.enableParamCB.connect("stateChanged(int)", self.onCheckBoxParam)
+
+        # Name simplification (string)
+        self.modelsDirectory = str(self.inputModelsDirectorySelector.directory)
+        self.propertyDirectory = str(self.inputPropertyDirectorySelector.directory)
+        self.outputDirectory = str(self.outputDirectorySelector.directory)
+
+        # -------------------------------- #
+        # ----- Group Box PARAMETERS ----- #
+        # -------------------------------- #
+        self.parametersGroupBox = qt.QGroupBox("Parameters")
+        self.ioQVBox.addWidget(self.parametersGroupBox)
+        self.paramQFormLayout = qt.QFormLayout(self.parametersGroupBox)
+        self.parametersGroupBox.setEnabled(False)
+
+        # Selection of the property we want to use (option: --filter)
+        self.specifyPropertySelector = ctk.ctkCheckableComboBox()
+        self.specifyPropertySelector.addItems(("medialMeshArea","medialMeshPartialArea","medialMeshRadius","medialMeshPartialRadius","paraPhi","paraTheta"))
+        self.paramQFormLayout.addRow(qt.QLabel("Properties name to use:"), self.specifyPropertySelector)
+
+        # Weights of each property - Choices on 3 lines (option: -w)
+        self.weightLayout = qt.QVBoxLayout(self.parametersGroupBox)
+        self.weightline1 = qt.QHBoxLayout(self.parametersGroupBox)  # Line 1
+        self.weightLayout.addLayout(self.weightline1)
+        self.weightline2 = qt.QHBoxLayout(self.parametersGroupBox)  # Line 2
+        self.weightLayout.addLayout(self.weightline2)
+        self.weightline3 = qt.QHBoxLayout(self.parametersGroupBox)  # Line 3
+        self.weightLayout.addLayout(self.weightline3)
+
+        # Fill out first line
+        self.labelArea = qt.QLabel("medialMeshArea")
+        self.weightline1.addWidget(self.labelArea)
+        self.weightArea = ctk.ctkDoubleSpinBox()
+        self.weightArea.enabled = False
+        self.weightArea.value = 1
+        self.weightline1.addWidget(self.weightArea)
+
+        self.labelPartialArea = qt.QLabel("medialMeshPartialArea")
+        self.weightline1.addWidget(self.labelPartialArea)
+        self.weightPartialArea = ctk.ctkDoubleSpinBox()
+        self.weightPartialArea.enabled = False
+        self.weightPartialArea.value = 1
+        self.weightline1.addWidget(self.weightPartialArea)
+
+        # Fill out second line
+        self.labelRadius = qt.QLabel("medialMeshRadius")
+        self.weightline2.addWidget(self.labelRadius)
+        self.weightRadius = ctk.ctkDoubleSpinBox()
+        self.weightRadius.enabled = False
+        self.weightRadius.value = 1
+        self.weightline2.addWidget(self.weightRadius)
+
+        self.labelPartialRadius = qt.QLabel("medialMeshPartialRadius")
+        self.weightline2.addWidget(self.labelPartialRadius)
+        self.weightPartialRadius = ctk.ctkDoubleSpinBox()
+        self.weightPartialRadius.enabled = False
+        self.weightPartialRadius.value = 1
+        self.weightline2.addWidget(self.weightPartialRadius)
+
+        # Fill out third line
+        self.labelparaPhi = qt.QLabel("paraPhi")
+        self.weightline3.addWidget(self.labelparaPhi)
+        self.weightparaPhi = ctk.ctkDoubleSpinBox()
+        self.weightparaPhi.enabled = False
+        self.weightparaPhi.value = 1
+        self.weightline3.addWidget(self.weightparaPhi)
+
+        self.labelparaTheta = qt.QLabel("paraTheta")
+        self.weightline3.addWidget(self.labelparaTheta)
+        self.weightparaTheta = ctk.ctkDoubleSpinBox()
+        self.weightparaTheta.enabled = False
+        self.weightparaTheta.value = 1
+        self.weightline3.addWidget(self.weightparaTheta)
+
+        self.paramQFormLayout.addRow("Weight of each property:", self.weightLayout)
+
+        # Specification of the SPHARM decomposition degree (option: -d)
+        self.degreeSpharm = ctk.ctkSliderWidget()
+        self.degreeSpharm.minimum = 0
+        self.degreeSpharm.maximum = 50
+        self.degreeSpharm.value = 5        # initial value
+        self.degreeSpharm.setDecimals(0)
+        self.paramQFormLayout.addRow(qt.QLabel("Degree of SPHARM decomposition:"), self.degreeSpharm)
+
+        # Maximum iteration (option: --maxIter)
+        self.maxIter = qt.QSpinBox()
+        self.maxIter.minimum = 0            # Check the range authorized
+        self.maxIter.maximum = 100000
+        self.maxIter.value = 5000
+        self.paramQFormLayout.addRow("Maximum number of iteration:", self.maxIter)
+
+        # Early stop of each stage (option: --stopWindow, 0: disabled)
+        self.stopWindow = qt.QSpinBox()
+        self.stopWindow.minimum = 0
+        self.stopWindow.maximum = 100000
+        self.stopWindow.value = 0
+        self.paramQFormLayout.addRow("Early stop window (iterations):", self.stopWindow)
+
+        # Adaptive degree schedule (option: --adaptiveDegree)
+        self.adaptiveDegree = ctk.ctkCheckBox()
+        self.adaptiveDegree.setText("Skip degree stages without gain")
+        self.paramQFormLayout.addRow("Adaptive degree schedule:", self.adaptiveDegree)
+
+        # Name simplification
+        self.property = ""
+        self.propertyValue = ""
+
+        # Connections
+        self.specifyPropertySelector.connect("checkedIndexesChanged()", self.onSpecifyPropertyChanged)
+
+        # ------------------------------------------ #
+        # ----- Apply button to launch the CLI ----- #
+        # ------------------------------------------ #
+        self.applyButton = qt.QPushButton("Apply")
+        self.applyButton.enabled = False
+        self.ioQVBox.addWidget(self.applyButton)
+
+        self.cancelButton = qt.QPushButton("Cancel")
+        self.cancelButton.enabled = False
+        self.ioQVBox.addWidget(self.cancelButton)
+
+        self.errorLabel = qt.QLabel("Error: Invalide inputs")
+        self.errorLabel.hide()
+        self.errorLabel.setStyleSheet("color: rgb(255, 0, 0);")
+        self.ioQVBox.addWidget(self.errorLabel)
+
+        # Convergence of the running registration
+        self.statusLabel = qt.QLabel("")
+        self.statusLabel.hide()
+        self.ioQVBox.addWidget(self.statusLabel)
+
+        # Connections
+        self.applyButton.connect('clicked(bool)', self.onApplyButtonClicked)
+        self.cancelButton.connect('clicked(bool)', self.onCancelButtonClicked)
+
+        # ----- Add vertical spacer ----- #
+        self.layout.addStretch(1)
+
+
+        #### SET PARAMETERS - for test!!
+        # self.inputModelsDirectorySelector.directory = "/Users/prisgdd/Desktop/Pipeline/inputGroupWiseRegisterationPART/Mesh-surfSPHARM"
+        # self.inputPropertyDirectorySelector.directory = "/Users/prisgdd/Desktop/Pipeline/inputGroupWiseRegisterationPART/attributes"
+        # self.outputDirectorySelector.directory = "/Users/prisgdd/Desktop/Example/outprout"
+        # self.sphericalModelsDirectorySelector.directory = "/Users/prisgdd/Desktop/Pipeline/inputGroupWiseRegisterationPART/mapped-sphere"
+        # self.degreeSpharm.value = 4
+        # self.maxIter.value = 11
+
+    ## Function cleanup(self):
+    def cleanup(self):
+        pass
+
+    ## Function onSelect(self):
+    # Check if each directory (Models, Property, Sphere and Output) have been chosen.
+    # If they were, Apply button is enabled to call the CLI
+    # Update the simplified names
+    def onSelect(self):
+        # Update names
+        self.modelsDirectory = str(self.inputModelsDirectorySelector.directory)
+        self.propertyDirectory = str(self.inputPropertyDirectorySelector.directory)
+        self.sphereDirectory = str(self.sphericalModelsDirectorySelector.directory)
+        self.outputDirectory = str(self.outputDirectorySelector.directory)
+
+        # Check if each directory has been choosen
+        self.applyButton.enabled = self.modelsDirectory != "." and self.propertyDirectory != "." and self.outputDirectory != "." and self.sphereDirectory != "."
+
+        # Hide error message if printed
+        self.errorLabel.hide()
+
+    ## Function onSpecifyPropertyChanged(self):
+    # Enable/Disable associated weights
+    def onSpecifyPropertyChanged(self):
+        if self.specifyPropertySelector.currentIndex == 0:
+            self.weightArea.enabled = not self.weightArea.enabled
+
+        if self.specifyPropertySelector.currentIndex == 1:
+            self.weightPartialArea.enabled = not self.weightPartialArea.enabled
+
+        if self.specifyPropertySelector.currentIndex == 2:
+            self.weightRadius.enabled = not self.weightRadius.enabled
+
+        if self.specifyPropertySelector.currentIndex == 3:
+            self.weightPartialRadius.enabled = not self.weightPartialRadius.enabled
+
+        if self.specifyPropertySelector.currentIndex == 4:
+            self.weightparaPhi.enabled = not self.weightparaPhi.enabled
+
+        if self.specifyPropertySelector.currentIndex == 5:
+            self.weightparaTheta.enabled = not self.weightparaTheta.enabled
+
+    ## Function onCheckBoxParam(self):
+    # Enable the parameter Group Box if associated check box is checked
+    def onCheckBoxParam(self):
+        if self.enableParamCB.checkState():
+            self.parametersGroupBox.setEnabled(True)
+        else:
+            self.parametersGroupBox.setEnabled(False)
+
+    ## Function onApplyButtonClicked(self):
+    # Update every parameters to call GroupWiseRegisteration
+    # Check maxIter is an integer
+    # Check if parameters group box enabled
+    def onApplyButtonClicked(self):
+        logic = GroupWiseRegisterationLogic()
+        self.logic = logic
+
+        self.errorLabel.hide()
+        # Update names
+        self.modelsDirectory = str(self.inputModelsDirectorySelector.directory)
+        self.propertyDirectory = str(self.inputPropertyDirectorySelector.directory)
+        self.sphereDirectory = str(self.sphericalModelsDirectorySelector.directory)
+        self.outputDirectory = str(self.outputDirectorySelector.directory)
+
+        if not self.enableParamCB.checkState():
+            handle = logic.runGroupWiseRegisterationAsync(modelsDir=self.modelsDirectory, propertyDir=self.propertyDirectory, sphereDir=self.sphereDirectory, outputDir=self.outputDirectory, procalign=self.chooseProcalign.checkState(),
+                                    progressCallback=self.onRegistrationProgress, finishedCallback=self.onRegistrationFinished)
+
+        else:
+            # ----- Creation of string for the specified properties and their values ----- #
+            self.property = ""
+            self.propertyValue = ""
+
+            if self.weightArea.enabled:
+                self.propertyValue = self.propertyValue + str(self.weightArea.value)
+                self.property = self.property + "medialMeshArea.txt"
+
+            if self.weightPartialArea.enabled:
+                if self.propertyValue != "":
+                    self.propertyValue = self.propertyValue + ","
+                    self.property = self.property + ","
+
+                self.propertyValue = self.propertyValue + str(self.weightPartialArea.value)
+                self.property = self.property + "medialMeshPartialArea.txt"
+
+            if self.weightRadius.enabled:
+                if self.propertyValue != "":
+                    self.propertyValue = self.propertyValue + ","
+                    self.property = self.property + ","
+
+                self.propertyValue = self.propertyValue + str(self.weightRadius.value)
+                self.property = self.property + "medialMeshRadius.txt"
+
+            if self.weightPartialRadius.enabled:
+                if self.propertyValue != "":
+                    self.propertyValue = self.propertyValue + ","
+                    self.property = self.property + ","
+
+                self.propertyValue = self.propertyValue + str(self.weightPartialRadius.value)
+                self.property = self.property + "medialMeshPartialRadius.txt"
+
+            if self.weightparaPhi.enabled:
+                if self.propertyValue != "":
+                    self.propertyValue = self.propertyValue + ","
+                    self.property = self.property + ","
+
+                self.propertyValue = self.propertyValue + str(self.weightparaPhi.value)
+                self.property = self.property + "paraPhi.txt"
+
+            if self.weightparaTheta.enabled:
+                if self.propertyValue != "":
+                    self.propertyValue = self.propertyValue + ","
+                    self.property = self.property + ","
+
+                self.propertyValue = self.propertyValue + str(self.weightparaTheta.value)
+                self.property = self.property + "paraTheta.txt"
+
+            if self.property == "" and self.propertyValue == "":                         # Si aucune propriete selectionnee
+                self.property = 0
+                self.propertyValue = 0
+
+            d = int(self.degreeSpharm.value)
+            m = int(self.maxIter.value)
+            w = int(self.stopWindow.value)
+
+            handle = logic.runGroupWiseRegisterationAsync(modelsDir = self.modelsDirectory, propertyDir = self.propertyDirectory,
+                                    sphereDir = self.sphereDirectory, outputDir = self.outputDirectory, procalign=self.chooseProcalign.checkState(), 
+                                    properties = self.property, propValues = self.propertyValue, degree = d, maxIter = m,
+                                    stopWindow = w, adaptiveDegree = self.adaptiveDegree.checked,
+                                    progressCallback=self.onRegistrationProgress, finishedCallback=self.onRegistrationFinished)
+
+        ## GroupWiseRegisteration didn't run because of invalid inputs
+        if handle is None:
+            self.errorLabel.show()
+            return
+
+        self.applyButton.enabled = False
+        self.cancelButton.enabled = True
+        self.statusLabel.text = "Initialization..."
+        self.statusLabel.show()
+
+    ## Function onCancelButtonClicked(self):
+    # Kill the running registration
+    def onCancelButtonClicked(self):
+        self.logic.process.cancel()
+
+    ## Function onRegistrationProgress(self, handle):
+    # Display the convergence of the running registration
+    def onRegistrationProgress(self, handle):
+        point = handle.series[-1]
+        self.statusLabel.text = "Stage %d - iteration %d - best cost: %g (%.1f it/s)" % (point["stage"], point["iteration"], handle.bestCost, handle.iterationsPerSecond)
+
+    ## Function onRegistrationFinished(self, handle):
+    def onRegistrationFinished(self, handle):
+        self.applyButton.enabled = True
+        self.cancelButton.enabled = False
+        if handle.cancelled:
+            self.statusLabel.text = "Cancelled"
+        elif handle.succeeded():
+            self.statusLabel.text = "Done - best cost: " + str(handle.bestCost)
+        else:
+            self.statusLabel.text = "Failed (exit code " + str(handle.exitCode) + ")"
+            self.errorLabel.show()
+
+#
+# GroupWiseRegisterationLogic
+#
+
+class GroupWiseRegisterationLogic(ScriptedLoadableModuleLogic):
+    """This class should implement all the actual
+  computation done by your module.  The interface
+  should be such that other python code can import
+  this class and make use of the functionality without
+  requiring an instance of the Widget.
+  Uses ScriptedLoadableModuleLogic base class, available at:
+  https://github.com/Slicer/Slicer/blob/master/Base/Python/slicer/ScriptedLoadableModule.py
+  """
+
+    ## GROUPS executable given on the command line of the batch mode (None: see groupsExecutable)
+    executable = None
+
+    ## Function runGroupWiseRegisteration(...)
+    #   Check if directories are ok
+    #   Create the command line
+    #   Call the CLI GroupWiseRegisteration and wait for its completion
+    def runGroupWiseRegisteration(self, modelsDir, propertyDir, sphereDir, outputDir, procalign=False, properties=0, propValues=0, degree=0, maxIter=0,
+                                  stopWindow=0, stopTolerance=0, adaptiveDegree=False, degreeGain=0, coefficientDir="", addSubjects=False):
+        print "--- function runGroupWiseRegisteration() ---"
+
+        """
+        Calling GroupWiseRegisteration CLI
+            Arguments:
+             --surfaceDir: Directory with input models
+             --propertyDir: Property folder (txt files from SPHARM)
+             --sphereDir: Sphere folder
+             --outputDir: Output directory
+             --filter: Properties to consider
+             -w: weights associated with each property
+             -d: Degree of deformation field
+             --maxIter: Maximum number of iteration
+             --stopWindow: Iterations of the sliding window for the early stop of each stage (0: disabled)
+             --stopTolerance: Minimum relative decrease of the best cost over the window
+             --adaptiveDegree: Raise the degree faster after stages without gain
+             --degreeGain: Minimum relative gain of a stage for the adaptive degree schedule
+             --coefficientDir: Initial coefficients
+             --addSubjects: Register only the subjects without a coefficient file against the others (fixed)
+        """
+
+        handle = self.runGroupWiseRegisterationAsync(modelsDir, propertyDir, sphereDir, outputDir, procalign=procalign,
+                                                     properties=properties, propValues=propValues, degree=degree, maxIter=maxIter,
+                                                     stopWindow=stopWindow, stopTolerance=stopTolerance, adaptiveDegree=adaptiveDegree, degreeGain=degreeGain,
+                                                     coefficientDir=coefficientDir, addSubjects=addSubjects)
+        if handle is None:
+            return False
+        handle.waitForFinished()
+
+        print "\n\n --------------------------- \n"
+        print handle.output()
+        print "\n\n --------------------------- \n"
+        return handle.succeeded()
+
+    ## Function runGroupWiseRegisterationAsync(...)
+    #   Same inputs as runGroupWiseRegisteration, but the CLI is started without waiting for it.
+    #   Returns a GroupWiseRegisterationProcess handle right away (None if the inputs are invalid):
+    #       progressCallback(handle) is called for each status line "[iter] cost (ecost + fcost) mincost"
+    #       finishedCallback(handle) is called once the process exits (see handle.succeeded())
+    #   The stop reason of each stage is collected in handle.stages
+    def runGroupWiseRegisterationAsync(self, modelsDir, propertyDir, sphereDir, outputDir, procalign=False, properties=0, propValues=0, degree=0, maxIter=0,
+                                       stopWindow=0, stopTolerance=0, adaptiveDegree=False, degreeGain=0, coefficientDir="", addSubjects=False,
+                                       progressCallback=None, finishedCallback=None):
+        if not self.checkInputs(modelsDir, propertyDir, sphereDir, procalign):
+            return None
+
+        arguments = self.buildArguments(modelsDir, propertyDir, sphereDir, outputDir, properties=properties, propValues=propValues, degree=degree, maxIter=maxIter,
+                                        stopWindow=stopWindow, stopTolerance=stopTolerance, adaptiveDegree=adaptiveDegree, degreeGain=degreeGain,
+                                        coefficientDir=coefficientDir, addSubjects=addSubjects)
+
+        ############################
+        # ----- Call the CLI ----- #
+        self.process = GroupWiseRegisterationProcess(self.groupsExecutable(), arguments,
+                                                     progressCallback=progressCallback, finishedCallback=finishedCallback)
+        return self.process
+
+    ## Function runMultiStart(...)
+    #   Same inputs as runMultiStartAsync, but waits for all the runs and the selection of the best one
+    #   Returns True if a winner was copied to outputDir
+    def runMultiStart(self, modelsDir, propertyDir, sphereDir, outputDir, procalign=False, properties=0, propValues=0, degree=0, maxIter=0,
+                      stopWindow=0, stopTolerance=0, adaptiveDegree=False, degreeGain=0,
+                      nRuns=4, perturbation=0.01, samplingDegrees=None, coreBudget=0, pruneMargin=0.1, pruneAfter=500, seed=0, coefficientDir="",
+                      addSubjects=False):
+        handle = self.runMultiStartAsync(modelsDir, propertyDir, sphereDir, outputDir, procalign=procalign, properties=properties, propValues=propValues,
+                                         degree=degree, maxIter=maxIter,
+                                         stopWindow=stopWindow, stopTolerance=stopTolerance, adaptiveDegree=adaptiveDegree, degreeGain=degreeGain,
+                                         nRuns=nRuns, perturbation=perturbation, samplingDegrees=samplingDegrees,
+                                         coreBudget=coreBudget, pruneMargin=pruneMargin, pruneAfter=pruneAfter, seed=seed, coefficientDir=coefficientDir,
+                                         addSubjects=addSubjects)
+        if handle is None:
+            return False
+        handle.waitForFinished()
+        print handle.summary()
+        return handle.succeeded()
+
+    ## Function runMultiStartAsync(...)
+    #   Multi-start registration: nRuns independent GROUPS processes from perturbed initial coefficients and/or different sampling degrees,
+    #   the best of which is kept. The first run starts from the unperturbed coefficients (coefficientDir, or zero if not given); the others
+    #   add a Gaussian perturbation of standard deviation perturbation (--perturbation, seeds seed + 1, seed + 2, ...).
+    #   samplingDegrees: list of icosahedron subdivision levels cycled over the runs (None: 4 for all the runs)
+    #   coreBudget: total # of cores (0: all the available cores), shared by the runs executed at the same time
+    #   pruneMargin: a run is killed once its minimum cost is worse than the best run with the same sampling degree, at the same stage
+    #       and number of evaluations, by more than pruneMargin (relative); pruneAfter: # of evaluations before a run can be killed
+    #   stopWindow, stopTolerance, adaptiveDegree, degreeGain: stopping and degree schedule of each run (see runGroupWiseRegisteration)
+    #   addSubjects: each run registers the subjects without a coefficient file in coefficientDir against the others; the fixed coefficient
+    #       files are copied into the run directories so that the runs can be evaluated on a common resolution, but not to outputDir
+    #   Only the .coeff files of the winner are written to outputDir, along with multistart_summary.csv (see GroupWiseRegisterationMultiStart)
+    def runMultiStartAsync(self, modelsDir, propertyDir, sphereDir, outputDir, procalign=False, properties=0, propValues=0, degree=0, maxIter=0,
+                           stopWindow=0, stopTolerance=0, adaptiveDegree=False, degreeGain=0,
+                           nRuns=4, perturbation=0.01, samplingDegrees=None, coreBudget=0, pruneMargin=0.1, pruneAfter=500, seed=0, coefficientDir="",
+                           addSubjects=False, progressCallback=None, finishedCallback=None):
+        if not self.checkInputs(modelsDir, propertyDir, sphereDir, procalign):
+            return None
+        if not os.path.isdir(outputDir) or nRuns < 1:
+            return None
+
+        fixedCoefficients = list()
+        if addSubjects and coefficientDir:
+            fixedCoefficients = [file for file in os.listdir(coefficientDir) if file.endswith(".coeff")]
+
+        workDir = tempfile.mkdtemp(prefix="GroupsMultiStart")
+        runs = list()
+        for i in range(0, nRuns):
+            run = {}
+            run["index"] = i
+            run["seed"] = seed + i
+            run["perturbation"] = perturbation if i > 0 else 0
+            run["samplingDegree"] = samplingDegrees[i % len(samplingDegrees)] if samplingDegrees else 4     # Default: samplingDegree=4
+            run["directory"] = os.path.join(workDir, "run%d" % i)
+            os.mkdir(run["directory"])
+            for file in fixedCoefficients:
+                shutil.copy(os.path.join(coefficientDir, file), run["directory"])
+
+            arguments = self.buildArguments(modelsDir, propertyDir, sphereDir, run["directory"], properties=properties, propValues=propValues,
+                                            degree=degree, maxIter=maxIter,
+                                            stopWindow=stopWindow, stopTolerance=stopTolerance, adaptiveDegree=adaptiveDegree, degreeGain=degreeGain,
+                                            coefficientDir=coefficientDir, addSubjects=addSubjects)
+            if run["perturbation"]:
+                arguments += ["--perturbation", str(float(run["perturbation"])), "--seed", str(int(run["seed"]))]
+            arguments += ["--samplingDegree", str(int(run["samplingDegree"]))]
+            run["arguments"] = arguments
+            runs.append(run)
+
+        # the evaluation of the candidates on a common resolution uses the same inputs
+        evaluationArguments = self.buildArguments(modelsDir, propertyDir, sphereDir, workDir, properties=properties, propValues=propValues,
+                                                  degree=degree, maxIter=maxIter)
+
+        self.process = GroupWiseRegisterationMultiStart(self.groupsExecutable(), runs, outputDir, workDir, evaluationArguments,
+                                                        coreBudget=coreBudget, pruneMargin=pruneMargin, pruneAfter=pruneAfter,
+                                                        fixedCoefficients=fixedCoefficients,
+                                                        progressCallback=progressCallback, finishedCallback=finishedCallback)
+        return self.process
+
+    ## Function checkInputs(...)
+    #   Check if directories contents correctly match with models Directory (see CohortManifest.groupsCohort)
+    #   The directories listings are cached: only the directories modified since the last check are scanned again
+    def checkInputs(self, modelsDir, propertyDir, sphereDir, procalign=False):
+        manifest = CohortManifest.CohortManifest()
+        subjects, errors = manifest.groupsCohort(modelsDir, propertyDir, sphereDir, procalign=procalign)
+        manifest.save()
+        for error in errors:
+            print error
+        return len(subjects) > 0 and not errors
+
+    ## Function groupsExecutable()
+    #   Path of the GROUPS CLI
+    def groupsExecutable(self):
+        if self.executable:
+            return self.executable
+
+        # Avec le make package
+        # self.moduleName = "GroupWiseRegisteration"
+        # scriptedModulesPath = eval('slicer.modules.%s.path' % self.moduleName.lower())
+        # scriptedModulesPath = os.path.dirname(scriptedModulesPath)
+        
+        # libPath = os.path.join(scriptedModulesPath)
+        # sys.path.insert(0, libPath)
+        # GroupWiseRegisteration = os.path.join(scriptedModulesPath, '../hidden-cli-modules/GroupWiseRegisteration')
+
+        # Sans le make package
+        GroupWiseRegisteration = "/Users/prisgdd/Documents/Projects/GroupWiseRegisteration/GroupWiseRegisteration-build/GroupWiseRegisteration-build/bin/GroupWiseRegisteration"
+        return GroupWiseRegisteration
+
+    ## Function buildArguments(...)
+    #   Create the command line of the CLI
+    def buildArguments(self, modelsDir, propertyDir, sphereDir, outputDir, properties=0, propValues=0, degree=0, maxIter=0,
+                       stopWindow=0, stopTolerance=0, adaptiveDegree=False, degreeGain=0, coefficientDir="", addSubjects=False):
+        ############################################
+        # ----- Creation of the command line ----- #
+        arguments = list()
+        arguments.append("--surfaceDir")
+        arguments.append(modelsDir)
+        arguments.append("--propertyDir")
+        arguments.append(propertyDir)
+        arguments.append("--sphereDir")
+        arguments.append(sphereDir)
+        arguments.append("--outputDir")
+        arguments.append(outputDir)
+
+        if properties and propValues:
+            # If # of properties and # of weights aren't the same, we cut those at the end
+            if properties.count(',') > propValues.count(','):
+                while properties.count(',') > propValues.count(','):
+                    properties = (','.join(properties.split(',')[:-1]))
+            elif propValues.count(',') > properties.count(','):
+                while propValues.count(',') > properties.count(','):
+                    propValues = (','.join(propValues.split(',')[:-1]))
+            arguments.append("--filter")
+            arguments.append(properties)
+            arguments.append("-w")
+            arguments.append(propValues)
+        else:       # If no properties specified - Default: each property with weight=1
+            arguments.append("--filter")
+            arguments.append("medialMeshArea.txt,medialMeshPartialArea.txt,medialMeshRadius.txt,medialMeshPartialRadius.txt,paraPhi.txt,paraTheta.txt")
+            arguments.append("-w")
+            arguments.append("1.0,1.0,1.0,1.0,1.0,1.0")
+
+        if degree:
+            arguments.append("-d")
+            arguments.append(str(int(degree)))
+        else:           # Default: degree=5
+            arguments.append("-d")
+            arguments.append("5")
+
+        if maxIter:
+            arguments.append("--maxIter")
+            arguments.append(str(int(maxIter)))
+        else:           # Default: # maximum of iteration = 5000
+            arguments.append("--maxIter")
+            arguments.append("5000")
+
+        # Early stop and adaptive degree schedule: the CLI defaults are used if not specified
+        if stopWindow:
+            arguments.append("--stopWindow")
+            arguments.append(str(int(stopWindow)))
+        if stopTolerance:
+            arguments.append("--stopTolerance")
+            arguments.append(str(float(stopTolerance)))
+        if adaptiveDegree:
+            arguments.append("--adaptiveDegree")
+        if degreeGain:
+            arguments.append("--degreeGain")
+            arguments.append(str(float(degreeGain)))
+
+        if coefficientDir:
+            arguments.append("--coefficientDir")
+            arguments.append(coefficientDir)
+        if addSubjects:
+            arguments.append("--addSubjects")
+
+        return arguments
+
+
+#
+# GroupWiseRegisterationProcess
+#
+
+class GroupWiseRegisterationProcess(object):
+    """Handle on a running GROUPS CLI (see GroupWiseRegisterationLogic.runGroupWiseRegisterationAsync).
+  The merged output of the process is streamed line by line; the status lines printed by
+  GroupwiseRegistration::cost ("[iter] cost (ecost + fcost) mincost") are parsed into a live
+  convergence series. Completion is reported through the exit code of the process.
+  Inside Slicer the process is a QProcess driven by the event loop; in the batch mode it is a plain subprocess whose output
+  is only read in waitForFinished (POSIX).
+  """
+
+    ## Status line of GroupwiseRegistration::cost: [iter] cost (ecost + fcost) mincost
+    costLine = re.compile(r"^\[(\d+)\] (\S+) \((\S+) \+ (\S+)\) (\S+)$")
+    ## End of a stage (GroupwiseRegistration::endStage): Stage s (degree d) stopped after n evaluations: reason, minimum cost c
+    stageLine = re.compile(r"^Stage (\d+) \(degree (\d+)\) stopped after (\d+) evaluations: (.*), minimum cost (\S+)$")
+
+    def __init__(self, executable, arguments, progressCallback=None, finishedCallback=None):
+        self.progressCallback = progressCallback
+        self.finishedCallback = finishedCallback
+
+        self.lines = list()         # every output line
+        self.series = list()        # convergence series: dict(time, stage, iteration, evaluations, cost, ecost, fcost, mincost)
+        self.stages = list()        # completed stages: dict(stage, degree, evaluations, reason, mincost)
+        self.stage = 0              # the iteration counter is reset at each degree stage
+        self.evaluations = 0        # cost evaluations since the beginning of the run
+        self.bestCost = None
+        self.iterationsPerSecond = 0.0
+        self.exitCode = None
+        self.cancelled = False
+        self.buffer = ""
+
+        self.executable = executable
+        self.startTime = time.time()
+        self.process = None
+        self.popen = None
+        if qt is None:
+            try:
+                self.popen = subprocess.Popen([executable] + arguments, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+            except OSError:
+                # reported by waitForFinished, as the finished callback of a QProcess that failed to start
+                self.lines.append("Failed to start " + executable)
+            return
+
+        self.process = qt.QProcess()
+        self.process.setProcessChannelMode(qt.QProcess.MergedChannels)
+        self.process.connect('readyReadStandardOutput()', self.onReadyRead)
+        self.process.connect('finished(int,QProcess::ExitStatus)', self.onFinished)
+        self.process.connect('error(QProcess::ProcessError)', self.onError)
+        self.process.start(executable, arguments)
+
+    ## Function isRunning()
+    def isRunning(self):
+        return self.exitCode is None
+
+    ## Function succeeded()
+    # True if the process exited normally with EXIT_SUCCESS
+    def succeeded(self):
+        return self.exitCode == 0 and not self.cancelled
+
+    ## Function output()
+    def output(self):
+        return "\n".join(self.lines)
+
+    ## Function cancel()
+    # Kill the CLI; the best coefficients found so far are already saved by the CLI
+    def cancel(self):
+        if self.isRunning():
+            self.cancelled = True
+            if self.process is not None:
+                self.process.kill()
+            elif self.popen is not None:
+                self.popen.kill()
+
+    ## Function waitForFinished(msecs=-1)
+    # Block until the process exits or msecs elapsed (-1: no time limit); the output is still parsed while waiting
+    def waitForFinished(self, msecs=-1):
+        if self.process is None:
+            self.readSubprocess(msecs)
+            return
+        if self.isRunning():
+            self.process.waitForFinished(msecs)
+        # process the remaining output in case the finished signal was not delivered yet
+        self.onReadyRead()
+        if self.isRunning() and self.process.state() == qt.QProcess.NotRunning:
+            self.onFinished(self.process.exitCode(), self.process.exitStatus())
+
+    ## Function readSubprocess(msecs)
+    # Batch mode: parse the output of the subprocess until it exits or msecs elapsed (-1: no time limit)
+    def readSubprocess(self, msecs):
+        if not self.isRunning():
+            return
+        if self.popen is None:
+            self.finished(-1)
+            return
+        fd = self.popen.stdout.fileno()
+        deadline = time.time() + msecs / 1000.0 if msecs >= 0 else None
+        while True:
+            timeout = max(0.0, deadline - time.time()) if deadline is not None else None
+            if not select.select([fd], [], [], timeout)[0]:
+                return
+            data = os.read(fd, 65536)
+            if not data:
+                break
+            self.parseOutput(data)
+        self.popen.stdout.close()
+        exitCode = self.popen.wait()
+        # killed by a signal: negative return code
+        self.finished(exitCode if exitCode >= 0 else -1)
+
+    def onReadyRead(self):
+        self.parseOutput(str(self.process.readAllStandardOutput()))
+
+    ## Function parseOutput(data)
+    # Split a chunk of output into lines (the last incomplete line is kept for the next chunk)
+    def parseOutput(self, data):
+        self.buffer += data
+        lines = self.buffer.split("\n")
+        self.buffer = lines.pop()
+        for line in lines:
+            self.parseLine(line.rstrip("\r"))
+
+    ## Function parseLine(line)
+    # Store the line and update the convergence series if it is a status line
+    def parseLine(self, line):
+        self.lines.append(line)
+        match = self.stageLine.match(line)
+        if match:
+            stage = {}
+            stage["stage"] = int(match.group(1))
+            stage["degree"] = int(match.group(2))
+            stage["evaluations"] = int(match.group(3))
+            stage["reason"] = match.group(4)
+            stage["mincost"] = float(match.group(5))
+            self.stages.append(stage)
+            return
+        match = self.costLine.match(line)
+        if not match:
+            return
+        iteration = int(match.group(1))
+        if self.series and iteration < self.series[-1]["iteration"]:
+            self.stage += 1
+        previous = self.series[-1] if self.series and self.series[-1]["stage"] == self.stage else None
+        self.evaluations += iteration - previous["iteration"] if previous else iteration + 1
+
+        point = {}
+        point["time"] = time.time() - self.startTime
+        point["stage"] = self.stage
+        point["iteration"] = iteration
+        point["evaluations"] = self.evaluations
+        point["cost"] = float(match.group(2))
+        point["ecost"] = float(match.group(3))
+        point["fcost"] = float(match.group(4))
+        point["mincost"] = float(match.group(5))
+        self.series.append(point)
+
+        if self.bestCost is None or point["mincost"] < self.bestCost:
+            self.bestCost = point["mincost"]
+        if point["time"] > 0:
+            self.iterationsPerSecond = self.evaluations / point["time"]
+        if self.progressCallback:
+            self.progressCallback(self)
+
+    def onFinished(self, exitCode, exitStatus):
+        if exitStatus != qt.QProcess.NormalExit:
+            exitCode = -1
+        self.finished(exitCode)
+
+    ## Function finished(exitCode)
+    # Parse the last line, store the exit code (-1: crashed or not started) and report the completion
+    def finished(self, exitCode):
+        if not self.isRunning():
+            return
+        if self.buffer:
+            self.parseLine(self.buffer.rstrip("\r"))
+            self.buffer = ""
+        self.exitCode = exitCode
+        if self.finishedCallback:
+            self.finishedCallback(self)
+
+    def onError(self, error):
+        # finished() is not emitted if the executable could not be started
+        if error == qt.QProcess.FailedToStart:
+            self.lines.append("Failed to start " + self.executable)
+            self.onFinished(-1, qt.QProcess.CrashExit)
+
+
+#
+# GroupWiseRegisterationMultiStart
+#
+
+class GroupWiseRegisterationMultiStart(object):
+    """Multi-start registration (see GroupWiseRegisterationLogic.runMultiStartAsync).
+  The runs are GroupWiseRegisterationProcess handles writing to their own directory under workDir; at most coreBudget cores are used
+  (runs executed at the same time share them through --threads, the others wait). Hopeless runs are killed while running.
+  If the finished runs used different sampling degrees, their costs are not comparable: each of them is evaluated again on the finest
+  sampling (GROUPS --evaluate) before the selection. The .coeff files of the best run (if any) and the summary table of all the runs
+  (multistart_summary.csv, in any case) are written to outputDir, and workDir is removed.
+  """
+
+    ## Status line of GroupwiseRegistration::evaluate: Evaluation: cost (n triangle flips)
+    evaluationLine = re.compile(r"^Evaluation: (\S+) \((\d+) triangle flips\)$")
+
+    def __init__(self, executable, runs, outputDir, workDir, evaluationArguments, coreBudget=0, pruneMargin=0.1, pruneAfter=500,
+                 fixedCoefficients=None, progressCallback=None, finishedCallback=None):
+        self.executable = executable
+        self.runs = runs            # dict(index, seed, perturbation, samplingDegree, directory, arguments), completed by the runs below
+        self.outputDir = outputDir
+        self.workDir = workDir
+        self.fixedCoefficients = set(fixedCoefficients or [])   # coefficient files of the fixed subjects (addSubjects), not copied to outputDir
+        self.evaluationArguments = evaluationArguments
+        self.pruneMargin = pruneMargin
+        self.pruneAfter = pruneAfter
+        self.progressCallback = progressCallback
+        self.finishedCallback = finishedCallback
+
+        if coreBudget <= 0:
+            coreBudget = multiprocessing.cpu_count()
+        self.concurrency = max(1, min(len(runs), coreBudget))
+        self.threads = max(1, coreBudget // self.concurrency)
+
+        self.phase = "optimization"     # optimization, evaluation, done
+        self.winner = None
+        self.cancelled = False
+        self.startTime = time.time()
+        for run in self.runs:
+            run["status"] = "pending"   # pending, running, finished, pruned, failed
+            run["handle"] = None
+            run["evaluation"] = None    # GROUPS --evaluate of the final coefficients (if required)
+            run["evaluations"] = 0      # cost evaluations of the run
+            run["cost"] = None          # final minimum cost of the run
+            run["score"] = None         # cost used for the selection
+            run["time"] = None
+        self.schedule()
+
+    ## Function isRunning()
+    def isRunning(self):
+        return self.phase != "done"
+
+    ## Function succeeded()
+    # True if a winner was selected and written to outputDir
+    def succeeded(self):
+        return self.winner is not None and not self.cancelled
+
+    ## Function cancel()
+    # Kill every run; nothing is written to outputDir
+    def cancel(self):
+        if not self.isRunning():
+            return
+        self.cancelled = True
+        for run in self.runs:
+            if run["status"] == "pending":
+                run["status"] = "failed"
+            if run["handle"] is not None:
+                run["handle"].cancel()
+        self.finish()
+
+    ## Function waitForFinished()
+    # Block until the selection is done (the outputs of all the running processes are parsed while waiting)
+    def waitForFinished(self):
+        while self.isRunning():
+            handles = [handle for run in self.runs for handle in (run["handle"], run["evaluation"]) if handle is not None and handle.isRunning()]
+            if not handles:
+                break
+            for handle in handles:
+                handle.waitForFinished(100)
+
+    ## Function schedule()
+    # Start pending processes (runs or evaluations) up to the concurrency, and move to the next phase once all of them are done
+    def schedule(self):
+        if self.phase == "done":
+            return
+        key = "handle" if self.phase == "optimization" else "evaluation"
+        running = [run for run in self.runs if run[key] is not None and run[key].isRunning()]
+        for run in self.runs:
+            if len(running) >= self.concurrency:
+                return
+            if self.phase == "optimization" and run["status"] == "pending":
+                run["status"] = "running"
+                arguments = run["arguments"] + ["--threads", str(self.threads)]
+                run["handle"] = GroupWiseRegisterationProcess(self.executable, arguments,
+                                                              progressCallback=self.onRunProgress, finishedCallback=self.onRunFinished)
+                running.append(run)
+            elif self.phase == "evaluation" and run["status"] == "finished" and run["evaluation"] is None:
+                arguments = self.evaluationArguments + ["--coefficientDir", run["directory"], "--evaluate",
+                                                        "--samplingDegree", str(int(self.evaluationDegree)), "--threads", str(self.threads)]
+                run["evaluation"] = GroupWiseRegisterationProcess(self.executable, arguments, finishedCallback=self.onEvaluationFinished)
+                running.append(run)
+        if running:
+            return
+
+        if self.phase == "optimization":
+            finished = [run for run in self.runs if run["status"] == "finished"]
+            degrees = set([run["samplingDegree"] for run in finished])
+            if len(degrees) > 1:
+                # costs at different sampling resolutions are not comparable
+                self.phase = "evaluation"
+                self.evaluationDegree = max(degrees)
+                self.schedule()
+                return
+            for run in finished:
+                run["score"] = run["cost"]
+        self.finish()
+
+    ## Function runOf(handle)
+    def runOf(self, handle):
+        for run in self.runs:
+            if run["handle"] is handle or run["evaluation"] is handle:
+                return run
+        return None
+
+    ## Function costAt(handle, stage, evaluations)
+    # Minimum cost of a run in the given stage after at most the given number of evaluations (None if the stage was not reached)
+    def costAt(self, handle, stage, evaluations):
+        cost = None
+        for point in handle.series:
+            if point["evaluations"] > evaluations:
+                break
+            if point["stage"] == stage:
+                cost = point["mincost"]
+        return cost
+
+    def onRunProgress(self, handle):
+        run = self.runOf(handle)
+        point = handle.series[-1]
+        if self.pruneMargin > 0 and run["status"] == "running" and point["evaluations"] >= self.pruneAfter:
+            # best run of the same sampling degree at the same progress
+            best = None
+            for other in self.runs:
+                if other is run or other["handle"] is None or other["samplingDegree"] != run["samplingDegree"] or other["status"] == "failed":
+                    continue
+                cost = self.costAt(other["handle"], point["stage"], point["evaluations"])
+                if cost is not None and (best is None or cost < best):
+                    best = cost
+            if best is not None and point["mincost"] - best > self.pruneMargin * max(abs(best), 1e-12):
+                print "Multi-start: run %d pruned at stage %d, %d evaluations (%g vs %g)" % (run["index"], point["stage"], point["evaluations"], point["mincost"], best)
+                run["status"] = "pruned"
+                handle.cancel()
+        if self.progressCallback:
+            self.progressCallback(self)
+
+    def onRunFinished(self, handle):
+        run = self.runOf(handle)
+        run["time"] = time.time() - handle.startTime
+        run["evaluations"] = handle.series[-1]["evaluations"] if handle.series else 0
+        if run["status"] == "running":
+            if handle.succeeded() and handle.series:
+                run["status"] = "finished"
+                run["cost"] = handle.stages[-1]["mincost"] if handle.stages else handle.series[-1]["mincost"]
+            else:
+                run["status"] = "failed"
+        if run["status"] == "pruned" and handle.series:
+            run["cost"] = handle.series[-1]["mincost"]
+        if not self.cancelled:
+            self.schedule()
+
+    def onEvaluationFinished(self, handle):
+        run = self.runOf(handle)
+        for line in handle.lines:
+            match = self.evaluationLine.match(line)
+            # solutions with triangle flips are not valid
+            if match and int(match.group(2)) == 0:
+                run["score"] = float(match.group(1))
+        if not self.cancelled:
+            self.schedule()
+
+    ## Function finish()
+    # Copy the coefficients of the best run (if any) to outputDir, write the summary table, and remove the run directories
+    def finish(self):
+        if self.phase == "done":
+            return
+        self.phase = "done"
+        if not self.cancelled:
+            for run in self.runs:
+                if run["score"] is not None and (self.winner is None or run["score"] < self.winner["score"]):
+                    self.winner = run
+        if self.winner is not None:
+            for file in os.listdir(self.winner["directory"]):
+                if file.endswith(".coeff") and file not in self.fixedCoefficients:
+                    shutil.copy(os.path.join(self.winner["directory"], file), self.outputDir)
+        # written even without a winner: the status of each run tells why they all failed or were cancelled
+        summaryFile = open(os.path.join(self.outputDir, "multistart_summary.csv"), "w")
+        summaryFile.write(self.summary())
+        summaryFile.close()
+        shutil.rmtree(self.workDir, ignore_errors=True)
+        if self.finishedCallback:
+            self.finishedCallback(self)
+
+    ## Function summary()
+    # Table of all the runs (comma-separated)
+    def summary(self):
+        lines = ["run,seed,perturbation,samplingDegree,threads,status,evaluations,cost,score,time,winner"]
+        for run in self.runs:
+            values = [run["index"], run["seed"], run["perturbation"], run["samplingDegree"], self.threads, run["status"], run["evaluations"],
+                      run["cost"], run["score"], "%.1f" % run["time"] if run["time"] is not None else "", int(run is self.winner)]
+            lines.append(",".join(["" if value is None else str(value) for value in values]))
+        return "\n".join(lines) + "\n"
+
+
+class GroupWiseRegisterationTest(ScriptedLoadableModuleTest):
+    """
+        This is the test case for your scripted module.
+        Uses ScriptedLoadableModuleTest base class, available at:
+        https://github.com/Slicer/Slicer/blob/master/Base/Python/slicer/ScriptedLoadableModule.py
+        """
+
+    def setUp(self):
+        """ Do whatever is needed to reset the state - typically a scene clear will be enough.
+            """
+        slicer.mrmlScene.Clear(0)
+
+        ## Prepare data & paths
+        self.initialPath = "/Users/prisgdd/Documents/Projects/GroupWiseRegisterationExtension/dataTest/"
+        self.localPath = slicer.app.temporaryPath + "/dataTest"
+
+        if os.path.isdir(self.localPath):
+            shutil.rmtree(self.localPath)
+
+        shutil.copytree(self.initialPath, self.localPath)
+
+    def runTest(self):
+        """Run as few or as many tests as needed here.
+            """
+        self.delayDisplay("Starting the test")
+        self.setUp()
+
+        self.delayDisplay("Test 1")
+        self.assertTrue(self.test_GroupWiseRegisteration1())
+        self.delayDisplay("Test 2 - All properties")
+        self.assertTrue(self.test_GroupWiseRegisteration2())
+        self.delayDisplay("Test 3 - Without landmark")
+        self.assertTrue(self.test_GroupWiseRegisteration3())
+        self.delayDisplay("Test 4 - No properties or weights specified")
+        self.assertTrue(self.test_GroupWiseRegisteration4())
+        self.delayDisplay("Test 5 - # of properties different from # of weights")
+        self.assertTrue(self.test_GroupWiseRegisteration5())
+        self.delayDisplay("Test 6 - No specified values for degree and # of iteration")
+        self.assertTrue(self.test_GroupWiseRegisteration6())
+
+        self.delayDisplay('All test passed!')
+
+
+    def test_GroupWiseRegisteration1(self):
+        self.delayDisplay('Start test 1')
+
+        ## --- Prepare parameters --- ##
+        meshDir = self.localPath + "/Mesh"
+        propertiesDir = self.localPath + "/attributes"
+        landmarkDir = self.localPath + "/landmark"
+        sphereDir = self.localPath + "/sphere"
+        degree = 5
+        maxIter = 1000
+        properties = "C.txt,S.txt"
+        propertiesValues = "0.5,0.25"
+        outputVerif1 = self.localPath + "/outputVerif/outputVerif1"
+        outputDir1 = self.localPath + "/outputTest/outputTest1"
+
+        if not os.path.exists(outputDir1):
+            os.mkdir(outputDir1)
+
+        ## --- Call the CLI --- ##
+        # logic = GroupWiseRegisterationLogic()
+        # logic.runGroupWiseRegisteration(modelsDir=meshDir, propertyDir=propertiesDir,
+        #                 sphereDir=sphereDir, outputDir=outputDir1, properties=properties,
+        #                 propValues=propertiesValues, landmark=landmarkDir, degree=degree, maxIter=maxIter)
+
+        ## --- Compare results --- ##
+        if self.outputcomparison(outputDir1, outputVerif1, meshDir):
+            self.delayDisplay('Test 1 passed!')
+            return True
+        else:
+            return False
+
+    # Test 2 - All properties
+    def test_GroupWiseRegisteration2(self):
+        self.delayDisplay('Start test 2')
+
+        ## --- Prepare parameters --- ##
+        meshDir = self.localPath + "/Mesh"
+        propertiesDir = self.localPath + "/attributes"
+        landmarkDir = self.localPath + "/landmark"
+        sphereDir = self.localPath + "/sphere"
+        degree = 5
+        maxIter = 5000
+        properties = "C.txt,H.txt,Kappa1.txt,S.txt,K.txt,Kappa2.txt,DPhi.txt,DTheta.txt"
+        propertiesValues = "0.2,1.0,0.3,0.25,0.3,0.8,0.1,0.4"
+        outputDir2 = self.localPath + "/outputTest/outputTest2"
+        outputVerif2 = self.localPath + "/outputVerif/outputVerif2"
+
+        if not os.path.exists(outputDir2):
+            os.mkdir(outputDir2)
+
+        ## --- Call the CLI --- ##
+        # logic = GroupWiseRegisterationLogic()
+        # logic.runGroupWiseRegisteration(modelsDir=meshDir, propertyDir=propertiesDir,
+        #                 sphereDir=sphereDir, outputDir=outputDir2, properties=properties,
+        #                 propValues=propertiesValues, landmark=landmarkDir, degree=degree, maxIter=maxIter)
+
+        ## --- Compare results --- ##
+        if self.outputcomparison(outputDir2, outputVerif2, meshDir):
+            self.delayDisplay('Test 2 passed!')
+            return True
+        else:
+            return False
+
+    # Test 3 - Without landmark
+    def test_GroupWiseRegisteration3(self):
+        self.delayDisplay('Start test 3')
+
+        ## --- Prepare parameters --- ##
+        meshDir = self.localPath + "/Mesh"
+        propertiesDir = self.localPath + "/attributes"
+        sphereDir = self.localPath + "/sphere"
+        degree = 5
+        maxIter = 1000
+        properties = "C.txt,S.txt"
+        propertiesValues = "0.5,0.25"
+        outputDir3 = self.localPath + "/outputTest/outputTest3"
+        outputVerif3 = self.localPath + "/outputVerif/outputVerif3"
+
+        if not os.path.exists(outputDir3):
+            os.mkdir(outputDir3)
+
+        ## --- Call the CLI --- ##
+        # logic = GroupWiseRegisterationLogic()
+        # logic.runGroupWiseRegisteration(modelsDir=meshDir, propertyDir=propertiesDir,
+        #                 sphereDir=sphereDir, outputDir=outputDir3, properties=properties,
+        #                 propValues=propertiesValues, degree=degree, maxIter=maxIter)
+
+        ## --- Compare results --- ##
+        if self.outputcomparison(outputDir3, outputVerif3, meshDir):
+            self.delayDisplay('Test 3 passed!')
+            return True
+        else:
+            return False
+
+    # Test 4 - No properties or weights specified"
+    def test_GroupWiseRegisteration4(self):
+        self.delayDisplay('Start test 4')
+
+        ## --- Prepare parameters --- ##
+        meshDir = self.localPath + "/Mesh"
+        propertiesDir = self.localPath + "/attributes"
+        landmarkDir = self.localPath + "/landmark"
+        sphereDir = self.localPath + "/sphere"
+        degree = 18
+        maxIter = 1000
+        outputDir4 = self.localPath + "/outputTest/outputTest4"
+        outputVerif4 = self.localPath + "/outputVerif/outputVerif4"
+
+        if not os.path.exists(outputDir4):
+            os.mkdir(outputDir4)
+
+        ## --- Call the CLI --- ##
+        # logic = GroupWiseRegisterationLogic()
+        # logic.runGroupWiseRegisteration(modelsDir=meshDir, propertyDir=propertiesDir,
+        #                 sphereDir=sphereDir, outputDir=outputDir4, landmark=landmarkDir, degree=degree, maxIter=maxIter)
+
+        ## --- Compare results --- ##
+        if self.outputcomparison(outputDir4, outputVerif4, meshDir):
+            self.delayDisplay('Test 4 passed!')
+            return True
+        else:
+            return False
+
+    # Test 5 - # of properties different from # of weights
+    def test_GroupWiseRegisteration5(self):
+        self.delayDisplay('Start test 5')
+
+        ## --- Prepare parameters --- ##
+        meshDir = self.localPath + "/Mesh"
+        propertiesDir = self.localPath + "/attributes"
+        sphereDir = self.localPath + "/sphere"
+        landmarkDir = self.localPath + "/landmark"
+        degree = 5
+        maxIter = 1000
+        properties = "DPhi.txt,C.txt,S.txt,Kappa1.txt"
+        propertiesValues = "0.1,0.3"
+        outputDir5 = self.localPath + "/outputTest/outputTest5"
+        outputVerif5 = self.localPath + "/outputVerif/outputVerif5"
+
+        if not os.path.exists(outputDir5):
+            os.mkdir(outputDir5)
+
+        ## --- Call the CLI --- ##
+        # logic = GroupWiseRegisterationLogic()
+        # logic.runGroupWiseRegisteration(modelsDir=meshDir, propertyDir=propertiesDir, properties=properties,
+        #                 propValues=propertiesValues,
+        #                 sphereDir=sphereDir, outputDir=outputDir5, landmark=landmarkDir, degree=degree, maxIter=maxIter)
+
+        ## --- Compare results --- ##
+        if self.outputcomparison(outputDir5, outputVerif5, meshDir):
+            self.delayDisplay('Test 5 passed!')
+            return True
+        else:
+            return False
+
+    # Test 6 - No specified values for degree and # of iteration
+    def test_GroupWiseRegisteration6(self):
+        self.delayDisplay('Start test 6')
+
+        ## --- Prepare parameters --- ##
+        meshDir = self.localPath + "/Mesh"
+        propertiesDir = self.localPath + "/attributes"
+        sphereDir = self.localPath + "/sphere"
+        landmarkDir = self.localPath + "/landmark"
+        properties = "C.txt,S.txt"
+        propertiesValues = "0.5,0.25"
+        outputDir6 = self.localPath + "/outputTest/outputTest6"
+        outputVerif6 = self.localPath + "/outputVerif/outputVerif6"
+
+        if not os.path.exists(outputDir6):
+            os.mkdir(outputDir6)
+
+        ## --- Call the CLI --- ##
+        # logic = GroupWiseRegisterationLogic()
+        # logic.runGroupWiseRegisteration(modelsDir=meshDir, propertyDir=propertiesDir,
+        #                 sphereDir=sphereDir, outputDir=outputDir6, properties=properties,
+        #                 propValues=propertiesValues, landmark=landmarkDir)
+
+        ## --- Compare results --- ##
+        if self.outputcomparison(outputDir6, outputVerif6, meshDir):
+            self.delayDisplay('Test 6 passed!')
+            return True
+        else:
+            return False
+
+    ## Function outputComparison(...)
+    # Compare the expected outputs (outputVerif) with those obtained (outputDir)
+    def outputcomparison(self, outputDir, outputVerif, inputDir):
+        listFilesOut = os.listdir(outputDir)
+        listFilesVerif = os.listdir(outputVerif)
+
+        ## Delete .DS_Store if there is one - for MacOS
+        if listFilesOut.count(".DS_Store"):
+            listFilesOut.remove(".DS_Store")
+        if listFilesVerif.count(".DS_Store"):
+            listFilesVerif.remove(".DS_Store")
+
+        ## Check number of outputs
+        nbFilesOut = len(listFilesOut)
+        nbFilesIn = len(os.listdir(inputDir))
+        if nbFilesOut != nbFilesIn:
+            print "Wrong number of outputs"
+            return False
+
+        ## Check files names
+        listFilesOutNames = list()
+        listFilesVerifNames = list()
+        for i in range(0, len(listFilesOut)):
+            listFilesOutNames.append('.'.join(listFilesOut[i].split('.')[:-1]))
+            listFilesVerifNames.append('.'.join(listFilesVerif[i].split('.')[:-1]))
+
+            if listFilesOutNames[i] != listFilesVerifNames[i]:
+                print "Erreur de noms"
+                return False
+
+        ## Compare files contents
+        taille = len(listFilesOut)
+        for i in range(0, taille):
+            fTest = open(outputDir + "/" + listFilesOut[i], "r")
+            contenuTest = fTest.read()
+
+            fVerif = open(outputVerif + "/" + listFilesVerif[i], "r")
+            contenuVerif = fVerif.read()
+
+            if contenuTest != contenuVerif:
+                print "Wrong contents"
+                return False
+
+        return True
+
+
+#
+# Batch mode
+#
+
+## Environment variables of the job-array index of the usual schedulers, with the index of their first task
+arrayTaskVariables = [("SLURM_ARRAY_TASK_ID", 0), ("PBS_ARRAYID", 0), ("SGE_TASK_ID", 1), ("LSB_JOBINDEX", 1)]
+
+## Function loadCohort(filename)
+#   Jobs of a cohort spec file (JSON): either a list of jobs, or {"defaults": {...}, "jobs": [...]} with the arguments shared by all the jobs.
+#   A job is a dictionary of keyword arguments of GroupWiseRegisterationLogic.runGroupWiseRegisteration (modelsDir, propertyDir, sphereDir,
+#   outputDir, degree, ...), or of runMultiStart if it has nRuns > 1
+def loadCohort(filename):
+    import json
+    specFile = open(filename)
+    spec = json.load(specFile)
+    specFile.close()
+    if isinstance(spec, list):
+        spec = {"jobs": spec}
+    jobs = list()
+    for job in spec["jobs"]:
+        arguments = dict(spec.get("defaults", {}))
+        arguments.update(job)
+        jobs.append(dict((str(key), value) for key, value in arguments.items()))
+    return jobs
+
+## Function arrayTask()
+#   Index of the current task of a scheduler job array (None: not in a job array)
+def arrayTask():
+    for variable, first in arrayTaskVariables:
+        value = os.environ.get(variable, "")
+        if value.isdigit():
+            return int(value) - first
+    return None
+
+## Options of runMultiStart that a single registration does not have
+multiStartOptions = ["nRuns", "perturbation", "seed", "coreBudget", "samplingDegrees", "pruneMargin", "pruneAfter"]
+
+## Function runJob(logic, job)
+#   One registration (a multi-start one if nRuns > 1); the multi-start options of a single registration are ignored
+def runJob(logic, job):
+    job = dict(job)
+    if job.get("nRuns", 1) > 1:
+        return logic.runMultiStart(**job)
+    ignored = [name for name in multiStartOptions[1:] if name in job]
+    if ignored:
+        print "Multi-start options ignored without nRuns > 1: " + ", ".join(ignored)
+    for name in multiStartOptions:
+        job.pop(name, None)
+    return logic.runGroupWiseRegisteration(**job)
+
+## Function main(argv)
+#   Command-line entry point: one registration from the arguments, or the jobs of a cohort spec file
+#   (a single one in a job array: --task, or the array index of the scheduler). Returns the exit code.
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(description="Group-wise registration of spherical maps (GROUPS) without the Slicer GUI")
+    parser.add_argument("--cohort", help="cohort spec file (JSON, see loadCohort)")
+    parser.add_argument("--task", type=int, help="index of the cohort job to run (default: the job-array index of the scheduler, or every job)")
+    parser.add_argument("--list", action="store_true", help="print the number of cohort jobs and exit")
+    parser.add_argument("--groups", help="GROUPS executable")
+    parser.add_argument("--modelsDir", help="input models directory")
+    parser.add_argument("--propertyDir", help="property directory")
+    parser.add_argument("--sphereDir", help="sphere directory")
+    parser.add_argument("--outputDir", help="output directory")
+    parser.add_argument("--procalign", action="store_true", default=None, help="procrustes-aligned models (_surfSPHARM_procalign.vtk)")
+    parser.add_argument("--properties", help="comma-separated property names")
+    parser.add_argument("--propValues", help="comma-separated property weights")
+    parser.add_argument("--degree", type=int, help="degree of the deformation field")
+    parser.add_argument("--maxIter", type=int, help="maximum number of iterations")
+    parser.add_argument("--stopWindow", type=int, help="iterations of the sliding window for the early stop of each stage")
+    parser.add_argument("--stopTolerance", type=float, help="minimum relative decrease of the best cost over the window")
+    parser.add_argument("--adaptiveDegree", action="store_true", default=None, help="raise the degree faster after stages without gain")
+    parser.add_argument("--degreeGain", type=float, help="minimum relative gain of a stage for the adaptive degree schedule")
+    parser.add_argument("--nRuns", type=int, help="multi-start registration with this number of runs")
+    parser.add_argument("--perturbation", type=float, help="multi-start: standard deviation of the perturbation of the initial coefficients")
+    parser.add_argument("--seed", type=int, help="multi-start: seed of the first perturbed run")
+    parser.add_argument("--coreBudget", type=int, help="multi-start: total number of cores (0: all)")
+    parser.add_argument("--coefficientDir", help="initial coefficients")
+    parser.add_argument("--addSubjects", action="store_true", default=None, help="register only the subjects without a coefficient file in coefficientDir")
+    args = parser.parse_args(argv)
+
+    if args.cohort:
+        jobs = loadCohort(args.cohort)
+        if args.list:
+            print len(jobs)
+            return 0
+        task = args.task if args.task is not None else arrayTask()
+        if task is not None:
+            if task < 0 or task >= len(jobs):
+                print "Task " + str(task) + " is out of the " + str(len(jobs)) + " jobs of " + args.cohort
+                return 1
+            jobs = [jobs[task]]
+        # a misspelled argument is an error of the spec file, not a failed registration
+        import inspect
+        known = set(inspect.getargspec(GroupWiseRegisterationLogic.runMultiStart).args[1:])
+        for job in jobs:
+            unknown = sorted(set(job) - known)
+            if unknown:
+                parser.error("unknown job arguments in " + args.cohort + ": " + ", ".join(unknown))
+    else:
+        names = ["modelsDir", "propertyDir", "sphereDir", "outputDir"]
+        if [name for name in names if getattr(args, name) is None]:
+            parser.error("--cohort or all of --" + ", --".join(names) + " are required")
+        options = ["procalign", "properties", "propValues", "degree", "maxIter", "stopWindow", "stopTolerance", "adaptiveDegree", "degreeGain",
+                   "coefficientDir", "addSubjects",
+                   "nRuns", "perturbation", "seed", "coreBudget"]
+        job = dict((name, getattr(args, name)) for name in names + options if getattr(args, name) is not None)
+        jobs = [job]
+
+    logic = GroupWiseRegisterationLogic()
+    logic.executable = args.groups
+
+    nFailed = 0
+    for i in range(0, len(jobs)):
+        print "--- Job " + str(i + 1) + "/" + str(len(jobs)) + " ---"
+        try:
+            success = runJob(logic, jobs[i])
+        except OSError, e:
+            print "Job failed " + str(jobs[i]) + ": " + str(e)
+            success = False
+        if not success:
+            nFailed += 1
+    return 0 if nFailed == 0 else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,230 @@
+import os, sys
+import json, time, stat
+
+#
+# CohortManifest
+#
+
+class CohortManifest(object):
+    """Index of the files of a cohort (see groupsCohort and rigidCohort), built from one scan of each directory.
+  The listing of a directory (names, sizes and modification times) is cached on disk and reused while the modification time of the
+  directory is unchanged, i.e. until a file is added, removed or renamed in it: only the changed directories are scanned again.
+  A file rewritten in place keeps its cached size and time until then (see refresh). The subjects are matched through dictionaries
+  keyed by the subject id, and every mismatch is reported in a single pass.
+  """
+
+    ## Cache shared by both modules, per user (the listings expose the file names of the user's cohorts)
+    defaultCacheFile = os.path.join(os.path.expanduser("~"), ".GroupsCohortManifest.json")
+    ## Listings of directories modified less than racyInterval seconds before their scan are not reused (coarse timestamps)
+    racyInterval = 2.0
+    version = 1
+
+    def __init__(self, cacheFile=defaultCacheFile):
+        self.cacheFile = cacheFile      # None: no cache on disk
+        self.directories = dict()       # absolute path: dict(mtime, scanned, files: name -> [size, mtime])
+        self.modified = False
+        if cacheFile and os.path.isfile(cacheFile):
+            try:
+                cacheFileObject = open(cacheFile)
+                try:
+                    cache = json.load(cacheFileObject)
+                finally:
+                    cacheFileObject.close()
+                if cache.get("version") == self.version:
+                    # json gives unicode strings: the paths are encoded back as listed by os.listdir (byte strings)
+                    encoding = sys.getfilesystemencoding() or "utf-8"
+                    for directory, cached in cache["directories"].items():
+                        cached["files"] = dict((name.encode(encoding), info) for name, info in cached["files"].items())
+                        self.directories[directory.encode(encoding)] = cached
+            except (IOError, OSError), e:
+                print "Cohort manifest: cannot read the cache " + cacheFile + " (" + str(e) + ")"
+                self.directories = dict()
+            except (ValueError, KeyError, AttributeError, TypeError):
+                print "Cohort manifest: invalid cache " + cacheFile + " (rebuilt)"
+                self.directories = dict()
+
+    ## Function listing(directory)
+    #   Regular files of a directory (hidden ones excluded, e.g. .DS_Store): name -> [size, mtime]
+    def listing(self, directory):
+        directory = os.path.abspath(directory)
+        if not os.path.isdir(directory):
+            return dict()
+        mtime = os.stat(directory).st_mtime
+        cached = self.directories.get(directory)
+        if cached is not None and cached["mtime"] == mtime and cached["scanned"] - mtime >= self.racyInterval:
+            return cached["files"]
+
+        files = dict()
+        for name in os.listdir(directory):
+            if name.startswith("."):
+                continue
+            try:
+                fileStat = os.stat(os.path.join(directory, name))
+            except OSError:
+                continue
+            if stat.S_ISREG(fileStat.st_mode):
+                files[name] = [fileStat.st_size, fileStat.st_mtime]
+        self.directories[directory] = {"mtime": mtime, "scanned": time.time(), "files": files}
+        self.modified = True
+        return files
+
+    ## Function refresh(directory=None)
+    #   Scan a directory (all of them if None) again at the next query
+    def refresh(self, directory=None):
+        if directory is None:
+            self.directories = dict()
+        else:
+            self.directories.pop(os.path.abspath(directory), None)
+        self.modified = True
+
+    ## Function save()
+    #   Write the cache if it changed (replaced at once: concurrent jobs may share it), without the directories that no longer exist.
+    #   A cache that cannot be written is only reported: the next run scans the directories again
+    def save(self):
+        for directory in self.directories.keys():
+            if not os.path.isdir(directory):
+                del self.directories[directory]
+                self.modified = True
+        if not self.cacheFile or not self.modified:
+            return
+        temporaryFile = "%s.%d.tmp" % (self.cacheFile, os.getpid())
+        try:
+            cacheFileObject = open(temporaryFile, "w")
+            try:
+                json.dump({"version": self.version, "directories": self.directories}, cacheFileObject)
+            finally:
+                cacheFileObject.close()
+            if os.path.exists(self.cacheFile) and sys.platform == "win32":
+                os.remove(self.cacheFile)
+            os.rename(temporaryFile, self.cacheFile)
+        except (IOError, OSError), e:
+            print "Cohort manifest: cannot write the cache " + self.cacheFile + " (" + str(e) + ")"
+            try:
+                os.remove(temporaryFile)
+            except OSError:
+                pass
+            return
+        self.modified = False
+
+    ## Function groupsCohort(modelsDir, propertyDir, sphereDir, outputDir=None, procalign=False, nProperties=6)
+    #   Inputs of GROUPS for each subject:
+    #       Mesh: [id]_surfSPHARM.vtk ([id]_surfSPHARM_procalign.vtk if procalign)
+    #       Properties: nProperties x [id]_[*]_[property].txt
+    #       Sphere: [id]_[*]_surf_para.vtk or [id]_[*].vtk
+    #   Returns (subjects, errors): subjects sorted by id, dict(id, mesh, properties, sphere, output, size, mtime) where output is the
+    #   coefficient file written by GROUPS (None if outputDir is not given), size the total size of the inputs and mtime the latest one
+    def groupsCohort(self, modelsDir, propertyDir, sphereDir, outputDir=None, procalign=False, nProperties=6):
+        errors = list()
+        subjects = dict()
+        modelsExtension = "_surfSPHARM_procalign.vtk" if procalign else "_surfSPHARM.vtk"
+        models = self.listing(modelsDir)
+        for name in sorted(models):
+            if not name.endswith(modelsExtension):
+                errors.append("Models. Not a " + modelsExtension + " file: " + name)
+                continue
+            subject = {"id": name[:-len(modelsExtension)], "properties": list(), "sphere": None, "output": None, "size": 0, "mtime": 0}
+            subject["mesh"] = os.path.join(modelsDir, name)
+            self.addFile(subject, models[name])
+            subjects[subject["id"]] = subject
+        if not subjects and not errors:
+            errors.append("Models. No model in " + modelsDir)
+
+        properties = self.listing(propertyDir)
+        for name in sorted(properties):
+            subject = subjects.get('_'.join(name.split('_')[:-2]))
+            if subject is not None:
+                subject["properties"].append(os.path.join(propertyDir, name))
+                self.addFile(subject, properties[name])
+
+        suffix = "_surf_para.vtk"
+        duplicates = dict()
+        spheres = self.listing(sphereDir)
+        for name in sorted(spheres):
+            if name.endswith(suffix):
+                subject = subjects.get('_'.join(name.split('_')[:-2]))
+            else:
+                subject = subjects.get('_'.join(name.split('_')[:-1]))
+            if subject is None:
+                continue
+            if subject["sphere"] is not None:
+                duplicates.setdefault(subject["id"], [os.path.basename(subject["sphere"])]).append(name)
+                continue
+            subject["sphere"] = os.path.join(sphereDir, name)
+            self.addFile(subject, spheres[name])
+            if outputDir is not None:
+                subject["output"] = os.path.join(outputDir, self.coefficientName(name))
+
+        for key in sorted(subjects):
+            subject = subjects[key]
+            if len(subject["properties"]) != nProperties:
+                errors.append("Properties. " + str(len(subject["properties"])) + " property files for " + key + " (" + str(nProperties) + " expected)")
+            if subject["sphere"] is None:
+                errors.append("Sphere. No sphere for " + key)
+            elif key in duplicates:
+                errors.append("Sphere. Several spheres for " + key + ": " + ", ".join(duplicates[key]))
+        return [subjects[key] for key in sorted(subjects)], errors
+
+    ## Function rigidCohort(modelsDir, fiducialDir=None, outputsphereDir=None, outputsurfaceDir=None)
+    #   Inputs and outputs of RigidAlignment and SurfRemesh for each subject:
+    #       Mesh: [id].vtk
+    #       Fiducials: [id].[extension] (not checked if fiducialDir is None)
+    #       Rotated sphere: [id]_rotSphere.vtk (None if outputsphereDir is not given or the file does not exist yet)
+    #       Aligned surface: [id]_aligned.vtk (None if outputsurfaceDir is not given)
+    #   Returns (subjects, errors): subjects sorted by id, dict(id, mesh, fiducial, sphere, output, size, mtime)
+    def rigidCohort(self, modelsDir, fiducialDir=None, outputsphereDir=None, outputsurfaceDir=None):
+        errors = list()
+        subjects = dict()
+        models = self.listing(modelsDir)
+        for name in sorted(models):
+            key, extension = os.path.splitext(name)
+            if extension != ".vtk":
+                errors.append("Models. Not a .vtk file: " + name)
+                continue
+            subject = {"id": key, "fiducial": None, "sphere": None, "output": None, "size": 0, "mtime": 0}
+            subject["mesh"] = os.path.join(modelsDir, name)
+            self.addFile(subject, models[name])
+            if outputsurfaceDir is not None:
+                subject["output"] = os.path.join(outputsurfaceDir, key + "_aligned.vtk")
+            subjects[key] = subject
+        if not subjects and not errors:
+            errors.append("Models. No model in " + modelsDir)
+
+        if fiducialDir is not None:
+            fiducials = self.listing(fiducialDir)
+            for name in sorted(fiducials):
+                subject = subjects.get(os.path.splitext(name)[0])
+                if subject is None:
+                    errors.append("Fiducials. No model for " + name)
+                elif subject["fiducial"] is not None:
+                    errors.append("Fiducials. Several fiducial files for " + subject["id"] + ": " + os.path.basename(subject["fiducial"]) + ", " + name)
+                else:
+                    subject["fiducial"] = os.path.join(fiducialDir, name)
+                    self.addFile(subject, fiducials[name])
+
+        spheres = self.listing(outputsphereDir) if outputsphereDir is not None else dict()
+        for key in sorted(subjects):
+            subject = subjects[key]
+            if key + "_rotSphere.vtk" in spheres:
+                subject["sphere"] = os.path.join(outputsphereDir, key + "_rotSphere.vtk")
+            if fiducialDir is not None and subject["fiducial"] is None:
+                errors.append("Fiducials. No fiducial file for " + key)
+        return [subjects[key] for key in sorted(subjects)], errors
+
+    ## Function coefficientName(sphereName)
+    #   Coefficient file written by GROUPS for a sphere (subject name of the GROUPS CLI + .coeff)
+    def coefficientName(self, sphereName):
+        for suffix in ["_pp_para.vtk", "_pp_surf_para.vtk"]:
+            if sphereName.endswith(suffix):
+                sphereName = sphereName[:-len(suffix)]
+                break
+        else:
+            sphereName = os.path.splitext(sphereName)[0]
+        if "." in sphereName:
+            sphereName = sphereName[:sphereName.rfind(".")]
+        return sphereName + ".coeff"
+
+    ## Function addFile(subject, info)
+    #   Add the [size, mtime] of an input file to the total size and the latest modification time of a subject
+    def addFile(self, subject, info):
+        subject["size"] += info[0]
+        subject["mtime"] = max(subject["mtime"], info[1])
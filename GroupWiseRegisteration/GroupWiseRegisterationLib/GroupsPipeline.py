@@ -0,0 +1,282 @@
+import os, sys
+import json, hashlib
+
+# The scripted modules are on the Python path in Slicer (RigidAlignment and GroupWiseRegisteration directories on PYTHONPATH in the batch mode)
+import RigidAlignment
+import GroupWiseRegisteration
+
+#
+# GroupsPipeline
+#
+
+class GroupsPipeline(object):
+    """Make-style scheduler of RigidAlignment -> SurfRemesh -> GROUPS over the logic classes of both modules.
+  Each stage output is recorded in a state file (JSON) with the content hashes (md5) of its inputs and outputs and its parameters;
+  a stage runs again only if one of them changed, or if it never succeeded:
+      rigid: RigidAlignment of the cohort (RigidAlignmentLogic.runRigidWrapper), one stage for all the subjects
+      remesh/[name]: SurfRemesh and the color map of one subject, run concurrently for the stale subjects (maxWorkers)
+      groups: GROUPS registration (GroupWiseRegisterationLogic.runGroupWiseRegisteration). If the previous population is unchanged and only
+          new subjects appeared, they are registered against it (GROUPS --addSubjects) unless addSubjects is False
+  Since the hashes are computed on the contents, a stage that rewrites identical outputs does not invalidate the next ones (e.g. the
+  spheres of the unchanged subjects after a new rigid alignment). The hashes are cached by size and modification time.
+  ShapePopulationViewer is only launched if inspect is True, without waiting for it.
+  """
+
+    def __init__(self, rigid=None, groups=None, stateFile=None, maxWorkers=0, addSubjects=True, inspect=False):
+        self.rigid = rigid              # keyword arguments of RigidAlignmentLogic.runRigidAlignment (modelsDir, fiducialDir, sphereDir, outputsphereDir, outputsurfaceDir)
+        self.groups = groups            # keyword arguments of GroupWiseRegisterationLogic.runGroupWiseRegisteration (None: stage skipped)
+        self.stateFile = stateFile      # None: nothing is recorded (every stage runs)
+        self.maxWorkers = maxWorkers    # concurrent SurfRemesh jobs (0: number of cores)
+        self.addSubjects = addSubjects
+        self.inspect = inspect
+
+        self.rigidLogic = RigidAlignment.RigidAlignmentLogic()
+        self.groupsLogic = GroupWiseRegisteration.GroupWiseRegisterationLogic()
+        self.state = {"hashes": {}, "stages": {}}
+        if stateFile and os.path.isfile(stateFile):
+            stateFileObject = open(stateFile)
+            self.state = json.load(stateFileObject)
+            stateFileObject.close()
+        self.report = list()            # (stage, action, reason) of the last run: action is run, skipped, failed or planned
+
+    ## Function run(force=False, dryRun=False)
+    #   Run the stale stages (all of them if force); with dryRun, only report what would run (see self.report).
+    #   Returns False if a stage failed (the next ones are not run)
+    def run(self, force=False, dryRun=False):
+        self.force = force
+        self.dryRun = dryRun
+        self.report = list()
+        if self.rigid:
+            if self.inspect and not dryRun:
+                self.rigidLogic.launchViewer(self.rigid["modelsDir"])
+            if not self.runRigid() or not self.runRemesh():
+                return False
+            if self.inspect and not dryRun:
+                self.rigidLogic.launchViewer(self.rigid["outputsurfaceDir"])
+        if self.groups:
+            return self.runGroups()
+        return True
+
+    ## Function runRigid()
+    def runRigid(self):
+        rigid = self.rigid
+        inputs = self.files(rigid["modelsDir"]) + self.files(rigid["fiducialDir"]) + [rigid["sphereDir"]]
+        reason = self.staleReason("rigid", {}, inputs)
+        if reason is None:
+            return self.log("rigid", "skipped", "up to date")
+        if self.dryRun:
+            return self.log("rigid", "planned", reason)
+
+        if not self.rigidLogic.runRigidWrapper(rigid["modelsDir"], rigid["fiducialDir"], rigid["sphereDir"], rigid["outputsphereDir"]):
+            self.forget("rigid")
+            return self.log("rigid", "failed", reason)
+        outputs = [path for path in self.files(rigid["outputsphereDir"]) if path.endswith("_rotSphere.vtk")]
+        self.record("rigid", {}, inputs, outputs)
+        return self.log("rigid", "run", reason)
+
+    ## Function runRemesh()
+    #   SurfRemesh of the stale subjects (concurrently); the records of the subjects that are gone are removed
+    def runRemesh(self):
+        rigid = self.rigid
+        if self.dryRun and not os.path.isdir(rigid["outputsphereDir"]):
+            return self.log("remesh", "planned", "no rigid alignment yet")
+        jobs = self.rigidLogic.surfRemeshJobs(rigid["modelsDir"], rigid["sphereDir"], rigid["outputsphereDir"], rigid["outputsurfaceDir"],
+                                              rigid.get("outputFormat", "ascii"))
+        parameters = dict((name, rigid[name]) for name in ["outputFormat"] if name in rigid)
+        names = set(["remesh/" + job["name"] for job in jobs])
+        for key in self.state["stages"].keys():
+            if key.startswith("remesh/") and key not in names:
+                self.forget(key)
+
+        staleJobs = dict()
+        for job in jobs:
+            key = "remesh/" + job["name"]
+            reason = self.staleReason(key, parameters, [job["input"], job["tempModel"], job["ref"]])
+            if reason is None:
+                self.log(key, "skipped", "up to date")
+            elif self.dryRun:
+                self.log(key, "planned", reason)
+            else:
+                staleJobs[job["name"]] = (job, reason)
+        if not staleJobs:
+            return True
+
+        nFailed = [0]
+        def onSubjectDone(nDone, nJobs, name, success):
+            job, reason = staleJobs[name]
+            key = "remesh/" + name
+            if success:
+                self.record(key, parameters, [job["input"], job["tempModel"], job["ref"]], [job["output"]])
+                self.log(key, "run", reason)
+            else:
+                self.forget(key)
+                self.log(key, "failed", reason)
+                nFailed[0] += 1
+        self.rigidLogic.runSurfRemeshBatch([job for job, reason in staleJobs.values()], maxWorkers=self.maxWorkers, progressCallback=onSubjectDone)
+        return nFailed[0] == 0
+
+    ## Function runGroups()
+    def runGroups(self):
+        groups = dict(self.groups)
+        inputs = self.files(groups["modelsDir"]) + self.files(groups["propertyDir"]) + self.files(groups["sphereDir"])
+        if groups.get("coefficientDir"):
+            inputs += self.files(groups["coefficientDir"])
+        reason = self.staleReason("groups", groups, inputs)
+        if reason is None:
+            return self.log("groups", "skipped", "up to date")
+
+        # only new subjects: the previous population is kept (GROUPS --addSubjects with its coefficients)
+        record = self.state["stages"].get("groups")
+        if self.addSubjects and not self.force and record is not None and record["parameters"] == groups and not groups.get("coefficientDir") \
+                and self.intact(record["inputs"]) and self.intact(record["outputs"]):
+            reason = "new subjects"
+            groups["coefficientDir"] = groups["outputDir"]
+            groups["addSubjects"] = True
+        if self.dryRun:
+            return self.log("groups", "planned", reason)
+
+        if not self.groupsLogic.runGroupWiseRegisteration(**groups):
+            self.forget("groups")
+            return self.log("groups", "failed", reason)
+        outputs = [path for path in self.files(groups["outputDir"]) if path.endswith(".coeff")]
+        self.record("groups", self.groups, inputs, outputs)
+        return self.log("groups", "run", reason)
+
+    ## Function staleReason(key, parameters, inputs)
+    #   Why a stage must run (None: up to date)
+    def staleReason(self, key, parameters, inputs):
+        if self.force:
+            return "forced"
+        record = self.state["stages"].get(key)
+        if record is None:
+            return "never run"
+        if record["parameters"] != parameters:
+            return "parameters changed"
+        paths = set([os.path.abspath(path) for path in inputs])
+        changed = sorted(paths.symmetric_difference(record["inputs"].keys()))
+        if changed:
+            return ("new input " if changed[0] in paths else "input removed ") + changed[0]
+        for path in sorted(paths):
+            if self.fileHash(path) != record["inputs"][path]:
+                return "input changed " + path
+        for path in sorted(record["outputs"].keys()):
+            if self.fileHash(path) != record["outputs"][path]:
+                return "output changed or missing " + path
+        return None
+
+    ## Function intact(hashes)
+    #   True if the files of a record still have the same contents
+    def intact(self, hashes):
+        for path in hashes:
+            if self.fileHash(path) != hashes[path]:
+                return False
+        return True
+
+    ## Function record(key, parameters, inputs, outputs)
+    #   Store a succeeded stage and save the state (an interrupted pipeline keeps its finished stages)
+    def record(self, key, parameters, inputs, outputs):
+        stage = {}
+        stage["parameters"] = parameters
+        stage["inputs"] = dict((os.path.abspath(path), self.fileHash(path)) for path in inputs)
+        stage["outputs"] = dict((os.path.abspath(path), self.fileHash(path)) for path in outputs)
+        self.state["stages"][key] = stage
+        self.save()
+
+    ## Function forget(key)
+    def forget(self, key):
+        if self.state["stages"].pop(key, None) is not None:
+            self.save()
+
+    ## Function save()
+    #   Write the state file (replaced at once), keeping only the hashes of existing files referenced by a recorded stage
+    #   (e.g. the legacy aligned surfaces after a switch to .vtp, or the files of removed subjects, are dropped)
+    def save(self):
+        if not self.stateFile:
+            return
+        referenced = set()
+        for stage in self.state["stages"].values():
+            referenced.update(stage["inputs"])
+            referenced.update(stage["outputs"])
+        for path in self.state["hashes"].keys():
+            if path not in referenced or not os.path.isfile(path):
+                del self.state["hashes"][path]
+        temporaryFile = self.stateFile + ".tmp"
+        stateFileObject = open(temporaryFile, "w")
+        json.dump(self.state, stateFileObject, indent=1, sort_keys=True)
+        stateFileObject.close()
+        if os.path.exists(self.stateFile) and sys.platform == "win32":
+            os.remove(self.stateFile)
+        os.rename(temporaryFile, self.stateFile)
+
+    ## Function fileHash(path)
+    #   md5 of the contents of a file (None: missing), cached by size and modification time
+    def fileHash(self, path):
+        path = os.path.abspath(path)
+        if not os.path.isfile(path):
+            return None
+        stat = os.stat(path)
+        cached = self.state["hashes"].get(path)
+        if cached is not None and cached[0] == stat.st_size and cached[1] == stat.st_mtime:
+            return cached[2]
+        md5 = hashlib.md5()
+        fileObject = open(path, "rb")
+        for chunk in iter(lambda: fileObject.read(1 << 20), b""):
+            md5.update(chunk)
+        fileObject.close()
+        self.state["hashes"][path] = [stat.st_size, stat.st_mtime, md5.hexdigest()]
+        return md5.hexdigest()
+
+    ## Function files(directory)
+    #   Files of a directory (hidden ones excluded, e.g. .DS_Store)
+    def files(self, directory):
+        if not os.path.isdir(directory):
+            return list()
+        return [os.path.join(directory, name) for name in sorted(os.listdir(directory))
+                if not name.startswith(".") and os.path.isfile(os.path.join(directory, name))]
+
+    ## Function log(key, action, reason)
+    #   Report a stage; returns True unless it failed
+    def log(self, key, action, reason):
+        self.report.append((key, action, reason))
+        print "--- Pipeline: " + key + " " + action + " (" + reason + ") ---"
+        return action != "failed"
+
+
+#
+# Batch mode
+#
+
+## Function main(argv)
+#   Command-line entry point: the pipeline of a spec file (JSON) {"rigid": {...}, "groups": {...}}, where each part holds the keyword
+#   arguments of RigidAlignmentLogic.runRigidAlignment and GroupWiseRegisterationLogic.runGroupWiseRegisteration. Returns the exit code.
+#   Run as: python -m GroupWiseRegisterationLib.GroupsPipeline spec.json
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(description="RigidAlignment -> SurfRemesh -> GROUPS, rerunning only the stale subjects and stages")
+    parser.add_argument("spec", help="pipeline spec file (JSON)")
+    parser.add_argument("--state", help="state file (default: [spec].state next to the spec file)")
+    parser.add_argument("--force", action="store_true", help="run every stage")
+    parser.add_argument("--dry-run", dest="dryRun", action="store_true", help="only report the stale stages")
+    parser.add_argument("--maxWorkers", type=int, default=0, help="concurrent SurfRemesh jobs (default: number of cores)")
+    parser.add_argument("--fullRegistration", action="store_true", help="register the whole population again when subjects are added")
+    parser.add_argument("--inspect", action="store_true", help="show the inputs and the aligned surfaces in ShapePopulationViewer (Slicer only)")
+    parser.add_argument("--rigidAlignment", help="RigidAlignment executable")
+    parser.add_argument("--surfRemesh", help="SurfRemesh executable")
+    parser.add_argument("--groups", help="GROUPS executable")
+    args = parser.parse_args(argv)
+
+    specFile = open(args.spec)
+    spec = json.load(specFile)
+    specFile.close()
+    pipeline = GroupsPipeline(rigid=spec.get("rigid"), groups=spec.get("groups"), stateFile=args.state or args.spec + ".state",
+                              maxWorkers=args.maxWorkers, addSubjects=not args.fullRegistration, inspect=args.inspect)
+    pipeline.rigidLogic.cliExecutables = dict(pipeline.rigidLogic.cliExecutables)
+    if args.rigidAlignment:
+        pipeline.rigidLogic.cliExecutables["rigidwrapper"] = args.rigidAlignment
+    if args.surfRemesh:
+        pipeline.rigidLogic.cliExecutables["SRemesh"] = args.surfRemesh
+    pipeline.groupsLogic.executable = args.groups
+    return 0 if pipeline.run(force=args.force, dryRun=args.dryRun) else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
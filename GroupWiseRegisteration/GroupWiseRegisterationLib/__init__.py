@@ -0,0 +1,3 @@
+# Modules shared by the GroupWiseRegisteration and RigidAlignment scripted modules:
+#   CohortManifest: index of the files of a cohort
+#   GroupsPipeline: make-style pipeline RigidAlignment -> SurfRemesh -> GROUPS
@@ -1,262 +1,682 @@
-import os
-import unittest
-import vtk, qt, ctk, slicer
-from slicer.ScriptedLoadableModule import *
-import logging
-
-#
-# RigidAlignment
-#
-
-class RigidAlignment(ScriptedLoadableModule):
-  """Uses ScriptedLoadableModule base class, available at:
-  https://github.com/Slicer/Slicer/blob/master/Base/Python/slicer/ScriptedLoadableModule.py
-  """
-
-  def __init__(self, parent):
-    ScriptedLoadableModule.__init__(self, parent)
-    self.parent.title = "RigidAlignment" # TODO make this more human readable by adding spaces
-    self.parent.categories = ["Quantification"]
-    self.parent.dependencies = []
-    self.parent.contributors = ["Mahmoud Mostapha (UNC)"] # replace with "Firstname Lastname (Organization)"
-    self.parent.helpText = """
-This is an example of scripted loadable module bundled in an extension.
-It performs a simple thresholding on the input volume and optionally captures a screenshot.
-"""
-    self.parent.helpText += self.getDefaultModuleDocumentationLink()
-    self.parent.acknowledgementText = """
-This file was originally developed by Jean-Christophe Fillion-Robin, Kitware Inc.
-and Steve Pieper, Isomics, Inc. and was partially funded by NIH grant 3P41RR013218-12S1.
-""" # replace with organization, grant and thanks.
-
-#
-# RigidAlignmentWidget
-#
-
-class RigidAlignmentWidget(ScriptedLoadableModuleWidget):
-  """Uses ScriptedLoadableModuleWidget base class, available at:
-  https://github.com/Slicer/Slicer/blob/master/Base/Python/slicer/ScriptedLoadableModule.py
-  """
-
-  def setup(self):
-    ScriptedLoadableModuleWidget.setup(self)
-    ###########################################################################
-    ##                                                                       ##
-    ##  Collapsible part for input/output parameters for RigidAlignment CLI  ##
-    ##                                                                       ##
-    ###########################################################################
-
-    self.ioCollapsibleButton = ctk.ctkCollapsibleButton()
-    self.ioCollapsibleButton.text = "IO"
-    self.layout.addWidget(self.ioCollapsibleButton)
-    self.ioQVBox = qt.QVBoxLayout(self.ioCollapsibleButton)
-
-    # --------------------------------- #
-    # ----- RigidAlignment Box DIRECTORIES ----- #
-    # --------------------------------- #
-    self.directoryGroupBox = qt.QGroupBox("Directories")
-    self.ioQVBox.addWidget(self.directoryGroupBox)
-    self.ioQFormLayout = qt.QFormLayout(self.directoryGroupBox)
-
-    # Selection of the directory containing the input models
-    self.inputMeshTypeHBox = qt.QVBoxLayout(self.directoryGroupBox)
-    self.inputModelsDirectorySelector = ctk.ctkDirectoryButton()
-    self.inputMeshTypeHBox.addWidget(self.inputModelsDirectorySelector)
-    self.ioQFormLayout.addRow(qt.QLabel("Input Models Directory:"), self.inputMeshTypeHBox)
-
-    # Selection of the input directory containing the landmark files 
-    self.inputFiducialDirectorySelector = ctk.ctkDirectoryButton()
-    self.ioQFormLayout.addRow(qt.QLabel("Input Fiducial Files Directory:"), self.inputFiducialDirectorySelector)
-
-    # Selection of the directory which contains the common spherical model
-    self.sphericalModelDirectorySelector = ctk.ctkDirectoryButton()
-    self.ioQFormLayout.addRow("Input Common Unit Sphere:", self.sphericalModelDirectorySelector)
-
-    # Selection of the output spheres directory
-    self.outputSphereDirectorySelector = ctk.ctkDirectoryButton()
-    self.ioQFormLayout.addRow(qt.QLabel("Output Spheres Directory:"), self.outputSphereDirectorySelector)
-
-    # Selection of the output surfaces directory
-    self.outputSurfacesDirectorySelector = ctk.ctkDirectoryButton()
-    self.ioQFormLayout.addRow(qt.QLabel("Output Surfaces Directory:"), self.outputSurfacesDirectorySelector)
-
-    # Connections
-    self.inputModelsDirectorySelector.connect("directoryChanged(const QString &)", self.onSelect)
-    self.inputFiducialDirectorySelector.connect("directoryChanged(const QString &)", self.onSelect)
-    self.sphericalModelDirectorySelector.connect("directoryChanged(const QString &)", self.onSelect)
-    self.outputSphereDirectorySelector.connect("directoryChanged(const QString &)", self.onSelect)
-    self.outputSurfacesDirectorySelector.connect("directoryChanged(const QString &)", self.onSelect)
-
-    # Name simplification (string)
-    self.modelsDirectory = str(self.inputModelsDirectorySelector.directory)
-    self.fiducialDirectory = str(self.inputFiducialDirectorySelector.directory)
-    self.sphericalDirectory = str(self.sphericalModelDirectorySelector.directory)
-    self.outputsphereDirectory = str(self.outputSphereDirectorySelector.directory)
-    self.outputsurfaceDirectory = str(self.outputSurfacesDirectorySelector.directory)
-    # ------------------------------------------ #
-    # ----- Apply button to launch the CLI ----- #
-    # ------------------------------------------ #
-    self.applyButton = qt.QPushButton("Apply")
-    self.applyButton.enabled = False
-    self.ioQVBox.addWidget(self.applyButton)
-
-    self.errorLabel = qt.QLabel("Error: Invalide inputs")
-    self.errorLabel.hide()
-    self.errorLabel.setStyleSheet("color: rgb(255, 0, 0);")
-    self.ioQVBox.addWidget(self.errorLabel)
-
-    # Connections
-    self.applyButton.connect('clicked(bool)', self.onApplyButtonClicked)
-
-    # ----- Add vertical spacer ----- #
-    self.layout.addStretch(1)
-
-  def cleanup(self):
-    pass
-
-  def onSelect(self):
-    # Update names
-    self.modelsDirectory = str(self.inputModelsDirectorySelector.directory)
-    self.fiducialDirectory = str(self.inputFiducialDirectorySelector.directory)
-    self.sphericalDirectory = str(self.sphericalModelDirectorySelector.directory)
-    self.outputsphereDirectory = str(self.outputSphereDirectorySelector.directory)
-    self.outputsurfaceDirectory = str(self.outputSurfacesDirectorySelector.directory)
-
-    # Check if each directory has been choosen
-    self.applyButton.enabled = self.modelsDirectory != "." and self.fiducialDirectory != "." and self.sphericalDirectory != "." and self.outputsphereDirectory != "." and self.outputsurfaceDirectory != "."
-
-    # Hide error message if printed
-    self.errorLabel.hide()
-
-  ## Function onSpecifyPropertyChanged(self):
-  # Enable/Disable associated weights
-
-  def onApplyButtonClicked(self):
-    logic = RigidAlignmentLogic()
-    self.errorLabel.hide()
-    # Update names
-    self.modelsDirectory = str(self.inputModelsDirectorySelector.directory)
-    self.fiducialDirectory = str(self.inputFiducialDirectorySelector.directory)
-    self.sphericalDirectory = str(self.sphericalModelDirectorySelector.directory)
-    self.outputsphereDirectory = str(self.outputSphereDirectorySelector.directory)
-    self.outputsurfaceDirectory = str(self.outputSurfacesDirectorySelector.directory)
-
-    endRigidAlignment = logic.runRigidAlignment(modelsDir=self.modelsDirectory, fiducialDir=self.fiducialDirectory, sphereDir=self.sphericalDirectory, outputsphereDir=self.outputDirectory, outputsurfaceDir=self.outputDirectory)
-
-    ## RigidAlignment didn't run because of invalid inputs
-    if not endRigidAlignment:
-        self.errorLabel.show()
-
-#
-# RigidAlignmentLogic
-#
-
-class RigidAlignmentLogic(ScriptedLoadableModuleLogic):
-  """This class should implement all the actual
-  computation done by your module.  The interface
-  should be such that other python code can import
-  this class and make use of the functionality without
-  requiring an instance of the Widget.
-  Uses ScriptedLoadableModuleLogic base class, available at:
-  https://github.com/Slicer/Slicer/blob/master/Base/Python/slicer/ScriptedLoadableModule.py
-  """
-
-  def runRigidAlignment(self, modelsDir, fiducialDir, sphereDir, outputsphereDir, outputsurfaceDir):
-    
-    # ------------------------------------ # 
-    # ---------- RigidAlignment ---------- # 
-    # ------------------------------------ # 
-
-    print "--- function runRigidAlignment() ---"
-    """
-    Calling RigidAlignment CLI
-        Arguments:
-         --mesh [<std::string> input models directory]
-         --landmark [<std::string> input fiducial files directory]
-         --sphere [<std::string> common unit sphere]
-         --output [<std::string> output sphers directory] 
-    """
-    print "--- Inspecting Input ---"
-    # Creation of the parameters of SPV
-    SPV_parameters = {}
-    SPV_parameters["Directory"] = modelsDir
-    #   If a binary of SPV has been installed
-    if hasattr(slicer.modules, 'shapepopulationviewer'):
-      SPV = slicer.modules.shapepopulationviewer
-    #   If SPV has been installed via the Extension Manager
-    elif hasattr(slicer.modules, 'launcher'):
-      SPV = slicer.modules.launcher
-    # Launch SPV
-    slicer.cli.run(module = SPV, node = None, parameters = SPV_parameters, wait_for_completion=True)
-    
-    print "--- Rigid Alignment Running ---"
-    # Run Rigid Alignment
-    RigidAlignment_parameters = {}
-    RigidAlignment_parameters["mesh"]       = modelsDir
-    RigidAlignment_parameters["landmark"]   = fiducialDir
-    RigidAlignment_parameters["sphere"]     = sphereDir
-    RigidAlignment_parameters["output"]     = outputsphereDir
-    slicer.cli.run(module = slicer.modules.rigidwrapper, node = None, parameters = RigidAlignment_parameters, wait_for_completion=True)
-    print "--- Rigid Alignment Done ---"
-
-    # ------------------------------------ # 
-    # ------------ SurfRemesh ------------ # 
-    # ------------------------------------ # 
-    print "--- function runSurfRemesh() ---"
-    """
-    Calling SurfRemesh CLI
-        Arguments:
-         -t [<std::string> input spheres directory]
-         -i [<std::string> input models directory]
-         -r [<std::string> common unit sphere]
-         -o [<std::string> output surfaces directory] 
-    """
-    listMesh = os.listdir(modelsDir)
-    listSphere = os.listdir(outputsphereDir)
-
-    if listMesh.count(".DS_Store"):
-      listMesh.remove(".DS_Store")
-    if listSphere.count(".DS_Store"):
-      listSphere.remove(".DS_Store")
-
-    for i in range(0,len(listMesh)):
-      print listSphere[i]
-      print listMesh[i]
-      # Run SurfRemesh
-      SurfRemesh_parameters = {}
-      SurfRemesh_parameters["tempModel"]     = os.path.join(outputsphereDir, listSphere[i])
-      SurfRemesh_parameters["input"]     = os.path.join(modelsDir, listMesh[i]) 
-      SurfRemesh_parameters["ref"]     = sphereDir
-      SurfRemesh_parameters["output"]     = os.path.join( outputsurfaceDir, listSphere[i].split("_rotSphere.vtk",1)[0] + "_aligned.vtk")
-      slicer.cli.run(module = slicer.modules.SRemesh, node = None, parameters = SurfRemesh_parameters, wait_for_completion=True)
-      print "--- Surface Remesh Done " + str(i) + "---"
-
-      # ------------------------------------ # 
-      # ------------ Color Maps ------------ # 
-      # ------------------------------------ # 
-      reader_in = vtk.vtkPolyDataReader()
-      reader_in.SetFileName(str(os.path.join(modelsDir, listMesh[i])))
-      reader_in.Update()
-      init_mesh = reader_in.GetOutput()
-
-      phiArray = init_mesh.GetPointData().GetScalars("_paraPhi")
-
-      reader_out = vtk.vtkPolyDataReader()
-      reader_out.SetFileName(os.path.join( outputsurfaceDir, listSphere[i].split("_rotSphere.vtk",1)[0] + "_aligned.vtk"))
-      reader_out.Update()
-      new_mesh = reader_out.GetOutput()
-      new_mesh.GetPointData().SetActiveScalars("_paraPhi")
-      new_mesh.GetPointData().SetScalars(phiArray)
-      new_mesh.Modified()
-      # write circle out
-      polyDataWriter = vtk.vtkPolyDataWriter()
-      polyDataWriter.SetInputData(new_mesh)
-      polyDataWriter.SetFileName(os.path.join( outputsurfaceDir, listSphere[i].split("_rotSphere.vtk",1)[0] + "_aligned.vtk"))
-      polyDataWriter.Write()
-    print "--- Rigid Alignment Done ---"
-    
-    print "--- Inspecting Results ---"
-    # Inspect Results
-    SPV_parameters = {}
-    SPV_parameters["Directory"] = outputsurfaceDir
-    slicer.cli.run(module = SPV, node = None, parameters = SPV_parameters, wait_for_completion=True)
\ No newline at end of file
+import os, sys
+import time, tempfile
+import subprocess
+import unittest
+import multiprocessing
+import logging
+
+# The GUI stack is only imported inside Slicer: run as a script (see main), the logic drives the CLIs with plain subprocess/VTK
+headless = __name__ == "__main__"
+if not headless:
+  try:
+    import qt, ctk, slicer
+    from slicer.ScriptedLoadableModule import *
+  except ImportError:
+    headless = True
+if headless:
+  qt = ctk = slicer = None
+  ScriptedLoadableModule = ScriptedLoadableModuleWidget = ScriptedLoadableModuleLogic = ScriptedLoadableModuleTest = object
+
+# CohortManifest is shared with GroupWiseRegisteration (GroupWiseRegisteration directory on PYTHONPATH in the batch mode)
+from GroupWiseRegisterationLib import CohortManifest
+
+#
+# RigidAlignment
+#
+
+class RigidAlignment(ScriptedLoadableModule):
+  """Uses ScriptedLoadableModule base class, available at:
+  https://github.com/Slicer/Slicer/blob/master/Base/Python/slicer/ScriptedLoadableModule.py
+  """
+
+  def __init__(self, parent):
+    ScriptedLoadableModule.__init__(self, parent)
+    self.parent.title = "RigidAlignment" # TODO make this more human readable by adding spaces
+    self.parent.categories = ["Quantification"]
+    self.parent.dependencies = []
+    self.parent.contributors = ["Mahmoud Mostapha (UNC)"] # replace with "Firstname Lastname (Organization)"
+    self.parent.helpText = """
+This is an example of scripted loadable module bundled in an extension.
+It performs a simple thresholding on the input volume and optionally captures a screenshot.
+"""
+    self.parent.helpText += self.getDefaultModuleDocumentationLink()
+    self.parent.acknowledgementText = """
+This file was originally developed by Jean-Christophe Fillion-Robin, Kitware Inc.
+and Steve Pieper, Isomics, Inc. and was partially funded by NIH grant 3P41RR013218-12S1.
+""" # replace with organization, grant and thanks.
+
+#
+# RigidAlignmentWidget
+#
+
+class RigidAlignmentWidget(ScriptedLoadableModuleWidget):
+  """Uses ScriptedLoadableModuleWidget base class, available at:
+  https://github.com/Slicer/Slicer/blob/master/Base/Python/slicer/ScriptedLoadableModule.py
+  """
+
+  def setup(self):
+    ScriptedLoadableModuleWidget.setup(self)
+    ###########################################################################
+    ##                                                                       ##
+    ##  Collapsible part for input/output parameters for RigidAlignment CLI  ##
+    ##                                                                       ##
+    ###########################################################################
+
+    self.ioCollapsibleButton = ctk.ctkCollapsibleButton()
+    self.ioCollapsibleButton.text = "IO"
+    self.layout.addWidget(self.ioCollapsibleButton)
+    self.ioQVBox = qt.QVBoxLayout(self.ioCollapsibleButton)
+
+    # --------------------------------- #
+    # ----- RigidAlignment Box DIRECTORIES ----- #
+    # --------------------------------- #
+    self.directoryGroupBox = qt.QGroupBox("Directories")
+    self.ioQVBox.addWidget(self.directoryGroupBox)
+    self.ioQFormLayout = qt.QFormLayout(self.directoryGroupBox)
+
+    # Selection of the directory containing the input models
+    self.inputMeshTypeHBox = qt.QVBoxLayout(self.directoryGroupBox)
+    self.inputModelsDirectorySelector = ctk.ctkDirectoryButton()
+    self.inputMeshTypeHBox.addWidget(self.inputModelsDirectorySelector)
+    self.ioQFormLayout.addRow(qt.QLabel("Input Models Directory:"), self.inputMeshTypeHBox)
+
+    # Selection of the input directory containing the landmark files 
+    self.inputFiducialDirectorySelector = ctk.ctkDirectoryButton()
+    self.ioQFormLayout.addRow(qt.QLabel("Input Fiducial Files Directory:"), self.inputFiducialDirectorySelector)
+
+    # Selection of the directory which contains the common spherical model
+    self.sphericalModelDirectorySelector = ctk.ctkDirectoryButton()
+    self.ioQFormLayout.addRow("Input Common Unit Sphere:", self.sphericalModelDirectorySelector)
+
+    # Selection of the output spheres directory
+    self.outputSphereDirectorySelector = ctk.ctkDirectoryButton()
+    self.ioQFormLayout.addRow(qt.QLabel("Output Spheres Directory:"), self.outputSphereDirectorySelector)
+
+    # Selection of the output surfaces directory
+    self.outputSurfacesDirectorySelector = ctk.ctkDirectoryButton()
+    self.ioQFormLayout.addRow(qt.QLabel("Output Surfaces Directory:"), self.outputSurfacesDirectorySelector)
+
+    # Connections
+    self.inputModelsDirectorySelector.connect("directoryChanged(const QString &)", self.onSelect)
+    self.inputFiducialDirectorySelector.connect("directoryChanged(const QString &)", self.onSelect)
+    self.sphericalModelDirectorySelector.connect("directoryChanged(const QString &)", self.onSelect)
+    self.outputSphereDirectorySelector.connect("directoryChanged(const QString &)", self.onSelect)
+    self.outputSurfacesDirectorySelector.connect("directoryChanged(const QString &)", self.onSelect)
+
+    # Name simplification (string)
+    self.modelsDirectory = str(self.inputModelsDirectorySelector.directory)
+    self.fiducialDirectory = str(self.inputFiducialDirectorySelector.directory)
+    self.sphericalDirectory = str(self.sphericalModelDirectorySelector.directory)
+    self.outputsphereDirectory = str(self.outputSphereDirectorySelector.directory)
+    self.outputsurfaceDirectory = str(self.outputSurfacesDirectorySelector.directory)
+
+    # --------------------------------- #
+    # ----- RigidAlignment Box EXECUTION ----- #
+    # --------------------------------- #
+    self.executionGroupBox = qt.QGroupBox("Execution")
+    self.ioQVBox.addWidget(self.executionGroupBox)
+    self.executionQFormLayout = qt.QFormLayout(self.executionGroupBox)
+
+    # Run the SurfRemesh jobs of all the subjects concurrently
+    self.concurrentCheckBox = ctk.ctkCheckBox()
+    self.concurrentCheckBox.setText("Run SurfRemesh concurrently")
+    self.executionQFormLayout.addRow(self.concurrentCheckBox)
+
+    # Number of SurfRemesh jobs running at the same time (default: number of cores)
+    self.workersSpinBox = qt.QSpinBox()
+    self.workersSpinBox.minimum = 1
+    self.workersSpinBox.maximum = 256
+    self.workersSpinBox.value = multiprocessing.cpu_count()
+    self.executionQFormLayout.addRow("Number of workers:", self.workersSpinBox)
+
+    # Format of the aligned surfaces (see RigidAlignmentLogic.outputFormats)
+    self.outputFormatComboBox = qt.QComboBox()
+    self.outputFormatComboBox.addItems(["ascii", "binary", "vtp"])
+    self.outputFormatComboBox.setToolTip("Aligned surfaces: legacy VTK (ASCII or binary) or compressed XML PolyData (not read by GROUPS)")
+    self.executionQFormLayout.addRow("Output format:", self.outputFormatComboBox)
+
+    self.progressBar = qt.QProgressBar()
+    self.progressBar.hide()
+    self.executionQFormLayout.addRow(self.progressBar)
+
+    # ------------------------------------------ #
+    # ----- Apply button to launch the CLI ----- #
+    # ------------------------------------------ #
+    self.applyButton = qt.QPushButton("Apply")
+    self.applyButton.enabled = False
+    self.ioQVBox.addWidget(self.applyButton)
+
+    self.errorLabel = qt.QLabel("Error: Invalide inputs")
+    self.errorLabel.hide()
+    self.errorLabel.setStyleSheet("color: rgb(255, 0, 0);")
+    self.ioQVBox.addWidget(self.errorLabel)
+
+    # Connections
+    self.applyButton.connect('clicked(bool)', self.onApplyButtonClicked)
+
+    # ----- Add vertical spacer ----- #
+    self.layout.addStretch(1)
+
+  def cleanup(self):
+    pass
+
+  def onSelect(self):
+    # Update names
+    self.modelsDirectory = str(self.inputModelsDirectorySelector.directory)
+    self.fiducialDirectory = str(self.inputFiducialDirectorySelector.directory)
+    self.sphericalDirectory = str(self.sphericalModelDirectorySelector.directory)
+    self.outputsphereDirectory = str(self.outputSphereDirectorySelector.directory)
+    self.outputsurfaceDirectory = str(self.outputSurfacesDirectorySelector.directory)
+
+    # Check if each directory has been choosen
+    self.applyButton.enabled = self.modelsDirectory != "." and self.fiducialDirectory != "." and self.sphericalDirectory != "." and self.outputsphereDirectory != "." and self.outputsurfaceDirectory != "."
+
+    # Hide error message if printed
+    self.errorLabel.hide()
+
+  ## Function onSpecifyPropertyChanged(self):
+  # Enable/Disable associated weights
+
+  def onApplyButtonClicked(self):
+    logic = RigidAlignmentLogic()
+    self.logic = logic  # keep the logic alive while concurrent jobs are running
+    self.errorLabel.hide()
+    # Update names
+    self.modelsDirectory = str(self.inputModelsDirectorySelector.directory)
+    self.fiducialDirectory = str(self.inputFiducialDirectorySelector.directory)
+    self.sphericalDirectory = str(self.sphericalModelDirectorySelector.directory)
+    self.outputsphereDirectory = str(self.outputSphereDirectorySelector.directory)
+    self.outputsurfaceDirectory = str(self.outputSurfacesDirectorySelector.directory)
+
+    self.progressBar.value = 0
+    self.progressBar.show()
+    endRigidAlignment = logic.runRigidAlignment(modelsDir=self.modelsDirectory, fiducialDir=self.fiducialDirectory, sphereDir=self.sphericalDirectory, outputsphereDir=self.outputsphereDirectory, outputsurfaceDir=self.outputsurfaceDirectory,
+                                                concurrent=self.concurrentCheckBox.checked, maxWorkers=self.workersSpinBox.value, progressCallback=self.onSurfRemeshProgress,
+                                                outputFormat=str(self.outputFormatComboBox.currentText))
+
+    ## RigidAlignment didn't run because of invalid inputs
+    if not endRigidAlignment:
+        self.errorLabel.show()
+
+  ## Function onSurfRemeshProgress(nDone, nJobs, name, success):
+  # Update the progress bar after each subject
+  def onSurfRemeshProgress(self, nDone, nJobs, name, success):
+    self.progressBar.maximum = nJobs
+    self.progressBar.value = nDone
+    self.progressBar.setFormat(str(nDone) + "/" + str(nJobs) + " - " + name)
+
+#
+# RigidAlignmentLogic
+#
+
+class RigidAlignmentLogic(ScriptedLoadableModuleLogic):
+  """This class should implement all the actual
+  computation done by your module.  The interface
+  should be such that other python code can import
+  this class and make use of the functionality without
+  requiring an instance of the Widget.
+  Uses ScriptedLoadableModuleLogic base class, available at:
+  https://github.com/Slicer/Slicer/blob/master/Base/Python/slicer/ScriptedLoadableModule.py
+  """
+
+  ## Executables and command-line flags of the CLIs in the batch mode (inside Slicer, the parameters are passed by name to slicer.cli.run)
+  cliExecutables = {"rigidwrapper": "RigidAlignment", "SRemesh": "SurfRemesh"}
+  cliFlags = {"rigidwrapper": {"mesh": "--mesh", "landmark": "--landmark", "sphere": "--sphere", "output": "--output"},
+              "SRemesh": {"tempModel": "-t", "input": "-i", "ref": "-r", "output": "-o"}}
+  ## Formats of the aligned surfaces: legacy VTK (ASCII or binary) or compressed XML PolyData, with their extension
+  outputFormats = {"ascii": ".vtk", "binary": ".vtk", "vtp": ".vtp"}
+
+  ## Function runRigidAlignment(...):
+  # RigidAlignment of the cohort, then SurfRemesh and the color map of each subject.
+  # inspect: show the inputs and the results in ShapePopulationViewer (non-blocking)
+  # outputFormat: format of the aligned surfaces (see outputFormats); GROUPS only reads the legacy ones
+  def runRigidAlignment(self, modelsDir, fiducialDir, sphereDir, outputsphereDir, outputsurfaceDir, concurrent=False, maxWorkers=None, progressCallback=None,
+                        inspect=True, outputFormat="ascii"):
+    if outputFormat not in self.outputFormats:
+      print "Unknown output format " + str(outputFormat) + " (" + ", ".join(sorted(self.outputFormats)) + ")"
+      return False
+    if not self.checkInputs(modelsDir, fiducialDir):
+      return False
+    if inspect:
+      print "--- Inspecting Input ---"
+      self.launchViewer(modelsDir)
+
+    if not self.runRigidWrapper(modelsDir, fiducialDir, sphereDir, outputsphereDir):
+      return False
+    jobs = self.surfRemeshJobs(modelsDir, sphereDir, outputsphereDir, outputsurfaceDir, outputFormat)
+
+    if slicer is None:
+      # batch mode: SurfRemesh processes (concurrent ones if requested) and no viewer
+      nFailed = self.runSurfRemeshBatch(jobs, maxWorkers=maxWorkers if concurrent else 1, progressCallback=progressCallback)
+      print "--- Rigid Alignment Done ---"
+      return nFailed == 0
+
+    if concurrent:
+      # SurfRemesh jobs run asynchronously; the color maps of each subject are
+      # transferred as soon as its job finishes and SPV is launched once all are done
+      def onAllDone(nFailed):
+        print "--- Rigid Alignment Done ---"
+        if inspect:
+          print "--- Inspecting Results ---"
+          self.launchViewer(outputsurfaceDir)
+      self.runSurfRemeshConcurrent(jobs, maxWorkers=maxWorkers, progressCallback=progressCallback, finishedCallback=onAllDone)
+      return True
+
+    for i in range(0,len(jobs)):
+      print jobs[i]["tempModel"]
+      print jobs[i]["input"]
+      # Run SurfRemesh
+      cliNode = slicer.cli.run(module = slicer.modules.SRemesh, node = None, parameters = self.surfRemeshParameters(jobs[i]), wait_for_completion=True)
+      print "--- Surface Remesh Done " + str(i) + "---"
+
+      # ------------------------------------ # 
+      # ------------ Color Maps ------------ # 
+      # ------------------------------------ # 
+      success = cliNode.GetStatus() == cliNode.Completed and self.transferColorMap(jobs[i]["input"], jobs[i]["remeshed"], jobs[i]["output"], jobs[i]["format"])
+      if progressCallback:
+        progressCallback(i + 1, len(jobs), jobs[i]["name"], success)
+    print "--- Rigid Alignment Done ---"
+    
+    if inspect:
+      print "--- Inspecting Results ---"
+      self.launchViewer(outputsurfaceDir)
+    return True
+
+  ## Function checkInputs(modelsDir, fiducialDir):
+  # Check that each model has its fiducial file (see CohortManifest.rigidCohort)
+  def checkInputs(self, modelsDir, fiducialDir):
+    manifest = CohortManifest.CohortManifest()
+    subjects, errors = manifest.rigidCohort(modelsDir, fiducialDir)
+    manifest.save()
+    for error in errors:
+      print error
+    return len(subjects) > 0 and not errors
+
+  ## Function runRigidWrapper(modelsDir, fiducialDir, sphereDir, outputsphereDir):
+  # RigidAlignment CLI of the cohort (blocking): writes the [name]_rotSphere.vtk spheres to outputsphereDir
+  def runRigidWrapper(self, modelsDir, fiducialDir, sphereDir, outputsphereDir):
+    # ------------------------------------ # 
+    # ---------- RigidAlignment ---------- # 
+    # ------------------------------------ # 
+
+    print "--- function runRigidAlignment() ---"
+    """
+    Calling RigidAlignment CLI
+        Arguments:
+         --mesh [<std::string> input models directory]
+         --landmark [<std::string> input fiducial files directory]
+         --sphere [<std::string> common unit sphere]
+         --output [<std::string> output sphers directory] 
+    """
+    print "--- Rigid Alignment Running ---"
+    # Run Rigid Alignment
+    RigidAlignment_parameters = {}
+    RigidAlignment_parameters["mesh"]       = modelsDir
+    RigidAlignment_parameters["landmark"]   = fiducialDir
+    RigidAlignment_parameters["sphere"]     = sphereDir
+    RigidAlignment_parameters["output"]     = outputsphereDir
+    if slicer is not None:
+      slicer.cli.run(module = slicer.modules.rigidwrapper, node = None, parameters = RigidAlignment_parameters, wait_for_completion=True)
+    elif subprocess.call(self.cliCommand("rigidwrapper", RigidAlignment_parameters)) != 0:
+      print "RigidAlignment failed"
+      return False
+    print "--- Rigid Alignment Done ---"
+    return True
+
+  ## Function surfRemeshJobs(modelsDir, sphereDir, outputsphereDir, outputsurfaceDir, outputFormat="ascii"):
+  # SurfRemesh jobs of the subjects: dict(name, tempModel, input, ref, remeshed, output, format)
+  # SurfRemesh writes the legacy [id]_aligned.vtk (remeshed), which the color map rewrites as the aligned surface (output) in the format
+  def surfRemeshJobs(self, modelsDir, sphereDir, outputsphereDir, outputsurfaceDir, outputFormat="ascii"):
+    # ------------------------------------ # 
+    # ------------ SurfRemesh ------------ # 
+    # ------------------------------------ # 
+    print "--- function runSurfRemesh() ---"
+    """
+    Calling SurfRemesh CLI
+        Arguments:
+         -t [<std::string> input spheres directory]
+         -i [<std::string> input models directory]
+         -r [<std::string> common unit sphere]
+         -o [<std::string> output surfaces directory] 
+    """
+    # the subjects are paired by name: the listing orders of the two directories may differ
+    manifest = CohortManifest.CohortManifest()
+    subjects, errors = manifest.rigidCohort(modelsDir, None, outputsphereDir, outputsurfaceDir)
+    manifest.save()
+    for error in errors:
+      print error
+
+    jobs = list()
+    for subject in subjects:
+      if subject["sphere"] is None:
+        print "SurfRemesh. No rotated sphere for " + subject["id"] + " (skipped)"
+        continue
+      job = {}
+      job["name"]      = subject["id"]
+      job["tempModel"] = subject["sphere"]
+      job["input"]     = subject["mesh"]
+      job["ref"]       = sphereDir
+      job["output"]    = os.path.splitext(subject["output"])[0] + self.outputFormats[outputFormat]
+      job["format"]    = outputFormat
+      job["remeshed"]  = subject["output"]
+      jobs.append(job)
+    return jobs
+
+  ## Function launchViewer(directory):
+  # Show the models of a directory in ShapePopulationViewer without waiting for it (skipped in the batch mode)
+  def launchViewer(self, directory):
+    if slicer is None:
+      return
+    # Creation of the parameters of SPV
+    SPV_parameters = {}
+    SPV_parameters["Directory"] = directory
+    #   If a binary of SPV has been installed
+    if hasattr(slicer.modules, 'shapepopulationviewer'):
+      SPV = slicer.modules.shapepopulationviewer
+    #   If SPV has been installed via the Extension Manager
+    elif hasattr(slicer.modules, 'launcher'):
+      SPV = slicer.modules.launcher
+    # Launch SPV
+    slicer.cli.run(module = SPV, node = None, parameters = SPV_parameters, wait_for_completion=False)
+
+  ## Function cliCommand(module, parameters):
+  # Command line of a CLI run as a subprocess (inside Slicer, the executable of the CLI module)
+  def cliCommand(self, module, parameters):
+    command = [self.cliExecutables[module] if slicer is None else getattr(slicer.modules, module).path]
+    for name in sorted(parameters.keys()):
+      command += [self.cliFlags[module][name], str(parameters[name])]
+    return command
+
+  ## Function surfRemeshParameters(job):
+  # SurfRemesh CLI parameters of one subject
+  def surfRemeshParameters(self, job):
+    SurfRemesh_parameters = {}
+    SurfRemesh_parameters["tempModel"]  = job["tempModel"]
+    SurfRemesh_parameters["input"]      = job["input"]
+    SurfRemesh_parameters["ref"]        = job["ref"]
+    SurfRemesh_parameters["output"]     = job["remeshed"]
+    return SurfRemesh_parameters
+
+  ## Function transferColorMap(inputMesh, remeshedMesh, alignedMesh, outputFormat="ascii"):
+  # Copy the _paraPhi color map of the input mesh onto the remeshed surface and write the aligned surface (see outputFormats).
+  # The array is shared between both meshes (no copy of the values). A legacy aligned surface replaces the remeshed one in place;
+  # the remeshed one is removed once a .vtp is written. Returns False if the color map or the write failed
+  def transferColorMap(self, inputMesh, remeshedMesh, alignedMesh, outputFormat="ascii"):
+    import vtk
+    reader_in = vtk.vtkPolyDataReader()
+    reader_in.SetFileName(str(inputMesh))
+    reader_in.Update()
+    init_mesh = reader_in.GetOutput()
+
+    phiArray = init_mesh.GetPointData().GetScalars("_paraPhi")
+
+    reader_out = vtk.vtkPolyDataReader()
+    reader_out.SetFileName(str(remeshedMesh))
+    reader_out.Update()
+    new_mesh = reader_out.GetOutput()
+    if phiArray is None or phiArray.GetNumberOfTuples() != new_mesh.GetNumberOfPoints():
+      print "Color map. No _paraPhi array matching the " + str(new_mesh.GetNumberOfPoints()) + " points of the remeshed surface in " + str(inputMesh)
+      return False
+    new_mesh.GetPointData().SetScalars(phiArray)
+    new_mesh.Modified()
+
+    # write circle out
+    if outputFormat == "vtp":
+      polyDataWriter = vtk.vtkXMLPolyDataWriter()
+      polyDataWriter.SetDataModeToAppended()
+      polyDataWriter.SetCompressorTypeToZLib()
+    else:
+      polyDataWriter = vtk.vtkPolyDataWriter()
+      if outputFormat == "binary":
+        polyDataWriter.SetFileTypeToBinary()
+    polyDataWriter.SetInputData(new_mesh)
+    polyDataWriter.SetFileName(str(alignedMesh))
+    if polyDataWriter.Write() != 1:
+      return False
+    if os.path.abspath(alignedMesh) != os.path.abspath(remeshedMesh):
+      os.remove(remeshedMesh)
+    return True
+
+  ## Function runSurfRemeshConcurrent(jobs, maxWorkers, progressCallback, finishedCallback):
+  # Launch SurfRemesh asynchronously with at most maxWorkers jobs running at the same time
+  # (default: number of cores). The color map of a subject is transferred as soon as its
+  # SurfRemesh job is completed, while the other jobs keep running.
+  #   progressCallback(nDone, nJobs, name, success) is called after each subject
+  #   finishedCallback(nFailed) is called once every job is done
+  # Returns immediately; the jobs are driven by the CLI node observers so the UI stays responsive.
+  def runSurfRemeshConcurrent(self, jobs, maxWorkers=None, progressCallback=None, finishedCallback=None):
+    if not maxWorkers or maxWorkers < 1:
+      maxWorkers = multiprocessing.cpu_count()
+
+    self.pendingJobs = list(jobs)
+    self.runningJobs = {}
+    self.nJobs = len(jobs)
+    self.nDone = 0
+    self.nFailed = 0
+    self.progressCallback = progressCallback
+    self.finishedCallback = finishedCallback
+    self.maxWorkers = maxWorkers
+
+    print "--- SurfRemesh: " + str(self.nJobs) + " subjects, " + str(maxWorkers) + " workers ---"
+    if not self.nJobs:
+      if finishedCallback:
+        finishedCallback(0)
+      return
+    self.launchPendingJobs()
+
+  def launchPendingJobs(self):
+    while self.pendingJobs and len(self.runningJobs) < self.maxWorkers:
+      job = self.pendingJobs.pop(0)
+      cliNode = slicer.cli.run(module = slicer.modules.SRemesh, node = None, parameters = self.surfRemeshParameters(job), wait_for_completion=False)
+      tag = cliNode.AddObserver('ModifiedEvent', self.onSurfRemeshModified)
+      self.runningJobs[cliNode.GetID()] = (cliNode, tag, job)
+
+  def onSurfRemeshModified(self, cliNode, event):
+    if cliNode.IsBusy() or cliNode.GetID() not in self.runningJobs:
+      return
+    cliNode, tag, job = self.runningJobs.pop(cliNode.GetID())
+    cliNode.RemoveObserver(tag)
+
+    remeshed = cliNode.GetStatus() == cliNode.Completed
+    if not remeshed:
+      print "SurfRemesh failed for " + job["name"] + ": " + cliNode.GetStatusString()
+    # ------------ Color Maps ------------ #
+    success = remeshed and self.transferColorMap(job["input"], job["remeshed"], job["output"], job["format"])
+    if not success:
+      self.nFailed += 1
+    slicer.mrmlScene.RemoveNode(cliNode)
+
+    self.nDone += 1
+    print "--- Surface Remesh Done " + str(self.nDone) + "/" + str(self.nJobs) + " (" + job["name"] + ") ---"
+    if self.progressCallback:
+      self.progressCallback(self.nDone, self.nJobs, job["name"], success)
+
+    # keep the workers busy
+    self.launchPendingJobs()
+    if self.nDone == self.nJobs and self.finishedCallback:
+      self.finishedCallback(self.nFailed)
+
+  ## Function runSurfRemeshBatch(jobs, maxWorkers, progressCallback):
+  # Batch-mode counterpart of runSurfRemeshConcurrent: SurfRemesh processes with at most maxWorkers running at the same time
+  # (default: number of cores), the color map of a subject being transferred as soon as its process exits.
+  # Blocks until every job is done and returns the number of failed jobs.
+  def runSurfRemeshBatch(self, jobs, maxWorkers=None, progressCallback=None):
+    if not maxWorkers or maxWorkers < 1:
+      maxWorkers = multiprocessing.cpu_count()
+
+    print "--- SurfRemesh: " + str(len(jobs)) + " subjects, " + str(maxWorkers) + " workers ---"
+    pendingJobs = list(jobs)
+    runningJobs = list()
+    nDone = 0
+    nFailed = 0
+    while pendingJobs or runningJobs:
+      while pendingJobs and len(runningJobs) < maxWorkers:
+        job = pendingJobs.pop(0)
+        runningJobs.append((subprocess.Popen(self.cliCommand("SRemesh", self.surfRemeshParameters(job))), job))
+      time.sleep(0.05)
+      for process, job in list(runningJobs):
+        if process.poll() is None:
+          continue
+        runningJobs.remove((process, job))
+
+        if process.returncode != 0:
+          print "SurfRemesh failed for " + job["name"] + ": exit code " + str(process.returncode)
+        # ------------ Color Maps ------------ #
+        success = process.returncode == 0 and self.transferColorMap(job["input"], job["remeshed"], job["output"], job["format"])
+        if not success:
+          nFailed += 1
+
+        nDone += 1
+        print "--- Surface Remesh Done " + str(nDone) + "/" + str(len(jobs)) + " (" + job["name"] + ") ---"
+        if progressCallback:
+          progressCallback(nDone, len(jobs), job["name"], success)
+    return nFailed
+
+  ## Function benchmarkColorMap(nPoints=100000, repeat=3):
+  # Time of the color map stage of one subject (read the input mesh and the remeshed surface, write the aligned surface)
+  # for each output format, on a synthetic sphere of about nPoints vertices written in ASCII like the SPHARM meshes and SurfRemesh
+  def benchmarkColorMap(self, nPoints=100000, repeat=3):
+    import vtk, math, shutil
+    resolution = int(math.sqrt(nPoints)) + 1
+    sphere = vtk.vtkSphereSource()
+    sphere.SetThetaResolution(resolution)
+    sphere.SetPhiResolution(resolution)
+    sphere.Update()
+    mesh = sphere.GetOutput()
+    phiArray = vtk.vtkFloatArray()
+    phiArray.SetName("_paraPhi")
+    phiArray.SetNumberOfTuples(mesh.GetNumberOfPoints())
+    for i in range(0, mesh.GetNumberOfPoints()):
+      x, y, z = mesh.GetPoint(i)
+      phiArray.SetValue(i, math.atan2(y, x))
+    mesh.GetPointData().SetScalars(phiArray)
+
+    benchmarkDir = tempfile.mkdtemp(prefix="RigidAlignmentBenchmark")
+    inputMesh = os.path.join(benchmarkDir, "input.vtk")
+    remeshedMesh = os.path.join(benchmarkDir, "aligned.vtk")
+    writer = vtk.vtkPolyDataWriter()
+    writer.SetInputData(mesh)
+    writer.SetFileName(inputMesh)
+    writer.Write()
+
+    print "--- Color map benchmark: " + str(mesh.GetNumberOfPoints()) + " points, " + str(repeat) + " runs ---"
+    print "format\tseconds/subject\toutput bytes"
+    results = dict()
+    try:
+      for outputFormat in sorted(self.outputFormats):
+        alignedMesh = os.path.join(benchmarkDir, "aligned" + self.outputFormats[outputFormat])
+        seconds = 0
+        for i in range(0, repeat):
+          shutil.copy(inputMesh, remeshedMesh)    # output of SurfRemesh, replaced or removed by the color map
+          start = time.time()
+          self.transferColorMap(inputMesh, remeshedMesh, alignedMesh, outputFormat)
+          seconds += time.time() - start
+        results[outputFormat] = seconds / repeat
+        print outputFormat + "\t" + "%.3f" % results[outputFormat] + "\t" + str(os.path.getsize(alignedMesh))
+    finally:
+      shutil.rmtree(benchmarkDir)
+    return results
+
+#
+# Batch mode
+#
+
+## Environment variables of the job-array index of the usual schedulers, with the index of their first task
+arrayTaskVariables = [("SLURM_ARRAY_TASK_ID", 0), ("PBS_ARRAYID", 0), ("SGE_TASK_ID", 1), ("LSB_JOBINDEX", 1)]
+
+## Function loadCohort(filename):
+# Jobs of a cohort spec file (JSON): either a list of jobs, or {"defaults": {...}, "jobs": [...]} with the arguments shared by all the jobs.
+# A job is a dictionary of keyword arguments of RigidAlignmentLogic.runRigidAlignment (modelsDir, fiducialDir, sphereDir, ...)
+def loadCohort(filename):
+  import json
+  specFile = open(filename)
+  spec = json.load(specFile)
+  specFile.close()
+  if isinstance(spec, list):
+    spec = {"jobs": spec}
+  jobs = list()
+  for job in spec["jobs"]:
+    arguments = dict(spec.get("defaults", {}))
+    arguments.update(job)
+    jobs.append(dict((str(key), value) for key, value in arguments.items()))
+  return jobs
+
+## Function arrayTask():
+# Index of the current task of a scheduler job array (None: not in a job array)
+def arrayTask():
+  for variable, first in arrayTaskVariables:
+    value = os.environ.get(variable, "")
+    if value.isdigit():
+      return int(value) - first
+  return None
+
+## Function main(argv):
+# Command-line entry point: one rigid alignment from the arguments, or the jobs of a cohort spec file
+# (a single one in a job array: --task, or the array index of the scheduler). Returns the exit code.
+def main(argv=None):
+  import argparse
+  parser = argparse.ArgumentParser(description="Rigid alignment of spherical maps (RigidAlignment + SurfRemesh) without the Slicer GUI")
+  parser.add_argument("--cohort", help="cohort spec file (JSON, see loadCohort)")
+  parser.add_argument("--task", type=int, help="index of the cohort job to run (default: the job-array index of the scheduler, or every job)")
+  parser.add_argument("--list", action="store_true", help="print the number of cohort jobs and exit")
+  parser.add_argument("--rigidAlignment", help="RigidAlignment executable (default: " + RigidAlignmentLogic.cliExecutables["rigidwrapper"] + ")")
+  parser.add_argument("--surfRemesh", help="SurfRemesh executable (default: " + RigidAlignmentLogic.cliExecutables["SRemesh"] + ")")
+  parser.add_argument("--modelsDir", help="input models directory")
+  parser.add_argument("--fiducialDir", help="input fiducial files directory")
+  parser.add_argument("--sphereDir", help="common unit sphere")
+  parser.add_argument("--outputsphereDir", help="output spheres directory")
+  parser.add_argument("--outputsurfaceDir", help="output surfaces directory")
+  parser.add_argument("--maxWorkers", type=int, help="concurrent SurfRemesh processes (default: 1; 0: number of cores)")
+  parser.add_argument("--outputFormat", choices=sorted(RigidAlignmentLogic.outputFormats), help="format of the aligned surfaces (default: ascii)")
+  parser.add_argument("--benchmark", type=int, metavar="POINTS", help="time the color map stage of one subject of POINTS vertices (e.g. 100000) and exit")
+  args = parser.parse_args(argv)
+
+  if args.benchmark:
+    RigidAlignmentLogic().benchmarkColorMap(args.benchmark)
+    return 0
+
+  if args.cohort:
+    jobs = loadCohort(args.cohort)
+    if args.list:
+      print len(jobs)
+      return 0
+    task = args.task if args.task is not None else arrayTask()
+    if task is not None:
+      if task < 0 or task >= len(jobs):
+        print "Task " + str(task) + " is out of the " + str(len(jobs)) + " jobs of " + args.cohort
+        return 1
+      jobs = [jobs[task]]
+  else:
+    names = ["modelsDir", "fiducialDir", "sphereDir", "outputsphereDir", "outputsurfaceDir"]
+    if [name for name in names if getattr(args, name) is None]:
+      parser.error("--cohort or all of --" + ", --".join(names) + " are required")
+    job = dict((name, getattr(args, name)) for name in names)
+    if args.maxWorkers is not None:
+      job["concurrent"] = True
+      job["maxWorkers"] = args.maxWorkers
+    jobs = [job]
+  if args.outputFormat:
+    for job in jobs:
+      job["outputFormat"] = args.outputFormat
+
+  logic = RigidAlignmentLogic()
+  logic.cliExecutables = dict(logic.cliExecutables)
+  if args.rigidAlignment:
+    logic.cliExecutables["rigidwrapper"] = args.rigidAlignment
+  if args.surfRemesh:
+    logic.cliExecutables["SRemesh"] = args.surfRemesh
+
+  nFailed = 0
+  for i in range(0, len(jobs)):
+    print "--- Job " + str(i + 1) + "/" + str(len(jobs)) + " ---"
+    try:
+      success = logic.runRigidAlignment(**jobs[i])
+    except (TypeError, OSError), e:
+      print "Job failed " + str(jobs[i]) + ": " + str(e)
+      success = False
+    if not success:
+      nFailed += 1
+  return 0 if nFailed == 0 else 1
+
+if __name__ == "__main__":
+  sys.exit(main())